@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User
+from .models import User, RevokedToken
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
@@ -42,4 +42,14 @@ class UserAdmin(BaseUserAdmin):
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.select_related()
\ No newline at end of file
+        return qs.select_related()
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    """Revoked tokens and sessions; adding a row here revokes it"""
+    
+    list_display = ['jti', 'reason', 'user', 'expires_at', 'created_at']
+    list_filter = ['reason', 'created_at']
+    search_fields = ['jti', 'user__email']
+    raw_id_fields = ['user']
+    ordering = ['-created_at']
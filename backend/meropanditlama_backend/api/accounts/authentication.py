@@ -0,0 +1,202 @@
+"""
+JWT authentication without a user query on read requests.
+
+CachedJWTAuthentication resolves the token's user, with its
+provider_profile, from the cache for GET/HEAD/OPTIONS requests; writes
+always load both from the database (select_related, one query) and
+refresh the entry. An entry holds their field values but not the
+password hash: the user is rebuilt with the password deferred, and only
+the digest of it that tokens carry (CHECK_REVOKE_TOKEN) is cached.
+Entries live for AUTH_USER_CACHE_TIMEOUT seconds under
+a per-user version; saving or deleting the user or its ServiceProvider
+bumps the version after commit (see signals.py), so role, active flag
+and profile changes apply on the next request. QuerySet.update() sends
+no signals; call invalidate_user() after one.
+
+With AUTH_TRUST_TOKEN_CLAIMS, read requests whose token carries the
+`role` and `provider_id` claims issued by tokens_for() skip the cache as
+well: the user is built from the claims with its other fields deferred,
+and the first access to one of them loads them all in one query. A role
+change or deactivation then only applies to tokens issued afterwards.
+"""
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from api import metrics
+from .models import User
+from .revocation import is_token_revoked, start_session
+
+CACHE_TIMEOUT = getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60)
+TRUST_TOKEN_CLAIMS = getattr(settings, 'AUTH_TRUST_TOKEN_CLAIMS', False)
+
+
+def _version_key(user_id):
+    return f'auth:user-version:{user_id}'
+
+
+def get_user_version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(user_id):
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted: start past any version handed out before
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def invalidate_user(user_id):
+    """Drop a user's cached entry once the current transaction commits"""
+    transaction.on_commit(partial(_bump, user_id))
+
+
+def load_user(user_id):
+    """The user with provider_profile (or its absence) already cached on it"""
+    return User.objects.select_related('provider_profile').get(
+        **{api_settings.USER_ID_FIELD: user_id}
+    )
+
+
+def tokens_for(user, sid=None, generation=0):
+    """
+    Refresh token (access token via .access_token) carrying role and
+    provider_id claims, for a new login session or, refreshing, for the
+    `generation` of session `sid`
+    """
+    from api.providers.models import ServiceProvider
+
+    refresh = RefreshToken.for_user(user)
+    # Login session id, inherited by refreshed and access tokens; revoking it logs the session out
+    refresh['sid'] = sid or start_session(user)
+    # Only the refresh token of the session's current generation can rotate (see revocation.py)
+    refresh['gen'] = generation
+    refresh['role'] = user.role
+    refresh['provider_id'] = (
+        ServiceProvider.objects.filter(user=user).values_list('id', flat=True).first()
+        if user.role == 'provider' else None
+    )
+    return refresh
+
+
+def _load_deferred(instance, model, using=None, fields=None):
+    # Any deferred field loads all of them, not one query per field
+    model.refresh_from_db(instance, using=using, fields=instance.get_deferred_fields() or fields)
+
+
+def _from_claims(model, **values):
+    """An instance with the given field values and every other field deferred"""
+    # from_db() takes the values in field order
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    instance = model.from_db(DEFAULT_DB_ALIAS, names, [values[name] for name in names])
+    instance.refresh_from_db = partial(_load_deferred, instance, model)
+    return instance
+
+
+def claims_user(validated_token):
+    """A User built from token claims; other fields load in one query on first access"""
+    from api.providers.models import ServiceProvider
+
+    user_id = validated_token[api_settings.USER_ID_CLAIM]
+    user = _from_claims(User, id=user_id, role=validated_token['role'], is_active=True)
+    provider = None
+    if validated_token.get('provider_id') is not None:
+        provider = _from_claims(ServiceProvider, id=validated_token['provider_id'], user_id=user_id)
+        ServiceProvider._meta.get_field('user').set_cached_value(provider, user)
+    User._meta.get_field('provider_profile').set_cached_value(user, provider)
+    return user
+
+
+def _field_values(instance, exclude=()):
+    return {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields if field.attname not in exclude
+    }
+
+
+def cache_entry(user):
+    """What the cache keeps of a user loaded by load_user()"""
+    provider = User._meta.get_field('provider_profile').get_cached_value(user)
+    return {
+        'user': _field_values(user, exclude=('password',)),
+        'provider': None if provider is None else _field_values(provider),
+        'password_hash': get_md5_hash_password(user.password) if api_settings.CHECK_REVOKE_TOKEN else None,
+    }
+
+
+def entry_user(entry):
+    """The user of a cache entry, provider_profile set and the password deferred"""
+    from api.providers.models import ServiceProvider
+
+    user = _from_claims(User, **entry['user'])
+    provider = None
+    if entry['provider'] is not None:
+        provider = _from_claims(ServiceProvider, **entry['provider'])
+        ServiceProvider._meta.get_field('user').set_cached_value(provider, user)
+    User._meta.get_field('provider_profile').set_cached_value(user, provider)
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that serves read requests' users from the cache (or token claims)"""
+
+    def authenticate(self, request):
+        # DRF creates authenticators per request, so this is the request's method
+        self.read_only = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if is_token_revoked(validated_token):
+            raise InvalidToken(_('Token has been revoked'))
+        return validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        if self.read_only and TRUST_TOKEN_CLAIMS and 'role' in validated_token:
+            return claims_user(validated_token)
+
+        version = get_user_version(user_id)
+        key = f'auth:user-fields:{user_id}:{version}'
+        entry = cache.get(key) if self.read_only else None
+        if entry is not None:
+            metrics.inc('cache_requests_total', cache='auth', result='hit')
+            user = entry_user(entry)
+        else:
+            if self.read_only:
+                metrics.inc('cache_requests_total', cache='auth', result='miss')
+            try:
+                user = load_user(user_id)
+            except User.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            entry = cache_entry(user)
+            cache.set(key, entry, CACHE_TIMEOUT)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != entry['password_hash']:
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
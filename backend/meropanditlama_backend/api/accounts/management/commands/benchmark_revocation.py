@@ -0,0 +1,124 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from api.accounts.authentication import CachedJWTAuthentication, tokens_for
+from api.accounts.models import RevokedToken, User
+from api.accounts.revocation import FALSE_POSITIVE_RATE, is_token_revoked, revocation_list
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the revoked-token check against a large revocation table: the '
+        'Bloom filter build, lookups of tokens that are and are not revoked, '
+        'the false positive rate and the check\'s share of authenticating a '
+        'request. Fails if the filter lets a revoked token through or reads '
+        'the table on more misses than its false positive rate allows. Runs '
+        'inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--revoked', type=int, default=1000000, help='Revoked tokens in the table')
+        parser.add_argument('--lookups', type=int, default=100000, help='Lookups of tokens that are not revoked')
+        parser.add_argument('--requests', type=int, default=2000, help='Authenticated requests timed')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['revoked'] < 1 or options['lookups'] < 1 or options['requests'] < 1:
+            raise CommandError('--revoked, --lookups and --requests must be at least 1')
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            try:
+                revoked = self._seed(rng, options['revoked'])
+                self._run(rng, revoked, options)
+            finally:
+                # The filter describes rows that are about to be rolled back
+                revocation_list.filter = None
+                transaction.set_rollback(True)
+
+    def _run(self, rng, revoked, options):
+        began = time.perf_counter()
+        revocation_list.rebuild()
+        build_ms = (time.perf_counter() - began) * 1000
+        bloom = revocation_list.filter
+        self.stdout.write(
+            f'filter: built in {build_ms:.0f} ms, {len(bloom.bits) / 2 ** 20:.1f} MiB, '
+            f'{bloom.count} items of {bloom.capacity}, {bloom.hashes} hashes'
+        )
+
+        # Tokens that were never revoked: any table read is a false positive
+        misses = [self._jti(rng) for _ in range(options['lookups'])]
+        with CaptureQueriesContext(connection) as context:
+            began = time.perf_counter()
+            for jti in misses:
+                revocation_list.is_revoked(jti)
+            miss_us = (time.perf_counter() - began) / len(misses) * 1e6
+        false_positives = len(context.captured_queries)
+        rate = false_positives / len(misses)
+        self.stdout.write(
+            f'not revoked: {miss_us:.1f} us per lookup, {false_positives} table reads '
+            f'({rate:.3%}; target {FALSE_POSITIVE_RATE:.3%})'
+        )
+
+        sample = rng.sample(revoked, min(1000, len(revoked)))
+        began = time.perf_counter()
+        found = sum(revocation_list.is_revoked(jti) for jti in sample)
+        hit_us = (time.perf_counter() - began) / len(sample) * 1e6
+        self.stdout.write(f'revoked: {hit_us:.1f} us per lookup (one table read each)')
+
+        total_ms, check_ms = self._authenticate(options['requests'])
+        self.stdout.write(
+            f'authentication: {total_ms * 1000:.1f} us per request, of which the revocation '
+            f'check {check_ms * 1000:.1f} us ({check_ms / total_ms:.1%})'
+        )
+
+        if found != len(sample):
+            raise CommandError(f'{len(sample) - found} of {len(sample)} revoked tokens were not found')
+        # Three times the target leaves room for chance on small --lookups
+        if rate > 3 * FALSE_POSITIVE_RATE:
+            raise CommandError(f'False positive rate {rate:.3%} is far over {FALSE_POSITIVE_RATE:.3%}')
+
+    def _authenticate(self, count):
+        """Median ms per authenticated GET (user cached) and per revocation check"""
+        user = User(username='bench-revocation', email='bench-revocation@example.invalid', role='user')
+        user.set_unusable_password()
+        user.save()
+        token = tokens_for(user).access_token
+        request = APIRequestFactory().get('/api/bookings/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        authentication = CachedJWTAuthentication()
+        # Caches the user, as the first request of a session would
+        authentication.authenticate(request)
+
+        totals, checks = [], []
+        for _ in range(count):
+            began = time.perf_counter()
+            authentication.authenticate(request)
+            totals.append(time.perf_counter() - began)
+            began = time.perf_counter()
+            is_token_revoked(token)
+            checks.append(time.perf_counter() - began)
+        return statistics.median(totals) * 1000, statistics.median(checks) * 1000
+
+    def _seed(self, rng, count):
+        expires_at = timezone.now() + timedelta(days=7)
+        revoked = []
+        for start in range(0, count, 10000):
+            batch = [self._jti(rng) for _ in range(min(10000, count - start))]
+            RevokedToken.objects.bulk_create(
+                [RevokedToken(jti=jti, expires_at=expires_at, reason='rotated') for jti in batch],
+                batch_size=2000
+            )
+            revoked.extend(batch)
+        self.stdout.write(f'Seeded {count} revoked tokens.')
+        return revoked
+
+    @staticmethod
+    def _jti(rng):
+        return f'{rng.getrandbits(128):032x}'
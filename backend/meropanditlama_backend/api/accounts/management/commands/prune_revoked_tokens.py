@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.accounts.revocation import prune_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete revoked-token and login-session rows that have expired anyway (run daily from cron)'
+
+    def handle(self, *args, **options):
+        deleted = prune_expired()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired revocation(s) and session(s).'))
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_user_role'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jti', models.CharField(help_text='Token jti, or sid for a whole login session', max_length=64, unique=True)),
+                ('reason', models.CharField(choices=[('logout', 'Logout'), ('rotated', 'Refresh token rotated'), ('reuse', 'Rotated refresh token reused'), ('admin', 'Revoked by admin')], default='admin', max_length=10)),
+                ('expires_at', models.DateTimeField(db_index=True, help_text='After this the token is expired anyway and the row can be pruned')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='revoked_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Revoked token',
+                'verbose_name_plural': 'Revoked tokens',
+                'db_table': 'revoked_tokens',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_revokedtoken_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoginSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sid', models.CharField(max_length=64, unique=True)),
+                ('generation', models.PositiveIntegerField(default=0, help_text='Bumped by every refresh; only the refresh token carrying it may rotate')),
+                ('expires_at', models.DateTimeField(db_index=True, help_text='Its latest refresh token expires then; the row can be pruned after')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='login_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Login session',
+                'verbose_name_plural': 'Login sessions',
+                'db_table': 'login_sessions',
+            },
+        ),
+    ]
@@ -2,6 +2,10 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.core.validators import RegexValidator
 
+def full_name(first_name, last_name, email):
+    """User.get_full_name() from column values"""
+    return f"{first_name} {last_name}".strip() or email
+
 class User(AbstractUser):
     """Custom User model with role-based access."""
     
@@ -60,4 +64,73 @@ class User(AbstractUser):
         return f"{self.get_full_name()} ({self.email})"
     
     def get_full_name(self):
-        return f"{self.first_name} {self.last_name}".strip() or self.email
\ No newline at end of file
+        return full_name(self.first_name, self.last_name, self.email)
+
+class RevokedToken(models.Model):
+    """A revoked token (by jti) or login session (by sid); see revocation.py"""
+    
+    REASON_CHOICES = [
+        ('logout', 'Logout'),
+        ('rotated', 'Refresh token rotated'),
+        ('reuse', 'Rotated refresh token reused'),
+        ('admin', 'Revoked by admin'),
+    ]
+    
+    jti = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text="Token jti, or sid for a whole login session"
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='revoked_tokens'
+    )
+    reason = models.CharField(max_length=10, choices=REASON_CHOICES, default='admin')
+    expires_at = models.DateTimeField(
+        db_index=True,
+        help_text="After this the token is expired anyway and the row can be pruned"
+    )
+    # Indexed: workers read the recent rows every few seconds (see revocation.py)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        db_table = 'revoked_tokens'
+        verbose_name = 'Revoked token'
+        verbose_name_plural = 'Revoked tokens'
+    
+    def __str__(self):
+        return f"{self.jti} ({self.reason})"
+
+
+class LoginSession(models.Model):
+    """
+    A login session (the sid of its tokens) and the generation of its
+    current refresh token; see revocation.py
+    """
+    
+    sid = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='login_sessions'
+    )
+    generation = models.PositiveIntegerField(
+        default=0,
+        help_text="Bumped by every refresh; only the refresh token carrying it may rotate"
+    )
+    expires_at = models.DateTimeField(
+        db_index=True,
+        help_text="Its latest refresh token expires then; the row can be pruned after"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'login_sessions'
+        verbose_name = 'Login session'
+        verbose_name_plural = 'Login sessions'
+    
+    def __str__(self):
+        return f"{self.sid} (generation {self.generation})"
@@ -0,0 +1,249 @@
+"""
+Token revocation.
+
+Revoked token jtis, and the sids of revoked login sessions (tokens_for()
+gives every login a sid, which refreshed and access tokens inherit), are
+rows of RevokedToken. Each worker keeps a Bloom filter of them:
+
+- built from the unexpired rows on first use, and rebuilt larger once
+  more rows were added than it was sized for
+- brought up to date every REVOCATION_REFRESH_SECONDS by reading the rows
+  created since the last refresh, and again those of the
+  REVOCATION_RESCAN_SECONDS before it: a row's id and created_at are set
+  when it is inserted, so a transaction that commits late may make rows
+  visible that an earlier refresh read past
+- asked first on every request; only a hit (revoked, or a false positive
+  at about REVOCATION_FALSE_POSITIVE_RATE) is checked in the table, and
+  false positives are remembered so the same token is not checked again
+
+Revocations made by another worker are seen within
+REVOCATION_REFRESH_SECONDS.
+
+Refresh tokens are not revoked one by one as they rotate. Each login
+session has a LoginSession row, and its refresh tokens carry the row's
+generation (the `gen` claim): rotating a token moves the generation on,
+with an UPDATE matching the token's, before the new tokens are issued.
+That is one in-place write per refresh; neither revoked_tokens nor the
+filters grow with it. An older token of the session, presented even
+concurrently with the rotation, matches no row; it means the token was
+copied, so its whole session is revoked. A refresh token issued before
+sessions had a generation is revoked by jti when it rotates, and its
+session gets a row then.
+"""
+import hashlib
+import math
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import LoginSession, RevokedToken
+
+REFRESH_SECONDS = getattr(settings, 'REVOCATION_REFRESH_SECONDS', 5)
+# Rows created this long before the last refresh are read again; covers late commits and clock skew
+RESCAN_SECONDS = getattr(settings, 'REVOCATION_RESCAN_SECONDS', 60)
+FALSE_POSITIVE_RATE = getattr(settings, 'REVOCATION_FALSE_POSITIVE_RATE', 0.001)
+# Smallest filter built, in items
+MIN_CAPACITY = 10000
+# Tokens confirmed not revoked after a filter hit, kept so they are not checked again
+CLEARED_LIMIT = 10000
+
+
+class BloomFilter:
+    """Set membership with false positives but no false negatives"""
+
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    """A worker's Bloom filter over RevokedToken, kept up to date incrementally"""
+
+    def __init__(self):
+        self.filter = None
+        # When the last rebuild or refresh started reading
+        self.scanned_at = None
+        self.refreshed_at = 0.0
+        self.cleared = set()
+        self.lock = threading.Lock()
+
+    def rebuild(self):
+        """Build a new filter from every unexpired row"""
+        scanned_at = timezone.now()
+        last_id = RevokedToken.objects.aggregate(last=Max('id'))['last'] or 0
+        rows = RevokedToken.objects.filter(id__lte=last_id, expires_at__gt=scanned_at)
+        bloom = BloomFilter(max(MIN_CAPACITY, 2 * rows.count()))
+        for jti in rows.values_list('jti', flat=True).iterator(chunk_size=10000):
+            bloom.add(jti)
+        self.filter, self.scanned_at = bloom, scanned_at
+        self.refreshed_at = time.monotonic()
+        self.cleared = set()
+
+    def refresh(self):
+        """Add the rows revoked since the last refresh, reading the RESCAN_SECONDS before it again"""
+        scanned_at = timezone.now()
+        jtis = list(RevokedToken.objects.filter(
+            created_at__gte=self.scanned_at - timedelta(seconds=RESCAN_SECONDS)
+        ).values_list('jti', flat=True))
+        added = [jti for jti in jtis if jti not in self.filter]
+        if self.filter.count + len(added) > self.filter.capacity:
+            self.rebuild()
+            return
+        for jti in added:
+            self.filter.add(jti)
+        self.cleared.difference_update(jtis)
+        self.scanned_at = scanned_at
+        self.refreshed_at = time.monotonic()
+
+    def ensure_current(self):
+        """Build the filter on first use, refresh it once it is REVOCATION_REFRESH_SECONDS old"""
+        if self.filter is None:
+            with self.lock:
+                if self.filter is None:
+                    self.rebuild()
+        elif time.monotonic() - self.refreshed_at > REFRESH_SECONDS and self.lock.acquire(blocking=False):
+            # One thread refreshes; the others carry on with the filter as it is
+            try:
+                self.refresh()
+            finally:
+                self.lock.release()
+
+    def add(self, jti):
+        if self.filter is not None:
+            self.filter.add(jti)
+            self.cleared.discard(jti)
+
+    def is_revoked(self, *identifiers):
+        """True if any of the jtis / sids is revoked; the table is only read on a filter hit"""
+        self.ensure_current()
+        candidates = [
+            identifier for identifier in identifiers
+            if identifier and identifier not in self.cleared and identifier in self.filter
+        ]
+        if not candidates:
+            return False
+        revoked = set(RevokedToken.objects.filter(jti__in=candidates).values_list('jti', flat=True))
+        if len(self.cleared) > CLEARED_LIMIT:
+            self.cleared = set()
+        self.cleared.update(candidate for candidate in candidates if candidate not in revoked)
+        return bool(revoked)
+
+
+revocation_list = RevocationList()
+
+
+def is_token_revoked(token):
+    return revocation_list.is_revoked(token.get(api_settings.JTI_CLAIM), token.get('sid'))
+
+
+def revoke(*entries):
+    """Save unsaved RevokedToken rows in one query; this worker's filter has them once the transaction commits"""
+    # An access token and its refresh token share a sid
+    entries = list({entry.jti: entry for entry in entries}.values())
+    RevokedToken.objects.bulk_create(entries, ignore_conflicts=True)
+    jtis = [entry.jti for entry in entries]
+    transaction.on_commit(lambda: [revocation_list.add(jti) for jti in jtis])
+
+
+def token_entry(token, reason='admin'):
+    """Row revoking one token until it expires"""
+    return RevokedToken(
+        jti=token[api_settings.JTI_CLAIM], user_id=token.get(api_settings.USER_ID_CLAIM), reason=reason,
+        expires_at=datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+    )
+
+
+def session_entry(token, reason='admin'):
+    """Row revoking every token of the token's login session; None if it has no sid"""
+    if not token.get('sid'):
+        return None
+    # Refresh tokens of the session issued before now expire by then
+    return RevokedToken(
+        jti=token['sid'], user_id=token.get(api_settings.USER_ID_CLAIM), reason=reason,
+        expires_at=timezone.now() + api_settings.REFRESH_TOKEN_LIFETIME
+    )
+
+
+def revoke_token(token, reason='admin'):
+    revoke(token_entry(token, reason))
+
+
+def start_session(user, sid=None):
+    """Record a login session, new unless `sid` is given; returns its sid"""
+    session = LoginSession.objects.create(
+        sid=sid or uuid.uuid4().hex, user=user,
+        expires_at=timezone.now() + api_settings.REFRESH_TOKEN_LIFETIME
+    )
+    return session.sid
+
+
+def rotate_session(token):
+    """
+    Move the session of a refresh token that is being rotated on to its
+    next generation, which the new refresh token carries; None if the
+    token is not the session's current one. The UPDATE is the check, so
+    of two concurrent rotations of one token only one succeeds.
+    """
+    generation = token['gen']
+    rotated = LoginSession.objects.filter(sid=token.get('sid'), generation=generation).update(
+        generation=generation + 1,
+        expires_at=timezone.now() + api_settings.REFRESH_TOKEN_LIFETIME
+    )
+    return generation + 1 if rotated else None
+
+
+def revoke_rotated(token):
+    """
+    Revoke a refresh token without a `gen` claim that is being rotated;
+    False if it was revoked already. The insert is the check, so of two
+    concurrent rotations of one token only one succeeds.
+    """
+    entry = token_entry(token, reason='rotated')
+    try:
+        with transaction.atomic():
+            entry.save(force_insert=True)
+    except IntegrityError:
+        return False
+    transaction.on_commit(lambda: revocation_list.add(entry.jti))
+    return True
+
+
+def revoke_session(token, reason='admin'):
+    """Revoke the token's login session; False if it has no sid"""
+    entry = session_entry(token, reason)
+    if entry is None:
+        return False
+    revoke(entry)
+    return True
+
+
+def prune_expired():
+    """Delete rows of tokens and sessions that have expired anyway; returns the number deleted"""
+    now = timezone.now()
+    deleted, _ = RevokedToken.objects.filter(expires_at__lte=now).delete()
+    sessions, _ = LoginSession.objects.filter(expires_at__lte=now).delete()
+    return deleted + sessions
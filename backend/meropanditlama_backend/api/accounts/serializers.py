@@ -1,7 +1,17 @@
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth import authenticate
-from .models import User
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from .authentication import tokens_for
+from .models import User, RevokedToken
+from .revocation import (
+    is_token_revoked, revoke_rotated, revoke_session, rotate_session, start_session
+)
+from api.projection import Projection
 
 class UserSerializer(serializers.ModelSerializer):
     """Basic user serializer."""
@@ -14,6 +24,8 @@ class UserSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'role']
 
+user_projection = Projection(UserSerializer)
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     """User registration serializer."""
     
@@ -110,4 +122,74 @@ class ProfileUpdateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 "Image file size cannot exceed 5MB."
             )
-        return value
\ No newline at end of file
+        return value
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Token refresh that rejects revoked tokens and moves the login session
+    on past the refresh token it rotates. A rotated token presented again
+    revokes its session.
+    The new tokens' claims come from the user as it is now, not from the
+    old token, and inactive users are refused.
+    """
+    
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if is_token_revoked(refresh):
+            self.reject_revoked(refresh)
+        
+        user = User.objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]}
+        ).first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed('User not found or inactive', code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and refresh.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+        
+        sid, generation = refresh.get('sid'), refresh.get('gen')
+        if api_settings.ROTATE_REFRESH_TOKENS and api_settings.BLACKLIST_AFTER_ROTATION:
+            # Rotated before the new tokens are handed out; failing means another request rotated it
+            if generation is None:
+                if not revoke_rotated(refresh):
+                    self.reject_revoked(refresh)
+                # Issued before sessions had a generation; the session gets one now
+                sid, generation = start_session(user, sid=sid), 0
+            else:
+                generation = rotate_session(refresh)
+                if generation is None:
+                    revoke_session(refresh, reason='reuse')
+                    raise InvalidToken('Token has been revoked')
+        
+        # Same login session
+        renewed = tokens_for(user, sid=sid, generation=generation or 0)
+        data = {'access': str(renewed.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            data['refresh'] = str(renewed)
+        return data
+    
+    def reject_revoked(self, refresh):
+        """Refuse a revoked token, revoking its session if it was already rotated"""
+        rotated = RevokedToken.objects.filter(
+            jti=refresh[api_settings.JTI_CLAIM], reason='rotated'
+        ).exists()
+        if rotated:
+            revoke_session(refresh, reason='reuse')
+        raise InvalidToken('Token has been revoked')
+
+class LogoutSerializer(serializers.Serializer):
+    """Refresh token to revoke along with the session"""
+    
+    refresh = serializers.CharField(required=False)
+    
+    def validate_refresh(self, value):
+        try:
+            refresh = RefreshToken(value)
+        except TokenError as e:
+            raise serializers.ValidationError(str(e))
+        # Otherwise anyone logged in could end someone else's session
+        user = self.context['request'].user
+        if str(refresh.get(api_settings.USER_ID_CLAIM)) != str(getattr(user, api_settings.USER_ID_FIELD)):
+            raise serializers.ValidationError('Token does not belong to this user')
+        return refresh
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .authentication import invalidate_user
+from .models import User
+
+# Auth user cache (provider profile changes are handled in providers.signals)
+
+@receiver(post_save, sender=User)
+def auth_user_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if created or raw:
+        return
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_user(instance.pk)
+
+@receiver(post_delete, sender=User)
+def auth_user_deleted(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
@@ -0,0 +1,180 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from api.accounts.authentication import get_user_version, tokens_for
+from api.accounts.models import LoginSession, RevokedToken
+from api.accounts.revocation import RevocationList, prune_expired
+from api.querycount import measure_queries
+from api.testing import auth_header, make_provider, make_user
+
+
+class CachedUserTests(TestCase):
+    """Read requests take the user from the cache, which never holds the password hash"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_entry_has_no_password_hash(self):
+        user = make_user(first_name='Sita')
+        user.set_password('A-long-password-42')
+        user.save()
+        self.assertEqual(self.client.get('/api/profile/', **auth_header(user)).status_code, 200)
+
+        entry = cache.get(f'auth:user-fields:{user.pk}:{get_user_version(user.pk)}')
+        self.assertNotIn('password', entry['user'])
+        self.assertNotIn(user.password, repr(entry))
+
+    def test_cached_user_serves_reads(self):
+        provider = make_provider(user=make_user(role='provider', first_name='Ram'))
+        headers = auth_header(provider.user)
+        _, cold = measure_queries(self.client, 'get', '/api/provider/profile/', **headers)
+        response, warm = measure_queries(self.client, 'get', '/api/provider/profile/', **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(warm.count, cold.count - 1)
+        self.assertEqual(response.json()['user']['first_name'], 'Ram')
+
+
+class TokenRefreshTests(TestCase):
+    """POST /api/auth/refresh/"""
+
+    def setUp(self):
+        cache.clear()
+
+    def refresh(self, token):
+        return self.client.post('/api/auth/refresh/', {'refresh': str(token)})
+
+    def test_claims_come_from_the_user(self):
+        user = make_user()
+        token = tokens_for(user)
+        provider = make_provider(user=user)
+        user.role = 'provider'
+        user.save()
+
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+        access = AccessToken(response.json()['access'])
+        self.assertEqual((access['role'], access['provider_id']), ('provider', provider.pk))
+        # Still the same login session
+        self.assertEqual(access['sid'], token['sid'])
+        self.assertEqual(RefreshToken(response.json()['refresh'])['sid'], token['sid'])
+
+    def test_inactive_user_is_refused(self):
+        user = make_user()
+        token = tokens_for(user)
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_rotated_token_is_refused_before_the_filter_knows(self):
+        # No on_commit callbacks run, so this worker's filter never hears of the rotation
+        token = tokens_for(make_user())
+        self.assertEqual(self.refresh(token).status_code, 200)
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertTrue(RevokedToken.objects.filter(jti=token['sid'], reason='reuse').exists())
+
+    def test_rotation_moves_the_session_on_without_revoking(self):
+        token = tokens_for(make_user())
+        renewed = RefreshToken(self.refresh(token).json()['refresh'])
+        self.assertEqual(renewed['gen'], 1)
+        self.assertEqual(LoginSession.objects.get(sid=token['sid']).generation, 1)
+        self.assertFalse(RevokedToken.objects.exists())
+        self.assertEqual(self.refresh(renewed).status_code, 200)
+
+    def test_token_without_generation_is_revoked_and_its_session_recorded(self):
+        user = make_user()
+        token = tokens_for(user)
+        LoginSession.objects.all().delete()
+        del token['gen']
+
+        renewed = RefreshToken(self.refresh(token).json()['refresh'])
+        self.assertTrue(RevokedToken.objects.filter(jti=token['jti'], reason='rotated').exists())
+        self.assertEqual((renewed['sid'], renewed['gen']), (token['sid'], 0))
+        self.assertEqual(self.refresh(renewed).status_code, 200)
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertTrue(RevokedToken.objects.filter(jti=token['sid'], reason='reuse').exists())
+
+    def test_expired_sessions_are_pruned(self):
+        user = make_user()
+        tokens_for(user)
+        tokens_for(user)
+        LoginSession.objects.filter(pk=LoginSession.objects.earliest('pk').pk).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(prune_expired(), 1)
+        self.assertEqual(LoginSession.objects.count(), 1)
+
+    def test_reusing_a_rotated_token_revokes_the_session(self):
+        token = tokens_for(make_user())
+        with self.captureOnCommitCallbacks(execute=True):
+            renewed = self.refresh(token).json()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertEqual(self.refresh(renewed['refresh']).status_code, 401)
+        response = self.client.get('/api/profile/', HTTP_AUTHORIZATION=f'Bearer {renewed["access"]}')
+        self.assertEqual(response.status_code, 401)
+
+
+class LogoutTests(TestCase):
+    """POST /api/auth/logout/"""
+
+    def setUp(self):
+        cache.clear()
+
+    def logout(self, token, refresh):
+        return self.client.post(
+            '/api/auth/logout/', {'refresh': str(refresh)},
+            HTTP_AUTHORIZATION=f'Bearer {token.access_token}'
+        )
+
+    def test_own_session_is_revoked(self):
+        token = tokens_for(make_user())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.logout(token, token).status_code, 200)
+        response = self.client.post('/api/auth/refresh/', {'refresh': str(token)})
+        self.assertEqual(response.status_code, 401)
+
+    def test_someone_elses_refresh_token_is_refused(self):
+        token, other = tokens_for(make_user()), tokens_for(make_user())
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.logout(token, other)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('refresh', response.json())
+        self.assertFalse(RevokedToken.objects.exists())
+        self.assertEqual(self.client.post('/api/auth/refresh/', {'refresh': str(other)}).status_code, 200)
+
+class RevocationListTests(TestCase):
+    """A worker's Bloom filter of revoked tokens"""
+
+    def revoke(self, jti, **fields):
+        return RevokedToken.objects.create(jti=jti, expires_at=timezone.now() + timedelta(days=1), **fields)
+
+    def test_refresh_adds_new_rows(self):
+        revoked = RevocationList()
+        revoked.rebuild()
+        self.revoke('added')
+        self.assertFalse(revoked.is_revoked('added'))
+        revoked.refresh()
+        self.assertTrue(revoked.is_revoked('added'))
+
+    def test_refresh_reads_rows_committed_out_of_order(self):
+        self.revoke('first', id=10)
+        revoked = RevocationList()
+        revoked.rebuild()
+        self.revoke('second', id=20)
+        revoked.refresh()
+        # Inserted before the second row but committed after the refresh read past it
+        self.revoke('late', id=15)
+        revoked.refresh()
+        self.assertTrue(all(revoked.is_revoked(jti) for jti in ('first', 'second', 'late')))
+
+    def test_refresh_skips_rows_it_has(self):
+        revoked = RevocationList()
+        revoked.rebuild()
+        self.revoke('added')
+        revoked.refresh()
+        revoked.refresh()
+        self.assertEqual(revoked.filter.count, 1)
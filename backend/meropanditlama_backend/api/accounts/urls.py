@@ -6,5 +6,6 @@ urlpatterns = [
     path('auth/signup/', views.signup, name='signup'),
     path('auth/login/', views.login, name='login'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('auth/logout/', views.logout, name='logout'),
     path('profile/', views.ProfileView.as_view(), name='profile'),
 ]
\ No newline at end of file
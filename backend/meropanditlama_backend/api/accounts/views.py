@@ -3,15 +3,20 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
+from api.querycount import query_budget
+from .authentication import tokens_for
 from .models import User
 from .serializers import (
     UserSerializer,
     UserRegistrationSerializer,
     UserLoginSerializer,
-    ProfileUpdateSerializer
+    ProfileUpdateSerializer,
+    LogoutSerializer
 )
+from .revocation import revoke, session_entry, token_entry
 
+# email check, user INSERT + UPDATE, provider id lookups, login session INSERT
+@query_budget(6)
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def signup(request):
@@ -20,7 +25,7 @@ def signup(request):
     
     if serializer.is_valid():
         user = serializer.save()
-        refresh = RefreshToken.for_user(user)
+        refresh = tokens_for(user)
         
         return Response({
             'message': 'Registration successful',
@@ -38,6 +43,8 @@ def signup(request):
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# user, login session INSERT, and a provider's id for its claim
+@query_budget(3)
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def login(request):
@@ -51,7 +58,7 @@ def login(request):
     
     if serializer.is_valid():
         user = serializer.validated_data['user']
-        refresh = RefreshToken.for_user(user)
+        refresh = tokens_for(user)
         
         return Response({
             'message': 'Login successful',
@@ -69,10 +76,28 @@ def login(request):
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@query_budget(2)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout(request):
+    """Revoke the login session of the access token (and the given refresh token)."""
+    serializer = LogoutSerializer(data=request.data, context={'request': request})
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    tokens = filter(None, [request.auth, serializer.validated_data.get('refresh')])
+    # Tokens issued before sessions existed are revoked one by one
+    revoke(*[session_entry(token, 'logout') or token_entry(token, 'logout') for token in tokens])
+    
+    return Response({
+        'message': 'Logged out'
+    }, status=status.HTTP_200_OK)
+
 class ProfileView(APIView):
     """Get and update user profile."""
     
     permission_classes = [IsAuthenticated]
+    query_budgets = {'get': 1, 'put': 4}
     
     def get(self, request):
         """Get current user profile."""
@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.utils import timezone
+from .exports import BOOKING_EXPORT
 from .models import Booking
+from api.exports import export_csv, export_ndjson
+from .transitions import transition_bookings
 
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
@@ -38,7 +41,8 @@ class BookingAdmin(admin.ModelAdmin):
         }),
     )
     
-    actions = ['mark_confirmed', 'mark_completed', 'mark_cancelled']
+    actions = ['mark_confirmed', 'mark_completed', 'mark_cancelled', export_csv, export_ndjson]
+    export = BOOKING_EXPORT
     
     def get_user_name(self, obj):
         return obj.user.get_full_name()
@@ -70,16 +74,16 @@ class BookingAdmin(admin.ModelAdmin):
     status_badge.short_description = 'Status'
     
     def mark_confirmed(self, request, queryset):
-        updated = queryset.filter(status='pending').update(status='confirmed')
+        updated = transition_bookings(queryset, 'confirmed')
         self.message_user(request, f'{updated} booking(s) marked as confirmed.')
     mark_confirmed.short_description = 'Mark as Confirmed'
     
     def mark_completed(self, request, queryset):
-        updated = queryset.filter(status='confirmed').update(status='completed')
+        updated = transition_bookings(queryset, 'completed')
         self.message_user(request, f'{updated} booking(s) marked as completed.')
     mark_completed.short_description = 'Mark as Completed'
     
     def mark_cancelled(self, request, queryset):
-        updated = queryset.update(status='cancelled')
+        updated = transition_bookings(queryset, 'cancelled', cancellation_reason='Cancelled by admin')
         self.message_user(request, f'{updated} booking(s) marked as cancelled.')
     mark_cancelled.short_description = 'Mark as Cancelled'
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class BookingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api.bookings'
-    verbose_name = 'Bookings'
\ No newline at end of file
+    verbose_name = 'Bookings'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,51 @@
+"""
+Booking conflict detection.
+
+Each booking stores its end time (Booking.end_datetime), so a conflict is
+a plain interval overlap - existing.start < new.end AND existing.end >
+new.start - for the same provider among active bookings, correct for any
+duration. The query is an index range scan on (provider, status,
+end_datetime, requested_datetime): leading with the end time means a
+check for a future booking only visits bookings that end after it starts,
+not the provider's whole history.
+
+On PostgreSQL with BOOKING_EXCLUSION_CONSTRAINT the same rule is also
+enforced by an exclusion constraint (see migration 0004), which closes the race between checking and
+inserting; IntegrityErrors from it are reported as conflicts.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError
+
+# Statuses that hold the provider's time
+ACTIVE_STATUSES = ['pending', 'confirmed']
+
+EXCLUSION_CONSTRAINT = 'bookings_no_overlap'
+
+
+def booking_end(start, duration_minutes):
+    return start + timedelta(minutes=duration_minutes)
+
+
+def find_conflicts(provider_id, start, end, exclude_booking_id=None):
+    """Active bookings for the provider overlapping [start, end)"""
+    from .models import Booking
+
+    conflicts = Booking.objects.filter(
+        provider_id=provider_id,
+        status__in=ACTIVE_STATUSES,
+        requested_datetime__lt=end,
+        end_datetime__gt=start,
+    )
+    if exclude_booking_id is not None:
+        conflicts = conflicts.exclude(pk=exclude_booking_id)
+    return conflicts
+
+
+def has_conflict(provider_id, start, end, exclude_booking_id=None):
+    return find_conflicts(provider_id, start, end, exclude_booking_id).exists()
+
+
+def is_overlap_violation(error):
+    """True if an IntegrityError came from the exclusion constraint"""
+    return isinstance(error, IntegrityError) and EXCLUSION_CONSTRAINT in str(error)
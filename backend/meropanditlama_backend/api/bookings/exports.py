@@ -0,0 +1,24 @@
+from api.exports import Export
+
+BOOKING_EXPORT = Export('bookings', [
+    ('id', 'id'),
+    ('status', 'status'),
+    ('requested_datetime', 'requested_datetime'),
+    ('end_datetime', 'end_datetime'),
+    ('duration_minutes', 'duration_minutes'),
+    ('service_id', 'service_id'),
+    ('service_name', 'service__name'),
+    ('provider_id', 'provider_id'),
+    ('provider_first_name', 'provider__user__first_name'),
+    ('provider_last_name', 'provider__user__last_name'),
+    ('provider_email', 'provider__user__email'),
+    ('user_id', 'user_id'),
+    ('user_first_name', 'user__first_name'),
+    ('user_last_name', 'user__last_name'),
+    ('user_email', 'user__email'),
+    ('user_phone', 'user__phone'),
+    ('notes', 'notes'),
+    ('cancellation_reason', 'cancellation_reason'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+], date_field='requested_datetime', status_field='status')
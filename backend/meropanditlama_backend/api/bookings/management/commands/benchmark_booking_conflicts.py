@@ -0,0 +1,121 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from api.accounts.models import User
+from api.bookings.conflicts import ACTIVE_STATUSES, booking_end, find_conflicts
+from api.bookings.models import Booking
+from api.providers.models import ServiceProvider
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark booking conflict detection against providers with many '
+        'historical bookings. Runs inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--providers', type=int, default=5)
+        parser.add_argument('--bookings', type=int, default=5000, help='Bookings per provider')
+        parser.add_argument('--checks', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            providers = self._seed(rng, options['providers'], options['bookings'])
+            self._run(rng, providers, options['checks'])
+            transaction.set_rollback(True)
+
+    def _seed(self, rng, provider_count, bookings_per_provider):
+        customer = User(
+            username='bench-customer', email='bench-customer@example.invalid', role='user'
+        )
+        customer.set_unusable_password()
+        customer.save()
+
+        providers = []
+        for i in range(provider_count):
+            user = User(
+                username=f'bench-provider-{i}', email=f'bench-provider-{i}@example.invalid',
+                role='provider'
+            )
+            user.set_unusable_password()
+            user.save()
+            providers.append(ServiceProvider.objects.create(
+                user=user, religion_type='hindu', experience_years=1,
+                location='Kathmandu', short_description='Benchmark provider',
+                price_per_service=1000, verified=True
+            ))
+
+        # Non-overlapping 30 min - 6 h bookings spread from three years ago to
+        # two months ahead; past ones are mostly closed, upcoming ones active
+        now = timezone.now()
+        start = now - timedelta(days=365 * 3)
+        step = (now + timedelta(days=60) - start) / bookings_per_provider
+        bookings = []
+        for provider in providers:
+            for i in range(bookings_per_provider):
+                begins = start + step * i
+                duration = min(rng.choice([30, 60, 120, 240, 360]), int(step.total_seconds() // 60))
+                if begins < now:
+                    status = rng.choice(['completed'] * 6 + ['cancelled'] * 3 + ACTIVE_STATUSES)
+                else:
+                    status = rng.choice(ACTIVE_STATUSES + ['cancelled'])
+                bookings.append(Booking(
+                    user=customer, provider=provider,
+                    requested_datetime=begins,
+                    duration_minutes=duration,
+                    end_datetime=booking_end(begins, duration),
+                    status=status,
+                ))
+        Booking.objects.bulk_create(bookings, batch_size=1000)
+        self.stdout.write(f'Seeded {len(bookings)} bookings for {len(providers)} provider(s).')
+        return providers
+
+    def _run(self, rng, providers, checks):
+        # New bookings must be at least 24 hours ahead; probe the next 60 days
+        first = timezone.now() + timedelta(hours=24)
+        seconds = 60 * 24 * 3600
+
+        probes = []
+        for _ in range(checks):
+            start = first + timedelta(seconds=rng.randrange(seconds))
+            probes.append((rng.choice(providers).id, start, booking_end(start, rng.choice([30, 60, 240]))))
+
+        def interval_check(provider_id, start, end):
+            return find_conflicts(provider_id, start, end).exists()
+
+        def lookback_check(provider_id, start, end):
+            # Previous implementation: only looked 60 minutes back
+            return Booking.objects.filter(
+                provider_id=provider_id, status__in=ACTIVE_STATUSES
+            ).filter(
+                Q(requested_datetime__lt=end) &
+                Q(requested_datetime__gte=start - timedelta(minutes=60))
+            ).exists()
+
+        results = {}
+        for name, check in [('interval overlap', interval_check), ('60 min lookback', lookback_check)]:
+            began = time.perf_counter()
+            results[name] = [check(*probe) for probe in probes]
+            elapsed = time.perf_counter() - began
+            self.stdout.write(
+                f'{name:>17}: {elapsed / checks * 1e6:8.1f} us/check, '
+                f'{sum(results[name])} conflicts'
+            )
+
+        missed = sum(
+            1 for new, old in zip(results['interval overlap'], results['60 min lookback'])
+            if new and not old
+        )
+        self.stdout.write(f'Conflicts missed by the 60 min lookback: {missed}')
+
+        provider_id, start, end = probes[0]
+        self.stdout.write('Query plan:')
+        self.stdout.write(find_conflicts(provider_id, start, end).order_by().explain())
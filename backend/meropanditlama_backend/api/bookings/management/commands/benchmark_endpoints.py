@@ -0,0 +1,111 @@
+import json
+import platform
+from pathlib import Path
+
+from django import get_version
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api import loadbench
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the API routes against the synthetic dataset (see '
+        'generate_synthetic_data), in-process or against a running server, and '
+        'report p50/p95/p99 latency, throughput and queries per request per '
+        'endpoint. Bookings it creates are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        names = [scenario.name for scenario in loadbench.SCENARIOS]
+        parser.add_argument(
+            '--endpoint', action='append', dest='endpoints', choices=names,
+            help='Only run the given endpoint (repeatable)'
+        )
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=4, help='Worker threads')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed requests per endpoint first')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--url', help='Base URL of a running server using this database, e.g. http://127.0.0.1:8000 '
+                          '(default: in-process through the test client)'
+        )
+        parser.add_argument('--save', help='Write the results to this JSON baseline file')
+        parser.add_argument('--compare', help='Compare with this JSON baseline file')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='With --compare, p95 slowdown allowed before failing (0.2 = 20%%)'
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be at least 1')
+        baseline = None
+        if options['compare']:
+            try:
+                baseline = json.loads(Path(options['compare']).read_text())
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read baseline: {e}')
+
+        try:
+            dataset = loadbench.Dataset()
+        except ValueError as e:
+            raise CommandError(str(e))
+        target = loadbench.HTTPTarget(options['url']) if options['url'] else loadbench.InProcessTarget()
+        scenarios = [
+            scenario for scenario in loadbench.SCENARIOS
+            if not options['endpoints'] or scenario.name in options['endpoints']
+        ]
+
+        self.stdout.write(
+            f'{"endpoint":<22} {"req":>5} {"err":>4} {"rps":>7} {"p50":>8} {"p95":>8} {"p99":>8} '
+            f'{"queries":>8} {"db ms":>7}'
+        )
+        results = {}
+        for scenario in scenarios:
+            try:
+                result = loadbench.run_scenario(
+                    target, scenario, dataset, requests=options['requests'],
+                    concurrency=options['concurrency'], warmup=options['warmup'], seed=options['seed'],
+                )
+            finally:
+                if scenario.writes:
+                    loadbench.cleanup()
+            results[scenario.name] = result
+            self.stdout.write(
+                f'{scenario.name:<22} {result["requests"]:>5} {result["errors"]:>4} '
+                f'{result["throughput_rps"]:>7} {self._ms(result["p50_ms"])} {self._ms(result["p95_ms"])} '
+                f'{self._ms(result["p99_ms"])} {self._value(result["queries_per_request"], 8)} '
+                f'{self._value(result["db_ms_per_request"], 7)}'
+            )
+            if result['errors']:
+                self.stdout.write(self.style.WARNING(f'  {result["first_error"]}'))
+
+        if options['save']:
+            Path(options['save']).write_text(json.dumps({
+                'created_at': timezone.now().isoformat(),
+                'target': options['url'] or target.name,
+                'database': connection.vendor,
+                'django': get_version(),
+                'python': platform.python_version(),
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'endpoints': results,
+            }, indent=2) + '\n')
+            self.stdout.write(f'Saved baseline to {options["save"]}.')
+
+        if baseline is not None:
+            regressions = loadbench.compare(baseline, results, options['tolerance'])
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(regression)
+                raise CommandError(f'{len(regressions)} regression(s) against {options["compare"]}')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["compare"]}.'))
+
+    def _ms(self, value):
+        return f'{value:>6.1f}ms' if value is not None else f'{"-":>8}'
+
+    def _value(self, value, width):
+        return f'{value:>{width}}' if value is not None else f'{"-":>{width}}'
@@ -0,0 +1,92 @@
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.accounts.models import User
+from api.bookings.conflicts import booking_end
+from api.bookings.exports import BOOKING_EXPORT
+from api.bookings.models import Booking
+from api.providers.models import Service, ServiceProvider
+
+SEED_BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream a booking export of many rows and fail if Python memory '
+        'grows past a ceiling. Runs inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000)
+        parser.add_argument('--output', choices=['csv', 'ndjson'], default='csv')
+        parser.add_argument('--compress', action='store_true', help='gzip the stream')
+        parser.add_argument('--ceiling-mb', type=float, default=32, help='Peak memory allowed while streaming')
+        parser.add_argument('--providers', type=int, default=50)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with transaction.atomic():
+            self._seed(rows, options['providers'])
+            # Seeding SQL would otherwise sit in the DEBUG query log
+            connection.queries_log.clear()
+
+            response = BOOKING_EXPORT.response(Booking.objects.all(), options['output'], options['compress'])
+            tracemalloc.start()
+            began = time.perf_counter()
+            size = 0
+            for chunk in response.streaming_content:
+                size += len(chunk)
+            elapsed = time.perf_counter() - began
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            transaction.set_rollback(True)
+
+        peak_mb = peak / 1024 / 1024
+        self.stdout.write(
+            f'{rows} rows, {options["output"]}{" gzip" if options["compress"] else ""}: '
+            f'{size / 1024 / 1024:.1f} MB in {elapsed:.1f} s ({rows / elapsed:,.0f} rows/s), '
+            f'peak memory {peak_mb:.1f} MB (ceiling {options["ceiling_mb"]:g} MB)'
+        )
+        if peak_mb > options['ceiling_mb']:
+            raise CommandError(f'Export peaked at {peak_mb:.1f} MB; the ceiling is {options["ceiling_mb"]:g} MB')
+
+    def _seed(self, rows, provider_count):
+        service = Service.objects.create(name='Benchmark export puja', default_price=1000)
+        users = User.objects.bulk_create([
+            User(
+                username=f'bench-export-{i}', email=f'bench-export-{i}@example.invalid',
+                first_name='Pandit', last_name=str(i), role='provider', password='!'
+            )
+            for i in range(provider_count)
+        ])
+        users = list(User.objects.filter(username__startswith='bench-export-').order_by('id'))
+        ServiceProvider.objects.bulk_create([
+            ServiceProvider(
+                user=user, religion_type='hindu', experience_years=5, location='Kathmandu',
+                short_description='Benchmark provider', price_per_service=1000, verified=True,
+            )
+            for user in users
+        ])
+        providers = list(ServiceProvider.objects.filter(user__in=users).order_by('id'))
+        customer = User(username='bench-export-customer', email='bench-export-customer@example.invalid', role='user')
+        customer.set_unusable_password()
+        customer.save()
+
+        # Built and inserted a batch at a time, so seeding stays flat too
+        now = timezone.now()
+        for first in range(0, rows, SEED_BATCH_SIZE):
+            batch = []
+            for i in range(first, min(first + SEED_BATCH_SIZE, rows)):
+                begins = now + timedelta(hours=i // len(providers))
+                batch.append(Booking(
+                    user=customer, provider=providers[i % len(providers)], service=service,
+                    requested_datetime=begins, duration_minutes=60, end_datetime=booking_end(begins, 60),
+                    status='confirmed' if i % 3 else 'pending', notes='Benchmark booking, "export"',
+                ))
+            Booking.objects.bulk_create(batch)
+        self.stdout.write(f'Seeded {rows} bookings.')
@@ -0,0 +1,194 @@
+import copy
+import multiprocessing
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.utils import timezone
+
+from api.bookings.conflicts import ACTIVE_STATUSES, booking_end
+from api.bookings.models import Booking
+from api.loadbench import Dataset
+from api.writequeue import WriteQueue
+
+# name -> (engine, journal mode of the copy, queued)
+MODES = {
+    'stock': ('django.db.backends.sqlite3', 'DELETE', False),
+    'tuned': ('api.sqlite', 'WAL', False),
+    'queued': ('api.sqlite', 'WAL', True),
+}
+
+
+def _write_bookings(alias, lock_path, rows, work_ms, results):
+    """Worker process: book each row in a transaction that checks for conflicts first"""
+    queue = WriteQueue(lock_path, record_waits=False) if lock_path else None
+    outcome = {'committed': 0, 'conflicts': 0, 'errors': 0, 'latencies': [], 'messages': set()}
+    lock = threading.Lock()
+
+    def run(thread_rows):
+        for row in thread_rows:
+            began = time.perf_counter()
+            try:
+                with queue.hold(timeout=120) if queue else nullcontext():
+                    # What booking creation does: read, then write, in one transaction
+                    with transaction.atomic(using=alias):
+                        taken = Booking.objects.using(alias).filter(
+                            provider_id=row['provider_id'], status__in=ACTIVE_STATUSES,
+                            requested_datetime__lt=row['end_datetime'],
+                            end_datetime__gt=row['requested_datetime'],
+                        ).exists()
+                        time.sleep(work_ms / 1000)
+                        if not taken:
+                            # bulk_create, so no signals touch the real database
+                            Booking.objects.using(alias).bulk_create([Booking(**row)])
+            except OperationalError as e:
+                with lock:
+                    outcome['errors'] += 1
+                    outcome['messages'].add(str(e))
+                continue
+            elapsed = time.perf_counter() - began
+            with lock:
+                outcome['conflicts' if taken else 'committed'] += 1
+                outcome['latencies'].append(elapsed)
+        connections[alias].close()
+
+    threads = [threading.Thread(target=run, args=(part,)) for part in rows]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    outcome['messages'] = sorted(outcome['messages'])
+    results.put(outcome)
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent booking writes from several processes against copies '
+        'of the SQLite database, and report throughput, latency and "database '
+        'is locked" errors for Django\'s stock SQLite settings, the production '
+        'profile (WAL, pragmas, BEGIN IMMEDIATE) and the profile with the '
+        'write queue. The real database is not written.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--threads', type=int, default=2, help='Threads per process')
+        parser.add_argument('--writes', type=int, default=100, help='Bookings per thread')
+        parser.add_argument(
+            '--work-ms', type=float, default=2.0,
+            help='Time spent inside each transaction between its read and its write'
+        )
+        parser.add_argument('--mode', action='append', dest='modes', choices=list(MODES))
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('benchmark_sqlite_writes needs a SQLite database')
+        if min(options['processes'], options['threads'], options['writes']) < 1:
+            raise CommandError('--processes, --threads and --writes must be at least 1')
+        try:
+            dataset = Dataset()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        rng = random.Random(options['seed'])
+        rows = self._rows(rng, dataset, options['processes'] * options['threads'] * options['writes'])
+        primary = connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+        self.stdout.write(
+            f'{options["processes"]} processes x {options["threads"]} threads x {options["writes"]} '
+            f'bookings, {options["work_ms"]} ms inside each transaction'
+        )
+        self.stdout.write(
+            f'{"mode":<8} {"ok":>6} {"errors":>6} {"error %":>7} {"writes/s":>8} {"p50 ms":>8} '
+            f'{"p95 ms":>8} {"max ms":>8}'
+        )
+
+        failures = []
+        with tempfile.TemporaryDirectory() as directory:
+            for name in options['modes'] or list(MODES):
+                outcome, elapsed = self._run(name, primary, Path(directory), rows, options)
+                attempted = len(rows)
+                done = outcome['committed'] + outcome['conflicts']
+                latencies = sorted(outcome['latencies']) or [0]
+                self.stdout.write(
+                    f'{name:<8} {done:>6} {outcome["errors"]:>6} {outcome["errors"] / attempted:>7.1%} '
+                    f'{done / elapsed:>8.0f} {statistics.median(latencies) * 1000:>8.1f} '
+                    f'{latencies[int(len(latencies) * 0.95)] * 1000:>8.1f} {latencies[-1] * 1000:>8.1f}'
+                )
+                for message in outcome['messages']:
+                    self.stdout.write(f'    {message}')
+                if MODES[name][2] and outcome['errors']:
+                    failures.append(f'{name}: {outcome["errors"]} of {attempted} writes failed')
+
+        if failures:
+            raise CommandError('; '.join(failures))
+
+    def _rows(self, rng, dataset, count):
+        """Bookings far enough ahead not to meet real ones, some of them overlapping"""
+        start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=800)
+        rows = []
+        for _ in range(count):
+            provider_id = rng.choice(dataset.providers)[0]
+            begins = start + timedelta(hours=rng.randrange(24 * 365))
+            rows.append({
+                'user_id': rng.choice(dataset.customers).pk, 'provider_id': provider_id,
+                'service_id': rng.choice(dataset.offered.get(provider_id) or [None]),
+                'requested_datetime': begins, 'duration_minutes': 60,
+                'end_datetime': booking_end(begins, 60), 'status': 'pending',
+            })
+        return rows
+
+    def _run(self, name, primary, directory, rows, options):
+        """Write rows concurrently to a fresh copy of the database in the given mode"""
+        engine, journal_mode, queued = MODES[name]
+        path = directory / f'{name}.sqlite3'
+        source, target = sqlite3.connect(primary), sqlite3.connect(path)
+        try:
+            source.backup(target)
+            target.execute(f'PRAGMA journal_mode = {journal_mode}')
+        finally:
+            source.close()
+            target.close()
+
+        alias = f'benchmark_{name}'
+        config = copy.deepcopy(connections.settings[DEFAULT_DB_ALIAS])
+        config.update(ENGINE=engine, NAME=str(path), OPTIONS={})
+        connections.settings[alias] = config
+        lock_path = str(directory / f'{name}.write-lock') if queued else None
+
+        # Children must open their own connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        per_process = options['threads'] * options['writes']
+        processes = []
+        began = time.perf_counter()
+        for number in range(options['processes']):
+            mine = rows[number * per_process:(number + 1) * per_process]
+            parts = [mine[i::options['threads']] for i in range(options['threads'])]
+            process = context.Process(
+                target=_write_bookings, args=(alias, lock_path, parts, options['work_ms'], results)
+            )
+            process.start()
+            processes.append(process)
+        outcomes = [results.get() for _ in processes]
+        elapsed = time.perf_counter() - began
+        for process in processes:
+            process.join()
+
+        total = {'committed': 0, 'conflicts': 0, 'errors': 0, 'latencies': [], 'messages': set()}
+        for outcome in outcomes:
+            for key in ('committed', 'conflicts', 'errors'):
+                total[key] += outcome[key]
+            total['latencies'].extend(outcome['latencies'])
+            total['messages'].update(outcome['messages'])
+        total['messages'] = sorted(total['messages'])
+        return total, elapsed
@@ -0,0 +1,201 @@
+import json
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import Client, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, resolve
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.accounts.authentication import tokens_for
+from api.bookings.models import Booking
+from api.loadbench import Dataset
+from api.providers.models import AvailabilityException, AvailabilityRule, AvailabilitySlot, ServiceProvider
+from api.querycount import budget_for, measure_queries, route_budget
+
+
+class Command(BaseCommand):
+    help = (
+        'Request every main API route once, as the right kind of user, against '
+        'the synthetic dataset (see generate_synthetic_data), and fail if a '
+        'route runs more queries than its declared budget. Runs inside a '
+        'transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-queries', action='store_true', help='List the SQL of routes over budget')
+
+    def handle(self, *args, **options):
+        try:
+            dataset = Dataset(customers=1)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        failures = []
+        # The test client's host, as the test runner allows it
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), transaction.atomic():
+            cases = self._cases(dataset)
+            # Run what the fixtures queued for commit, so requests queue (and are counted for) their own
+            for connection in connections.all():
+                callbacks, connection.run_on_commit = connection.run_on_commit, []
+                for _, callback, _ in callbacks:
+                    callback()
+            client = Client(raise_request_exception=False)
+            self.stdout.write(f'{"route":<60} {"status":>6} {"queries":>7} {"budget":>6}')
+            for i, (method, path, data, user) in enumerate(cases):
+                extra = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'} if user else {}
+                if method == 'get':
+                    # A query string of its own, so the catalog cache misses
+                    path = f'{path}{"&" if "?" in path else "?"}_budget={i}'
+                else:
+                    data, extra['content_type'] = json.dumps(data), 'application/json'
+                response, log = measure_queries(client, method, path, data, **extra)
+                budget = route_budget(method, path)
+                label = f'{method.upper()} {path.split("_budget=")[0].rstrip("?&")}'
+                over = budget is not None and log.count > budget
+                self.stdout.write(
+                    f'{label[:60]:<60} {response.status_code:>6} {log.count:>7} '
+                    f'{"-" if budget is None else budget:>6}{"  OVER" if over else ""}'
+                )
+                if not 200 <= response.status_code < 400:
+                    failures.append(f'{label} returned {response.status_code}: {response.content[:200]!r}')
+                if budget is None:
+                    failures.append(f'{label} has no query budget')
+                elif over:
+                    failures.append(f'{label} ran {log.count} queries; its budget is {budget}')
+                    if options['verbose_queries']:
+                        for sql, _ in log.queries:
+                            self.stdout.write(f'    {sql[:200]}')
+            transaction.set_rollback(True)
+
+        missing = [route for route in self._routes() if route not in self.checked]
+        for route in missing:
+            self.stdout.write(self.style.WARNING(f'Not checked: {route}'))
+        if failures:
+            for failure in failures:
+                self.stderr.write(failure)
+            raise CommandError(f'{len(failures)} route(s) failed their query budget check')
+        self.stdout.write(self.style.SUCCESS(f'{len(cases)} request(s) within their query budgets.'))
+
+    def _cases(self, dataset):
+        """(method, path, data, user) per route; creates what the writes need"""
+        customer = dataset.customers[0]
+        provider = ServiceProvider.objects.select_related('user').get(pk=dataset.providers[0][0])
+        service_id = dataset.offered[provider.pk][0]
+        today = timezone.localdate()
+        tz = timezone.get_current_timezone()
+
+        # Bookings on free slots, so transitions update slots as they would in use
+        taken = set(Booking.objects.filter(
+            provider=provider, status__in=['pending', 'confirmed']
+        ).values_list('requested_datetime', flat=True))
+        free = [
+            begins for begins in (
+                datetime.combine(date, start_time, tzinfo=tz)
+                for date, start_time in AvailabilitySlot.objects.filter(
+                    provider=provider, is_booked=False, date__gte=today + timedelta(days=2)
+                ).order_by('date', 'start_time').values_list('date', 'start_time')
+            ) if begins not in taken
+        ]
+        if len(free) < 7:
+            raise CommandError(f'Provider {provider.pk} has too few free slots; regenerate the synthetic dataset')
+
+        def booking(status='pending'):
+            begins = free.pop()
+            return Booking.objects.create(
+                user=customer, provider=provider, service_id=service_id, requested_datetime=begins,
+                duration_minutes=60, status=status,
+            ).pk
+
+        start = free.pop()
+        to_confirm, to_reject, to_cancel, confirmed = booking(), booking(), booking(), booking('confirmed')
+        to_bulk = [booking(), booking()]
+        slot = AvailabilitySlot.objects.create(
+            provider=provider, date=today + timedelta(days=50), start_time=time(5), end_time=time(6)
+        )
+        rule = AvailabilityRule.objects.create(
+            provider=provider, weekdays=[6], start_time=time(18), end_time=time(19),
+            valid_from=today + timedelta(days=90), materialized_until=today + timedelta(days=89),
+        )
+        exception = AvailabilityException.objects.create(provider=provider, date=today + timedelta(days=91))
+        window = f'date_from={today}&date_to={today + timedelta(days=7)}'
+        later = (today + timedelta(days=60)).isoformat()
+
+        account = {'email': 'query-budget@example.com', 'password': 'Budget-check-42'}
+        cases = [
+            ('post', '/api/auth/signup/', {
+                **account, 'password2': account['password'], 'first_name': 'Query', 'last_name': 'Budget',
+            }, None),
+            ('post', '/api/auth/login/', account, None),
+            ('get', '/api/services/', None, None),
+            ('get', f'/api/services/{service_id}/', None, None),
+            ('get', '/api/providers/', None, None),
+            ('get', '/api/providers/?near=27.7172,85.3240&radius_km=10', None, None),
+            ('get', '/api/providers/?search=Puja', None, None),
+            ('get', f'/api/providers/{provider.pk}/', None, None),
+            ('get', f'/api/providers/available/?date={today + timedelta(days=3)}', None, None),
+            ('get', f'/api/providers/{provider.pk}/availability/?{window}', None, None),
+            ('get', f'/api/providers/{provider.pk}/reviews/', None, None),
+            ('get', '/api/profile/', None, customer),
+            ('put', '/api/profile/', {'first_name': 'Budget'}, customer),
+            ('get', '/api/bookings/', None, customer),
+            ('get', '/api/bookings/', None, provider.user),
+            ('get', f'/api/bookings/{to_confirm}/', None, customer),
+            ('post', '/api/bookings/', {
+                'provider_id': provider.pk, 'service_id': service_id,
+                'requested_datetime': start.isoformat(), 'duration_minutes': 60,
+            }, customer),
+            ('post', f'/api/bookings/{to_confirm}/confirm/', {}, provider.user),
+            ('post', f'/api/bookings/{to_reject}/reject/', {}, provider.user),
+            ('post', f'/api/bookings/{to_cancel}/cancel/', {}, customer),
+            ('post', f'/api/bookings/{confirmed}/complete/', {}, provider.user),
+            ('post', '/api/bookings/bulk-transition/', {'ids': to_bulk, 'status': 'confirmed'}, provider.user),
+            ('get', '/api/history/', None, customer),
+            ('get', '/api/history/', None, provider.user),
+            ('get', '/api/provider/dashboard/', None, provider.user),
+            ('get', '/api/provider/profile/', None, provider.user),
+            ('put', '/api/provider/profile/', {'experience_years': 12}, provider.user),
+            ('get', f'/api/provider/availability/?{window}', None, provider.user),
+            ('post', '/api/provider/availability/', {
+                'date': later, 'start_time': '05:00', 'end_time': '06:00',
+            }, provider.user),
+            ('put', f'/api/provider/availability/{slot.pk}/', {'notes': 'Budget'}, provider.user),
+            ('delete', f'/api/provider/availability/{slot.pk}/', None, provider.user),
+            ('get', '/api/provider/availability/rules/', None, provider.user),
+            ('post', '/api/provider/availability/rules/', {
+                'weekdays': [0, 2], 'start_time': '05:00', 'end_time': '07:00', 'slot_minutes': 60,
+                'valid_from': later,
+            }, provider.user),
+            ('put', f'/api/provider/availability/rules/{rule.pk}/', {'notes': 'Budget'}, provider.user),
+            ('delete', f'/api/provider/availability/rules/{rule.pk}/', None, provider.user),
+            ('get', '/api/provider/availability/exceptions/', None, provider.user),
+            ('post', '/api/provider/availability/exceptions/', {'date': later}, provider.user),
+            ('delete', f'/api/provider/availability/exceptions/{exception.pk}/', None, provider.user),
+            # Revokes the access token of this request only; each request above has its own
+            ('post', '/api/auth/logout/', {'refresh': str(tokens_for(customer))}, customer),
+        ]
+        self.checked = {
+            f'{method.upper()} {resolve(path.split("?")[0]).url_name}' for method, path, _, _ in cases
+        }
+        return cases
+
+    def _routes(self):
+        """'METHOD url-name' for every route that declares a budget"""
+        routes = set()
+
+        def walk(patterns):
+            for pattern in patterns:
+                if isinstance(pattern, URLResolver):
+                    walk(pattern.url_patterns)
+                elif isinstance(pattern, URLPattern):
+                    view = pattern.callback
+                    actions = getattr(view, 'actions', None)
+                    methods = actions or getattr(getattr(view, 'cls', None), 'http_method_names', [])
+                    for method in methods:
+                        if method not in ('head', 'options') and budget_for(view, method) is not None:
+                            routes.add(f'{method.upper()} {pattern.name}')
+
+        walk(get_resolver().url_patterns)
+        return sorted(routes)
@@ -0,0 +1,119 @@
+import io
+import shlex
+from collections import OrderedDict
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, migrations
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+
+from api.indexadvisor import advise, capture, index_source
+
+
+class Command(BaseCommand):
+    help = (
+        'Run another command (check_query_budgets by default), capture the '
+        'SQL it executes, explain each distinct query and report full table '
+        'scans and temporary sorts, with an index proposed for each from the '
+        'query\'s shape. --emit writes the proposals as migrations.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--run', default='check_query_budgets',
+            help='The command (and its arguments) whose queries to capture, e.g. "benchmark_endpoints --requests 50"'
+        )
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='Propose no index for tables with fewer rows; scanning them is cheap'
+        )
+        parser.add_argument('--analyze', action='store_true', help='Run ANALYZE first, so plans use fresh statistics')
+        parser.add_argument('--emit', action='store_true', help='Write an AddIndex migration per app')
+        parser.add_argument('--show-sql', action='store_true', help='Print the SQL and plan of each flagged query')
+
+    def handle(self, *args, **options):
+        command = shlex.split(options['run'])
+        if not command:
+            raise CommandError('--run needs a command')
+        if options['analyze']:
+            for connection in connections.all():
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+        with capture() as queries:
+            try:
+                quiet = options['verbosity'] < 2
+                call_command(*command, stdout=io.StringIO() if quiet else self.stdout,
+                             stderr=io.StringIO() if quiet else self.stderr)
+            except CommandError as e:
+                # Its queries ran all the same
+                self.stderr.write(f'{command[0]} failed: {e}')
+        self.stdout.write(f'Captured {len(queries)} distinct queries from {command[0]}.')
+
+        proposals = OrderedDict()
+        flagged_count = 0
+        for query, plan, flagged in advise(queries, options['min_rows']):
+            flagged_count += 1
+            for kind, table, rows, proposal in flagged:
+                suggestion = ''
+                if proposal:
+                    model, index = proposal
+                    proposals.setdefault((model, index.name), (model, index))
+                    suggestion = f' -> {index.name}'
+                elif rows < options['min_rows']:
+                    suggestion = f' ({rows} rows, left alone)'
+                else:
+                    suggestion = ' (no index proposed)'
+                self.stdout.write(f'{kind:<5} {table:<32} x{query.count:<4}{suggestion}')
+            if options['show_sql'] or options['verbosity'] > 1:
+                self.stdout.write(f'      {query.sql}')
+                for line in plan:
+                    self.stdout.write(f'      | {line}')
+
+        if not flagged_count:
+            self.stdout.write(self.style.SUCCESS('No full scans or temporary sorts.'))
+            return
+        if not proposals:
+            self.stdout.write(self.style.SUCCESS(
+                f'{flagged_count} queries scan or sort, none on a table worth a new index.'
+            ))
+            return
+
+        self.stdout.write('')
+        self.stdout.write('Proposed indexes (Meta.indexes):')
+        by_model = OrderedDict()
+        for model, index in proposals.values():
+            by_model.setdefault(model, []).append(index)
+        for model, indexes in by_model.items():
+            self.stdout.write(f'  {model.__name__} ({model._meta.db_table}):')
+            for index in indexes:
+                self.stdout.write(f'    {index_source(index)},')
+
+        if options['emit']:
+            for path in self._emit(by_model):
+                self.stdout.write(f'Wrote {path}')
+            self.stdout.write(
+                'Add the same indexes to the models\' Meta.indexes, or makemigrations will want to remove them.'
+            )
+
+    def _emit(self, by_model):
+        """One migration per app adding its proposed indexes; yields the paths written"""
+        loader = MigrationLoader(connections[DEFAULT_DB_ALIAS], ignore_no_migrations=True)
+        by_app = OrderedDict()
+        for model, indexes in by_model.items():
+            by_app.setdefault(model._meta.app_label, []).extend(
+                migrations.AddIndex(model_name=model._meta.model_name, index=index) for index in indexes
+            )
+        for app_label, operations in by_app.items():
+            leaves = loader.graph.leaf_nodes(app_label)
+            if len(leaves) != 1:
+                raise CommandError(f'{app_label} has {len(leaves)} leaf migrations; run makemigrations --merge first')
+            number = int(leaves[0][1].split('_')[0]) + 1
+            migration = migrations.Migration(f'{number:04d}_advised_indexes', app_label)
+            migration.dependencies = leaves
+            migration.operations = operations
+            writer = MigrationWriter(migration)
+            with open(writer.path, 'w') as f:
+                f.write(writer.as_string())
+            yield writer.path
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:40
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill_end_datetime(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    batch = []
+    for booking in Booking.objects.only('id', 'requested_datetime', 'duration_minutes').iterator(chunk_size=2000):
+        booking.end_datetime = booking.requested_datetime + timedelta(minutes=booking.duration_minutes)
+        batch.append(booking)
+        if len(batch) >= 2000:
+            Booking.objects.bulk_update(batch, ['end_datetime'])
+            batch = []
+    Booking.objects.bulk_update(batch, ['end_datetime'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='end_datetime',
+            field=models.DateTimeField(editable=False, null=True, help_text='requested_datetime + duration_minutes, set on save'),
+        ),
+        migrations.RunPython(backfill_end_datetime, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='booking',
+            name='end_datetime',
+            field=models.DateTimeField(editable=False, help_text='requested_datetime + duration_minutes, set on save'),
+        ),
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='bookings_provide_f84a5e_idx',
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['provider', 'status', 'end_datetime', 'requested_datetime'], name='bookings_provider_interval_idx'),
+        ),
+    ]
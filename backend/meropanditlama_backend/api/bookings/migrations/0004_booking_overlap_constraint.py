@@ -0,0 +1,132 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:42
+"""
+PostgreSQL only, and only with BOOKING_EXCLUSION_CONSTRAINT set: an
+exclusion constraint against overlapping active bookings of a provider.
+
+The old 60-minute-window check let some overlaps through, and an
+exclusion constraint cannot be added NOT VALID, so the migration first
+looks for existing overlaps. If there are any it fails, listing the
+bookings that overlap an earlier-made one of the same provider; cancel
+or move those (the bulk-transition endpoint keeps stats, bitmaps and
+notifications in step) and migrate again. Nothing is changed on its own.
+
+Reversing drops the constraint, and btree_gist too if this migration
+installed it and nothing else uses it.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, migrations, transaction
+from django.db.models import Exists, OuterRef
+
+ACTIVE_STATUSES = ['pending', 'confirmed']
+
+# Marks a btree_gist this migration installed, so reversing removes only that
+INSTALLED_EXTENSION = 'installed btree_gist'
+
+CREATE_CONSTRAINT = """
+ALTER TABLE bookings ADD CONSTRAINT bookings_no_overlap EXCLUDE USING gist (
+    provider_id WITH =,
+    tstzrange(requested_datetime, end_datetime, '[)') WITH &&
+) WHERE (status IN ('pending', 'confirmed'))
+"""
+
+DROP_CONSTRAINT = 'ALTER TABLE bookings DROP CONSTRAINT IF EXISTS bookings_no_overlap'
+
+
+def _enabled(schema_editor):
+    return (
+        schema_editor.connection.vendor == 'postgresql' and
+        getattr(settings, 'BOOKING_EXCLUSION_CONSTRAINT', False)
+    )
+
+
+class OverlappingBookings(Exception):
+    pass
+
+
+def overlapping_bookings(Booking, using):
+    """
+    Active bookings overlapping an earlier-made active booking of the same
+    provider, as {earlier booking id: [overlapping booking ids]}
+    """
+    active = Booking.objects.using(using).filter(status__in=ACTIVE_STATUSES)
+    overlapping = active.filter(Exists(
+        active.filter(
+            provider_id=OuterRef('provider_id'),
+            requested_datetime__lt=OuterRef('end_datetime'),
+            end_datetime__gt=OuterRef('requested_datetime'),
+        ).exclude(pk=OuterRef('pk'))
+    )).order_by('provider_id', 'created_at', 'id').values_list(
+        'id', 'provider_id', 'requested_datetime', 'end_datetime'
+    )
+
+    kept = defaultdict(list)
+    conflicts = defaultdict(list)
+    for booking_id, provider_id, start, end in overlapping.iterator():
+        earlier = next((
+            kept_id for kept_id, kept_start, kept_end in kept[provider_id]
+            if start < kept_end and end > kept_start
+        ), None)
+        if earlier is None:
+            kept[provider_id].append((booking_id, start, end))
+        else:
+            conflicts[earlier].append(booking_id)
+    return dict(conflicts)
+
+
+def check_overlapping_bookings(apps, schema_editor):
+    if not _enabled(schema_editor):
+        return
+    conflicts = overlapping_bookings(apps.get_model('bookings', 'Booking'), schema_editor.connection.alias)
+    if conflicts:
+        listing = '\n'.join(
+            f'  booking {earlier} is overlapped by {later}' for earlier, later in conflicts.items()
+        )
+        raise OverlappingBookings(
+            f'{sum(map(len, conflicts.values()))} active booking(s) overlap earlier ones of the same provider; '
+            f'cancel or move them, then migrate again:\n{listing}'
+        )
+
+
+def add_overlap_constraint(apps, schema_editor):
+    if not _enabled(schema_editor):
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'btree_gist'")
+        installed = cursor.fetchone() is None
+    if installed:
+        schema_editor.execute('CREATE EXTENSION btree_gist')
+    schema_editor.execute(CREATE_CONSTRAINT)
+    if installed:
+        schema_editor.execute(f"COMMENT ON CONSTRAINT bookings_no_overlap ON bookings IS '{INSTALLED_EXTENSION}'")
+
+
+def remove_overlap_constraint(apps, schema_editor):
+    if not _enabled(schema_editor):
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT obj_description(oid, 'pg_constraint') FROM pg_constraint WHERE conname = 'bookings_no_overlap'"
+        )
+        row = cursor.fetchone()
+    schema_editor.execute(DROP_CONSTRAINT)
+    if row and row[0] == INSTALLED_EXTENSION:
+        try:
+            # RESTRICT: fails, and is left installed, if anything else now uses it
+            with transaction.atomic(using=schema_editor.connection.alias):
+                schema_editor.execute('DROP EXTENSION IF EXISTS btree_gist RESTRICT')
+        except DatabaseError:
+            pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_booking_end_datetime'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_overlapping_bookings, migrations.RunPython.noop),
+        migrations.RunPython(add_overlap_constraint, remove_overlap_constraint),
+    ]
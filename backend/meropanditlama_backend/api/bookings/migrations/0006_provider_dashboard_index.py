@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_booking_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['provider', 'requested_datetime', 'status'], name='bookings_provider_date_idx'),
+        ),
+    ]
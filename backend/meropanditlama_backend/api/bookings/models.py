@@ -1,7 +1,14 @@
 from django.db import models
 from django.core.validators import MinValueValidator
+from django.db import transaction
 from django.utils import timezone
 from api.accounts.models import User
+from api.providers.bitmaps import booking_days, local_day_spans, mark_days
+from api.providers.stats import record_booking_change
+from .conflicts import booking_end
+from .transitions import (
+    InvalidTransition, can_transition, check_transition, slot_change, update_slots
+)
 
 class Booking(models.Model):
     """Booking model for service requests"""
@@ -39,6 +46,10 @@ class Booking(models.Model):
         validators=[MinValueValidator(30)],
         help_text="Service duration in minutes"
     )
+    end_datetime = models.DateTimeField(
+        editable=False,
+        help_text="requested_datetime + duration_minutes, set on save"
+    )
     status = models.CharField(
         max_length=10,
         choices=STATUS_CHOICES,
@@ -57,8 +68,21 @@ class Booking(models.Model):
         verbose_name_plural = 'Bookings'
         indexes = [
             models.Index(fields=['user', 'status']),
-            models.Index(fields=['provider', 'status']),
+            # Conflict checks: provider + status equality, then a range on
+            # end_datetime, which for new (future) bookings skips history
+            models.Index(
+                fields=['provider', 'status', 'end_datetime', 'requested_datetime'],
+                name='bookings_provider_interval_idx'
+            ),
             models.Index(fields=['requested_datetime', 'status']),
+            # Keyset pagination of each side's booking list, newest first
+            models.Index(fields=['user', 'created_at', 'id'], name='bookings_user_created_idx'),
+            models.Index(fields=['provider', 'created_at', 'id'], name='bookings_provider_created_idx'),
+            # Provider dashboard series: a date range per provider, status read from the index
+            models.Index(
+                fields=['provider', 'requested_datetime', 'status'],
+                name='bookings_provider_date_idx'
+            ),
         ]
     
     def __str__(self):
@@ -72,28 +96,64 @@ class Booking(models.Model):
     def can_cancel(self):
         return self.status in ['pending', 'confirmed'] and not self.is_past
     
+    # Fields whose saved values Booking.save() compares against
+    TRACKED_FIELDS = ('status', 'provider_id', 'requested_datetime', 'end_datetime')
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_state()
+        return instance
+    
+    def _remember_state(self):
+        state = {name: self.__dict__.get(name) for name in self.TRACKED_FIELDS}
+        # Deferred fields are unknown; save() re-reads them
+        self._loaded_state = state if None not in state.values() else None
+    
+    def _saved_state(self):
+        """Field values as last loaded or saved, without a query when possible"""
+        state = getattr(self, '_loaded_state', None)
+        if state is None:
+            state = Booking.objects.filter(pk=self.pk).values(*self.TRACKED_FIELDS).first()
+        return state
+    
+    def clean(self):
+        """Reject status changes the state machine does not allow"""
+        from django.core.exceptions import ValidationError
+        if self.pk is not None:
+            state = self._saved_state()
+            if state and not can_transition(state['status'], self.status):
+                raise ValidationError({'status': str(InvalidTransition(state['status'], self.status))})
+    
     def save(self, *args, **kwargs):
-        is_new = self.pk is None
-        old_status = None
-        
-        if not is_new:
-            old_booking = Booking.objects.get(pk=self.pk)
-            old_status = old_booking.status
+        old = self._saved_state() if self.pk is not None else None
+        old_status = old['status'] if old else None
+        if old_status is not None:
+            check_transition(old_status, self.status)
         
-        super().save(*args, **kwargs)
+        self.end_datetime = booking_end(self.requested_datetime, self.duration_minutes)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'requested_datetime', 'duration_minutes'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'end_datetime'}
         
-        from api.providers.models import AvailabilitySlot  # import inside method to avoid circular import
-        if self.status == 'confirmed' and old_status != 'confirmed':
-            AvailabilitySlot.objects.filter(
-                provider=self.provider,
-                date=self.requested_datetime.date(),
-                start_time__lte=self.requested_datetime.time(),
-                end_time__gte=self.requested_datetime.time()
-            ).update(is_booked=True)
-        elif self.status in ['cancelled', 'completed'] and old_status == 'confirmed':
-            AvailabilitySlot.objects.filter(
-                provider=self.provider,
-                date=self.requested_datetime.date(),
-                start_time__lte=self.requested_datetime.time(),
-                end_time__gte=self.requested_datetime.time()
-            ).update(is_booked=False)
+        # No savepoint: inside a caller's transaction this commits or rolls back with it
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            record_booking_change(
+                self.provider_id, old_status, self.status,
+                old_provider_id=old['provider_id'] if old else None
+            )
+            
+            is_booked = slot_change(old_status, self.status)
+            if is_booked is not None:
+                update_slots([(self.provider_id, self.requested_datetime)], is_booked)
+            
+            # Slot updates above send no signals; refresh the bitmaps of both the old and new times
+            days = booking_days(self)
+            if old:
+                days |= {
+                    (old['provider_id'], day)
+                    for day, _, _ in local_day_spans(old['requested_datetime'], old['end_datetime'])
+                }
+            mark_days(days)
+        self._remember_state()
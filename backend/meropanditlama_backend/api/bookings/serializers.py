@@ -1,12 +1,20 @@
 from rest_framework import serializers
 from datetime import datetime, timedelta
+from django.db import IntegrityError, transaction
 from django.utils import timezone
-from django.db.models import Q
 
+from .conflicts import booking_end, has_conflict, is_overlap_violation
 from .models import Booking
 from api.providers.models import ServiceProvider, Service
 from api.providers.serializers import ServiceSerializer
+from api.accounts.models import full_name
 from api.accounts.serializers import UserSerializer
+from api.projection import Computed, Projection
+from api.notifications.utils import queue_booking_notification
+
+CONFLICT_ERROR = {
+    'requested_datetime': 'This time slot is not available. Please choose another time.'
+}
 
 class BookingCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating bookings"""
@@ -21,18 +29,11 @@ class BookingCreateSerializer(serializers.ModelSerializer):
             'duration_minutes', 'notes'
         ]
     
-    def validate_provider_id(self, value):
-        """Validate provider exists and is verified"""
-        try:
-            provider = ServiceProvider.objects.get(id=value, verified=True)
-        except ServiceProvider.DoesNotExist:
-            raise serializers.ValidationError("Provider not found or not verified")
-        return value
-    
     def validate_service_id(self, value):
         """Validate service exists"""
         try:
-            Service.objects.get(id=value)
+            # Kept for create(), so the service is read once
+            self.service = Service.objects.get(id=value)
         except Service.DoesNotExist:
             raise serializers.ValidationError("Service not found")
         return value
@@ -45,45 +46,42 @@ class BookingCreateSerializer(serializers.ModelSerializer):
             )
         return value
     
-    def validate(self, attrs):
-        """Check for booking conflicts"""
-        provider = ServiceProvider.objects.get(id=attrs['provider_id'])
-        requested_dt = attrs['requested_datetime']
-        duration = attrs['duration_minutes']
-        end_dt = requested_dt + timedelta(minutes=duration)
-        
-        # Check for conflicting bookings
-        conflicts = Booking.objects.filter(
-            provider=provider,
-            status__in=['pending', 'confirmed']
-        ).filter(
-            Q(requested_datetime__lt=end_dt) &
-            Q(requested_datetime__gte=requested_dt - timedelta(minutes=60))
-        )
-        
-        if conflicts.exists():
-            raise serializers.ValidationError({
-                'requested_datetime': 'This time slot is not available. Please choose another time.'
-            })
-        
-        return attrs
-    
     def create(self, validated_data):
-        """Create booking"""
-        provider = ServiceProvider.objects.get(id=validated_data.pop('provider_id'))
-        service = Service.objects.get(id=validated_data.pop('service_id'))
+        """
+        Create the booking. The provider and conflict checks run here, with
+        the provider row locked, so concurrent requests check in turn.
+        """
+        service_id = validated_data.pop('service_id')
+        service = getattr(self, 'service', None)
+        if service is None or service.id != service_id:
+            service = Service.objects.get(id=service_id)
         user = self.context['request'].user
         
-        booking = Booking.objects.create(
-            user=user,
-            provider=provider,
-            service=service,
-            **validated_data
-        )
-        
-        # Send email notification to provider
-        from api.notifications.utils import send_booking_notification
-        send_booking_notification(booking, 'requested', provider.user)
+        try:
+            with transaction.atomic():
+                provider = ServiceProvider.objects.select_for_update(of=('self',)).select_related(
+                    'user'
+                ).filter(id=validated_data.pop('provider_id'), verified=True).first()
+                if provider is None:
+                    raise serializers.ValidationError({'provider_id': ['Provider not found or not verified']})
+                requested_dt = validated_data['requested_datetime']
+                duration = validated_data.get('duration_minutes', Booking._meta.get_field('duration_minutes').default)
+                if has_conflict(provider.id, requested_dt, booking_end(requested_dt, duration)):
+                    raise serializers.ValidationError(CONFLICT_ERROR)
+                
+                booking = Booking.objects.create(
+                    user=user,
+                    provider=provider,
+                    service=service,
+                    **validated_data
+                )
+                
+                # Queue email notification to provider
+                queue_booking_notification(booking, 'requested', provider.user)
+        except IntegrityError as e:
+            if is_overlap_violation(e):
+                raise serializers.ValidationError(CONFLICT_ERROR)
+            raise
         
         return booking
 
@@ -132,6 +130,16 @@ class BookingListSerializer(serializers.ModelSerializer):
     def get_user_name(self, obj):
         return obj.user.get_full_name()
 
+# BookingListSerializer from .values() rows, for the list endpoints
+booking_list_projection = Projection(
+    BookingListSerializer,
+    provider_name=Computed(
+        ['provider__user__first_name', 'provider__user__last_name', 'provider__user__email'],
+        full_name
+    ),
+    user_name=Computed(['user__first_name', 'user__last_name', 'user__email'], full_name),
+)
+
 class BookingCancelSerializer(serializers.Serializer):
     """Serializer for cancelling bookings"""
     
@@ -139,4 +147,19 @@ class BookingCancelSerializer(serializers.Serializer):
         required=False,
         allow_blank=True,
         max_length=500
-    )
\ No newline at end of file
+    )
+
+class BookingBulkTransitionSerializer(serializers.Serializer):
+    """Serializer for moving many bookings to a new status"""
+    
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=5000
+    )
+    status = serializers.ChoiceField(choices=['confirmed', 'completed', 'cancelled'])
+    cancellation_reason = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        max_length=500
+    )
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Booking
+from api.providers.bitmaps import booking_days, mark_days
+from api.providers.catalog_cache import bump_catalog_version
+from api.providers.dashboard import invalidate_dashboard
+from api.providers.stats import record_booking_change
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, **kwargs):
+    """Remove a deleted booking from its provider's status counters and bitmaps"""
+    record_booking_change(
+        instance.provider_id, instance.status, None,
+        create_missing=False
+    )
+    mark_days(booking_days(instance))
+
+@receiver([post_save, post_delete], sender=Booking)
+def booking_changed(sender, instance, raw=False, **kwargs):
+    """Booking counts and free slots are part of the public catalog and the provider's dashboard"""
+    if not raw:
+        bump_catalog_version()
+        invalidate_dashboard([instance.provider_id])
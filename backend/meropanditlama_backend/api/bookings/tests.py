@@ -0,0 +1,399 @@
+import csv
+import importlib
+import io
+import json
+import tracemalloc
+from datetime import datetime, time, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api import exports
+from api.bookings.conflicts import booking_end
+from api.bookings.models import Booking
+from api.bookings.serializers import BookingListSerializer
+from api.bookings.transitions import InvalidTransition, transition_bookings
+from api.notifications.models import OutboxNotification
+from api.providers.models import AvailabilitySlot
+from api.providers.stats import find_stats_drift
+from api.querycount import QueryLog, assert_query_budget
+from api.testing import (
+    auth_header, future_day, make_booking, make_provider, make_service, make_slot, make_user
+)
+
+overlap_migration = importlib.import_module('api.bookings.migrations.0004_booking_overlap_constraint')
+
+
+class BookingCreateTests(TestCase):
+    """POST /api/bookings/"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = make_service()
+        cls.provider = make_provider(services=[cls.service])
+        cls.customer = make_user()
+        cls.day = future_day()
+
+    def setUp(self):
+        # Users are cached by id, and ids are reused once a test rolls back
+        cache.clear()
+
+    def book(self, start='10:00', provider=None, duration_minutes=60):
+        requested = timezone.make_aware(datetime.combine(self.day, time.fromisoformat(start)))
+        return self.client.post('/api/bookings/', json.dumps({
+            'provider_id': (provider or self.provider).id, 'service_id': self.service.id,
+            'requested_datetime': requested.isoformat(), 'duration_minutes': duration_minutes,
+        }), content_type='application/json', **auth_header(self.customer))
+
+    def test_creates_booking_and_queues_notification(self):
+        response = self.book()
+        self.assertEqual(response.status_code, 201)
+        booking = Booking.objects.get()
+        self.assertEqual(booking.status, 'pending')
+        self.assertEqual(booking.end_datetime - booking.requested_datetime, timedelta(minutes=60))
+        self.assertTrue(OutboxNotification.objects.filter(
+            booking=booking, recipient=self.provider.user, notification_type='requested'
+        ).exists())
+
+    def test_overlapping_booking_is_rejected(self):
+        self.assertEqual(self.book('10:00', duration_minutes=120).status_code, 201)
+        response = self.book('11:30')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('requested_datetime', response.json())
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_adjacent_booking_is_accepted(self):
+        self.assertEqual(self.book('10:00').status_code, 201)
+        self.assertEqual(self.book('11:00').status_code, 201)
+
+    def test_unverified_provider_is_rejected(self):
+        unverified = make_provider(verified=False, services=[self.service])
+        response = self.book(provider=unverified)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('provider_id', response.json())
+        self.assertFalse(Booking.objects.exists())
+
+    def test_provider_is_read_once(self):
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            self.assertEqual(self.book().status_code, 201)
+        self.assertEqual(sum('FROM "service_providers"' in sql for sql in queries), 1)
+        self.assertEqual(sum('AS "a" FROM "bookings"' in sql for sql in queries), 1)
+
+
+class BookingQueryBudgetTests(TransactionTestCase):
+    """
+    Booking routes stay within their declared query budgets. Requests
+    really commit, so the counts include the BEGIN of each transaction and
+    the availability bitmap refresh that runs after it.
+    """
+
+    def setUp(self):
+        self.service = make_service()
+        self.provider = make_provider(services=[self.service])
+        self.customer = make_user()
+        self.day = future_day()
+        # Enough rows that a query per row would show, each on a slot so
+        # transitions pay for the slot update too
+        for hour in range(6, 18):
+            make_slot(self.provider, self.day, f'{hour:02}:00', f'{hour + 1:02}:00')
+            make_booking(self.customer, self.provider, self.day, f'{hour:02}:00', service=self.service)
+        cache.clear()
+
+    def request(self, method, path, user, data=None):
+        response = assert_query_budget(
+            self.client, method, path, json.dumps(data or {}) if method == 'post' else data,
+            content_type='application/json', **auth_header(user)
+        )
+        self.assertLess(response.status_code, 300, response.content)
+        return response
+
+    def booking(self, status='pending'):
+        return Booking.objects.filter(status=status).earliest('requested_datetime')
+
+    def test_list(self):
+        for user in (self.customer, self.provider.user):
+            with self.subTest(role=user.role):
+                response = self.request('get', '/api/bookings/', user)
+                self.assertEqual(len(response.json()['results']), 12)
+
+    def test_retrieve(self):
+        self.request('get', f'/api/bookings/{self.booking().pk}/', self.customer)
+
+    def test_create(self):
+        requested = timezone.make_aware(datetime.combine(self.day, time(20)))
+        self.request('post', '/api/bookings/', self.customer, {
+            'provider_id': self.provider.id, 'service_id': self.service.id,
+            'requested_datetime': requested.isoformat(), 'duration_minutes': 60,
+        })
+
+    def test_transitions(self):
+        # Each booking runs through the API, so confirm books its slot and
+        # complete and the second cancel free one: the dearest path of each
+        for action, user, status in [
+            ('confirm', self.provider.user, 'pending'),
+            ('reject', self.provider.user, 'pending'),
+            ('cancel', self.customer, 'pending'),
+            ('complete', self.provider.user, 'confirmed'),
+            ('confirm', self.provider.user, 'pending'),
+            ('cancel', self.customer, 'confirmed'),
+        ]:
+            with self.subTest(action=action, status=status):
+                self.request('post', f'/api/bookings/{self.booking(status).pk}/{action}/', user)
+        self.assertFalse(AvailabilitySlot.objects.filter(is_booked=True).exists())
+
+    def test_bulk_transition(self):
+        ids = list(Booking.objects.values_list('id', flat=True))
+        response = self.request('post', '/api/bookings/bulk-transition/', self.provider.user, {
+            'ids': ids, 'status': 'confirmed',
+        })
+        self.assertEqual(response.json()['updated'], len(ids))
+
+
+class BookingListProjectionTests(TestCase):
+    """The booking list endpoints render .values() rows as BookingListSerializer renders instances"""
+
+    @classmethod
+    def setUpTestData(cls):
+        service = make_service()
+        # Without a name, so get_full_name() falls back to the email
+        cls.customer = make_user(first_name='', last_name='')
+        cls.provider = make_provider(services=[service])
+        day = future_day()
+        with cls.captureOnCommitCallbacks(execute=True):
+            for hour, status in enumerate(['pending', 'confirmed', 'confirmed', 'completed', 'cancelled'], start=8):
+                make_booking(cls.customer, cls.provider, day, f'{hour:02}:00', service=service, status=status)
+            # Its service has since been deleted
+            make_booking(cls.customer, cls.provider, day, '15:00', status='completed', notes='No service')
+
+    def setUp(self):
+        cache.clear()
+
+    def assertSerializerOutput(self, results):
+        bookings = Booking.objects.select_related('user', 'provider__user', 'service').in_bulk(
+            [data['id'] for data in results]
+        )
+        expected = BookingListSerializer([bookings[data['id']] for data in results], many=True).data
+        self.assertEqual(JSONRenderer().render(results), JSONRenderer().render(expected))
+
+    def test_list(self):
+        for user in (self.customer, self.provider.user):
+            with self.subTest(role=user.role):
+                response = self.client.get('/api/bookings/', **auth_header(user))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), 6)
+                self.assertSerializerOutput(response.data['results'])
+
+    def test_history(self):
+        response = self.client.get('/api/history/', **auth_header(self.customer))
+        self.assertEqual(response.status_code, 200)
+        for name, count in [('upcoming', 2), ('completed', 2), ('cancelled', 1)]:
+            with self.subTest(name):
+                self.assertEqual(len(response.data[name]), count)
+                self.assertSerializerOutput(response.data[name])
+
+
+@mock.patch.object(exports, 'CHUNK_SIZE', 250)
+class BookingExportTests(TestCase):
+    """GET /api/bookings/export/ streams a chunk of rows at a time"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_user()
+        cls.provider = make_provider()
+        begins = timezone.now() + timedelta(days=1)
+        Booking.objects.bulk_create([
+            Booking(
+                user=cls.customer, provider=cls.provider, requested_datetime=begins + timedelta(hours=i),
+                duration_minutes=60, end_datetime=booking_end(begins + timedelta(hours=i), 60),
+                notes=f'Booking {i}, "exported"',
+            )
+            for i in range(5000)
+        ], batch_size=1000)
+
+    def setUp(self):
+        cache.clear()
+
+    def stream(self, rows):
+        """(chunk sizes, first chunk, queries and peak bytes allocated while streaming) for the first `rows` bookings"""
+        last = Booking.objects.order_by('pk').values_list('pk', flat=True)[rows - 1]
+        response = self.client.get('/api/bookings/export/', {
+            'date_to': timezone.localtime(Booking.objects.get(pk=last).requested_datetime).date(),
+        }, **auth_header(self.customer))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+
+        log = QueryLog()
+        # Sizes only, so the peak is what streaming itself holds
+        chunks = []
+        tracemalloc.start()
+        with connection.execute_wrapper(log):
+            for chunk in response.streaming_content:
+                if not chunks:
+                    first = chunk.decode()
+                chunks.append(len(chunk))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return chunks, first, log.count, peak
+
+    def test_streams_in_chunks_with_one_query(self):
+        chunks, first, queries, _ = self.stream(5000)
+        self.assertEqual(queries, 1)
+        self.assertEqual(len(chunks), 20)
+        # The header and the first CHUNK_SIZE rows
+        self.assertEqual(len(list(csv.reader(io.StringIO(first)))), 251)
+
+    def test_memory_does_not_grow_with_rows(self):
+        small, _, small_queries, small_peak = self.stream(1000)
+        large, _, large_queries, large_peak = self.stream(5000)
+        self.assertEqual(small_queries, large_queries)
+        # Five times the output, about the same peak (buffering it all would about double it)
+        self.assertGreater(sum(large), 4 * sum(small))
+        self.assertLess(large_peak, 1.5 * small_peak)
+
+
+class ExportEscapingTests(TestCase):
+    """User-entered text cannot become a spreadsheet formula in a CSV export"""
+
+    def test_formula_cells_are_quoted_in_csv_only(self):
+        customer = make_user(first_name='=HYPERLINK("http://evil.example","x")', last_name='-1+1')
+        make_booking(customer, make_provider(), future_day(), '10:00', notes='@SUM(A1)')
+        response = self.client.get('/api/bookings/export/', **auth_header(customer))
+        row, = csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode()))
+        self.assertEqual(row['user_first_name'], '\'=HYPERLINK("http://evil.example","x")')
+        self.assertEqual(row['user_last_name'], "'-1+1")
+        self.assertEqual(row['notes'], "'@SUM(A1)")
+        # Other cells are untouched
+        self.assertEqual(row['status'], 'pending')
+        self.assertEqual(row['duration_minutes'], '60')
+
+        response = self.client.get('/api/bookings/export/', {'output': 'ndjson'}, **auth_header(customer))
+        record = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(record['user_first_name'], '=HYPERLINK("http://evil.example","x")')
+
+
+class OverlapMigrationTests(TestCase):
+    """The data step of migration 0004, which the constraint depends on"""
+
+    def test_overlaps_fail_the_migration_and_change_nothing(self):
+        customer, provider, other = make_user(), make_provider(), make_provider()
+        day = future_day()
+        # Rows the old 60-minute-window check let through (models do not check)
+        first = make_booking(customer, provider, day, '10:00')
+        second = make_booking(customer, provider, day, '10:30')
+        third = make_booking(customer, provider, day, '11:00')
+        make_booking(customer, other, day, '10:30')
+
+        # third only overlaps second, which is reported against first
+        self.assertEqual(overlap_migration.overlapping_bookings(Booking, 'default'), {first.pk: [second.pk]})
+        with mock.patch.object(overlap_migration, '_enabled', return_value=True), \
+                self.assertRaisesMessage(overlap_migration.OverlappingBookings, f'booking {first.pk} is overlapped by [{second.pk}]'):
+            overlap_migration.check_overlapping_bookings(apps, SimpleNamespace(connection=connection))
+        self.assertFalse(Booking.objects.exclude(status='pending').exists())
+
+    def test_off_unless_enabled(self):
+        make_booking(make_user(), make_provider(), future_day(), '10:00')
+        self.assertFalse(overlap_migration._enabled(SimpleNamespace(connection=SimpleNamespace(vendor='postgresql'))))
+
+
+class BookingTransitionTests(TestCase):
+    """The status state machine, one booking at a time and in bulk"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider()
+        cls.other_provider = make_provider()
+        cls.customer = make_user()
+        cls.day = future_day()
+
+    def setUp(self):
+        cache.clear()
+
+    def bookings(self, *statuses, provider=None):
+        return [
+            make_booking(self.customer, provider or self.provider, self.day, f'{8 + hour:02}:00', status=status)
+            for hour, status in enumerate(statuses)
+        ]
+
+    def test_save_rejects_disallowed_changes(self):
+        for old, new in [('pending', 'completed'), ('completed', 'pending'), ('cancelled', 'confirmed'),
+                         ('completed', 'cancelled')]:
+            booking, = self.bookings(old)
+            booking.status = new
+            with self.subTest(old=old, new=new):
+                with self.assertRaises(ValidationError):
+                    booking.full_clean()
+                with self.assertRaises(InvalidTransition):
+                    booking.save()
+            Booking.objects.filter(pk=booking.pk).delete()
+
+    def test_only_allowed_sources_move(self):
+        pending, confirmed, completed, cancelled = self.bookings('pending', 'confirmed', 'completed', 'cancelled')
+        self.assertEqual(transition_bookings(Booking.objects.all(), 'cancelled', cancellation_reason='Ill'), 2)
+        self.assertEqual(
+            dict(Booking.objects.values_list('id', 'status')),
+            {pending.pk: 'cancelled', confirmed.pk: 'cancelled', completed.pk: 'completed',
+             cancelled.pk: 'cancelled'}
+        )
+        self.assertEqual(
+            set(Booking.objects.filter(cancellation_reason='Ill').values_list('id', flat=True)),
+            {pending.pk, confirmed.pk}
+        )
+        self.assertEqual(transition_bookings(Booking.objects.all(), 'cancelled'), 0)
+        with self.assertRaises(ValueError):
+            transition_bookings(Booking.objects.all(), 'lost')
+
+    def test_side_effects_match_single_saves(self):
+        make_slot(self.provider, self.day, '08:00', '12:00')
+        self.bookings('pending', 'pending', 'completed')
+        self.assertEqual(transition_bookings(Booking.objects.all(), 'confirmed'), 2)
+
+        _, drift = find_stats_drift([self.provider.pk])
+        self.assertEqual(drift, [])
+        self.assertTrue(AvailabilitySlot.objects.get(provider=self.provider).is_booked)
+        self.assertEqual(OutboxNotification.objects.filter(notification_type='confirmed').count(), 2)
+
+    def test_query_count_does_not_grow(self):
+        def count(statuses):
+            Booking.objects.all().delete()
+            self.bookings(*statuses)
+            self.bookings(*statuses, provider=self.other_provider)
+            with CaptureQueriesContext(connection) as queries:
+                transition_bookings(Booking.objects.all(), 'confirmed')
+            return len(queries)
+
+        self.assertEqual(count(['pending'] * 2), count(['pending'] * 10))
+
+    def post(self, user, ids, new_status):
+        return self.client.post('/api/bookings/bulk-transition/', json.dumps({
+            'ids': ids, 'status': new_status,
+        }), content_type='application/json', **auth_header(user))
+
+    def test_bulk_endpoint_skips_what_it_may_not_change(self):
+        mine = self.bookings('pending', 'completed')
+        theirs, = self.bookings('pending', provider=self.other_provider)
+        started = make_booking(self.customer, self.provider, timezone.localdate() - timedelta(days=1), '10:00')
+
+        ids = [booking.pk for booking in mine + [theirs, started]]
+        response = self.post(self.provider.user, ids, 'cancelled')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['updated'], response.json()['skipped']), (1, 3))
+        self.assertEqual(
+            dict(Booking.objects.values_list('id', 'status')),
+            {mine[0].pk: 'cancelled', mine[1].pk: 'completed', theirs.pk: 'pending', started.pk: 'pending'}
+        )
+        self.assertEqual(self.post(self.customer, ids, 'cancelled').status_code, 403)
+        self.assertEqual(self.post(self.provider.user, ids, 'pending').status_code, 400)
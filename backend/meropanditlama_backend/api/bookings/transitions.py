@@ -0,0 +1,153 @@
+"""
+Booking status state machine.
+
+    pending   -> confirmed, cancelled
+    confirmed -> completed, cancelled
+    completed, cancelled: final
+
+Booking.save() validates single changes against TRANSITIONS, using the
+status the instance was loaded with instead of re-reading the row.
+transition_bookings() moves a whole queryset at once with set-based
+statements: a constant number of queries however many bookings change,
+with the same side effects as saving each one (provider stats, slot
+is_booked flags, availability bitmaps, catalog cache, notifications).
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+# Allowed status changes
+TRANSITIONS = {
+    'pending': {'confirmed', 'cancelled'},
+    'confirmed': {'completed', 'cancelled'},
+    'completed': set(),
+    'cancelled': set(),
+}
+
+# Email queued to the customer when a booking enters a status
+CUSTOMER_NOTIFICATIONS = {
+    'confirmed': 'confirmed',
+    'cancelled': 'cancelled',
+}
+
+
+class InvalidTransition(ValueError):
+    def __init__(self, old_status, new_status):
+        self.old_status = old_status
+        self.new_status = new_status
+        super().__init__(f'Cannot change booking status from {old_status} to {new_status}')
+
+
+def can_transition(old_status, new_status):
+    return old_status == new_status or new_status in TRANSITIONS.get(old_status, ())
+
+
+def check_transition(old_status, new_status):
+    if not can_transition(old_status, new_status):
+        raise InvalidTransition(old_status, new_status)
+
+
+def sources(new_status):
+    """Statuses a booking may move to new_status from"""
+    return [status for status, targets in TRANSITIONS.items() if new_status in targets]
+
+
+def slot_change(old_status, new_status):
+    """True to book the booking's slot, False to free it, None to leave it"""
+    if new_status == 'confirmed' and old_status != 'confirmed':
+        return True
+    if new_status in ('cancelled', 'completed') and old_status == 'confirmed':
+        return False
+    return None
+
+
+def update_slots(bookings, is_booked):
+    """
+    Set is_booked on the slots holding the start of each booking, given
+    as (provider_id, requested_datetime) pairs, in two queries.
+    """
+    from api.providers.models import AvailabilitySlot
+
+    starts = defaultdict(list)
+    for provider_id, requested_datetime in bookings:
+        start = timezone.localtime(requested_datetime)
+        starts[provider_id, start.date()].append(start.time())
+    if not starts:
+        return 0
+
+    slots = AvailabilitySlot.objects.filter(
+        provider_id__in={provider_id for provider_id, _ in starts},
+        date__in={day for _, day in starts},
+        is_booked=not is_booked,
+    ).values_list('id', 'provider_id', 'date', 'start_time', 'end_time')
+    slot_ids = [
+        slot_id for slot_id, provider_id, day, start_time, end_time in slots
+        if any(start_time <= t < end_time for t in starts.get((provider_id, day), ()))
+    ]
+    if not slot_ids:
+        return 0
+    return AvailabilitySlot.objects.filter(id__in=slot_ids).update(is_booked=is_booked)
+
+
+def transition_bookings(queryset, new_status, cancellation_reason='', notify=True):
+    """
+    Move every booking in the queryset that is allowed to reach
+    new_status; others are left alone. Returns the number changed.
+    """
+    from api.notifications.models import OutboxNotification
+    from api.providers.bitmaps import local_day_spans, mark_days
+    from api.providers.catalog_cache import bump_catalog_version
+    from api.providers.dashboard import invalidate_dashboard
+    from api.providers.stats import record_booking_changes
+    from .models import Booking
+
+    if new_status not in TRANSITIONS:
+        raise ValueError(f'Unknown booking status: {new_status}')
+    allowed = sources(new_status)
+
+    with transaction.atomic():
+        rows = list(
+            queryset.filter(status__in=allowed).select_for_update().order_by().values_list(
+                'id', 'provider_id', 'user_id', 'status', 'requested_datetime', 'end_datetime'
+            )
+        )
+        if not rows:
+            return 0
+
+        changes = {'status': new_status, 'updated_at': timezone.now()}
+        if new_status == 'cancelled' and cancellation_reason:
+            changes['cancellation_reason'] = cancellation_reason
+        Booking.objects.filter(id__in=[row[0] for row in rows]).update(**changes)
+
+        record_booking_changes(Counter(
+            (provider_id, old_status, new_status)
+            for _, provider_id, _, old_status, _, _ in rows
+        ))
+
+        for is_booked in (True, False):
+            update_slots([
+                (provider_id, start)
+                for _, provider_id, _, old_status, start, _ in rows
+                if slot_change(old_status, new_status) is is_booked
+            ], is_booked)
+
+        notification_type = CUSTOMER_NOTIFICATIONS.get(new_status)
+        if notify and notification_type:
+            OutboxNotification.objects.bulk_create([
+                OutboxNotification(
+                    booking_id=booking_id, recipient_id=user_id,
+                    notification_type=notification_type,
+                )
+                for booking_id, _, user_id, _, _, _ in rows
+            ])
+
+        # update() sends no signals
+        invalidate_dashboard({provider_id for _, provider_id, _, _, _, _ in rows})
+        mark_days({
+            (provider_id, day)
+            for _, provider_id, _, _, start, end in rows
+            for day, _, _ in local_day_spans(start, end)
+        })
+        bump_catalog_version()
+    return len(rows)
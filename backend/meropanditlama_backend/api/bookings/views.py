@@ -2,23 +2,63 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 
 from .models import Booking
 from .serializers import (
     BookingSerializer, BookingListSerializer,
-    BookingCreateSerializer, BookingCancelSerializer
+    BookingCreateSerializer, BookingCancelSerializer,
+    BookingBulkTransitionSerializer, booking_list_projection
 )
+from .exports import BOOKING_EXPORT
+from .transitions import transition_bookings
 from api.accounts.permissions import IsProvider
-from api.notifications.utils import send_booking_notification
+from api.exports import export_response
+from api.pagination import KeysetPagination
+from api.querycount import query_budget
+from api.writequeue import SerializedWritesMixin
+from api.notifications.utils import queue_booking_notification
 
-class BookingViewSet(viewsets.ModelViewSet):
+class BookingViewSet(SerializedWritesMixin, viewsets.ModelViewSet):
     """Booking management endpoints"""
     
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status']
+    # Every budget starts with the user lookup behind the access token.
+    # Writes open a transaction (BEGIN; the COMMIT is not a query) and,
+    # once it commits, refresh the day's availability bitmap: slots and
+    # bookings SELECTs, BEGIN, upsert - 4 queries, "bitmap" below.
+    # export streams, so its queries fall outside the request's count.
+    query_budgets = {
+        # user + one page of bookings
+        'list': 2,
+        # user + the booking
+        'retrieve': 2,
+        # user, service, BEGIN, provider, overlap EXISTS, INSERT, stats
+        # UPDATE, outbox INSERT, bitmap
+        'create': 12,
+        # user, booking, BEGIN, booking UPDATE, stats UPDATE, slot SELECT +
+        # UPDATE, outbox INSERT, bitmap
+        'confirm': 12,
+        # user, booking, BEGIN, booking UPDATE, stats UPDATE, outbox INSERT,
+        # bitmap (a pending booking holds no slot)
+        'reject': 10,
+        # as reject, plus slot SELECT + UPDATE when a confirmed booking
+        # frees its slot
+        'cancel': 12,
+        # user, booking, BEGIN, booking UPDATE, stats UPDATE, slot SELECT +
+        # UPDATE, bitmap
+        'complete': 11,
+        # user, BEGIN, rows SELECT FOR UPDATE, bookings UPDATE, one stats
+        # UPDATE for all providers, slot SELECT + UPDATE, outbox INSERT,
+        # bitmap
+        'bulk_transition': 12,
+    }
     
     def get_queryset(self):
         """Return bookings based on user role"""
@@ -42,6 +82,12 @@ class BookingViewSet(viewsets.ModelViewSet):
             return BookingListSerializer
         return BookingSerializer
     
+    def list(self, request, *args, **kwargs):
+        """Same payload as BookingListSerializer, built from .values() rows"""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(booking_list_projection.values(queryset))
+        return self.get_paginated_response(booking_list_projection.represent(page, request))
+    
     def create(self, request, *args, **kwargs):
         """Create a new booking (User only)"""
         if request.user.role != 'user':
@@ -75,10 +121,11 @@ class BookingViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         booking.status = 'confirmed'
-        booking.save()
-        
-        # Send confirmation email to user
-        send_booking_notification(booking, 'confirmed', booking.user)
+        with transaction.atomic():
+            booking.save()
+            
+            # Queue confirmation email to user
+            queue_booking_notification(booking, 'confirmed', booking.user)
         
         return Response({
             'message': 'Booking confirmed successfully',
@@ -102,10 +149,11 @@ class BookingViewSet(viewsets.ModelViewSet):
         
         booking.status = 'cancelled'
         booking.cancellation_reason = request.data.get('reason', 'Rejected by provider')
-        booking.save()
-        
-        # Send cancellation email to user
-        send_booking_notification(booking, 'cancelled', booking.user)
+        with transaction.atomic():
+            booking.save()
+            
+            # Queue cancellation email to user
+            queue_booking_notification(booking, 'cancelled', booking.user)
         
         return Response({
             'message': 'Booking rejected',
@@ -135,13 +183,14 @@ class BookingViewSet(viewsets.ModelViewSet):
                 'cancellation_reason',
                 f'Cancelled by {request.user.get_full_name()}'
             )
-            booking.save()
-            
-            # Send notification to other party
-            if booking.user == request.user:
-                send_booking_notification(booking, 'cancelled', booking.provider.user)
-            else:
-                send_booking_notification(booking, 'cancelled', booking.user)
+            with transaction.atomic():
+                booking.save()
+                
+                # Queue notification to other party
+                if booking.user == request.user:
+                    queue_booking_notification(booking, 'cancelled', booking.provider.user)
+                else:
+                    queue_booking_notification(booking, 'cancelled', booking.user)
             
             return Response({
                 'message': 'Booking cancelled successfully',
@@ -172,6 +221,40 @@ class BookingViewSet(viewsets.ModelViewSet):
             'booking': BookingSerializer(booking).data
         })
 
+    @action(detail=False, methods=['post'], url_path='bulk-transition', permission_classes=[IsProvider])
+    def bulk_transition(self, request):
+        """Confirm, complete or cancel many of the provider's bookings at once"""
+        serializer = BookingBulkTransitionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        ids = set(serializer.validated_data['ids'])
+        new_status = serializer.validated_data['status']
+        bookings = Booking.objects.filter(id__in=ids, provider__user=request.user)
+        if new_status == 'cancelled':
+            # Same rule as cancelling one booking: not once it has started
+            bookings = bookings.filter(requested_datetime__gt=timezone.now())
+        
+        updated = transition_bookings(
+            bookings, new_status,
+            cancellation_reason=serializer.validated_data.get(
+                'cancellation_reason',
+                f'Cancelled by {request.user.get_full_name()}'
+            )
+        )
+        return Response({
+            'message': f'{updated} booking(s) marked as {new_status}',
+            'updated': updated,
+            'skipped': len(ids) - updated
+        })
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the bookings the user can see (every booking for staff) as CSV or NDJSON"""
+        bookings = Booking.objects.all() if request.user.is_staff else self.get_queryset()
+        return export_response(BOOKING_EXPORT, bookings, request)
+
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def booking_history(request):
@@ -185,18 +268,20 @@ def booking_history(request):
     
     upcoming = bookings.filter(
         status='confirmed'
-    ).order_by('requested_datetime')[:10]
+    ).order_by('requested_datetime')
     
     completed = bookings.filter(
         status='completed'
-    ).order_by('-requested_datetime')[:10]
+    ).order_by('-requested_datetime')
     
     cancelled = bookings.filter(
         status='cancelled'
-    ).order_by('-updated_at')[:10]
+    ).order_by('-updated_at')
     
+    # BookingListSerializer payloads from .values() rows, one query per list
     return Response({
-        'upcoming': BookingListSerializer(upcoming, many=True).data,
-        'completed': BookingListSerializer(completed, many=True).data,
-        'cancelled': BookingListSerializer(cancelled, many=True).data
+        name: booking_list_projection.represent(booking_list_projection.values(queryset)[:10])
+        for name, queryset in [
+            ('upcoming', upcoming), ('completed', completed), ('cancelled', cancelled)
+        ]
     })
\ No newline at end of file
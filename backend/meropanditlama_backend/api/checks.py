@@ -0,0 +1,42 @@
+"""
+System checks for settings the apps depend on together.
+
+Several features keep state in the default cache that every worker
+process must see:
+
+- the catalog response version (providers.catalog_cache)
+- the cached provider dashboards (providers.dashboard)
+- the cached users and their versions (accounts.authentication)
+- the read-your-writes pins of the replica router (api.dbrouter)
+
+With a per-process cache, a write handled by one worker leaves the
+others serving stale catalog pages, dashboards and user roles, and
+reading a replica right after the write. Unless SINGLE_PROCESS says one
+process serves every request, a per-process default cache is warned
+about; it is not an error, as a single-worker deploy is fine with it.
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Backends whose entries only the process that wrote them can read
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+}
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if getattr(settings, 'SINGLE_PROCESS', False):
+        return []
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        f"The default cache ({backend}) is private to each process, but the catalog cache, "
+        "provider dashboards, authenticated users and replica pinning must be shared by all workers.",
+        hint=(
+            "Set CACHE_BACKEND to a shared backend (e.g. django.core.cache.backends.redis.RedisCache "
+            "with CACHE_LOCATION), or set SINGLE_PROCESS=True if one process serves every request."
+        ),
+        id='api.W001',
+    )]
@@ -0,0 +1,135 @@
+"""
+Read replicas.
+
+ReplicaRouter sends every write, and every read, to the `default`
+(primary) database, except reads made while a request handler runs in a
+replica context. Only views using ReplicaReadMixin set one: the public
+catalog (services, providers, their reviews and availability), for GET
+and HEAD. Bookings, dashboards and everything else that must see its own
+writes stay on the primary.
+
+Replica reads fall back to the primary:
+
+- inside transaction.atomic() on the primary
+- for DATABASE_STICKY_SECONDS after the user made a write request, so
+  they see their own changes (DatabaseRoutingMiddleware records it)
+- while filling the catalog cache within DATABASE_STICKY_SECONDS of a
+  catalog change, so a lagging replica is not cached under the new
+  version (see catalog_cache.py)
+
+DATABASE_STICKY_SECONDS should exceed the replicas' usual lag. Replicas
+are listed in DATABASE_REPLICAS; with none, everything uses the primary.
+Locally, SQLite file copies kept current by `sync_sqlite_replicas` stand
+in for replicas.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+REPLICAS = list(getattr(settings, 'DATABASE_REPLICAS', []))
+STICKY_SECONDS = getattr(settings, 'DATABASE_STICKY_SECONDS', 5)
+
+_read_alias = ContextVar('db_read_alias', default=None)
+_primary_only = ContextVar('db_primary_only', default=False)
+
+
+def _pin_key(user_id):
+    return f'db:pinned:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Read the user's requests from the primary for the next DATABASE_STICKY_SECONDS"""
+    cache.set(_pin_key(user_id), True, STICKY_SECONDS)
+
+
+def unpin(user_id):
+    cache.delete(_pin_key(user_id))
+
+
+def is_pinned(user):
+    return bool(user and user.is_authenticated and cache.get(_pin_key(user.pk)))
+
+
+def read_alias(request):
+    """The replica a read request may use, or None for the primary"""
+    if not REPLICAS or _primary_only.get() or is_pinned(getattr(request, 'user', None)):
+        return None
+    return random.choice(REPLICAS)
+
+
+@contextmanager
+def primary_reads():
+    """Keep reads in the block on the primary, even in a replica context"""
+    token = _primary_only.set(True)
+    try:
+        yield
+    finally:
+        _primary_only.reset(token)
+
+
+class ReplicaRouter:
+    """Reads in a replica context go to its replica; everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or _primary_only.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Explicit, as Django would otherwise write an instance back where it was read from
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema from the primary
+        if db in REPLICAS:
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Run GET/HEAD handlers of a viewset in a replica context.
+
+    The context starts after authentication and permission checks, which
+    stay on the primary, and ends with dispatch().
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        token = _read_alias.set(None)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            _read_alias.set(read_alias(request))
+
+
+class DatabaseRoutingMiddleware:
+    """Pins users to the primary for DATABASE_STICKY_SECONDS after a write request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if REPLICAS and request.method not in SAFE_METHODS:
+            # DRF sets the user it authenticated on the Django request too
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin_to_primary(user.pk)
+        return response
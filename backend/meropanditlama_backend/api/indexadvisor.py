@@ -0,0 +1,249 @@
+"""
+Index advice from the queries a run actually executes.
+
+capture() records every distinct query shape (see querycount.sql_shape)
+run on any connection, with the parameters of its first execution.
+advise() then explains each SELECT, UPDATE and DELETE on the database it
+ran on (EXPLAIN QUERY PLAN on SQLite, EXPLAIN on PostgreSQL) and flags:
+
+    scan    a table read in full, no index
+    sort    rows sorted for ORDER BY in a temporary B-tree (SQLite) or a
+            Sort node (PostgreSQL)
+    group   the same for GROUP BY or DISTINCT; reported, nothing proposed
+
+For each scan or sort of a table of at least `min_rows` rows it proposes
+an index from the query's shape: the columns the WHERE clause compares
+for equality (IN and IS NULL included) and, on SQLite, those the plan
+already searches the table by (join columns), then the first
+range-compared column (for scans) or the ORDER BY columns (for sorts).
+Boolean columns tested on their own (`WHERE verified`) become the
+condition of a partial index instead. A proposal is dropped when an
+existing index starts with the same columns; if the planner scanned
+anyway, the table's statistics are probably stale (ANALYZE).
+
+The SQL is read with regular expressions written for the SQL Django
+generates, so proposals are a starting point for review, not a verdict.
+"""
+import re
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+
+from django.apps import apps
+from django.db import connections, models
+
+from api.querycount import sql_shape
+
+EXPLAINED = ('SELECT', 'UPDATE', 'DELETE')
+
+# `"table" U0` in FROM / JOIN clauses: subquery aliases
+_ALIAS_RE = re.compile(r'"(\w+)" ([A-Z]\d+)\b')
+# A column reference: "table"."column" or U0."column"
+_REFERENCE = r'(?:"(?P<table>\w+)"|(?P<alias>[A-Z]\d+))\."(?P<column>\w+)"'
+_EQUALITY_RE = re.compile(_REFERENCE + r' (?:= |IN \(|IS NULL)')
+_RANGE_RE = re.compile(_REFERENCE + r' (?:[<>]=? |BETWEEN )')
+_BOOLEAN_RE = re.compile(r'(?P<negated>NOT )?' + _REFERENCE + r'(?= AND | OR |\)| ORDER BY | LIMIT |$)')
+_ORDER_RE = re.compile(_REFERENCE + r'(?P<direction> DESC| ASC)?')
+# SQLite plan lines: "SCAN bookings" (no USING), "USE TEMP B-TREE FOR ORDER BY"
+_SQLITE_SCAN_RE = re.compile(r'^SCAN (\w+)$')
+_SQLITE_SEARCH_RE = re.compile(r'^SEARCH (\w+) USING .*\((.*)\)')
+# JOIN ... ON (...) clauses, left out of the WHERE columns
+_JOIN_ON_RE = re.compile(r' ON \([^()]*\)')
+_PG_SCAN_RE = re.compile(r'Seq Scan on (\w+)(?: (\w+))?')
+
+
+class Query:
+    """One captured query shape"""
+
+    def __init__(self, alias, sql, params):
+        self.alias = alias
+        self.sql = sql
+        self.params = params
+        self.count = 0
+
+
+@contextmanager
+def capture():
+    """Record the distinct query shapes run in the block: yields {shape: Query}"""
+    queries = OrderedDict()
+
+    def record(alias):
+        def wrapper(execute, sql, params, many, context):
+            if not many and sql.lstrip().upper().startswith(EXPLAINED):
+                query = queries.get(sql_shape(sql))
+                if query is None:
+                    query = queries[sql_shape(sql)] = Query(alias, sql, params)
+                query.count += 1
+            return execute(sql, params, many, context)
+        return wrapper
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(record(connection.alias)))
+        yield queries
+
+
+def explain(connection, sql, params):
+    """The query plan as lines of text"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute(f'EXPLAIN {sql}', params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def problems(connection, sql, plan):
+    """[(kind, table)] flagged in a plan; kind is 'scan', 'sort' or 'group'"""
+    aliases = dict((alias, table) for table, alias in _ALIAS_RE.findall(sql))
+    # The outermost FROM table, for sorts, which plans do not attribute
+    outer = re.search(r' FROM "(\w+)"', sql)
+    found = []
+    for line in plan:
+        line = line.strip()
+        if connection.vendor == 'sqlite':
+            scan = _SQLITE_SCAN_RE.match(line)
+            if scan:
+                found.append(('scan', aliases.get(scan.group(1), scan.group(1))))
+            elif line.startswith('USE TEMP B-TREE') and outer:
+                found.append(('sort' if line.endswith('ORDER BY') else 'group', outer.group(1)))
+        else:
+            scan = _PG_SCAN_RE.search(line)
+            if scan:
+                found.append(('scan', scan.group(1)))
+            elif line.lstrip('-> ').startswith(('Sort ', 'Incremental Sort ')) and outer:
+                found.append(('group' if ' GROUP BY ' in sql else 'sort', outer.group(1)))
+    return list(OrderedDict.fromkeys(found))
+
+
+def _columns(pattern, sql, table, aliases):
+    """(column, match) for references in sql to `table`, in order of appearance"""
+    for match in pattern.finditer(sql):
+        referenced = match.group('table') or aliases.get(match.group('alias'))
+        if referenced == table:
+            yield match.group('column'), match
+
+
+def searched_columns(sql, table, plan):
+    """Columns a SQLite plan searches table's index by with equality (`provider_id=?`)"""
+    aliases = dict((alias, name) for name, alias in _ALIAS_RE.findall(sql))
+    columns = []
+    for line in plan:
+        search = _SQLITE_SEARCH_RE.match(line.strip())
+        if search and aliases.get(search.group(1), search.group(1)) == table:
+            columns.extend(re.findall(r'(\w+)=\?', search.group(2)))
+    return [column for column in columns if column != 'rowid']
+
+
+def shape_columns(sql, table):
+    """Equality, range, boolean (column, value) and ORDER BY (column, descending) columns of table"""
+    aliases = dict((alias, name) for name, alias in _ALIAS_RE.findall(sql))
+    where, _, order = sql.rpartition(' ORDER BY ') if ' ORDER BY ' in sql else (sql, '', '')
+    where = _JOIN_ON_RE.sub('', where)
+    equality = list(OrderedDict.fromkeys(column for column, _ in _columns(_EQUALITY_RE, where, table, aliases)))
+    ranged = list(OrderedDict.fromkeys(
+        column for column, _ in _columns(_RANGE_RE, where, table, aliases) if column not in equality
+    ))
+    booleans = OrderedDict()
+    if ' WHERE ' in where:
+        clause = where.split(' WHERE ', 1)[1]
+        for column, match in _columns(_BOOLEAN_RE, clause, table, aliases):
+            booleans[column] = not match.group('negated')
+    ordering = [
+        (column, match.group('direction') == ' DESC')
+        for column, match in _columns(_ORDER_RE, order.split(' LIMIT ')[0], table, aliases)
+    ]
+    equality = [column for column in equality if column not in booleans]
+    return equality, ranged, booleans, ordering
+
+
+def model_for_table(table):
+    for model in apps.get_models():
+        if model._meta.db_table == table:
+            return model
+    return None
+
+
+def existing_indexes(connection, table):
+    """Column lists of the table's indexes (and unique constraints)"""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return [info['columns'] for info in constraints.values() if info['index'] or info['unique']]
+
+
+def propose(connection, kind, sql, plan, table):
+    """(model, models.Index) for a scan or sort of table, or None"""
+    model = model_for_table(table)
+    if kind == 'group' or model is None:
+        return None
+    equality, ranged, booleans, ordering = shape_columns(sql, table)
+    searched = [column for column in searched_columns(sql, table, plan) if column not in booleans]
+    equality = list(OrderedDict.fromkeys(searched + equality))
+    ranged = [column for column in ranged if column not in equality]
+    if kind == 'sort':
+        # An index only gives the order after equality columns; a range column breaks it
+        columns = equality + [column for column, _ in ordering if column not in equality]
+        descending = {column for column, desc in ordering if desc}
+        # All one direction: the index is read backwards, so keep it ascending
+        if len(descending) == len(ordering):
+            descending = set()
+    else:
+        columns = equality + ranged[:1]
+        descending = set()
+    if not columns:
+        return None
+    for index_columns in existing_indexes(connection, table):
+        if index_columns[:len(columns)] == columns:
+            return None
+
+    fields = {field.column: field.name for field in model._meta.concrete_fields}
+    if any(column not in fields for column in columns + list(booleans)):
+        return None
+    names = [f'-{fields[column]}' if column in descending else fields[column] for column in columns]
+    condition = models.Q(**{fields[column]: value for column, value in booleans.items()}) if booleans else None
+    index = models.Index(fields=names)
+    index.set_name_with_model(model)
+    if condition is not None:
+        index = models.Index(fields=names, name=index.name, condition=condition)
+    return model, index
+
+
+def table_rows(connection, table):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+        return cursor.fetchone()[0]
+
+
+def advise(queries, min_rows=1000):
+    """
+    Explain captured queries: yields (query, plan, [(kind, table, rows, proposal)])
+    for every query with something flagged; proposal is (model, index) or None.
+    """
+    rows = {}
+    for query in queries.values():
+        connection = connections[query.alias]
+        try:
+            plan = explain(connection, query.sql, query.params)
+        except Exception:
+            # Queries against tables the run created and dropped, and the like
+            continue
+        flagged = []
+        for kind, table in problems(connection, query.sql, plan):
+            if (query.alias, table) not in rows:
+                try:
+                    rows[query.alias, table] = table_rows(connection, table)
+                except Exception:
+                    rows[query.alias, table] = 0
+            count = rows[query.alias, table]
+            proposal = propose(connection, kind, query.sql, plan, table) if count >= min_rows else None
+            flagged.append((kind, table, count, proposal))
+        if flagged:
+            yield query, plan, flagged
+
+
+def index_source(index):
+    """The models.Index(...) line for Meta.indexes"""
+    arguments = [f'fields={index.fields!r}', f'name={index.name!r}']
+    if index.condition is not None:
+        conditions = ', '.join(f'{key}={value!r}' for key, value in index.condition.children)
+        arguments.append(f'condition=models.Q({conditions})')
+    return f'models.Index({", ".join(arguments)})'
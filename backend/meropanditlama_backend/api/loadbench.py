@@ -0,0 +1,330 @@
+"""
+End-to-end load benchmark over the real URL routes.
+
+Each Scenario builds requests for one endpoint from the synthetic dataset
+(see api.synthetic). run_scenario() sends them from a number of worker
+threads, either in-process through django.test.Client and the whole
+middleware stack, or over HTTP to a running server that uses the same
+database. Per endpoint it reports p50/p95/p99 latency, throughput and,
+in-process, database queries per request.
+
+Results are saved as JSON baselines; compare() lists the endpoints that
+got slower or run more queries than a baseline.
+"""
+import http.client
+import json
+import math
+import queue
+import random
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+
+from django.db import connections
+from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.accounts.models import User
+from api.bookings.models import Booking
+from api.providers.models import AvailabilitySlot, ServiceProvider
+from api.synthetic import PREFIX, SERVICE_NAMES
+
+# Latency percentiles reported per endpoint
+PERCENTILES = [50, 95, 99]
+# Notes of the bookings a run creates, so cleanup() finds them all, even
+# ones whose request failed after the booking was saved
+BOOKING_NOTES = 'Created by benchmark_endpoints'
+
+
+
+def percentile(samples, p):
+    """Nearest-rank percentile of sorted samples"""
+    if not samples:
+        return None
+    return samples[max(0, math.ceil(p / 100 * len(samples)) - 1)]
+
+
+class Dataset:
+    """Ids and tokens of the synthetic dataset the scenarios draw from"""
+
+    def __init__(self, customers=50):
+        self.today = timezone.localdate()
+        self.customers = list(User.objects.filter(
+            username__startswith=f'{PREFIX}user-'
+        ).order_by('id')[:customers])
+        self.providers = list(ServiceProvider.objects.filter(
+            user__username__startswith=PREFIX, verified=True
+        ).order_by('id').values_list('id', 'latitude', 'longitude'))
+        if not self.customers or not self.providers:
+            raise ValueError('No synthetic dataset; run `manage.py generate_synthetic_data` first')
+        self.tokens = {user.pk: str(AccessToken.for_user(user)) for user in self.customers}
+        # Bookable slots for write scenarios, see reserve_slots()
+        self.slots = []
+        self.offered = {}
+        for provider_id, service_id in ServiceProvider.services.through.objects.filter(
+            serviceprovider__user__username__startswith=PREFIX
+        ).values_list('serviceprovider_id', 'service_id'):
+            self.offered.setdefault(provider_id, []).append(service_id)
+
+    def reserve_slots(self, count, rng):
+        """Collect up to count distinct bookable (provider_id, start) pairs, at least two days ahead"""
+        tz = timezone.get_current_timezone()
+        slots = list(AvailabilitySlot.objects.filter(
+            provider__user__username__startswith=PREFIX, provider__verified=True,
+            is_booked=False, date__gte=self.today + timedelta(days=2),
+        ).order_by('id').values_list('provider_id', 'date', 'start_time')[:count * 5])
+        taken = set(Booking.objects.filter(
+            provider__user__username__startswith=PREFIX, status__in=['pending', 'confirmed'],
+            requested_datetime__gte=timezone.now(),
+        ).values_list('provider_id', 'requested_datetime'))
+        free = []
+        for provider_id, date, start_time in slots:
+            start = datetime.combine(date, start_time, tzinfo=tz)
+            if (provider_id, start) not in taken and provider_id in self.offered:
+                free.append((provider_id, start))
+        rng.shuffle(free)
+        self.slots = free[:count]
+
+
+class Scenario:
+    """
+    One endpoint. build(rng, dataset) returns (method, path, params or
+    JSON body, customer id to authenticate as or None), or None when the
+    dataset has nothing left to request.
+    """
+
+    def __init__(self, name, build, writes=False):
+        self.name = name
+        self.build = build
+        # Takes a free slot per request from dataset.slots
+        self.writes = writes
+
+
+def _near(rng, dataset):
+    _, latitude, longitude = rng.choice(dataset.providers)
+    return f'{latitude:.4f},{longitude:.4f}'
+
+
+def _day(rng, dataset):
+    return (dataset.today + timedelta(days=rng.randint(2, 14))).isoformat()
+
+
+def _create_booking(rng, dataset):
+    if not dataset.slots:
+        return None
+    provider_id, start = dataset.slots.pop()
+    return ('POST', '/api/bookings/', {
+        'provider_id': provider_id, 'service_id': rng.choice(dataset.offered[provider_id]),
+        'requested_datetime': start.isoformat(), 'duration_minutes': 60, 'notes': BOOKING_NOTES,
+    }, rng.choice(dataset.customers).pk)
+
+
+SCENARIOS = [
+    Scenario('providers', lambda rng, data: (
+        'GET', '/api/providers/', {}, None
+    )),
+    Scenario('providers-near', lambda rng, data: (
+        'GET', '/api/providers/', {'near': _near(rng, data), 'radius_km': 10}, None
+    )),
+    Scenario('providers-search', lambda rng, data: (
+        'GET', '/api/providers/', {'search': rng.choice(SERVICE_NAMES)[0].split()[0]}, None
+    )),
+    Scenario('providers-available', lambda rng, data: (
+        'GET', '/api/providers/available/', {'date': _day(rng, data), 'time_from': '09:00', 'time_to': '12:00'}, None
+    )),
+    Scenario('provider-availability', lambda rng, data: (
+        'GET', f'/api/providers/{rng.choice(data.providers)[0]}/availability/',
+        {'date_from': data.today.isoformat(), 'date_to': (data.today + timedelta(days=rng.randint(7, 30))).isoformat()},
+        None
+    )),
+    Scenario('bookings', lambda rng, data: (
+        'GET', '/api/bookings/', {}, rng.choice(data.customers).pk
+    )),
+    Scenario('booking-history', lambda rng, data: (
+        'GET', '/api/history/', {}, rng.choice(data.customers).pk
+    )),
+    Scenario('booking-create', _create_booking, writes=True),
+]
+
+
+class InProcessTarget:
+    """Requests through django.test.Client; counts queries and their time"""
+
+    name = 'in-process'
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def send(self, method, path, data, token):
+        if not hasattr(self.local, 'client'):
+            # Server errors come back as 500 responses, as they would from a server
+            self.local.client = Client(raise_request_exception=False)
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            began = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append(time.perf_counter() - began)
+
+        with ExitStack() as stack:
+            # Replica reads included
+            for database in connections.all():
+                stack.enter_context(database.execute_wrapper(count))
+            if method == 'GET':
+                response = self.local.client.get(path, data, **headers)
+            else:
+                response = self.local.client.generic(
+                    method, path, json.dumps(data), content_type='application/json', **headers
+                )
+        return response.status_code, response.content, len(queries), sum(queries) * 1000
+
+    def close(self):
+        connections.close_all()
+
+
+class HTTPTarget:
+    """Requests to a running server over keep-alive connections, one per thread"""
+
+    name = 'http'
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.connection_class = (
+            http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        )
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.local = threading.local()
+
+    def send(self, method, path, data, token):
+        if not hasattr(self.local, 'connection'):
+            self.local.connection = self.connection_class(self.netloc, timeout=60)
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        body = None
+        if method == 'GET':
+            path = f'{path}?{urlencode(data)}' if data else path
+        else:
+            body = json.dumps(data)
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.local.connection.request(method, self.prefix + path, body=body, headers=headers)
+            response = self.local.connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            # Dropped keep-alive connection; reconnect once
+            self.local.connection.close()
+            try:
+                self.local.connection.request(method, self.prefix + path, body=body, headers=headers)
+                response = self.local.connection.getresponse()
+                content = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                self.local.connection.close()
+                return 0, str(e).encode(), None, None
+        return response.status, content, None, None
+
+    def close(self):
+        if hasattr(self.local, 'connection'):
+            self.local.connection.close()
+
+
+def _send_all(target, dataset, requests, concurrency, on_response):
+    """Send the requests from `concurrency` threads; returns the wall time in seconds"""
+    work = queue.Queue()
+    for request in requests:
+        work.put(request)
+
+    def worker():
+        try:
+            while True:
+                try:
+                    method, path, data, user_id = work.get_nowait()
+                except queue.Empty:
+                    return
+                token = dataset.tokens[user_id] if user_id else None
+                began = time.perf_counter()
+                status_code, content, queries, db_ms = target.send(method, path, data, token)
+                on_response(method, path, status_code, content, (time.perf_counter() - began) * 1000, queries, db_ms)
+        finally:
+            target.close()
+
+    began = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - began
+
+
+def run_scenario(target, scenario, dataset, requests=200, concurrency=4, warmup=10, seed=42):
+    """
+    Send `warmup` untimed requests, then `requests` timed ones, with
+    `concurrency` threads. Returns the endpoint's results.
+    """
+    rng = random.Random(f'{seed}:{scenario.name}')
+    if scenario.writes:
+        dataset.reserve_slots(warmup + requests, rng)
+    built = []
+    for _ in range(warmup + requests):
+        request = scenario.build(rng, dataset)
+        if request is None:
+            break
+        built.append(request)
+
+    samples, errors = [], []
+    lock = threading.Lock()
+
+    def record(method, path, status_code, content, elapsed, queries, db_ms, timed=True):
+        with lock:
+            if timed:
+                samples.append((elapsed, queries, db_ms))
+                if not 200 <= status_code < 400:
+                    errors.append(f'{status_code} {method} {path}: {content[:200]!r}')
+
+    _send_all(target, dataset, built[:warmup], concurrency, lambda *args: record(*args, timed=False))
+    wall = _send_all(target, dataset, built[warmup:], concurrency, record)
+
+    latencies = sorted(elapsed for elapsed, _, _ in samples)
+    counted = [(queries, db_ms) for _, queries, db_ms in samples if queries is not None]
+    result = {
+        'requests': len(samples),
+        'errors': len(errors),
+        'throughput_rps': round(len(samples) / wall, 1) if samples else 0,
+        'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else None,
+        **{f'p{p}_ms': round(percentile(latencies, p), 2) if latencies else None for p in PERCENTILES},
+        'queries_per_request': round(sum(q for q, _ in counted) / len(counted), 2) if counted else None,
+        'max_queries': max(q for q, _ in counted) if counted else None,
+        'db_ms_per_request': round(sum(ms for _, ms in counted) / len(counted), 2) if counted else None,
+    }
+    if errors:
+        result['first_error'] = errors[0]
+    return result
+
+
+def compare(baseline, results, tolerance=0.2):
+    """Regressions of results against a baseline: slower p95 beyond tolerance, or more queries"""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get('endpoints', {}).get(name)
+        if not before:
+            continue
+        if before.get('p95_ms') and result['p95_ms'] and result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f'{name}: p95 {before["p95_ms"]} -> {result["p95_ms"]} ms')
+        if before.get('max_queries') is not None and result['max_queries'] is not None \
+                and result['max_queries'] > before['max_queries']:
+            regressions.append(f'{name}: queries {before["max_queries"]} -> {result["max_queries"]}')
+        if result['errors'] > before.get('errors', 0):
+            regressions.append(f'{name}: errors {before.get("errors", 0)} -> {result["errors"]}')
+    return regressions
+
+
+def cleanup():
+    """Delete the bookings runs created, through the ORM so stats and bitmaps follow"""
+    deleted, _ = Booking.objects.filter(notes=BOOKING_NOTES).delete()
+    return deleted
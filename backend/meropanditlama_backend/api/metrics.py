@@ -0,0 +1,267 @@
+"""
+In-process metrics, aggregated across worker processes.
+
+Each process records counters and histograms in memory; a record is one
+dict update under a lock that is never held for I/O. A daemon thread
+writes the process's totals to METRICS_DIR/<pid>.json every
+METRICS_FLUSH_SECONDS (and at exit), so web workers and the
+process_notifications worker all end up there. metrics_view, an
+admin-only endpoint, adds up every process's file and returns the
+Prometheus text format:
+
+    http_request_duration_seconds   histogram, per route, action, method, status
+    db_queries_total                queries run by requests, per route
+    db_query_seconds_total          time spent in them, per route
+    cache_requests_total            per cache and result (hit / miss)
+    notification_send_seconds       histogram of mail sends, per type
+    notifications_total             delivery outcomes, per result
+    db_write_wait_seconds           histogram of waits for the SQLite write lock
+
+The files hold running totals, so counters from workers that have exited
+still count; a file overwritten by a process reusing a pid looks like a
+counter reset, which Prometheus handles.
+"""
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+
+logger = logging.getLogger(__name__)
+
+ENABLED = getattr(settings, 'METRICS', True)
+METRICS_DIR = Path(getattr(settings, 'METRICS_DIR', Path(tempfile.gettempdir()) / 'meropanditlama-metrics'))
+FLUSH_SECONDS = getattr(settings, 'METRICS_FLUSH_SECONDS', 5)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SEND_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'http_request_duration_seconds': (
+        'histogram', 'Request latency by route and action', LATENCY_BUCKETS
+    ),
+    'db_queries_total': ('counter', 'Database queries run by requests', None),
+    'db_query_seconds_total': ('counter', 'Time requests spent in database queries', None),
+    'cache_requests_total': ('counter', 'Cache lookups by cache and result', None),
+    'notification_send_seconds': ('histogram', 'Time to send a notification email', SEND_BUCKETS),
+    'notifications_total': ('counter', 'Notification deliveries by result', None),
+    'db_write_wait_seconds': (
+        'histogram', 'Time write requests waited for the SQLite write lock', LATENCY_BUCKETS
+    ),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Registry:
+    """Counters and histograms of this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (name, labels) -> value; labels is a sorted tuple of (key, value)
+        self.counters = {}
+        # (name, labels) -> [bucket counts..., sum, count]
+        self.histograms = {}
+        self.dirty = False
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+            self.dirty = True
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        # Index of the first bucket the value fits, worked out before taking the lock
+        index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+        with self.lock:
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = [0] * (len(buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+            self.dirty = True
+
+    def snapshot(self):
+        """The totals as JSON-ready lists"""
+        with self.lock:
+            counters = [[name, list(labels), value] for (name, labels), value in self.counters.items()]
+            histograms = [[name, list(labels), list(series)] for (name, labels), series in self.histograms.items()]
+        return {'counters': counters, 'histograms': histograms}
+
+
+registry = Registry()
+
+
+def inc(name, amount=1, **labels):
+    if ENABLED:
+        _ensure_flusher()
+        registry.inc(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    if ENABLED:
+        _ensure_flusher()
+        registry.observe(name, value, **labels)
+
+
+def flush():
+    """Write this process's totals to its file in METRICS_DIR"""
+    if not registry.dirty:
+        return
+    # Cleared first, so a record made during the write is flushed next time
+    registry.dirty = False
+    data = registry.snapshot()
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    target = METRICS_DIR / f'{os.getpid()}.json'
+    temporary = target.with_suffix('.tmp')
+    temporary.write_text(json.dumps(data))
+    os.replace(temporary, target)
+
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def _flush_forever():
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        try:
+            flush()
+        except OSError as e:
+            logger.warning(f'Could not write metrics: {e}')
+
+
+def _ensure_flusher():
+    """Start the flush thread once per process (workers fork after import)"""
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid != os.getpid():
+            _flusher_pid = os.getpid()
+            threading.Thread(target=_flush_forever, name='metrics-flush', daemon=True).start()
+            atexit.register(flush)
+
+
+def collect():
+    """Every process's totals added up: ({(name, labels): value}, {(name, labels): series})"""
+    counters, histograms = {}, {}
+    own = f'{os.getpid()}.json'
+    sources = [registry.snapshot()]
+    for path in METRICS_DIR.glob('*.json') if METRICS_DIR.exists() else []:
+        if path.name == own:
+            continue
+        try:
+            sources.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    for data in sources:
+        for name, labels, value in data.get('counters', []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, series in data.get('histograms', []):
+            if name not in METRICS or len(series) != len(METRICS[name][2]) + 3:
+                continue
+            key = (name, tuple(tuple(pair) for pair in labels))
+            total = histograms.setdefault(key, [0] * len(series))
+            for i, value in enumerate(series):
+                total[i] += value
+    return counters, histograms
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def render():
+    """Prometheus text exposition of collect()"""
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {value}')
+            continue
+        for (metric, labels), series in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], series):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {series[-2]}')
+            lines.append(f'{name}_count{_labels(labels)} {series[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Records latency and database use per route"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not ENABLED:
+            return self.get_response(request)
+
+        db = [0, 0.0]
+
+        def count(execute, sql, params, many, context):
+            began = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                db[0] += 1
+                db[1] += time.perf_counter() - began
+
+        began = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - began
+
+        match = request.resolver_match
+        # Unresolved paths share one label, so scanners cannot blow up the series count
+        route = (match.url_name or match.view_name) if match else 'unmatched'
+        actions = getattr(match.func, 'actions', None) if match else None
+        action = actions.get(request.method.lower(), '') if actions else ''
+        observe(
+            'http_request_duration_seconds', elapsed, route=route, action=action,
+            method=request.method, status=f'{response.status_code // 100}xx'
+        )
+        if db[0]:
+            inc('db_queries_total', db[0], route=route)
+            inc('db_query_seconds_total', db[1], route=route)
+        return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    """Admin: metrics of all worker processes, Prometheus text format"""
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
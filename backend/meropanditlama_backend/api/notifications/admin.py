@@ -0,0 +1,26 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import OutboxNotification
+
+@admin.register(OutboxNotification)
+class OutboxNotificationAdmin(admin.ModelAdmin):
+    list_display = [
+        'id', 'notification_type', 'booking', 'recipient',
+        'status', 'attempts', 'next_attempt_at', 'sent_at'
+    ]
+    list_filter = ['status', 'notification_type', 'created_at']
+    search_fields = ['recipient__email', 'booking__id']
+    list_select_related = ['recipient', 'booking__user', 'booking__provider__user']
+    raw_id_fields = ['booking', 'recipient']
+    readonly_fields = ['attempts', 'last_error', 'created_at', 'sent_at']
+    ordering = ['-created_at']
+    
+    actions = ['retry_now']
+    
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status='sent').update(
+            status='pending',
+            next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} notification(s) queued for delivery.')
+    retry_now.short_description = 'Retry selected notifications now'
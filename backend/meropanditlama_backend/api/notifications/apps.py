@@ -0,0 +1,6 @@
+from django.apps import AppConfig
+
+class NotificationsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'api.notifications'
+    verbose_name = 'Notifications'
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.notifications.outbox import BATCH_SIZE, CircuitBreaker, deliver_batch
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued booking notifications from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Drain what is due now and exit instead of polling'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--interval', type=float, default=5.0,
+            help='Seconds to sleep when the outbox is empty (default 5)'
+        )
+
+    def handle(self, *args, **options):
+        breaker = CircuitBreaker()
+        totals = {'sent': 0, 'retried': 0, 'failed': 0, 'skipped': 0, 'deferred': 0}
+
+        try:
+            while True:
+                if not breaker.allow():
+                    if options['once']:
+                        break
+                    time.sleep(breaker.retry_after())
+                    continue
+
+                result = deliver_batch(breaker, options['batch_size'])
+                for key, count in result.items():
+                    totals[key] += count
+                if any(result.values()):
+                    self.stdout.write(
+                        f"sent {result['sent']}, retried {result['retried']}, "
+                        f"failed {result['failed']}, skipped {result['skipped']}, "
+                        f"deferred {result['deferred']}"
+                    )
+                    continue
+
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {totals['sent']} notification(s); {totals['retried']} to retry, "
+            f"{totals['failed']} failed, {totals['skipped']} skipped, {totals['deferred']} deferred."
+        ))
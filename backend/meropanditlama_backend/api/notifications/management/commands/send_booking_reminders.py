@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.notifications.reminders import REMINDER_BATCH_SIZE, REMINDER_OFFSETS, schedule_reminders
+
+
+class Command(BaseCommand):
+    help = 'Queue booking reminder emails that are due (delivered by process_notifications)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Queue what is due now and exit instead of polling'
+        )
+        parser.add_argument('--batch-size', type=int, default=REMINDER_BATCH_SIZE)
+        parser.add_argument(
+            '--interval', type=float, default=60.0,
+            help='Seconds between scheduler runs (default 60)'
+        )
+
+    def handle(self, *args, **options):
+        offsets = ', '.join(f'{offset}m' for offset in sorted(REMINDER_OFFSETS, reverse=True))
+        self.stdout.write(f'Reminder offsets: {offsets}')
+
+        try:
+            while True:
+                count = schedule_reminders(batch_size=options['batch_size'])
+                if count or options['once']:
+                    self.stdout.write(self.style.SUCCESS(f'Queued reminders for {count} booking(s).'))
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
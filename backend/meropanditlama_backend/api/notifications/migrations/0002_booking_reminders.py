@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxnotification',
+            name='reminder_offset',
+            field=models.PositiveIntegerField(blank=True, help_text='Minutes before requested_datetime (reminders only)', null=True),
+        ),
+        migrations.AlterField(
+            model_name='outboxnotification',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed'), ('skipped', 'Skipped')], default='pending', max_length=10),
+        ),
+        migrations.AddConstraint(
+            model_name='outboxnotification',
+            constraint=models.UniqueConstraint(condition=models.Q(('notification_type', 'reminder')), fields=('booking', 'recipient', 'reminder_offset'), name='outbox_unique_reminder'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+from django.db import models
+from django.utils import timezone
+from api.accounts.models import User
+
+class OutboxNotification(models.Model):
+    """
+    Booking email waiting to be delivered.
+
+    Rows are written in the same transaction as the booking change and
+    drained by `manage.py process_notifications`.
+    """
+    
+    TYPE_CHOICES = [
+        ('requested', 'Requested'),
+        ('confirmed', 'Confirmed'),
+        ('cancelled', 'Cancelled'),
+        ('reminder', 'Reminder'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+    ]
+    
+    booking = models.ForeignKey(
+        'bookings.Booking',
+        on_delete=models.CASCADE,
+        related_name='notifications'
+    )
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='outbox_notifications'
+    )
+    notification_type = models.CharField(max_length=10, choices=TYPE_CHOICES)
+    reminder_offset = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Minutes before requested_datetime (reminders only)"
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Not picked up before this time (retry backoff / worker lease)"
+    )
+    claim_token = models.CharField(max_length=32, blank=True, editable=False)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'notification_outbox'
+        ordering = ['id']
+        verbose_name = 'Outbox Notification'
+        verbose_name_plural = 'Outbox Notifications'
+        indexes = [
+            # Worker poll: pending rows that are due, oldest first
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+        constraints = [
+            # One reminder per booking, recipient and offset; the scheduler
+            # relies on this to stay idempotent across restarts
+            models.UniqueConstraint(
+                fields=['booking', 'recipient', 'reminder_offset'],
+                condition=models.Q(notification_type='reminder'),
+                name='outbox_unique_reminder'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.notification_type} for booking #{self.booking_id} → {self.recipient_id} ({self.status})"
@@ -0,0 +1,262 @@
+"""
+Notification outbox delivery.
+
+Booking changes write OutboxNotification rows in their own transaction
+(see utils.queue_booking_notification), so a slow or unreachable mail
+server never holds up a request. `manage.py process_notifications` drains
+the table:
+
+- rows are claimed in batches by pointing next_attempt_at past a lease,
+  so several workers can run without sending the same row twice
+- each batch is sent over one mail connection
+- failed rows are retried with exponential backoff, up to MAX_ATTEMPTS;
+  rows whose template cannot be rendered fail immediately
+- reminders whose booking was cancelled or has started are skipped
+- connection-level errors trip a per-worker circuit breaker; while it is
+  open nothing is claimed, and after BREAKER_RESET_SECONDS one trial
+  batch decides whether to close it again
+"""
+import logging
+import random
+import smtplib
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.utils import timezone
+
+from api import metrics
+from .models import OutboxNotification
+from .reminders import is_stale_reminder
+from .utils import build_booking_email
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'NOTIFICATION_BATCH_SIZE', 50)
+MAX_ATTEMPTS = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 6)
+RETRY_BASE_SECONDS = getattr(settings, 'NOTIFICATION_RETRY_BASE_SECONDS', 30)
+RETRY_MAX_SECONDS = getattr(settings, 'NOTIFICATION_RETRY_MAX_SECONDS', 3600)
+# How long a claimed row is hidden from other workers
+LEASE_SECONDS = getattr(settings, 'NOTIFICATION_LEASE_SECONDS', 300)
+BREAKER_THRESHOLD = getattr(settings, 'NOTIFICATION_BREAKER_THRESHOLD', 3)
+BREAKER_RESET_SECONDS = getattr(settings, 'NOTIFICATION_BREAKER_RESET_SECONDS', 60)
+
+# Refusals of one message; anything else that is an OSError (smtplib
+# errors included) means the server or network is the problem
+MESSAGE_ERRORS = (
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+    smtplib.SMTPDataError,
+)
+RENDER_ERRORS = (TemplateDoesNotExist, TemplateSyntaxError)
+
+
+def is_transport_error(error):
+    return isinstance(error, OSError) and not isinstance(error, MESSAGE_ERRORS)
+
+
+def retry_delay(attempts):
+    """Seconds to wait after the given number of failed attempts"""
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    # Jitter so rows that failed together do not retry together
+    return delay * random.uniform(0.8, 1.2)
+
+
+class CircuitBreaker:
+    """
+    Stops delivery after `threshold` consecutive transport failures.
+
+    closed -> open on the threshold; open -> half-open once `reset_timeout`
+    seconds have passed; half-open -> closed on the next success, or back
+    to open on the next failure.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET_SECONDS,
+                 clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        return self.state != self.OPEN
+
+    def retry_after(self):
+        """Seconds until an open breaker lets a trial batch through"""
+        if self.state != self.OPEN:
+            return 0
+        return self.reset_timeout - (self.clock() - self.opened_at)
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            if self.state == self.CLOSED:
+                logger.warning(f"Notification circuit breaker opened after {self.failures} failure(s)")
+            self.opened_at = self.clock()
+
+
+def claim_batch(size=BATCH_SIZE):
+    """Claim up to `size` due rows for this worker; returns them with related objects loaded"""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    due = OutboxNotification.objects.filter(status='pending', next_attempt_at__lte=now)
+    ids = list(due.order_by('next_attempt_at', 'id').values_list('id', flat=True)[:size])
+    if not ids:
+        return []
+    # Rows another worker claimed in the meantime no longer match `due`
+    due.filter(id__in=ids).update(
+        claim_token=token,
+        next_attempt_at=now + timedelta(seconds=LEASE_SECONDS),
+    )
+    return list(
+        OutboxNotification.objects.filter(claim_token=token, status='pending').select_related(
+            'recipient', 'booking__user', 'booking__provider__user', 'booking__service'
+        ).order_by('id')
+    )
+
+
+def mark_sent(notification):
+    OutboxNotification.objects.filter(pk=notification.pk).update(
+        status='sent',
+        attempts=notification.attempts + 1,
+        sent_at=timezone.now(),
+        last_error='',
+    )
+
+
+def mark_failed(notification, error, permanent=False):
+    """Schedule a retry with backoff, or give up after MAX_ATTEMPTS"""
+    attempts = notification.attempts + 1
+    if permanent or attempts >= MAX_ATTEMPTS:
+        status = 'failed'
+        next_attempt_at = timezone.now()
+        logger.error(
+            f"Giving up on notification #{notification.pk} ({notification.notification_type} "
+            f"for booking #{notification.booking_id}) after {attempts} attempt(s): {error}"
+        )
+    else:
+        status = 'pending'
+        next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(attempts))
+    OutboxNotification.objects.filter(pk=notification.pk).update(
+        status=status,
+        attempts=attempts,
+        next_attempt_at=next_attempt_at,
+        last_error=str(error)[:2000],
+    )
+
+
+def mark_skipped(notification):
+    OutboxNotification.objects.filter(pk=notification.pk).update(status='skipped')
+
+
+def defer(notifications, seconds):
+    """Put claimed rows back without counting an attempt (server was down)"""
+    OutboxNotification.objects.filter(pk__in=[n.pk for n in notifications]).update(
+        next_attempt_at=timezone.now() + timedelta(seconds=seconds)
+    )
+
+
+def send(message, notification_type):
+    """Send an email, recording how long it took"""
+    began = time.perf_counter()
+    try:
+        message.send()
+    finally:
+        metrics.observe('notification_send_seconds', time.perf_counter() - began, type=notification_type)
+
+
+def record_outcomes(result):
+    for outcome, count in result.items():
+        if count:
+            metrics.inc('notifications_total', count, result=outcome)
+
+
+def deliver_batch(breaker, size=BATCH_SIZE):
+    """
+    Claim and send one batch over a single mail connection.
+
+    Returns {'sent', 'retried', 'failed', 'skipped', 'deferred'} counts.
+    """
+    result = {'sent': 0, 'retried': 0, 'failed': 0, 'skipped': 0, 'deferred': 0}
+    if not breaker.allow():
+        return result
+    # A half-open breaker only risks one message on its trial
+    notifications = claim_batch(size if breaker.state == breaker.CLOSED else 1)
+    if not notifications:
+        return result
+
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        breaker.record_failure()
+        logger.warning(f"Mail server unavailable, deferring {len(notifications)} notification(s): {e}")
+        defer(notifications, breaker.reset_timeout)
+        result['deferred'] = len(notifications)
+        record_outcomes(result)
+        return result
+
+    try:
+        for index, notification in enumerate(notifications):
+            if is_stale_reminder(notification):
+                mark_skipped(notification)
+                result['skipped'] += 1
+                continue
+            
+            try:
+                message = build_booking_email(
+                    notification.booking, notification.notification_type,
+                    notification.recipient, connection=connection
+                )
+            except RENDER_ERRORS as e:
+                mark_failed(notification, e, permanent=True)
+                result['failed'] += 1
+                continue
+
+            try:
+                send(message, notification.notification_type)
+            except Exception as e:
+                mark_failed(notification, e)
+                result['failed' if notification.attempts + 1 >= MAX_ATTEMPTS else 'retried'] += 1
+                if is_transport_error(e):
+                    # The connection is gone. This message's attempt counts, so one
+                    # that always drops it still runs out of attempts; the untouched
+                    # rest of the batch waits for the breaker
+                    breaker.record_failure()
+                    logger.warning(f"Mail server error, deferring rest of batch: {e}")
+                    rest = notifications[index + 1:]
+                    defer(rest, breaker.reset_timeout)
+                    result['deferred'] += len(rest)
+                    break
+            else:
+                mark_sent(notification)
+                breaker.record_success()
+                result['sent'] += 1
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    record_outcomes(result)
+    return result
@@ -0,0 +1,108 @@
+"""
+Booking reminders.
+
+Confirmed bookings get a 'reminder' email, to both the user and the
+provider, at each offset in BOOKING_REMINDER_OFFSETS (minutes before
+requested_datetime). The scheduler queues them on the notification
+outbox, and the outbox rows are the record of what was sent: a partial
+unique constraint on (booking, recipient, reminder_offset) makes
+re-running it harmless.
+
+Each offset only covers bookings between it and the next smaller offset.
+A scheduler that was down for a while therefore skips stale reminders:
+after 20 hours of downtime, a booking 3 hours away gets its 2h reminder
+but not the 24h one.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import OutboxNotification
+
+# Minutes before requested_datetime
+REMINDER_OFFSETS = getattr(settings, 'BOOKING_REMINDER_OFFSETS', [24 * 60, 2 * 60])
+REMINDER_BATCH_SIZE = getattr(settings, 'BOOKING_REMINDER_BATCH_SIZE', 500)
+
+
+def reminder_windows(now, offsets=REMINDER_OFFSETS):
+    """[(offset, start, end)]: bookings in (start, end] are due the offset's reminder"""
+    windows = []
+    lower = 0
+    for offset in sorted(set(offsets)):
+        windows.append((offset, now + timedelta(minutes=lower), now + timedelta(minutes=offset)))
+        lower = offset
+    return windows
+
+
+def due_bookings(offset, start, end):
+    """
+    Confirmed bookings in (start, end] without this offset's reminder.
+
+    A range scan on the (requested_datetime, status) booking index; the
+    sent check is an index probe on the outbox unique constraint.
+    """
+    from api.bookings.models import Booking
+
+    queued = OutboxNotification.objects.filter(
+        booking=OuterRef('pk'),
+        notification_type='reminder',
+        reminder_offset=offset,
+    )
+    return Booking.objects.filter(
+        requested_datetime__gt=start,
+        requested_datetime__lte=end,
+        status='confirmed',
+    ).exclude(Exists(queued)).order_by('requested_datetime', 'id')
+
+
+def schedule_reminders(now=None, offsets=REMINDER_OFFSETS, batch_size=REMINDER_BATCH_SIZE):
+    """Queue every due reminder; returns the number of bookings reminded"""
+    now = now or timezone.now()
+    reminded = 0
+
+    for offset, start, end in reminder_windows(now, offsets):
+        bookings = due_bookings(offset, start, end)
+        last = None
+        while True:
+            batch = bookings
+            if last is not None:
+                # Keyset pagination along the index
+                batch = batch.filter(
+                    Q(requested_datetime__gt=last[0]) | Q(requested_datetime=last[0], id__gt=last[1])
+                )
+            rows = list(batch.values_list(
+                'requested_datetime', 'id', 'user_id', 'provider__user_id'
+            )[:batch_size])
+            if not rows:
+                break
+
+            notifications = [
+                OutboxNotification(
+                    booking_id=booking_id,
+                    recipient_id=recipient_id,
+                    notification_type='reminder',
+                    reminder_offset=offset,
+                )
+                for _, booking_id, user_id, provider_user_id in rows
+                for recipient_id in (user_id, provider_user_id)
+            ]
+            with transaction.atomic():
+                # Another scheduler may have queued some of these already
+                OutboxNotification.objects.bulk_create(notifications, ignore_conflicts=True)
+
+            reminded += len(rows)
+            last = rows[-1][:2]
+
+    return reminded
+
+
+def is_stale_reminder(notification, now=None):
+    """Reminders are not sent once the booking is no longer confirmed or has started"""
+    booking = notification.booking
+    return (
+        notification.notification_type == 'reminder'
+        and (booking.status != 'confirmed' or booking.requested_datetime <= (now or timezone.now()))
+    )
@@ -0,0 +1,335 @@
+import smtplib
+import socketserver
+import threading
+from datetime import timedelta
+
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.notifications.models import OutboxNotification
+from api.notifications.outbox import MAX_ATTEMPTS, CircuitBreaker, deliver_batch
+from api.notifications.reminders import schedule_reminders
+from api.notifications.utils import queue_booking_notification
+from api.testing import future_day, make_booking, make_provider, make_service, make_user
+
+SUBJECTS = {
+    ('requested', 'en'): 'New Booking Request - MeroPanditLama',
+    ('requested', 'ne'): 'नयाँ बुकिंग अनुरोध - MeroPanditLama',
+    ('confirmed', 'en'): 'Booking Confirmed - MeroPanditLama',
+    ('confirmed', 'ne'): 'बुकिंग पुष्टि भयो - MeroPanditLama',
+    ('cancelled', 'en'): 'Booking Cancelled - MeroPanditLama',
+    ('cancelled', 'ne'): 'बुकिंग रद्द भयो - MeroPanditLama',
+    ('reminder', 'en'): 'Booking Reminder - MeroPanditLama',
+    ('reminder', 'ne'): 'बुकिंग सम्झना - MeroPanditLama',
+}
+# A phrase of each template's heading, to tell the language rendered
+HEADINGS = {'en': 'Booking', 'ne': 'बुकिंग'}
+
+
+class DownBackend(BaseEmailBackend):
+    """A mail server that cannot be reached"""
+
+    def open(self):
+        raise ConnectionRefusedError('Connection refused')
+
+    def send_messages(self, messages):
+        self.open()
+
+
+class RefusingBackend(LocmemBackend):
+    """A mail server that refuses every recipient"""
+
+    def send_messages(self, messages):
+        raise smtplib.SMTPRecipientsRefused({message.to[0]: (550, b'No such user') for message in messages})
+
+
+class DroppingBackend(LocmemBackend):
+    """A mail server that drops the connection on every message"""
+
+    def send_messages(self, messages):
+        raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """
+    A local SMTP server that keeps what it receives: `connections` opened
+    and `messages` per connection. It hangs up after `drop_after` messages
+    on a connection, if set.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, drop_after=None):
+        super().__init__(('127.0.0.1', 0), SMTPSinkHandler)
+        self.drop_after = drop_after
+        self.connections = []
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        messages = []
+        self.server.connections.append(messages)
+        self.reply('220 sink ready')
+        while line := self.rfile.readline():
+            command = line.decode().strip().split(' ')[0].upper()
+            if command == 'DATA':
+                self.reply('354 go ahead')
+                lines = []
+                while (line := self.rfile.readline()) not in (b'.\r\n', b''):
+                    lines.append(line)
+                messages.append(b''.join(lines))
+                if self.server.drop_after is not None and len(messages) >= self.server.drop_after:
+                    return
+                self.reply('250 queued')
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class DeliverBatchTests(TestCase):
+    """deliver_batch() over Django's in-memory mail backend"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = make_service(name='Satyanarayan Puja')
+        cls.provider = make_provider(services=[cls.service])
+        cls.customer = make_user()
+        cls.booking = make_booking(
+            cls.customer, cls.provider, future_day(), '10:00', service=cls.service, status='confirmed'
+        )
+
+    def queue(self, notification_type='confirmed', language='en'):
+        recipient = make_user(language_pref=language)
+        return queue_booking_notification(self.booking, notification_type, recipient)
+
+    def test_every_event_and_language_is_sent(self):
+        for notification_type, language in SUBJECTS:
+            self.queue(notification_type, language)
+
+        result = deliver_batch(CircuitBreaker(), size=len(SUBJECTS))
+
+        self.assertEqual(result['sent'], len(SUBJECTS), result)
+        self.assertEqual(result['failed'], 0)
+        self.assertFalse(OutboxNotification.objects.exclude(status='sent').exists())
+        sent = {message.to[0]: message for message in mail.outbox}
+        for notification in OutboxNotification.objects.select_related('recipient'):
+            key = (notification.notification_type, notification.recipient.language_pref)
+            with self.subTest(type=key[0], language=key[1]):
+                message = sent[notification.recipient.email]
+                self.assertEqual(message.subject, SUBJECTS[key])
+                html, mimetype = message.alternatives[0]
+                self.assertEqual(mimetype, 'text/html')
+                self.assertIn(HEADINGS[key[1]], html)
+                if key[1] == 'en':
+                    self.assertNotIn(HEADINGS['ne'], html)
+                self.assertIn('Satyanarayan Puja', html)
+
+    def test_missing_translation_falls_back_to_english(self):
+        notification = self.queue('confirmed', language='hi')
+        self.assertEqual(deliver_batch(CircuitBreaker())['sent'], 1)
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'sent')
+        self.assertIn('Booking Confirmed', mail.outbox[0].alternatives[0][0])
+
+    def test_refused_message_is_retried_with_backoff(self):
+        notification = self.queue()
+        with override_settings(EMAIL_BACKEND='api.notifications.tests.RefusingBackend'):
+            result = deliver_batch(CircuitBreaker())
+        self.assertEqual(result['retried'], 1)
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), ('pending', 1))
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+        self.assertIn('No such user', notification.last_error)
+
+    def test_refused_message_fails_after_max_attempts(self):
+        notification = self.queue()
+        OutboxNotification.objects.filter(pk=notification.pk).update(attempts=MAX_ATTEMPTS - 1)
+        with override_settings(EMAIL_BACKEND='api.notifications.tests.RefusingBackend'), \
+                self.assertLogs('api.notifications.outbox', 'ERROR'):
+            result = deliver_batch(CircuitBreaker())
+        self.assertEqual(result['failed'], 1)
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), ('failed', MAX_ATTEMPTS))
+
+    def test_breaker_opens_on_transport_errors_and_recovers(self):
+        notification = self.queue()
+        clock = FakeClock()
+        breaker = CircuitBreaker(threshold=2, reset_timeout=60, clock=clock)
+
+        def make_due():
+            OutboxNotification.objects.filter(pk=notification.pk).update(next_attempt_at=timezone.now())
+
+        with override_settings(EMAIL_BACKEND='api.notifications.tests.DownBackend'), \
+                self.assertLogs('api.notifications.outbox', 'WARNING'):
+            for _ in range(2):
+                make_due()
+                self.assertEqual(deliver_batch(breaker)['deferred'], 1)
+        self.assertEqual(breaker.state, breaker.OPEN)
+        notification.refresh_from_db()
+        # Deferred without counting an attempt
+        self.assertEqual((notification.status, notification.attempts), ('pending', 0))
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+
+        # Open: nothing is claimed, even when due
+        make_due()
+        self.assertEqual(sum(deliver_batch(breaker).values()), 0)
+        self.assertEqual(OutboxNotification.objects.get(pk=notification.pk).claim_token, notification.claim_token)
+
+        # Half-open after the reset timeout: one trial message, which closes it
+        clock.now += 60
+        self.assertEqual(breaker.state, breaker.HALF_OPEN)
+        self.queue()
+        result = deliver_batch(breaker)
+        self.assertEqual(result['sent'], 1)
+        self.assertEqual(breaker.state, breaker.CLOSED)
+        self.assertEqual(deliver_batch(breaker)['sent'], 1)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_dropped_connection_counts_an_attempt_for_its_message(self):
+        first, *rest = [self.queue() for _ in range(3)]
+        with override_settings(EMAIL_BACKEND='api.notifications.tests.DroppingBackend'), \
+                self.assertLogs('api.notifications.outbox', 'WARNING'):
+            result = deliver_batch(CircuitBreaker())
+        self.assertEqual((result['retried'], result['deferred']), (1, 2))
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), ('pending', 1))
+        self.assertIn('unexpectedly closed', first.last_error)
+        # The rest were never tried
+        for notification in rest:
+            notification.refresh_from_db()
+            self.assertEqual((notification.status, notification.attempts), ('pending', 0))
+
+    def test_message_that_always_drops_the_connection_fails(self):
+        notification = self.queue()
+        OutboxNotification.objects.filter(pk=notification.pk).update(attempts=MAX_ATTEMPTS - 1)
+        with override_settings(EMAIL_BACKEND='api.notifications.tests.DroppingBackend'), \
+                self.assertLogs('api.notifications.outbox', 'WARNING'):
+            result = deliver_batch(CircuitBreaker())
+        self.assertEqual((result['failed'], result['deferred']), (1, 0))
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), ('failed', MAX_ATTEMPTS))
+
+
+class ReminderSchedulerTests(TestCase):
+    """schedule_reminders() queues each offset's reminder once, for confirmed bookings in its window"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_user()
+        cls.booking = make_booking(cls.customer, make_provider(), future_day(), '10:00', status='confirmed')
+        cls.start = cls.booking.requested_datetime
+
+    def reminders(self):
+        return sorted(OutboxNotification.objects.filter(notification_type='reminder').values_list(
+            'booking_id', 'reminder_offset', 'recipient_id'
+        ))
+
+    def test_each_offset_is_queued_once_for_both_parties(self):
+        self.assertEqual(schedule_reminders(now=self.start - timedelta(hours=23)), 1)
+        self.assertEqual(schedule_reminders(now=self.start - timedelta(hours=22)), 0)
+        self.assertEqual(schedule_reminders(now=self.start - timedelta(hours=1)), 1)
+        self.assertEqual(self.reminders(), [
+            (self.booking.pk, 120, self.customer.pk),
+            (self.booking.pk, 120, self.booking.provider.user_id),
+            (self.booking.pk, 1440, self.customer.pk),
+            (self.booking.pk, 1440, self.booking.provider.user_id),
+        ])
+
+    def test_stale_offsets_are_skipped(self):
+        # The scheduler was down until an hour before the booking
+        schedule_reminders(now=self.start - timedelta(hours=1))
+        self.assertEqual({offset for _, offset, _ in self.reminders()}, {120})
+
+    def test_only_confirmed_bookings(self):
+        for status in ('pending', 'cancelled'):
+            make_booking(self.customer, make_provider(), future_day(), '10:00', status=status)
+        self.assertEqual(schedule_reminders(now=self.start - timedelta(hours=23)), 1)
+        self.assertEqual({booking_id for booking_id, _, _ in self.reminders()}, {self.booking.pk})
+
+    def test_batches_page_past_equal_times(self):
+        others = [
+            make_booking(self.customer, make_provider(), future_day(), '10:00', status='confirmed')
+            for _ in range(4)
+        ]
+        self.assertEqual(schedule_reminders(now=self.start - timedelta(hours=23), batch_size=2), 5)
+        self.assertEqual(
+            {booking_id for booking_id, _, _ in self.reminders()},
+            {self.booking.pk} | {booking.pk for booking in others}
+        )
+
+    def test_cancelled_booking_reminder_is_skipped(self):
+        schedule_reminders(now=self.start - timedelta(hours=23))
+        self.booking.status = 'cancelled'
+        self.booking.save()
+        self.assertEqual(deliver_batch(CircuitBreaker())['skipped'], 2)
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class SMTPDeliveryTests(TestCase):
+    """deliver_batch() against a real SMTP conversation with a local server"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.booking = make_booking(make_user(), make_provider(), future_day(), '10:00', status='confirmed')
+
+    def deliver(self, sink, count):
+        notifications = [
+            queue_booking_notification(self.booking, 'confirmed', make_user()) for _ in range(count)
+        ]
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=sink.port, EMAIL_USE_TLS=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+        ):
+            result = deliver_batch(CircuitBreaker())
+        for notification in notifications:
+            notification.refresh_from_db()
+        return result, notifications
+
+    def test_batch_is_sent_over_one_connection(self):
+        sink = SMTPSink()
+        self.addCleanup(sink.close)
+        result, notifications = self.deliver(sink, 3)
+        self.assertEqual(result['sent'], 3, result)
+        self.assertEqual([len(messages) for messages in sink.connections], [3])
+        self.assertEqual({notification.status for notification in notifications}, {'sent'})
+        self.assertIn(b'Booking Confirmed', sink.connections[0][0])
+
+    def test_hang_up_counts_an_attempt_and_defers_the_rest(self):
+        # Takes the first message, hangs up after the second
+        sink = SMTPSink(drop_after=2)
+        self.addCleanup(sink.close)
+        with self.assertLogs('api.notifications.outbox', 'WARNING'):
+            result, notifications = self.deliver(sink, 4)
+        self.assertEqual((result['sent'], result['retried'], result['deferred']), (1, 1, 2), result)
+        self.assertEqual(len(sink.connections), 1)
+        self.assertEqual(
+            [(notification.status, notification.attempts) for notification in notifications],
+            [('sent', 1), ('pending', 1), ('pending', 0), ('pending', 0)]
+        )
@@ -1,29 +1,45 @@
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.conf import settings
 import logging
 
+from api.profiling import phase
+
 logger = logging.getLogger(__name__)
 
-def send_booking_notification(booking, notification_type, recipient):
+def queue_booking_notification(booking, notification_type, recipient):
+    """
+    Queue an email notification for booking events.
+    
+    Call inside the transaction that changes the booking so the outbox row
+    commits (or rolls back) with it; `manage.py process_notifications`
+    delivers it.
+    """
+    from .models import OutboxNotification
+    
+    return OutboxNotification.objects.create(
+        booking=booking,
+        recipient=recipient,
+        notification_type=notification_type,
+    )
+
+def build_booking_email(booking, notification_type, recipient, connection=None):
     """
-    Send email notification for booking events.
+    Render the email for a booking event.
     
     Args:
         booking: Booking instance
         notification_type: 'requested', 'confirmed', 'cancelled', 'reminder'
         recipient: User instance to send email to
+        connection: optional mail backend connection to send through
     """
     
     language = recipient.language_pref
     
-    # Email templates
-    template_map = {
-        'requested': f'emails/booking_requested_{language}.html',
-        'confirmed': f'emails/booking_confirmed_{language}.html',
-        'cancelled': f'emails/booking_cancelled.html',  # Same for both languages
-        'reminder': f'emails/booking_reminder_{language}.html',
-    }
+    # Email templates: emails/booking_<type>_<language>.html, English if there is no translation
+    templates = [f'emails/booking_{notification_type}_{language}.html']
+    if language != 'en':
+        templates.append(f'emails/booking_{notification_type}_en.html')
     
     # Email subjects
     subject_map = {
@@ -41,42 +57,53 @@ def send_booking_notification(booking, notification_type, recipient):
         }
     }
     
+    # Prepare context
+    context = {
+        'booking': booking,
+        'recipient': recipient,
+        'user_name': booking.user.get_full_name(),
+        'provider_name': booking.provider.user.get_full_name(),
+        'provider_phone': booking.provider.user.phone,
+        'provider_location': booking.provider.location,
+        'service_name': booking.service.name if booking.service else 'Service',
+        'requested_datetime': booking.requested_datetime.strftime('%B %d, %Y at %I:%M %p'),
+        'duration_minutes': booking.duration_minutes,
+        'notes': booking.notes,
+        'cancellation_reason': booking.cancellation_reason,
+        'booking_url': f"{settings.FRONTEND_URL}/bookings/{booking.id}",
+    }
+    
+    # Render email
+    with phase('render'):
+        html_message = render_to_string(templates, context)
+    
+    # Get subject
+    subject = subject_map.get(language, subject_map['en']).get(
+        notification_type,
+        'MeroPanditLama Notification'
+    )
+    
+    message = EmailMultiAlternatives(
+        subject=subject,
+        body='',  # Plain text version
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[recipient.email],
+        connection=connection,
+    )
+    message.attach_alternative(html_message, 'text/html')
+    return message
+
+def send_booking_notification(booking, notification_type, recipient):
+    """
+    Send email notification for booking events immediately.
+    
+    Booking views queue notifications instead (queue_booking_notification);
+    this is for one-off sends outside a request.
+    """
     try:
-        # Prepare context
-        context = {
-            'booking': booking,
-            'recipient': recipient,
-            'user_name': booking.user.get_full_name(),
-            'provider_name': booking.provider.user.get_full_name(),
-            'provider_phone': booking.provider.user.phone,
-            'provider_location': booking.provider.location,
-            'service_name': booking.service.name if booking.service else 'Service',
-            'requested_datetime': booking.requested_datetime.strftime('%B %d, %Y at %I:%M %p'),
-            'duration_minutes': booking.duration_minutes,
-            'notes': booking.notes,
-            'cancellation_reason': booking.cancellation_reason,
-            'booking_url': f"{settings.FRONTEND_URL}/bookings/{booking.id}",
-        }
-        
-        # Render email
-        template = template_map.get(notification_type)
-        html_message = render_to_string(template, context)
-        
-        # Get subject
-        subject = subject_map.get(language, subject_map['en']).get(
-            notification_type,
-            'MeroPanditLama Notification'
-        )
-        
-        # Send email
-        send_mail(
-            subject=subject,
-            message='',  # Plain text version
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[recipient.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
+        message = build_booking_email(booking, notification_type, recipient)
+        with phase('email'):
+            message.send()
         
         logger.info(
             f"Email sent: {notification_type} to {recipient.email} for booking #{booking.id}"
@@ -85,4 +112,4 @@ def send_booking_notification(booking, notification_type, recipient):
     except Exception as e:
         logger.error(
             f"Failed to send email: {notification_type} to {recipient.email}. Error: {str(e)}"
-        )
\ No newline at end of file
+        )
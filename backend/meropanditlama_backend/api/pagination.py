@@ -0,0 +1,239 @@
+"""
+Keyset (cursor) pagination.
+
+A page is fetched with `WHERE (ordering columns) > (last row seen) LIMIT n`
+rather than OFFSET, so page 500 costs the same as page 1 when an index
+matches the ordering, and no COUNT(*) runs unless asked for.
+
+The ordering is whatever the view produced: OrderingFilter, a filter
+backend's annotation (e.g. distance_km) or the model's Meta.ordering. An
+`id` tie-break is appended so every position is unique. The ordering must
+consist of field or annotation names; expressions are not supported.
+
+`?count=approx` adds `count` and `count_is_exact`. The count is exact up
+to COUNT_CAP rows; above that it is the cap, or the planner's estimate on
+PostgreSQL. Page links drop the parameter, so only the first request
+pays for counting.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import connections
+from django.db.models import BooleanField, Expression, F, Q, Value
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+COUNT_CAP = getattr(settings, 'PAGINATION_COUNT_CAP', 10000)
+
+
+class RowComparison(Expression):
+    """`(a, b, c) < (x, y, z)`; lets the database seek an index on (a, b, c)"""
+
+    conditional = True
+    output_field = BooleanField()
+
+    def __init__(self, lhs, rhs, operator):
+        super().__init__()
+        self.lhs = list(lhs)
+        self.rhs = list(rhs)
+        self.operator = operator
+
+    def get_source_expressions(self):
+        return self.lhs + self.rhs
+
+    def set_source_expressions(self, exprs):
+        self.lhs, self.rhs = exprs[:len(self.lhs)], exprs[len(self.lhs):]
+
+    def as_sql(self, compiler, connection):
+        sql, params = [], []
+        for side in (self.lhs, self.rhs):
+            parts = []
+            for expression in side:
+                part_sql, part_params = compiler.compile(expression)
+                parts.append(part_sql)
+                params.extend(part_params)
+            sql.append('(%s)' % ', '.join(parts))
+        return f'{sql[0]} {self.operator} {sql[1]}', params
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(queryset)
+        position, reverse = self.decode_cursor(request)
+
+        self.count = self.count_is_exact = None
+        if request.query_params.get(self.count_query_param) == 'approx':
+            self.count, self.count_is_exact = self.get_count(queryset)
+
+        queryset = queryset.order_by(*(
+            ('-' if descending != reverse else '') + name for name, descending in self.ordering
+        ))
+        if position is not None:
+            queryset = queryset.filter(self.seek(queryset, position, reverse))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        payload = OrderedDict()
+        if self.count is not None:
+            payload['count'] = self.count
+            payload['count_is_exact'] = self.count_is_exact
+        payload['next'] = self.get_next_link()
+        payload['previous'] = self.get_previous_link()
+        payload['results'] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {'type': 'integer', 'example': 123},
+                'count_is_exact': {'type': 'boolean'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.position_of(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.position_of(self.page[0]), reverse=True)
+
+    # Ordering and positions
+
+    def get_ordering(self, queryset):
+        """[(name, descending)], ending with an id tie-break"""
+        names = list(queryset.query.order_by)
+        if not names and queryset.query.default_ordering:
+            names = list(queryset.model._meta.ordering)
+        if not all(isinstance(name, str) for name in names) or '?' in names:
+            raise ImproperlyConfigured(
+                'KeysetPagination needs an ordering of field or annotation names'
+            )
+
+        ordering = [(name.lstrip('-'), name.startswith('-')) for name in names]
+        ordering = [('id' if name == 'pk' else name, descending) for name, descending in ordering]
+        if 'id' not in [name for name, _ in ordering]:
+            ordering.append(('id', ordering[0][1] if ordering else False))
+        return ordering
+
+    def position_of(self, obj):
+        if isinstance(obj, dict):
+            # .values() rows (see api.projection)
+            return [obj[name] for name, _ in self.ordering]
+        values = []
+        for name, _ in self.ordering:
+            value = obj
+            for attr in name.split('__'):
+                value = getattr(value, attr)
+            values.append(value)
+        return values
+
+    def seek(self, queryset, position, reverse):
+        """Condition selecting rows after `position` (before it when reverse)"""
+        try:
+            values = [
+                self.get_output_field(queryset, name).to_python(value)
+                for (name, _), value in zip(self.ordering, position)
+            ]
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+        directions = {descending != reverse for _, descending in self.ordering}
+        if len(directions) == 1:
+            fields = [self.get_output_field(queryset, name) for name, _ in self.ordering]
+            return RowComparison(
+                [F(name) for name, _ in self.ordering],
+                [Value(value, output_field=field) for value, field in zip(values, fields)],
+                '<' if directions.pop() else '>'
+            )
+
+        # Mixed directions: (a > x) OR (a = x AND b < y) OR ...
+        condition = Q()
+        for i, (name, descending) in enumerate(self.ordering):
+            term = Q(**{
+                f'{name}__{"lt" if descending != reverse else "gt"}': values[i]
+            })
+            for (previous, _), value in zip(self.ordering[:i], values):
+                term &= Q(**{previous: value})
+            condition |= term
+        return condition
+
+    def get_output_field(self, queryset, name):
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        model, field = queryset.model, None
+        for attr in name.split('__'):
+            field = model._meta.get_field(attr)
+            model = field.related_model
+        return field
+
+    def get_count(self, queryset):
+        """(count, is_exact), exact up to COUNT_CAP rows"""
+        queryset = queryset.order_by()
+        count = queryset[:COUNT_CAP + 1].count()
+        if count <= COUNT_CAP:
+            return count, True
+        if connections[queryset.db].vendor == 'postgresql':
+            plan = json.loads(queryset.explain(format='json'))
+            return max(COUNT_CAP, int(plan[0]['Plan']['Plan Rows'])), False
+        return COUNT_CAP, False
+
+    # Cursor encoding
+
+    def encode_cursor(self, position, reverse):
+        payload = {'o': [name for name, _ in self.ordering], 'p': position}
+        if reverse:
+            payload['r'] = 1
+        token = base64.urlsafe_b64encode(
+            json.dumps(payload, default=str, separators=(',', ':')).encode()
+        ).decode().rstrip('=')
+        url = remove_query_param(self.base_url, self.count_query_param)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        """(position, reverse), or (None, False) on the first page"""
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+            position = payload['p']
+            valid = (
+                payload['o'] == [name for name, _ in self.ordering]
+                and isinstance(position, list)
+                and len(position) == len(self.ordering)
+            )
+        except (TypeError, ValueError, KeyError):
+            valid = False
+        if not valid:
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(payload.get('r'))
@@ -0,0 +1,220 @@
+"""
+Request phase timing (Server-Timing) and a sampling profiler.
+
+ProfilingMiddleware times each request and its phases and reports them
+in a Server-Timing header, e.g.
+
+    Server-Timing: db;dur=4.21;desc="6 queries", serialize;dur=1.10, total;dur=9.87
+
+    db          SQL, on every connection
+    serialize   rendering a DRF Response body
+    render      templates: TemplateResponses, and emails (phase('render'))
+    email       sending mail (phase('email'))
+
+Phases can overlap (queries run while rendering count in both) and other
+code can time its own with `with phase(name):`; outside a request it is a
+no-op.
+
+The header is on with PROFILING, which defaults to DEBUG: it tells any
+client how long the database and rendering took.
+
+A PROFILING_SAMPLE_RATE fraction of requests, and every request slower
+than PROFILING_SLOW_MS, is profiled, with or without PROFILING: one background thread samples
+the stacks of the tracked request threads every PROFILING_INTERVAL_MS
+and the stacks are written to PROFILING_DIR in collapsed form
+("frame;frame;frame count" lines), the input of flamegraph.pl and
+speedscope. With PROFILING_SLOW_MS set every request is tracked, since a
+request is only known to be slow once it ends; the cost is the sampler's
+walk of the active threads' stacks, not per-call hooks.
+"""
+import logging
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+ENABLED = getattr(settings, 'PROFILING', settings.DEBUG)
+SAMPLE_RATE = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+# 0 disables profiling requests for being slow
+SLOW_MS = getattr(settings, 'PROFILING_SLOW_MS', 0)
+INTERVAL_MS = getattr(settings, 'PROFILING_INTERVAL_MS', 10)
+PROFILE_DIR = Path(getattr(settings, 'PROFILING_DIR', Path(tempfile.gettempdir()) / 'meropanditlama-profiles'))
+# Oldest profiles are removed beyond this many
+MAX_FILES = getattr(settings, 'PROFILING_MAX_FILES', 500)
+
+_timings = ContextVar('profiling_timings', default=None)
+_SLUG_RE = re.compile(r'[^A-Za-z0-9]+')
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block to the current request's `name` phase"""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(timings, name, (time.perf_counter() - began) * 1000)
+
+
+def _record(timings, name, ms):
+    total, count = timings.get(name, (0.0, 0))
+    timings[name] = (total + ms, count + 1)
+
+
+def _time_query(execute, sql, params, many, context):
+    with phase('db'):
+        return execute(sql, params, many, context)
+
+
+def server_timing(timings, total_ms):
+    """Server-Timing header value for the phase timings of a request"""
+    metrics = []
+    for name, (ms, count) in timings.items():
+        desc = f';desc="{count} {"query" if count == 1 else "queries"}"' if name == 'db' else ''
+        metrics.append(f'{name};dur={ms:.2f}{desc}')
+    metrics.append(f'total;dur={total_ms:.2f}')
+    return ', '.join(metrics)
+
+
+def collapse(frame):
+    """A stack as one collapsed line, outermost frame first"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = frame.f_globals.get('__name__', '?')
+        names.append(f'{module}:{getattr(code, "co_qualname", code.co_name)}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler(threading.Thread):
+    """Samples the stacks of tracked threads every `interval` seconds"""
+
+    def __init__(self, interval):
+        super().__init__(name='profiling-sampler', daemon=True)
+        self.interval = interval
+        self.tracked = {}
+        self.lock = threading.Lock()
+
+    def track(self, ident):
+        """Start sampling a thread; returns the Counter its stacks go in"""
+        stacks = Counter()
+        with self.lock:
+            self.tracked[ident] = stacks
+        return stacks
+
+    def untrack(self, ident):
+        with self.lock:
+            self.tracked.pop(ident, None)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                tracked = list(self.tracked.items())
+            if not tracked:
+                continue
+            frames = sys._current_frames()
+            for ident, stacks in tracked:
+                frame = frames.get(ident)
+                if frame is not None:
+                    stacks[collapse(frame)] += 1
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler():
+    """The process's sampler thread, started on first use (after any fork)"""
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = Sampler(INTERVAL_MS / 1000)
+            _sampler.start()
+        return _sampler
+
+
+def write_profile(stacks, method, path, total_ms):
+    """Write collapsed stacks to PROFILE_DIR; returns the file's path"""
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    slug = _SLUG_RE.sub('-', path).strip('-')[:60] or 'root'
+    name = f'{timezone.now():%Y%m%dT%H%M%S.%f}-{method}-{slug}-{total_ms:.0f}ms.folded'
+    target = PROFILE_DIR / name
+    target.write_text(''.join(f'{stack} {count}\n' for stack, count in stacks.most_common()))
+    profiles = sorted(PROFILE_DIR.glob('*.folded'))
+    for old in profiles[:max(0, len(profiles) - MAX_FILES)]:
+        old.unlink(missing_ok=True)
+    return target
+
+
+class ProfilingMiddleware:
+    """Adds Server-Timing to every response with PROFILING; profiles sampled and slow requests either way"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampled = bool(SAMPLE_RATE) and random.random() < SAMPLE_RATE
+        if not (ENABLED or sampled or SLOW_MS):
+            return self.get_response(request)
+
+        stacks = None
+        if sampled or SLOW_MS:
+            sampler = get_sampler()
+            stacks = sampler.track(threading.get_ident())
+        timings = {}
+        token = _timings.set(timings)
+        began = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_time_query))
+                response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+            if stacks is not None:
+                sampler.untrack(threading.get_ident())
+        total_ms = (time.perf_counter() - began) * 1000
+
+        if ENABLED:
+            response['Server-Timing'] = server_timing(timings, total_ms)
+        if stacks and (sampled or total_ms >= SLOW_MS):
+            try:
+                target = write_profile(stacks, request.method, request.path, total_ms)
+            except OSError as e:
+                logger.warning(f'Could not write profile of {request.method} {request.path}: {e}')
+            else:
+                logger.info(f'{request.method} {request.path} took {total_ms:.0f}ms; profile in {target}')
+        return response
+
+    def process_template_response(self, request, response):
+        timings = _timings.get()
+        # Views that render early (the catalog cache) time it themselves
+        if timings is None or response.is_rendered:
+            return response
+        name = 'serialize' if isinstance(response, Response) else 'render'
+        began = time.perf_counter()
+
+        def rendered(response):
+            _record(timings, name, (time.perf_counter() - began) * 1000)
+
+        response.add_post_render_callback(rendered)
+        return response
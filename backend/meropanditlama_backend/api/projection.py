@@ -0,0 +1,317 @@
+"""
+Read-only projections for hot list endpoints.
+
+Serializing a page of model instances costs a model instance per row,
+plus attribute lookups and a to_representation() call per field. A
+Projection is compiled once from the serializer an endpoint already
+uses. Every readable field becomes a .values() column and a converter
+that returns what the field's to_representation() would. A page is then
+fetched as plain dicts and rendered to the same JSON, without model
+instances or serializer machinery.
+
+Fields the serializer computes (method fields, model properties, nested
+serializers) are given explicitly:
+
+    Computed(['user__first_name', 'user__last_name', 'user__email'], full_name)
+    Nested(user_projection)           # forward foreign key, same query
+    NestedMany(service_projection)    # many-to-many, one extra query per page
+    Annotation()                      # only present when the queryset annotates it
+
+Output must stay byte-identical to the serializer's. `manage.py
+benchmark_projections` checks this and times both.
+"""
+import decimal
+from operator import methodcaller
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.utils import timezone
+from django.utils.functional import cached_property
+from rest_framework import fields as drf
+from rest_framework.settings import api_settings
+
+# A field DRF would leave out of the output
+MISSING = object()
+
+
+def _is_iso(output_format):
+    return output_format is not None and output_format.lower() == drf.ISO_8601
+
+
+def converter(field, model_field=None, request=None):
+    """fn(value) returning field.to_representation(value) for a non-None database value"""
+    if isinstance(field, drf.DateTimeField):
+        if not settings.USE_TZ or hasattr(field, 'timezone'):
+            return field.to_representation
+        if not _is_iso(getattr(field, 'format', api_settings.DATETIME_FORMAT)):
+            return field.to_representation
+        tz = timezone.get_current_timezone()
+
+        def convert(value):
+            if timezone.is_naive(value):
+                return field.to_representation(value)
+            value = value.astimezone(tz).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return convert
+
+    if isinstance(field, drf.DateField):
+        if _is_iso(getattr(field, 'format', api_settings.DATE_FORMAT)):
+            return methodcaller('isoformat')
+        return field.to_representation
+
+    if isinstance(field, drf.TimeField):
+        if _is_iso(getattr(field, 'format', api_settings.TIME_FORMAT)):
+            return methodcaller('isoformat')
+        return field.to_representation
+
+    if isinstance(field, drf.DecimalField):
+        coerce = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        if not coerce or field.localize or field.decimal_places is None:
+            return field.to_representation
+        exponent = decimal.Decimal('.1') ** field.decimal_places
+        context = decimal.getcontext().copy()
+        if field.max_digits is not None:
+            context.prec = field.max_digits
+        return lambda value: '{:f}'.format(
+            value.quantize(exponent, rounding=field.rounding, context=context)
+        )
+
+    if isinstance(field, drf.FileField):
+        if not getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+            return lambda name: name or None
+        storage = model_field.storage
+
+        def convert(name):
+            if not name:
+                return None
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request is not None else url
+        return convert
+
+    if isinstance(field, drf.ChoiceField):
+        choices = field.choice_strings_to_values
+        return lambda value: choices.get(str(value), value)
+    if isinstance(field, drf.BooleanField):
+        return bool
+    if isinstance(field, drf.IntegerField):
+        return int
+    if isinstance(field, drf.FloatField):
+        return float
+    if isinstance(field, drf.CharField):
+        return str
+    if isinstance(field, drf.ReadOnlyField):
+        return lambda value: value
+    return field.to_representation
+
+
+def missing_value(field):
+    """What the serializer outputs when the field's source is absent"""
+    if field.default is not drf.empty:
+        return field.get_default
+    if field.allow_null:
+        return lambda: None
+    return lambda: MISSING
+
+
+class Column:
+    """A model field reached through the serializer field's source"""
+
+    def setup(self, field, model, label):
+        self.field = field
+        self.nullable = []
+        attrs = field.source_attrs
+        for i, attr in enumerate(attrs):
+            try:
+                self.model_field = model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                raise ImproperlyConfigured(
+                    f'{label}: source {field.source!r} is not a model field; '
+                    'describe the field explicitly'
+                )
+            if i < len(attrs) - 1:
+                if not (self.model_field.many_to_one or self.model_field.one_to_one):
+                    raise ImproperlyConfigured(f'{label}: cannot follow {attr!r}')
+                if self.model_field.null:
+                    self.nullable.append('__'.join(attrs[:i + 1]))
+                model = self.model_field.related_model
+        if self.model_field.is_relation:
+            raise ImproperlyConfigured(f'{label}: {field.source!r} is a relation')
+        self.column = '__'.join(attrs)
+
+    def columns(self, queryset):
+        return [self.column, *self.nullable]
+
+    def bind(self, prefix, request, rows):
+        column = prefix + self.column
+        nullable = [prefix + name for name in self.nullable]
+        convert = converter(self.field, self.model_field, request)
+        missing = missing_value(self.field)
+
+        def get(row):
+            value = row[column]
+            if value is None:
+                if any(row[name] is None for name in nullable):
+                    # DRF: the related object is None, so the source is missing
+                    return missing()
+                return None
+            return convert(value)
+        return get
+
+
+class Computed:
+    """A value computed from columns, e.g. what a SerializerMethodField returns"""
+
+    def __init__(self, columns, function):
+        self.column_names = list(columns)
+        self.function = function
+
+    def setup(self, field, model, label):
+        pass
+
+    def columns(self, queryset):
+        return self.column_names
+
+    def bind(self, prefix, request, rows):
+        columns = [prefix + name for name in self.column_names]
+        function = self.function
+        return lambda row: function(*[row[name] for name in columns])
+
+
+class Annotation:
+    """A field backed by a queryset annotation that is not always there"""
+
+    def setup(self, field, model, label):
+        self.field = field
+        self.column = field.source
+
+    def columns(self, queryset):
+        return [self.column] if self.column in queryset.query.annotations else []
+
+    def bind(self, prefix, request, rows):
+        column = prefix + self.column
+        convert = converter(self.field, request=request)
+        missing = missing_value(self.field)
+
+        def get(row):
+            if column not in row:
+                return missing()
+            value = row[column]
+            return None if value is None else convert(value)
+        return get
+
+
+class Nested:
+    """A nested serializer over a forward foreign key"""
+
+    def __init__(self, projection):
+        self.projection = projection
+
+    def setup(self, field, model, label):
+        self.source = field.source
+
+    def columns(self, queryset):
+        return [self.source] + [
+            f'{self.source}__{name}' for name in self.projection.columns(queryset)
+        ]
+
+    def bind(self, prefix, request, rows):
+        key = prefix + self.source
+        represent = self.projection.bind(f'{key}__', request, rows)
+        return lambda row: None if row[key] is None else represent(row)
+
+
+class NestedMany:
+    """A nested many=True serializer over a many-to-many field"""
+
+    def __init__(self, projection):
+        self.projection = projection
+
+    def setup(self, field, model, label):
+        self.model_field = model._meta.get_field(field.source)
+        if not self.model_field.many_to_many or self.model_field.auto_created:
+            raise ImproperlyConfigured(f'{label}: {field.source!r} is not a many-to-many field')
+
+    def columns(self, queryset):
+        return ['id']
+
+    def bind(self, prefix, request, rows):
+        through = self.model_field.remote_field.through
+        parent = self.model_field.m2m_field_name()
+        target = self.model_field.m2m_reverse_field_name()
+        # Same order a prefetch of the related model would give
+        ordering = [
+            f'-{target}__{name[1:]}' if name.startswith('-') else f'{target}__{name}'
+            for name in self.model_field.related_model._meta.ordering
+        ]
+        related = through.objects.filter(
+            **{f'{parent}__in': {row[prefix + 'id'] for row in rows}}
+        ).order_by(*ordering).values(
+            parent, *(f'{target}__{name}' for name in self.projection.columns())
+        )
+
+        represent = self.projection.bind(f'{target}__', request, rows)
+        grouped = {}
+        for row in related:
+            grouped.setdefault(row[parent], []).append(represent(row))
+        key = prefix + 'id'
+        return lambda row: grouped.get(row[key], [])
+
+
+class Projection:
+    """
+    Renders .values() rows exactly like `serializer_class(many=True)`
+    renders instances. Keyword arguments describe fields that are not
+    plain model columns.
+    """
+
+    def __init__(self, serializer_class, **fields):
+        self.serializer_class = serializer_class
+        self.explicit = fields
+
+    @cached_property
+    def fields(self):
+        model = self.serializer_class.Meta.model
+        fields = []
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            spec = self.explicit.get(name) or Column()
+            spec.setup(field, model, f'{self.serializer_class.__name__}.{name}')
+            fields.append((name, spec))
+        return fields
+
+    def columns(self, queryset=None):
+        columns = {}
+        for _, spec in self.fields:
+            columns.update(dict.fromkeys(spec.columns(queryset)))
+        return list(columns)
+
+    def values(self, queryset):
+        """The queryset as .values() rows carrying every column the projection and its ordering need"""
+        columns = dict.fromkeys(self.columns(queryset))
+        ordering = queryset.query.order_by or (
+            queryset.model._meta.ordering if queryset.query.default_ordering else ()
+        )
+        for name in ordering:
+            if isinstance(name, str) and name != '?':
+                name = name.lstrip('-')
+                columns['id' if name == 'pk' else name] = None
+        return queryset.prefetch_related(None).values(*columns)
+
+    def bind(self, prefix='', request=None, rows=()):
+        getters = [(name, spec.bind(prefix, request, rows)) for name, spec in self.fields]
+
+        def represent(row):
+            data = {}
+            for name, get in getters:
+                value = get(row)
+                if value is not MISSING:
+                    data[name] = value
+            return data
+        return represent
+
+    def represent(self, rows, request=None):
+        """List of dicts for .values() rows; pass the request when the serializer would get it in its context"""
+        rows = list(rows)
+        represent = self.bind('', request, rows)
+        return [represent(row) for row in rows]
@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Service, ServiceProvider, AvailabilitySlot, Review
+from .models import (
+    Service, ServiceProvider, AvailabilitySlot, AvailabilityRule,
+    AvailabilityException, Review
+)
+from .catalog_cache import bump_catalog_version
+from .exports import PROVIDER_EXPORT, REVIEW_EXPORT
+from api.exports import export_csv, export_ndjson
 
 @admin.register(Service)
 class ServiceAdmin(admin.ModelAdmin):
@@ -12,22 +18,30 @@ class ServiceAdmin(admin.ModelAdmin):
 class ServiceProviderAdmin(admin.ModelAdmin):
     list_display = [
         'get_provider_name', 'religion_type', 'location',
-        'experience_years', 'price_per_service', 'verified', 'created_at'
+        'experience_years', 'price_per_service', 'verified',
+        'average_rating', 'total_reviews', 'created_at'
     ]
+    list_select_related = ['user', 'stats']
     list_filter = ['religion_type', 'verified', 'location', 'created_at']
     search_fields = [
         'user__first_name', 'user__last_name',
         'user__email', 'location', 'short_description'
     ]
     filter_horizontal = ['services']
-    readonly_fields = ['created_at', 'updated_at', 'average_rating', 'total_reviews']
+    readonly_fields = [
+        'geohash', 'created_at', 'updated_at', 'average_rating',
+        'total_reviews', 'total_bookings'
+    ]
     
     fieldsets = (
         ('Provider Information', {
             'fields': ('user', 'religion_type', 'experience_years')
         }),
         ('Location & Services', {
-            'fields': ('location', 'services', 'price_per_service')
+            'fields': (
+                'location', 'latitude', 'longitude', 'geohash',
+                'services', 'price_per_service'
+            )
         }),
         ('Description', {
             'fields': ('short_description', 'short_description_ne')
@@ -36,7 +50,7 @@ class ServiceProviderAdmin(admin.ModelAdmin):
             'fields': ('verified',)
         }),
         ('Statistics', {
-            'fields': ('average_rating', 'total_reviews'),
+            'fields': ('average_rating', 'total_reviews', 'total_bookings'),
             'classes': ('collapse',)
         }),
         ('Timestamps', {
@@ -45,20 +59,44 @@ class ServiceProviderAdmin(admin.ModelAdmin):
         }),
     )
     
-    actions = ['mark_verified', 'mark_unverified']
+    actions = ['mark_verified', 'mark_unverified', export_csv, export_ndjson]
+    export = PROVIDER_EXPORT
+    
+    def save_model(self, request, obj, form, change):
+        # A new location without edited coordinates is re-geocoded on save
+        changed = set(form.changed_data)
+        if 'location' in changed and not changed & {'latitude', 'longitude'}:
+            obj.latitude = obj.longitude = None
+        super().save_model(request, obj, form, change)
     
     def get_provider_name(self, obj):
         return obj.user.get_full_name()
     get_provider_name.short_description = 'Provider Name'
     get_provider_name.admin_order_field = 'user__first_name'
     
+    def average_rating(self, obj):
+        return obj.average_rating
+    average_rating.short_description = 'Avg Rating'
+    
+    def total_reviews(self, obj):
+        return obj.total_reviews
+    total_reviews.short_description = 'Reviews'
+    total_reviews.admin_order_field = 'stats__review_count'
+    
+    def total_bookings(self, obj):
+        return obj.total_bookings
+    total_bookings.short_description = 'Completed Bookings'
+    total_bookings.admin_order_field = 'stats__completed_bookings'
+    
     def mark_verified(self, request, queryset):
         updated = queryset.update(verified=True)
+        bump_catalog_version()
         self.message_user(request, f'{updated} provider(s) marked as verified.')
     mark_verified.short_description = 'Mark selected as verified'
     
     def mark_unverified(self, request, queryset):
         updated = queryset.update(verified=False)
+        bump_catalog_version()
         self.message_user(request, f'{updated} provider(s) marked as unverified.')
     mark_unverified.short_description = 'Mark selected as unverified'
 
@@ -78,6 +116,35 @@ class AvailabilitySlotAdmin(admin.ModelAdmin):
     get_provider_name.short_description = 'Provider'
     get_provider_name.admin_order_field = 'provider__user__first_name'
 
+@admin.register(AvailabilityRule)
+class AvailabilityRuleAdmin(admin.ModelAdmin):
+    list_display = [
+        'get_provider_name', 'weekdays', 'start_time', 'end_time',
+        'slot_minutes', 'valid_from', 'valid_until', 'is_active', 'materialized_until'
+    ]
+    list_select_related = ['provider__user']
+    list_filter = ['is_active', 'valid_from']
+    search_fields = ['provider__user__first_name', 'provider__user__last_name']
+    readonly_fields = ['materialized_until', 'created_at', 'updated_at']
+    
+    def get_provider_name(self, obj):
+        return obj.provider.user.get_full_name()
+    get_provider_name.short_description = 'Provider'
+    get_provider_name.admin_order_field = 'provider__user__first_name'
+
+@admin.register(AvailabilityException)
+class AvailabilityExceptionAdmin(admin.ModelAdmin):
+    list_display = ['get_provider_name', 'date', 'start_time', 'end_time', 'reason']
+    list_select_related = ['provider__user']
+    search_fields = ['provider__user__first_name', 'provider__user__last_name', 'reason']
+    date_hierarchy = 'date'
+    ordering = ['-date']
+    
+    def get_provider_name(self, obj):
+        return obj.provider.user.get_full_name()
+    get_provider_name.short_description = 'Provider'
+    get_provider_name.admin_order_field = 'provider__user__first_name'
+
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = [
@@ -92,6 +159,8 @@ class ReviewAdmin(admin.ModelAdmin):
     ]
     readonly_fields = ['created_at', 'updated_at']
     ordering = ['-created_at']
+    actions = [export_csv, export_ndjson]
+    export = REVIEW_EXPORT
     
     def get_user_name(self, obj):
         return obj.user.get_full_name()
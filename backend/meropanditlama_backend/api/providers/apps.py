@@ -3,4 +3,9 @@ from django.apps import AppConfig
 class ProvidersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api.providers'
-    verbose_name = 'Service Providers'
\ No newline at end of file
+    verbose_name = 'Service Providers'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
+        # Registers the shared cache check for the cache users across the apps
+        from api import checks  # noqa: F401
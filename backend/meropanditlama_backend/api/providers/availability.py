@@ -0,0 +1,144 @@
+"""
+Cross-provider availability lookups.
+
+Providers with free time are found by a bitwise test on the per-day
+availability bitmaps (one row per provider and day, see bitmaps.py), used
+as a subquery of the provider list. Slot rows are only loaded for the
+page being returned, so cost does not grow with the number of matches.
+
+Slots are rows as providers entered them and know nothing of bookings, so
+the page's slots are masked with the same bitmaps: a slot is listed only
+if it touches a free bucket and no busy one (an active booking overlaps
+it). A provider whose only free time lies in a partly booked slot is
+then left off the page, so a page can hold fewer providers than its size.
+"""
+from collections import defaultdict
+from datetime import datetime, time
+
+from django.conf import settings
+
+from .bitmaps import free_in_window, minute_of_day, touched_mask
+from .models import AvailabilityBitmap, AvailabilitySlot
+
+# Longest date range one search may cover
+MAX_SEARCH_DAYS = 31
+# Longest date range of one provider's calendar
+MAX_CALENDAR_DAYS = getattr(settings, 'AVAILABILITY_MAX_RANGE_DAYS', 92)
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def parse_time(value):
+    return datetime.strptime(value, '%H:%M').time()
+
+
+def parse_search_window(params):
+    """
+    Read date/date_from/date_to and time_from/time_to from query params.
+
+    Returns (date_from, date_to, time_from, time_to); raises ValueError
+    with a user-facing message on bad input.
+    """
+    date = params.get('date')
+    date_from = params.get('date_from') or date
+    date_to = params.get('date_to') or date
+    if not date_from or not date_to:
+        raise ValueError('date, or date_from and date_to, are required (YYYY-MM-DD format)')
+
+    try:
+        date_from, date_to = parse_date(date_from), parse_date(date_to)
+    except ValueError:
+        raise ValueError('Invalid date format. Use YYYY-MM-DD')
+    if date_to < date_from:
+        raise ValueError('date_to must not be before date_from')
+    if (date_to - date_from).days >= MAX_SEARCH_DAYS:
+        raise ValueError(f'Date range cannot exceed {MAX_SEARCH_DAYS} days')
+
+    try:
+        time_from = parse_time(params['time_from']) if params.get('time_from') else time.min
+        time_to = parse_time(params['time_to']) if params.get('time_to') else time.max
+    except ValueError:
+        raise ValueError('Invalid time format. Use HH:MM')
+    if time_to <= time_from:
+        raise ValueError('time_to must be after time_from')
+
+    return date_from, date_to, time_from, time_to
+
+
+def parse_date_range(params, max_days=MAX_CALENDAR_DAYS):
+    """
+    Read date_from/date_to from query params for a calendar view.
+
+    Returns (date_from, date_to); raises ValueError with a user-facing
+    message on bad input.
+    """
+    date_from, date_to = params.get('date_from'), params.get('date_to')
+    if not date_from or not date_to:
+        raise ValueError('date_from and date_to parameters are required (YYYY-MM-DD format)')
+    try:
+        date_from, date_to = parse_date(date_from), parse_date(date_to)
+    except ValueError:
+        raise ValueError('Invalid date format. Use YYYY-MM-DD')
+    if date_to < date_from:
+        raise ValueError('date_to must not be before date_from')
+    if (date_to - date_from).days >= max_days:
+        raise ValueError(f'Date range cannot exceed {max_days} days')
+    return date_from, date_to
+
+
+def wants_rle(params):
+    """True if the client asked for run-length encoded availability (?encoding=rle)"""
+    return params.get('encoding') == 'rle'
+
+
+def free_provider_ids(date_from, date_to, time_from=time.min, time_to=time.max):
+    """
+    Subquery of providers with a free bucket overlapping the time window
+    on any day in [date_from, date_to]
+    """
+    bitmaps = AvailabilityBitmap.objects.filter(date__gte=date_from, date__lte=date_to)
+    return free_in_window(bitmaps, time_from, time_to).values('provider_id')
+
+
+def free_slots(date_from, date_to, time_from=time.min, time_to=time.max):
+    """
+    Unbooked slots overlapping the time window on any day in
+    [date_from, date_to]; a range scan on the slot search index.
+    """
+    return AvailabilitySlot.objects.filter(
+        date__gte=date_from,
+        date__lte=date_to,
+        is_booked=False,
+        start_time__lt=time_to,
+        end_time__gt=time_from,
+    )
+
+
+def group_by_provider(slots, provider_ids):
+    """{provider_id: [AvailabilitySlot]} for the given providers, in one query"""
+    slots = slots.filter(provider_id__in=provider_ids).only(
+        'id', 'provider_id', 'date', 'start_time', 'end_time', 'is_booked', 'notes'
+    ).order_by('date', 'start_time')
+
+    result = defaultdict(list)
+    for slot in slots:
+        result[slot.provider_id].append(slot)
+    return result
+
+
+def drop_busy(slots, bitmaps):
+    """
+    Keep the slots of group_by_provider() that touch a free bucket of their
+    day and no busy one; bitmaps is provider_bitmaps() of the same providers
+    """
+    result = defaultdict(list)
+    for provider_id, provider_slots in slots.items():
+        days = bitmaps.get(provider_id, {})
+        for slot in provider_slots:
+            free, busy = days.get(slot.date, (0, 0))
+            touched = touched_mask(minute_of_day(slot.start_time), minute_of_day(slot.end_time, round_up=True))
+            if touched & free and not touched & busy:
+                result[provider_id].append(slot)
+    return result
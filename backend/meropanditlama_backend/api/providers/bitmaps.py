@@ -0,0 +1,303 @@
+"""
+Per-day availability bitmaps.
+
+Each provider's day is 96 buckets of 15 minutes. AvailabilityBitmap keeps
+two masks per (provider, date):
+
+- free: buckets lying wholly inside an unbooked slot and not taken
+- busy: buckets overlapping an active booking or a booked slot
+
+Overlap and free-time checks then become bitwise tests. "Who is free"
+searches test one small row per provider-day instead of scanning slots,
+and a month calendar is a run-length string of a few hundred bytes.
+
+Bitmaps are derived data. Slot and booking changes mark their days
+dirty, and the days are recomputed from the source rows once the
+transaction commits, in a handful of queries per batch however many rows
+changed. `manage.py rebuild_availability_bitmaps` recomputes a date range
+from scratch.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import AvailabilityBitmap, AvailabilitySlot
+
+BUCKET_MINUTES = 15
+BUCKETS = 24 * 60 // BUCKET_MINUTES
+WORD_BITS = 32
+WORDS = BUCKETS // WORD_BITS
+WORD_MASK = (1 << WORD_BITS) - 1
+
+# Providers recomputed per set of queries
+REFRESH_BATCH_SIZE = 200
+
+# Run-length symbols: not offered, free, busy
+NONE, FREE, BUSY = 'n', 'f', 'b'
+
+
+# Bucket arithmetic
+
+def minute_of_day(value, round_up=False):
+    minutes = value.hour * 60 + value.minute
+    if round_up and (value.second or value.microsecond):
+        minutes += 1
+    return minutes
+
+
+def bucket_mask(first, last):
+    """Bits first..last-1"""
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def covered_mask(start_minute, end_minute):
+    """Buckets lying wholly inside [start, end)"""
+    return bucket_mask(-(-start_minute // BUCKET_MINUTES), end_minute // BUCKET_MINUTES)
+
+
+def touched_mask(start_minute, end_minute):
+    """Buckets overlapping [start, end)"""
+    return bucket_mask(start_minute // BUCKET_MINUTES, -(-end_minute // BUCKET_MINUTES))
+
+
+def window_mask(time_from, time_to):
+    """Buckets overlapping a time-of-day window"""
+    return touched_mask(minute_of_day(time_from), minute_of_day(time_to, round_up=True))
+
+
+def split_words(bitmap):
+    return [(bitmap >> (WORD_BITS * i)) & WORD_MASK for i in range(WORDS)]
+
+
+def local_day_spans(start, end):
+    """Split an aware [start, end) into [(date, start_minute, end_minute)] local days"""
+    start = timezone.localtime(start).replace(tzinfo=None)
+    end = timezone.localtime(end).replace(tzinfo=None)
+    spans = []
+    day = start.date()
+    while datetime.combine(day, time.min) < end:
+        midnight = datetime.combine(day, time.min)
+        span_start = max(start, midnight)
+        span_end = min(end, midnight + timedelta(days=1))
+        spans.append((
+            day,
+            int((span_start - midnight).total_seconds() // 60),
+            -int(-(span_end - midnight).total_seconds() // 60),
+        ))
+        day += timedelta(days=1)
+    return spans
+
+
+def booking_days(booking):
+    """{(provider_id, date)} a booking's bitmaps depend on"""
+    return {
+        (booking.provider_id, day)
+        for day, _, _ in local_day_spans(booking.requested_datetime, booking.end_datetime)
+    }
+
+
+# Keeping bitmaps in sync
+
+class PendingDays(set):
+    """(provider_id, date) pairs to recompute when the transaction commits"""
+
+    def __call__(self):
+        refresh_days(self)
+
+
+def mark_days(days):
+    """Recompute these (provider_id, date) bitmaps after commit, once per transaction"""
+    days = set(days)
+    if not days:
+        return
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        for _, func, *_ in connection.run_on_commit:
+            if isinstance(func, PendingDays):
+                func.update(days)
+                return
+    # robust: the data is committed either way; rebuild_availability_bitmaps repairs drift
+    transaction.on_commit(PendingDays(days), robust=True)
+
+
+def compute_days(days):
+    """{(provider_id, date): (free, busy)} for the given days, from slots and bookings"""
+    from api.bookings.conflicts import ACTIVE_STATUSES
+    from api.bookings.models import Booking
+
+    provider_ids = {provider_id for provider_id, _ in days}
+    dates = {day for _, day in days}
+    offered = defaultdict(int)
+    busy = defaultdict(int)
+
+    slots = AvailabilitySlot.objects.filter(
+        provider_id__in=provider_ids, date__in=dates
+    ).values_list('provider_id', 'date', 'start_time', 'end_time', 'is_booked')
+    for provider_id, day, start_time, end_time, is_booked in slots:
+        if (provider_id, day) not in days:
+            continue
+        start, end = minute_of_day(start_time), minute_of_day(end_time, round_up=True)
+        if is_booked:
+            busy[provider_id, day] |= touched_mask(start, end)
+        else:
+            offered[provider_id, day] |= covered_mask(start, end)
+
+    tz = timezone.get_current_timezone()
+    range_start = datetime.combine(min(dates), time.min, tzinfo=tz)
+    range_end = datetime.combine(max(dates) + timedelta(days=1), time.min, tzinfo=tz)
+    bookings = Booking.objects.filter(
+        provider_id__in=provider_ids,
+        status__in=ACTIVE_STATUSES,
+        requested_datetime__lt=range_end,
+        end_datetime__gt=range_start,
+    ).order_by().values_list('provider_id', 'requested_datetime', 'end_datetime')
+    for provider_id, start, end in bookings:
+        for day, start_minute, end_minute in local_day_spans(start, end):
+            if (provider_id, day) in days:
+                busy[provider_id, day] |= touched_mask(start_minute, end_minute)
+
+    return {key: (offered[key] & ~busy[key], busy[key]) for key in days}
+
+
+def refresh_days(days):
+    """Recompute and store the bitmaps of (provider_id, date) pairs"""
+    by_provider = defaultdict(set)
+    for provider_id, day in days:
+        by_provider[provider_id].add(day)
+    provider_ids = sorted(by_provider)
+
+    for i in range(0, len(provider_ids), REFRESH_BATCH_SIZE):
+        batch = {
+            (provider_id, day)
+            for provider_id in provider_ids[i:i + REFRESH_BATCH_SIZE]
+            for day in by_provider[provider_id]
+        }
+        bitmaps = compute_days(batch)
+        rows, empty = [], defaultdict(list)
+        for (provider_id, day), (free, busy) in bitmaps.items():
+            if free or busy:
+                free_words, busy_words = split_words(free), split_words(busy)
+                rows.append(AvailabilityBitmap(
+                    provider_id=provider_id, date=day,
+                    **{f'free_{n}': word for n, word in enumerate(free_words)},
+                    **{f'busy_{n}': word for n, word in enumerate(busy_words)},
+                ))
+            else:
+                empty[provider_id].append(day)
+
+        with transaction.atomic():
+            if rows:
+                AvailabilityBitmap.objects.bulk_create(
+                    rows,
+                    update_conflicts=True,
+                    unique_fields=['provider', 'date'],
+                    update_fields=[
+                        *(f'free_{n}' for n in range(WORDS)),
+                        *(f'busy_{n}' for n in range(WORDS)),
+                        'updated_at',
+                    ],
+                )
+            if empty:
+                condition = Q()
+                for provider_id, dates in empty.items():
+                    condition |= Q(provider_id=provider_id, date__in=dates)
+                AvailabilityBitmap.objects.filter(condition).delete()
+
+
+def rebuild_bitmaps(date_from, date_to, provider_ids=None):
+    """Recompute every bitmap in [date_from, date_to]; returns the number of days written"""
+    from api.bookings.conflicts import ACTIVE_STATUSES
+    from api.bookings.models import Booking
+
+    slots = AvailabilitySlot.objects.filter(date__gte=date_from, date__lte=date_to)
+    bitmaps = AvailabilityBitmap.objects.filter(date__gte=date_from, date__lte=date_to)
+    tz = timezone.get_current_timezone()
+    bookings = Booking.objects.filter(
+        status__in=ACTIVE_STATUSES,
+        requested_datetime__lt=datetime.combine(date_to + timedelta(days=1), time.min, tzinfo=tz),
+        end_datetime__gt=datetime.combine(date_from, time.min, tzinfo=tz),
+    ).only('provider_id', 'requested_datetime', 'end_datetime')
+    if provider_ids is not None:
+        slots = slots.filter(provider_id__in=provider_ids)
+        bitmaps = bitmaps.filter(provider_id__in=provider_ids)
+        bookings = bookings.filter(provider_id__in=provider_ids)
+
+    # Days with slots or bookings, plus stored days that may have become empty
+    days = set(slots.values_list('provider_id', 'date').distinct())
+    days.update(bitmaps.values_list('provider_id', 'date'))
+    for booking in bookings.iterator():
+        days.update(
+            (provider_id, day) for provider_id, day in booking_days(booking)
+            if date_from <= day <= date_to
+        )
+    refresh_days(days)
+    return len(days)
+
+
+# Queries
+
+def free_in_window(queryset, time_from=time.min, time_to=time.max):
+    """Bitmap rows with at least one free bucket overlapping the time window"""
+    condition = Q()
+    for n, word in enumerate(split_words(window_mask(time_from, time_to))):
+        if word:
+            queryset = queryset.alias(**{f'free_hit_{n}': F(f'free_{n}').bitand(word)})
+            condition |= Q(**{f'free_hit_{n}__gt': 0})
+    return queryset.filter(condition)
+
+
+def provider_bitmaps(provider_ids, date_from, date_to):
+    """{provider_id: {date: (free, busy)}} in one query"""
+    result = defaultdict(dict)
+    bitmaps = AvailabilityBitmap.objects.filter(
+        provider_id__in=provider_ids, date__gte=date_from, date__lte=date_to
+    )
+    for bitmap in bitmaps:
+        result[bitmap.provider_id][bitmap.date] = (bitmap.free, bitmap.busy)
+    return result
+
+
+def encode_runs(days, date_from, date_to):
+    """
+    Run-length encode [date_from, date_to] from 00:00 of date_from, one
+    bucket per BUCKET_MINUTES, as '<count><symbol>' runs: n = not offered,
+    f = free, b = busy. `days` is {date: (free, busy)}; missing days are n.
+    """
+    runs = []
+    symbol, count = None, 0
+
+    def push(next_symbol, length):
+        nonlocal symbol, count
+        if next_symbol == symbol:
+            count += length
+        else:
+            if count:
+                runs.append(f'{count}{symbol}')
+            symbol, count = next_symbol, length
+
+    day = date_from
+    while day <= date_to:
+        free, busy = days.get(day, (0, 0))
+        if not free and not busy:
+            push(NONE, BUCKETS)
+        else:
+            for bucket in range(BUCKETS):
+                bit = 1 << bucket
+                push(BUSY if busy & bit else FREE if free & bit else NONE, 1)
+        day += timedelta(days=1)
+    push(None, 0)
+    return ''.join(runs)
+
+
+def rle_response(days, date_from, date_to):
+    return {
+        'encoding': 'rle',
+        'bucket_minutes': BUCKET_MINUTES,
+        'start': date_from,
+        'runs': encode_runs(days, date_from, date_to),
+    }
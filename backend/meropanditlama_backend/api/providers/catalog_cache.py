@@ -0,0 +1,164 @@
+"""
+Response cache for the public catalog endpoints (services and providers).
+
+Every cached response is keyed by a global catalog version plus the
+scheme and host (bodies hold absolute photo URLs), the path, the
+normalized query string and the request language. Signals bump the
+version, after commit, whenever a Service, ServiceProvider, Review,
+Booking or AvailabilitySlot changes, which orphans all older entries at
+once. Nothing has to be deleted.
+
+The ETag is derived from the same key, so a matching If-None-Match is
+answered with 304 from the cache alone, before authentication or any
+database access. These responses do not depend on who is asking.
+
+The version lives in the default cache, so it must be shared (Redis or
+memcached) when several worker processes serve requests. It is seeded
+from the clock so that an evicted counter never reuses an old version.
+
+Misses within DATABASE_STICKY_SECONDS of a change are filled from the
+primary database, not a replica that may not have the change yet.
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe, parse_etags
+from django.utils.translation import get_language_from_request
+
+from api.dbrouter import STICKY_SECONDS, primary_reads
+from api.metrics import inc
+from api.profiling import phase
+
+VERSION_KEY = 'catalog:version'
+MODIFIED_KEY = 'catalog:modified'
+
+# Seconds a rendered response is kept (version bumps invalidate sooner)
+CACHE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+
+def get_catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def get_last_modified():
+    modified = cache.get(MODIFIED_KEY)
+    if modified is None:
+        cache.add(MODIFIED_KEY, int(time.time()), None)
+        modified = cache.get(MODIFIED_KEY)
+    return modified
+
+
+def _bump():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Evicted: start past any version handed out before
+        cache.set(VERSION_KEY, int(time.time() * 1000), None)
+    cache.set(MODIFIED_KEY, int(time.time()), None)
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response once the current transaction commits"""
+    connection = transaction.get_connection()
+    # A bulk delete sends one signal per row; one bump per transaction is enough.
+    # Callbacks of rolled-back savepoints are dropped from run_on_commit too.
+    if connection.in_atomic_block and any(
+        func is _bump for _, func, *_ in connection.run_on_commit
+    ):
+        return
+    transaction.on_commit(_bump)
+
+
+def cache_key(request, version):
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    language = get_language_from_request(request)
+    # Bodies hold absolute photo URLs built from the request's scheme and host
+    origin = f'{request.scheme}://{request.get_host()}'
+    digest = hashlib.md5(f'{origin}{request.path}?{query}|{language}'.encode()).hexdigest()
+    return f'catalog:{version}:{digest}'
+
+
+def wants_json(request):
+    """
+    True if DRF will negotiate the JSON renderer. The browsable API's HTML
+    shows the logged-in user, so only JSON is cached.
+    """
+    format = request.GET.get('format')
+    if format:
+        return format == 'json'
+    return 'text/html' not in request.META.get('HTTP_ACCEPT', '')
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+def _set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Let clients store the response but always revalidate it
+    patch_cache_control(response, max_age=0, must_revalidate=True)
+    patch_vary_headers(response, ['Accept', 'Accept-Language'])
+
+
+class CatalogCacheMixin:
+    """
+    Cache GET/HEAD JSON responses of a read-only viewset.
+
+    Works at dispatch(), ahead of DRF authentication, so only use it on
+    endpoints whose responses are the same for every caller.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or not wants_json(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = cache_key(request, get_catalog_version())
+        etag = '"%s"' % key.split(':', 1)[1].replace(':', '-')
+        last_modified = get_last_modified()
+
+        if _not_modified(request, etag, last_modified):
+            inc('cache_requests_total', cache='catalog', result='hit')
+            response = HttpResponseNotModified()
+            _set_validators(response, etag, last_modified)
+            return response
+
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Cache'] = 'HIT'
+            inc('cache_requests_total', cache='catalog', result='hit')
+            _set_validators(response, etag, last_modified)
+            return response
+
+        if time.time() - last_modified <= STICKY_SECONDS:
+            # Replicas may not have the change yet; fill the new version from the primary
+            with primary_reads():
+                response = super().dispatch(request, *args, **kwargs)
+        else:
+            response = super().dispatch(request, *args, **kwargs)
+        renderer = getattr(response, 'accepted_renderer', None)
+        if response.status_code == 200 and getattr(renderer, 'format', None) == 'json':
+            with phase('serialize'):
+                response.render()
+            cache.set(key, (response.content, response['Content-Type']), CACHE_TIMEOUT)
+            response['X-Cache'] = 'MISS'
+            inc('cache_requests_total', cache='catalog', result='miss')
+            _set_validators(response, etag, last_modified)
+        return response
@@ -0,0 +1,313 @@
+"""
+Bulk catalog import: services, providers (with their user accounts) and
+provider-service links, from CSV or JSON files.
+
+Every row is validated in memory with the model fields' own clean()
+before anything is written, and any error aborts the whole import.
+Foreign keys are resolved through in-memory maps (service name -> id,
+email -> user id -> provider id). Rows already in the database are
+fetched once per batch and compared, so only new or changed rows are
+written, with bulk_create(update_conflicts=True); importing the same
+file twice writes nothing the second time.
+
+Writes bypass save() and signals. The side effects those would have
+(geocoding and geohash, ProviderStats rows, the search index, the
+catalog cache version, cached dashboards) are applied in bulk instead.
+"""
+import csv
+import json
+from pathlib import Path
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+
+from api.accounts.models import User
+from .catalog_cache import bump_catalog_version
+from .dashboard import invalidate_dashboard
+from .geo import geocode, geohash_encode
+from .models import ProviderStats, Service, ServiceProvider
+from .search import get_search_backend
+
+BATCH_SIZE = 2000
+# Errors listed before giving up on a file
+MAX_ERRORS = 50
+
+SERVICE_FIELDS = ['name', 'name_ne', 'description', 'description_ne', 'default_price']
+USER_FIELDS = ['email', 'first_name', 'last_name', 'phone']
+PROVIDER_FIELDS = [
+    'religion_type', 'experience_years', 'location', 'latitude', 'longitude',
+    'short_description', 'short_description_ne', 'price_per_service', 'verified',
+]
+LINK_FIELDS = ['email', 'service']
+
+TRUE_STRINGS = {'true', 't', 'yes', 'y', '1'}
+FALSE_STRINGS = {'false', 'f', 'no', 'n', '0'}
+
+
+class ImportFailed(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f'{len(errors)} error(s)')
+
+
+def read_rows(path):
+    """[dict] from a .csv file (header row) or a .json file (list of objects)"""
+    path = Path(path)
+    if path.suffix.lower() == '.csv':
+        with path.open(newline='', encoding='utf-8-sig') as f:
+            return list(csv.DictReader(f))
+    if path.suffix.lower() == '.json':
+        with path.open(encoding='utf-8') as f:
+            rows = json.load(f)
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ImportFailed([f'{path.name}: expected a list of objects'])
+        return rows
+    raise ImportFailed([f'{path.name}: use a .csv or .json file'])
+
+
+def batches(items, size=BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# Validation
+
+def clean_value(field, value):
+    """A raw CSV/JSON value cleaned by the model field; missing and empty mean the default"""
+    if isinstance(value, str):
+        value = value.strip()
+        if isinstance(field, models.BooleanField) and value.lower() in TRUE_STRINGS | FALSE_STRINGS:
+            value = value.lower() in TRUE_STRINGS
+    if value in ('', None):
+        # get_default() is '' for text fields without a default; blank=False still rejects it
+        value = None if field.null else field.get_default()
+    return field.clean(value, None)
+
+
+def clean_rows(model, rows, fields, key, label, errors):
+    """Rows reduced to `fields`, cleaned; problems are appended to errors"""
+    model_fields = [model._meta.get_field(name) for name in fields]
+    cleaned, seen = [], {}
+    # Row numbers as people see them: CSV data starts on line 2
+    for number, row in enumerate(rows, start=2 if label.endswith('.csv') else 1):
+        values, valid = {}, True
+        for field in model_fields:
+            try:
+                values[field.name] = clean_value(field, row.get(field.name))
+            except ValidationError as e:
+                errors.append(f'{label} row {number}: {field.name}: {" ".join(e.messages)}')
+                valid = False
+        if valid and key:
+            if values[key] in seen:
+                errors.append(f'{label} row {number}: duplicate {key} {values[key]!r} (row {seen[values[key]]})')
+                valid = False
+            seen[values[key]] = number
+        if valid:
+            cleaned.append(values)
+        if len(errors) >= MAX_ERRORS:
+            raise ImportFailed(errors)
+    return cleaned
+
+
+def with_coordinates(row, geocoded):
+    """Fill latitude/longitude/geohash the way ServiceProvider.save() does"""
+    if row['latitude'] is None or row['longitude'] is None:
+        location = row['location']
+        if location not in geocoded:
+            geocoded[location] = geocode(location)
+        if geocoded[location]:
+            row['latitude'], row['longitude'] = geocoded[location]
+    row['geohash'] = (
+        geohash_encode(row['latitude'], row['longitude'])
+        if row['latitude'] is not None and row['longitude'] is not None
+        else ''
+    )
+    return row
+
+
+# Writing
+
+def upsert(model, rows, key, create_defaults=None, progress=None, label=''):
+    """
+    Insert new rows and update changed ones, matched on the unique field
+    `key`. Unchanged rows are not written. Returns
+    ({key: pk}, created_keys, updated_keys).
+    """
+    if not rows:
+        return {}, [], []
+    fields = [name for name in rows[0] if name != key]
+    update_fields = list(fields)
+    if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+        update_fields.append('updated_at')
+    unique_field = model._meta.get_field(key).name
+
+    ids, created, updated = {}, [], []
+    done = 0
+    for batch in batches(rows):
+        existing = {
+            row[key]: row
+            for row in model.objects.filter(**{f'{key}__in': [row[key] for row in batch]}).values('pk', key, *fields)
+        }
+        new, changed = [], []
+        for row in batch:
+            current = existing.get(row[key])
+            if current is None:
+                new.append(row)
+            elif any(current[name] != row[name] for name in fields):
+                changed.append(row)
+            if current is not None:
+                ids[row[key]] = current['pk']
+        if new or changed:
+            model.objects.bulk_create(
+                [model(**{**(create_defaults(row) if create_defaults else {}), **row}) for row in new + changed],
+                update_conflicts=True,
+                unique_fields=[unique_field],
+                update_fields=update_fields,
+            )
+        if new:
+            ids.update(model.objects.filter(
+                **{f'{key}__in': [row[key] for row in new]}
+            ).values_list(key, 'pk'))
+        created.extend(row[key] for row in new)
+        updated.extend(row[key] for row in changed)
+        done += len(batch)
+        if progress:
+            progress(label, done, len(rows))
+    return ids, created, updated
+
+
+def import_catalog(services=None, providers=None, links=None, dry_run=False, progress=None):
+    """
+    Import the given files (paths, any of them optional) in one
+    transaction. Returns {'services': (created, updated, unchanged),
+    'users': ..., 'providers': ..., 'links': (created, 0, unchanged)},
+    with an entry per file given.
+    Raises ImportFailed with every validation error found.
+    """
+    errors = []
+    service_rows = provider_rows = link_rows = []
+    if services:
+        service_rows = clean_rows(
+            Service, read_rows(services), SERVICE_FIELDS, 'name', Path(services).name, errors
+        )
+    if providers:
+        raw = read_rows(providers)
+        label = Path(providers).name
+        # Each row holds a user account and its provider profile
+        user_rows = clean_rows(User, raw, USER_FIELDS, 'email', label, errors)
+        profile_rows = clean_rows(ServiceProvider, raw, PROVIDER_FIELDS, None, label, errors)
+        if errors:
+            raise ImportFailed(errors)
+        provider_rows = [{'user': user, **profile} for user, profile in zip(user_rows, profile_rows)]
+        for batch in batches([row['email'] for row in user_rows]):
+            for email in User.objects.filter(email__in=batch).exclude(role='provider').values_list('email', flat=True):
+                errors.append(f'{label}: {email} belongs to an account that is not a provider')
+    if links:
+        label = Path(links).name
+        link_rows = []
+        for number, row in enumerate(read_rows(links), start=2 if label.endswith('.csv') else 1):
+            email, service = (str(row.get(name) or '').strip() for name in LINK_FIELDS)
+            if not email or not service:
+                errors.append(f'{label} row {number}: email and service are required')
+            else:
+                link_rows.append((number, email, service))
+    if errors:
+        raise ImportFailed(errors[:MAX_ERRORS])
+
+    # Foreign keys through in-memory maps
+    service_ids = dict(Service.objects.values_list('name', 'id'))
+    known_services = set(service_ids) | {row['name'] for row in service_rows}
+    provider_emails = {row['user']['email'] for row in provider_rows}
+    link_emails = {email for _, email, _ in link_rows}
+    existing_providers = {}
+    for batch in batches(list(link_emails - provider_emails)):
+        existing_providers.update(
+            ServiceProvider.objects.filter(user__email__in=batch).values_list('user__email', 'id')
+        )
+    for number, email, service in link_rows:
+        if service not in known_services:
+            errors.append(f'{Path(links).name} row {number}: unknown service {service!r}')
+        if email not in provider_emails and email not in existing_providers:
+            errors.append(f'{Path(links).name} row {number}: no provider with email {email!r}')
+        if len(errors) >= MAX_ERRORS:
+            break
+    if errors:
+        raise ImportFailed(errors)
+
+    report = {}
+    with transaction.atomic():
+        ids, created, updated = upsert(Service, service_rows, 'name', progress=progress, label='services')
+        service_ids.update(ids)
+        if services:
+            report['services'] = (len(created), len(updated), len(service_rows) - len(created) - len(updated))
+
+        touched = set()
+        if provider_rows:
+            user_rows = [row['user'] for row in provider_rows]
+            # New accounts sign in after a password reset; one unusable hash serves them all
+            password = make_password(None)
+            user_ids, created_users, updated_users = upsert(
+                User, user_rows, 'email', progress=progress, label='users',
+                create_defaults=lambda row: {'username': row['email'], 'role': 'provider', 'password': password},
+            )
+            report['users'] = (len(created_users), len(updated_users), len(user_rows) - len(created_users) - len(updated_users))
+
+            geocoded = {}
+            rows = [
+                with_coordinates({'user_id': user_ids[row['user']['email']], **{
+                    name: value for name, value in row.items() if name != 'user'
+                }}, geocoded)
+                for row in provider_rows
+            ]
+            by_user, created_providers, updated_providers = upsert(
+                ServiceProvider, rows, 'user_id', progress=progress, label='providers'
+            )
+            ProviderStats.objects.bulk_create(
+                [ProviderStats(provider_id=by_user[user_id]) for user_id in created_providers],
+                batch_size=BATCH_SIZE, ignore_conflicts=True,
+            )
+            report['providers'] = (
+                len(created_providers), len(updated_providers),
+                len(rows) - len(created_providers) - len(updated_providers)
+            )
+            # Renamed users change their provider's search document too
+            renamed = {user_ids[email] for email in updated_users}
+            touched = {by_user[user_id] for user_id in [*created_providers, *updated_providers, *renamed]}
+            existing_providers.update({email: by_user[user_ids[email]] for email in provider_emails})
+
+        if link_rows:
+            through = ServiceProvider.services.through
+            pairs = {(existing_providers[email], service_ids[service]) for _, email, service in link_rows}
+            present = set()
+            for batch in batches(list({provider_id for provider_id, _ in pairs})):
+                present.update(through.objects.filter(serviceprovider_id__in=batch).values_list(
+                    'serviceprovider_id', 'service_id'
+                ))
+            new = sorted(pairs - present)
+            through.objects.bulk_create(
+                [through(serviceprovider_id=provider_id, service_id=service_id) for provider_id, service_id in new],
+                batch_size=BATCH_SIZE, ignore_conflicts=True,
+            )
+            report['links'] = (len(new), 0, len(pairs) - len(new))
+            touched.update(provider_id for provider_id, _ in new)
+            if progress:
+                progress('links', len(link_rows), len(link_rows))
+
+        if updated:
+            # Service names are part of the search documents of the providers offering them
+            for batch in batches(updated):
+                touched.update(ServiceProvider.services.through.objects.filter(
+                    service__name__in=batch
+                ).values_list('serviceprovider_id', flat=True))
+        touched = sorted(touched)
+        backend = get_search_backend()
+        for batch in batches(touched):
+            backend.index(batch)
+        if dry_run:
+            transaction.set_rollback(True)
+        elif created or updated or touched:
+            # Caches only change once the import commits; a failed import never does
+            transaction.on_commit(bump_catalog_version)
+            transaction.on_commit(lambda: invalidate_dashboard(touched))
+    return report
@@ -0,0 +1,144 @@
+"""
+Provider dashboard.
+
+Status totals come from the denormalized ProviderStats row. The weekly
+(last 52 weeks) and monthly (last 12 months) series come from a single
+conditional aggregate over the provider's bookings, grouped by local day
+on the (provider, requested_datetime, status) index and folded into
+weeks and months in Python.
+
+The whole payload is cached per provider for DASHBOARD_CACHE_TIMEOUT
+seconds. Booking, review and profile changes delete the entry after
+commit (see signals.py and bookings.transitions).
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from api.metrics import inc
+
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+SERIES_WEEKS = 52
+SERIES_MONTHS = 12
+RECENT_BOOKINGS = 5
+
+
+def cache_key(provider_id):
+    return f'dashboard:{provider_id}'
+
+
+def invalidate_dashboard(provider_ids):
+    """Drop the cached dashboards once the current transaction commits"""
+    keys = [cache_key(provider_id) for provider_id in set(provider_ids) if provider_id]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return day.replace(year=day.year + month // 12, month=month % 12 + 1, day=1)
+
+
+def booking_series(provider, today=None):
+    """
+    {'weekly': [...], 'monthly': [...]} oldest first, one entry per week
+    (starting Monday) or month, including empty ones. Revenue is
+    completed bookings x the provider's current price; bookings do not
+    store what was charged.
+    """
+    from api.bookings.models import Booking
+
+    today = today or timezone.localdate()
+    first_week = today - timedelta(days=today.weekday(), weeks=SERIES_WEEKS - 1)
+    first_month = add_months(today.replace(day=1), -(SERIES_MONTHS - 1))
+    end = max(
+        today - timedelta(days=today.weekday()) + timedelta(weeks=1),
+        add_months(today.replace(day=1), 1),
+    )
+    tz = timezone.get_current_timezone()
+
+    days = (
+        Booking.objects.filter(
+            provider=provider,
+            requested_datetime__gte=datetime.combine(min(first_week, first_month), time.min, tzinfo=tz),
+            requested_datetime__lt=datetime.combine(end, time.min, tzinfo=tz),
+        )
+        .annotate(day=TruncDate('requested_datetime'))
+        .order_by()
+        .values('day')
+        .annotate(
+            bookings=Count('id'),
+            completed=Count('id', filter=Q(status='completed')),
+            cancelled=Count('id', filter=Q(status='cancelled')),
+        )
+    )
+
+    weekly = {
+        first_week + timedelta(weeks=n): {'bookings': 0, 'completed': 0, 'cancelled': 0}
+        for n in range(SERIES_WEEKS)
+    }
+    monthly = {
+        add_months(first_month, n): {'bookings': 0, 'completed': 0, 'cancelled': 0}
+        for n in range(SERIES_MONTHS)
+    }
+    for row in days:
+        day = row['day']
+        for bucket in (weekly.get(day - timedelta(days=day.weekday())), monthly.get(day.replace(day=1))):
+            if bucket is not None:
+                for field in ('bookings', 'completed', 'cancelled'):
+                    bucket[field] += row[field]
+
+    def entries(buckets):
+        return [
+            {'start': start, **counts, 'revenue': counts['completed'] * provider.price_per_service}
+            for start, counts in sorted(buckets.items())
+        ]
+
+    return {'weekly': entries(weekly), 'monthly': entries(monthly)}
+
+
+def build_dashboard(provider_id):
+    from api.bookings.serializers import BookingSerializer
+    from .models import ServiceProvider
+    from .serializers import ServiceProviderDetailSerializer
+
+    provider = ServiceProvider.objects.select_related('user', 'stats').prefetch_related(
+        'services'
+    ).get(pk=provider_id)
+    stats = provider.provider_stats
+    recent_bookings = provider.bookings.select_related(
+        'user', 'provider__user', 'service'
+    ).order_by('-created_at')[:RECENT_BOOKINGS]
+
+    return {
+        'provider': ServiceProviderDetailSerializer(provider).data,
+        'stats': {
+            'total_bookings': stats.total_bookings,
+            'pending_bookings': stats.pending_bookings,
+            'confirmed_bookings': stats.confirmed_bookings,
+            'completed_bookings': stats.completed_bookings,
+            'cancelled_bookings': stats.cancelled_bookings,
+            'average_rating': stats.average_rating,
+            'total_reviews': stats.review_count,
+        },
+        'series': booking_series(provider),
+        'recent_bookings': BookingSerializer(recent_bookings, many=True).data,
+    }
+
+
+def get_dashboard(provider_id):
+    """Cached dashboard payload for a provider"""
+    key = cache_key(provider_id)
+    data = cache.get(key)
+    if data is not None:
+        inc('cache_requests_total', cache='dashboard', result='hit')
+        return data
+    inc('cache_requests_total', cache='dashboard', result='miss')
+    data = build_dashboard(provider_id)
+    cache.set(key, data, DASHBOARD_CACHE_TIMEOUT)
+    return data
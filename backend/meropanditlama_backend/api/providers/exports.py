@@ -0,0 +1,36 @@
+from api.exports import Export
+
+PROVIDER_EXPORT = Export('providers', [
+    ('id', 'id'),
+    ('user_id', 'user_id'),
+    ('first_name', 'user__first_name'),
+    ('last_name', 'user__last_name'),
+    ('email', 'user__email'),
+    ('phone', 'user__phone'),
+    ('religion_type', 'religion_type'),
+    ('experience_years', 'experience_years'),
+    ('location', 'location'),
+    ('latitude', 'latitude'),
+    ('longitude', 'longitude'),
+    ('price_per_service', 'price_per_service'),
+    ('verified', 'verified'),
+    ('review_count', 'stats__review_count'),
+    ('rating_sum', 'stats__rating_sum'),
+    ('completed_bookings', 'stats__completed_bookings'),
+    ('created_at', 'created_at'),
+])
+
+REVIEW_EXPORT = Export('reviews', [
+    ('id', 'id'),
+    ('provider_id', 'provider_id'),
+    ('provider_email', 'provider__user__email'),
+    ('booking_id', 'booking_id'),
+    ('user_id', 'user_id'),
+    ('user_first_name', 'user__first_name'),
+    ('user_last_name', 'user__last_name'),
+    ('user_email', 'user__email'),
+    ('rating', 'rating'),
+    ('comment', 'comment'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+])
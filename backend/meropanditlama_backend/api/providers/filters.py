@@ -1,5 +1,12 @@
 import django_filters
+from django.conf import settings
+from django.db.models import Case, When, IntegerField
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+from . import geo
 from .models import ServiceProvider
+from .search import get_search_backend
 
 class ServiceProviderFilter(django_filters.FilterSet):
     """Advanced filtering for providers"""
@@ -19,4 +26,81 @@ class ServiceProviderFilter(django_filters.FilterSet):
     
     class Meta:
         model = ServiceProvider
-        fields = ['religion_type', 'location', 'verified']
\ No newline at end of file
+        fields = ['religion_type', 'location', 'verified']
+
+class ProviderSearchFilter(filters.BaseFilterBackend):
+    """
+    Full-text `?search=` backed by api.providers.search.
+    
+    Results are ranked by relevance unless the client passes an explicit
+    `ordering`, so this backend must run after OrderingFilter.
+    """
+    
+    search_param = api_settings.SEARCH_PARAM
+    ordering_param = api_settings.ORDERING_PARAM
+    
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        
+        ranked_ids = get_search_backend().search(query)
+        queryset = queryset.filter(id__in=ranked_ids)
+        if request.query_params.get(self.ordering_param) or not ranked_ids:
+            return queryset
+        
+        # A named annotation, so keyset pagination can page through it
+        rank = Case(
+            *[When(id=provider_id, then=position) for position, provider_id in enumerate(ranked_ids)],
+            output_field=IntegerField()
+        )
+        return queryset.annotate(search_rank=rank).order_by('search_rank', 'id')
+
+
+class ProviderNearFilter(filters.BaseFilterBackend):
+    """
+    `?near=lat,lon[&radius_km=]` proximity filter backed by the geohash index.
+    
+    With radius_km, returns providers inside the circle; without it, the
+    NEAREST_LIMIT closest providers. Each result is annotated with
+    `distance_km` and, unless the client passes an explicit `ordering`,
+    sorted nearest first - so this backend runs last.
+    """
+    
+    near_param = 'near'
+    radius_param = 'radius_km'
+    ordering_param = api_settings.ORDERING_PARAM
+    MAX_RADIUS_KM = getattr(settings, 'PROVIDER_NEAR_MAX_RADIUS_KM', 200)
+    NEAREST_LIMIT = getattr(settings, 'PROVIDER_NEAREST_LIMIT', 50)
+    
+    def filter_queryset(self, request, queryset, view):
+        near = request.query_params.get(self.near_param)
+        if not near:
+            return queryset
+        
+        try:
+            latitude, longitude = geo.parse_point(near)
+        except ValueError:
+            raise ValidationError({self.near_param: 'Use near=<latitude>,<longitude>'})
+        
+        radius = request.query_params.get(self.radius_param)
+        if radius:
+            try:
+                radius = float(radius)
+            except ValueError:
+                radius = None
+            if radius is None or not 0 < radius <= self.MAX_RADIUS_KM:
+                raise ValidationError({
+                    self.radius_param: f'Must be a number between 0 and {self.MAX_RADIUS_KM}'
+                })
+            queryset = geo.within_radius(queryset, latitude, longitude, radius)
+        else:
+            matches = geo.nearest(queryset, latitude, longitude, self.NEAREST_LIMIT)
+            queryset = geo.annotate_distance(
+                queryset.filter(id__in=[pk for pk, _ in matches]),
+                latitude, longitude
+            )
+        
+        if request.query_params.get(self.ordering_param):
+            return queryset
+        return queryset.order_by('distance_km', 'id')
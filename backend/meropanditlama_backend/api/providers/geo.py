@@ -0,0 +1,212 @@
+"""
+Offline geocoding and geohash-based proximity search for providers.
+
+Locations are geocoded against a bundled Nepal gazetteer
+(data/nepal_gazetteer.csv), so no external service is needed. Each
+provider stores latitude/longitude plus an indexed geohash; radius and
+k-nearest queries first narrow candidates to the 3x3 block of geohash
+cells around the point (index range scans), then compute exact haversine
+distances on the remaining rows.
+"""
+import csv
+import math
+import re
+from functools import lru_cache
+from pathlib import Path
+
+from django.db.models import ExpressionWrapper, FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Round, Sin, Sqrt
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / 'data' / 'nepal_gazetteer.csv'
+
+EARTH_RADIUS_KM = 6371.0088
+
+GEOHASH_PRECISION = 7
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# More specific places win when a location mentions several
+_KIND_PRIORITY = {'locality': 0, 'city': 1}
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+# Geohash
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """(lat_degrees, lon_degrees) spanned by one cell"""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def geohash_neighbourhood(latitude, longitude, precision):
+    """The cell containing the point plus its eight neighbours"""
+    dlat, dlon = geohash_cell_size(precision)
+    cells = set()
+    for i in (-1, 0, 1):
+        for j in (-1, 0, 1):
+            lat = min(max(latitude + i * dlat, -90.0), 90.0)
+            lon = (longitude + j * dlon + 180.0) % 360.0 - 180.0
+            cells.add(geohash_encode(lat, lon, precision))
+    return sorted(cells)
+
+
+def _cell_min_km(precision, latitude):
+    """Smallest side of a cell, in km, at the given latitude"""
+    dlat, dlon = geohash_cell_size(precision)
+    km_per_degree = math.pi * EARTH_RADIUS_KM / 180.0
+    return min(dlat * km_per_degree, dlon * km_per_degree * math.cos(math.radians(latitude)))
+
+
+def precision_for_radius(latitude, radius_km):
+    """Finest precision whose 3x3 neighbourhood still covers the circle"""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        if _cell_min_km(precision, latitude) >= radius_km:
+            return precision
+    return 1
+
+
+def geohash_cells_q(cells, field='geohash'):
+    """Q matching any of the cells as index-friendly range scans"""
+    condition = Q()
+    for cell in cells:
+        # '~' sorts after every base32 character
+        condition |= Q(**{f'{field}__gte': cell, f'{field}__lt': cell + '~'})
+    return condition
+
+
+# Gazetteer
+
+_WORD_RE = re.compile(r'[\w\u0900-\u097f]+')
+
+
+def _normalize(text):
+    return ' '.join(_WORD_RE.findall((text or '').lower()))
+
+
+@lru_cache(maxsize=1)
+def load_gazetteer():
+    """[(normalized_name, kind, latitude, longitude)] longest names first"""
+    entries = []
+    with open(GAZETTEER_PATH, encoding='utf-8') as handle:
+        for row in csv.DictReader(handle):
+            point = (float(row['latitude']), float(row['longitude']))
+            names = [row['name'], row['name_ne']] + row['aliases'].split('|')
+            for name in filter(None, names):
+                entries.append((_normalize(name), row['kind'], *point))
+    entries.sort(key=lambda entry: -len(entry[0]))
+    return entries
+
+
+def geocode(location):
+    """
+    Resolve a free-text location to (latitude, longitude), or None.
+
+    Matches gazetteer names and aliases (English or Nepali) as whole words,
+    preferring localities over cities and earlier mentions over later ones,
+    so "Thamel, Kathmandu" resolves to Thamel.
+    """
+    text = f' {_normalize(location)} '
+    if not text.strip():
+        return None
+
+    best = None
+    for name, kind, latitude, longitude in load_gazetteer():
+        position = text.find(f' {name} ')
+        if position < 0:
+            continue
+        key = (_KIND_PRIORITY.get(kind, len(_KIND_PRIORITY)), position)
+        if best is None or key < best[0]:
+            best = (key, latitude, longitude)
+    return best[1:] if best else None
+
+
+def parse_point(value):
+    """Parse "lat,lon"; raises ValueError on bad input"""
+    parts = (value or '').split(',')
+    if len(parts) != 2:
+        raise ValueError('Expected "lat,lon"')
+    latitude, longitude = float(parts[0]), float(parts[1])
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError('Coordinates out of range')
+    return latitude, longitude
+
+
+# Proximity queries
+
+def _distances(queryset, latitude, longitude, precision):
+    rows = queryset.filter(
+        geohash_cells_q(geohash_neighbourhood(latitude, longitude, precision))
+    ).values_list('id', 'latitude', 'longitude')
+    return [
+        (pk, haversine_km(latitude, longitude, lat, lon))
+        for pk, lat, lon in rows
+    ]
+
+
+def distance_km_expression(latitude, longitude, lat_field='latitude', lon_field='longitude'):
+    """Haversine distance from the point as an ORM expression (km, 2 dp)"""
+    lat1, lon1 = math.radians(latitude), math.radians(longitude)
+    lat2, lon2 = Radians(lat_field), Radians(lon_field)
+    a = (
+        Power(Sin((lat2 - Value(lat1)) / 2), 2) +
+        Value(math.cos(lat1)) * Cos(lat2) * Power(Sin((lon2 - Value(lon1)) / 2), 2)
+    )
+    return Round(
+        ExpressionWrapper(Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a)), output_field=FloatField()),
+        2
+    )
+
+
+def annotate_distance(queryset, latitude, longitude):
+    return queryset.annotate(distance_km=distance_km_expression(latitude, longitude))
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """queryset narrowed to the radius, annotated with distance_km"""
+    precision = precision_for_radius(latitude, radius_km)
+    queryset = queryset.filter(
+        geohash_cells_q(geohash_neighbourhood(latitude, longitude, precision))
+    )
+    return annotate_distance(queryset, latitude, longitude).filter(distance_km__lte=radius_km)
+
+
+def nearest(queryset, latitude, longitude, k):
+    """[(provider_id, distance_km)] for the k nearest providers, nearest first"""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        candidates = _distances(queryset, latitude, longitude, precision)
+        if len(candidates) < k and precision > 1:
+            continue
+        candidates.sort(key=lambda match: (match[1], match[0]))
+        candidates = candidates[:k]
+        # The neighbourhood only guarantees completeness up to one cell side
+        if precision == 1 or not candidates or candidates[-1][1] <= _cell_min_km(precision, latitude):
+            return candidates
+    return []
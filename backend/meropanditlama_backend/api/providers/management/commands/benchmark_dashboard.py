@@ -0,0 +1,115 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.accounts.models import User
+from api.bookings.conflicts import booking_end
+from api.bookings.models import Booking
+from api.providers.dashboard import cache_key
+from api.providers.models import Service, ServiceProvider
+from api.providers.views import provider_dashboard
+
+# Queries per dashboard request, whatever the number of bookings:
+# provider profile, provider + user + stats, services, series, recent bookings
+COLD_QUERY_CEILING = 5
+# Cached: only the provider profile lookup
+WARM_QUERY_CEILING = 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the provider dashboard against a long booking history and fail '
+        'if it runs more queries than the ceiling. Runs inside a transaction '
+        'that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=20000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        factory = APIRequestFactory()
+        with transaction.atomic():
+            provider = self._seed(rng, options['bookings'])
+            key = cache_key(provider.pk)
+
+            user = provider.user
+
+            def fetch():
+                request = factory.get('/api/providers/dashboard/')
+                force_authenticate(request, user=user)
+                response = provider_dashboard(request)
+                if response.status_code != 200:
+                    raise CommandError(f'Dashboard returned {response.status_code}: {response.data}')
+                return response
+
+            try:
+                for label, ceiling, warm in [
+                    ('cold', COLD_QUERY_CEILING, False),
+                    ('warm', WARM_QUERY_CEILING, True),
+                ]:
+                    samples, queries = [], 0
+                    for _ in range(options['repeat']):
+                        cache.delete(key)
+                        if warm:
+                            fetch()
+                        # Fresh user, as authentication would load it
+                        user = User.objects.get(pk=provider.user_id)
+                        with CaptureQueriesContext(connection) as context:
+                            began = time.perf_counter()
+                            fetch()
+                            samples.append((time.perf_counter() - began) * 1000)
+                        queries = max(queries, len(context.captured_queries))
+                    self.stdout.write(
+                        f'{label}: {statistics.median(samples):7.1f} ms, '
+                        f'{queries} queries (ceiling {ceiling})'
+                    )
+                    if queries > ceiling:
+                        raise CommandError(
+                            f'{label} dashboard ran {queries} queries; the ceiling is {ceiling}'
+                        )
+            finally:
+                # The cached payload describes rows that are about to be rolled back
+                cache.delete(key)
+                transaction.set_rollback(True)
+
+    def _seed(self, rng, count):
+        service = Service.objects.create(name='Benchmark puja', default_price=1000)
+        user = User(username='bench-dashboard', email='bench-dashboard@example.invalid', role='provider')
+        user.set_unusable_password()
+        user.save()
+        customer = User(username='bench-dashboard-customer', email='bench-dashboard-customer@example.invalid', role='user')
+        customer.set_unusable_password()
+        customer.save()
+        provider = ServiceProvider.objects.create(
+            user=user, religion_type='hindu', experience_years=10, location='Kathmandu',
+            short_description='Benchmark provider', price_per_service=1500, verified=True,
+        )
+        provider.services.add(service)
+
+        # Two years of history, so half of it falls outside the series
+        now = timezone.now()
+        bookings = []
+        for _ in range(count):
+            begins = now - timedelta(minutes=rng.randrange(2 * 365 * 24 * 60))
+            bookings.append(Booking(
+                user=customer, provider=provider, service=service,
+                requested_datetime=begins, duration_minutes=60,
+                end_datetime=booking_end(begins, 60),
+                status=rng.choice(['pending', 'confirmed', 'completed', 'completed', 'cancelled']),
+            ))
+        Booking.objects.bulk_create(bookings, batch_size=2000)
+        if connection.vendor == 'sqlite':
+            connection.cursor().execute('ANALYZE')
+        self.stdout.write(f'Seeded {count} bookings for one provider.')
+        return provider
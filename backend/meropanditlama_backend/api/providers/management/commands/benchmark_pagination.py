@@ -0,0 +1,142 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.accounts.models import User
+from api.bookings.conflicts import booking_end
+from api.bookings.models import Booking
+from api.pagination import KeysetPagination
+from api.providers.models import ServiceProvider
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark page-number (COUNT + OFFSET) against keyset pagination deep '
+        'into large provider and booking lists. Runs inside a transaction '
+        'that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--page', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.factory = APIRequestFactory()
+        with transaction.atomic():
+            customer = self._seed(rng, options['rows'])
+            if connection.vendor == 'sqlite':
+                connection.cursor().execute('ANALYZE')
+
+            providers = ServiceProvider.objects.filter(verified=True).select_related('user', 'stats')
+            for label, ordering in [
+                ('providers -verified,-created_at', ['-verified', '-created_at']),
+                ('providers experience_years', ['experience_years']),
+                ('providers -price_per_service', ['-price_per_service']),
+            ]:
+                self._compare(label, providers.order_by(*ordering), options)
+
+            bookings = Booking.objects.filter(user=customer).select_related(
+                'user', 'provider__user', 'service'
+            )
+            self._compare('bookings -created_at', bookings, options)
+            transaction.set_rollback(True)
+
+    def _seed(self, rng, rows):
+        now = timezone.now()
+        users = [
+            User(
+                username=f'bench-page-{i}', email=f'bench-page-{i}@example.invalid',
+                role='provider', password='!'
+            )
+            for i in range(rows)
+        ]
+        User.objects.bulk_create(users, batch_size=2000)
+        users = list(User.objects.filter(username__startswith='bench-page-').order_by('id'))
+
+        providers = ServiceProvider.objects.bulk_create([
+            ServiceProvider(
+                user=user, religion_type=rng.choice(['hindu', 'buddhist']),
+                experience_years=rng.randrange(40), location='Kathmandu',
+                short_description='Benchmark provider',
+                price_per_service=rng.choice([500, 1000, 1500, 2000, 3000, 5000]),
+                verified=rng.random() < 0.9,
+            )
+            for user in users
+        ], batch_size=2000)
+        # auto_now_add stamps every row alike; spread sign-ups over two years
+        providers = list(ServiceProvider.objects.filter(user__in=users).only('id'))
+        for provider in providers:
+            provider.created_at = now - timedelta(seconds=rng.randrange(2 * 365 * 86400))
+        ServiceProvider.objects.bulk_update(providers, ['created_at'], batch_size=2000)
+
+        customer = users[0]
+        bookings = []
+        for i in range(rows):
+            begins = now + timedelta(days=1, minutes=30 * i)
+            bookings.append(Booking(
+                user=customer, provider=providers[i % len(providers)],
+                requested_datetime=begins, duration_minutes=30,
+                end_datetime=booking_end(begins, 30), status='completed',
+            ))
+        bookings = Booking.objects.bulk_create(bookings, batch_size=2000)
+        for booking in bookings:
+            booking.created_at = now - timedelta(seconds=rng.randrange(2 * 365 * 86400))
+        Booking.objects.bulk_update(bookings, ['created_at'], batch_size=2000)
+
+        self.stdout.write(f'Seeded {len(providers)} providers and {len(bookings)} bookings.')
+        return customer
+
+    def _time(self, run, repeat):
+        samples = []
+        for _ in range(repeat):
+            began = time.perf_counter()
+            run()
+            samples.append((time.perf_counter() - began) * 1000)
+        return statistics.median(samples)
+
+    def _compare(self, label, queryset, options):
+        page, repeat = options['page'], options['repeat']
+
+        keyset = KeysetPagination()
+        keyset.ordering = keyset.get_ordering(queryset)
+        keyset.base_url = 'http://testserver/'
+        # Same total order (with the id tie-break) for both paginators
+        ordered = queryset.order_by(*(
+            ('-' if descending else '') + name for name, descending in keyset.ordering
+        ))
+
+        def page_number():
+            request = Request(self.factory.get('/', {'page': page}))
+            return PageNumberPagination().paginate_queryset(ordered, request)
+
+        # Cursor for the requested page: position of the last row before it
+        offset = (page - 1) * keyset.page_size
+        cursor_url = keyset.encode_cursor(keyset.position_of(ordered[offset - 1]), reverse=False)
+
+        def keyset_page():
+            request = Request(self.factory.get(cursor_url))
+            return KeysetPagination().paginate_queryset(queryset, request)
+
+        if [obj.pk for obj in page_number()] != [obj.pk for obj in keyset_page()]:
+            raise CommandError(f'{label}: keyset page {page} differs from page-number page {page}')
+
+        offset_ms = self._time(page_number, repeat)
+        keyset_ms = self._time(keyset_page, repeat)
+        self.stdout.write(
+            f'{label:>33}: page {page} offset {offset_ms:8.1f} ms, '
+            f'keyset {keyset_ms:6.1f} ms ({offset_ms / keyset_ms:5.1f}x)'
+        )
+        if options['verbosity'] > 1:
+            position = keyset.position_of(ordered[offset - 1])
+            self.stdout.write(ordered.filter(keyset.seek(ordered, position, False))[:keyset.page_size].explain())
@@ -0,0 +1,151 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.accounts.models import User
+from api.bookings.conflicts import booking_end
+from api.bookings.models import Booking
+from api.bookings.serializers import BookingListSerializer, booking_list_projection
+from api.providers.filters import ProviderNearFilter
+from api.providers.geo import geohash_encode
+from api.providers.models import ProviderStats, Service, ServiceProvider
+from api.providers.serializers import ServiceProviderListSerializer, provider_list_projection
+
+
+class Command(BaseCommand):
+    help = (
+        'Check that the .values() projections of the provider and booking '
+        'lists render byte-identical JSON to their serializers, and compare '
+        'throughput. Runs inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        rows = options['rows']
+        request = Request(APIRequestFactory().get('/api/providers/', {'near': '27.7172,85.3240', 'radius_km': 50}))
+        renderer = JSONRenderer()
+
+        with transaction.atomic():
+            customer = self._seed(rng, rows)
+            providers = ServiceProvider.objects.filter(
+                user__username__startswith='bench-projection-'
+            ).select_related('user', 'stats').prefetch_related('services')
+            near = ProviderNearFilter().filter_queryset(request, providers, None)
+            bookings = Booking.objects.filter(user=customer).select_related(
+                'user', 'provider__user', 'service'
+            )
+
+            cases = [
+                # (label, queryset, serializer, projection, serializer context / request)
+                ('providers', providers, ServiceProviderListSerializer, provider_list_projection, request),
+                ('providers ?near=', near, ServiceProviderListSerializer, provider_list_projection, request),
+                ('bookings', bookings, BookingListSerializer, booking_list_projection, None),
+            ]
+            for label, queryset, serializer_class, projection, context_request in cases:
+                context = {'request': context_request} if context_request else {}
+
+                def serialized():
+                    return renderer.render(serializer_class(queryset[:rows], many=True, context=context).data)
+
+                def projected():
+                    return renderer.render(projection.represent(projection.values(queryset)[:rows], context_request))
+
+                expected, actual = serialized(), projected()
+                if expected != actual:
+                    raise CommandError(f'{label}: projection output differs from {serializer_class.__name__}')
+
+                serializer_ms = self._time(serialized, options['repeat'])
+                projection_ms = self._time(projected, options['repeat'])
+                self.stdout.write(
+                    f'{label:>17}: {len(expected):>8} bytes identical; serializer '
+                    f'{serializer_ms:7.1f} ms, projection {projection_ms:6.1f} ms '
+                    f'({serializer_ms / projection_ms:4.1f}x, '
+                    f'{rows / projection_ms * 1000:,.0f} rows/s)'
+                )
+            transaction.set_rollback(True)
+
+    def _time(self, run, repeat):
+        samples = []
+        for _ in range(repeat):
+            began = time.perf_counter()
+            run()
+            samples.append((time.perf_counter() - began) * 1000)
+        return statistics.median(samples)
+
+    def _seed(self, rng, rows):
+        services = [
+            Service.objects.create(name=f'Benchmark puja {i}', name_ne='पूजा', default_price=1000 + i)
+            for i in range(5)
+        ]
+        users = User.objects.bulk_create([
+            User(
+                username=f'bench-projection-{i}', email=f'bench-projection-{i}@example.invalid',
+                # Some without a name, so get_full_name falls back to the email
+                first_name='' if i % 7 == 0 else f'Pandit{i}', last_name='' if i % 7 == 0 else 'Sharma',
+                profile_photo=f'profiles/bench-{i}.jpg' if i % 3 == 0 else '',
+                role='provider', password='!'
+            )
+            for i in range(rows)
+        ], batch_size=2000)
+        users = list(User.objects.filter(username__startswith='bench-projection-').order_by('id'))
+
+        points = [(27.7172 + rng.uniform(-0.3, 0.3), 85.3240 + rng.uniform(-0.3, 0.3)) for _ in users]
+        ServiceProvider.objects.bulk_create([
+            ServiceProvider(
+                user=user, religion_type=rng.choice(['hindu', 'buddhist']),
+                experience_years=rng.randrange(40), location='Kathmandu',
+                # bulk_create skips save(), which derives the geohash used by ?near=
+                latitude=latitude, longitude=longitude, geohash=geohash_encode(latitude, longitude),
+                short_description='Benchmark provider', short_description_ne='पण्डित',
+                price_per_service=rng.choice(['500', '1250.50', '3000']), verified=True,
+            )
+            for user, (latitude, longitude) in zip(users, points)
+        ], batch_size=2000)
+        providers = list(ServiceProvider.objects.filter(user__in=users).order_by('id'))
+        through = ServiceProvider.services.through
+        through.objects.bulk_create([
+            through(serviceprovider=provider, service=service)
+            for provider in providers
+            for service in rng.sample(services, rng.randrange(1, 4))
+        ], batch_size=2000)
+        # Most providers have stats, some have none yet
+        ProviderStats.objects.filter(provider__in=providers).delete()
+        ProviderStats.objects.bulk_create([
+            ProviderStats(
+                provider=provider, rating_sum=(reviews := rng.randrange(20)) * rng.randrange(1, 6),
+                review_count=reviews, completed_bookings=rng.randrange(100),
+            )
+            for provider in providers if rng.random() < 0.9
+        ], batch_size=2000)
+
+        customer = User(username='bench-projection-customer', email='bench-projection-customer@example.invalid', role='user')
+        customer.set_unusable_password()
+        customer.save()
+        now = timezone.now()
+        Booking.objects.bulk_create([
+            Booking(
+                user=customer, provider=rng.choice(providers),
+                # Some whose service has since been deleted
+                service=None if i % 10 == 0 else rng.choice(services),
+                requested_datetime=(begins := now + timedelta(days=1, minutes=30 * i)),
+                duration_minutes=30, end_datetime=booking_end(begins, 30),
+                status=rng.choice(['pending', 'confirmed', 'completed', 'cancelled']),
+            )
+            for i in range(rows)
+        ], batch_size=2000)
+
+        self.stdout.write(f'Seeded {rows} providers and {rows} bookings.')
+        return customer
@@ -0,0 +1,94 @@
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.dbrouter import REPLICAS, STICKY_SECONDS, unpin
+from api.loadbench import Dataset
+from api.providers.catalog_cache import get_last_modified
+
+
+class Command(BaseCommand):
+    help = (
+        'Request catalog and booking routes against the synthetic dataset (see '
+        'generate_synthetic_data) and fail unless catalog reads go to a '
+        'replica, bookings stay on the primary, and a user\'s reads stay on '
+        'the primary after a write request. Needs DATABASE_REPLICAS; makes no '
+        'writes.'
+    )
+
+    def handle(self, *args, **options):
+        if not REPLICAS:
+            raise CommandError('No DATABASE_REPLICAS configured')
+        try:
+            dataset = Dataset(customers=1)
+        except ValueError as e:
+            raise CommandError(str(e))
+        customer = dataset.customers[0]
+        provider_id = dataset.providers[0][0]
+        token = str(AccessToken.for_user(customer))
+        client = Client(raise_request_exception=False)
+
+        # Cache fills right after a catalog change read the primary on purpose
+        wait = get_last_modified() + STICKY_SECONDS + 1 - time.time()
+        if wait > 0:
+            self.stdout.write(f'Waiting {wait:.0f}s for the last catalog change to age out...')
+            time.sleep(wait)
+        unpin(customer.pk)
+
+        failures = []
+        self.stdout.write(f'{"request":<56} {"status":>6} {"primary":>7} {"replica":>7}')
+
+        def check(label, method, path, user_token, replica, data=None):
+            """Request path; replica says whether its data must come from a replica"""
+            queries = {}
+
+            def record(alias):
+                def wrapper(execute, sql, params, many, context):
+                    queries[alias] = queries.get(alias, 0) + 1
+                    return execute(sql, params, many, context)
+                return wrapper
+
+            extra = {'HTTP_AUTHORIZATION': f'Bearer {user_token}'} if user_token else {}
+            if method == 'get':
+                # A query string of its own, so the catalog cache misses
+                path = f'{path}{"&" if "?" in path else "?"}_routing={time.monotonic_ns()}'
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record(connection.alias)))
+                response = client.generic(method.upper(), path, data or '', content_type='application/json', **extra)
+            primary = queries.pop(DEFAULT_DB_ALIAS, 0)
+            replicas = sum(queries.values())
+            self.stdout.write(f'{label[:56]:<56} {response.status_code:>6} {primary:>7} {replicas:>7}')
+            if method == 'get' and response.status_code != 200:
+                failures.append(f'{label} returned {response.status_code}')
+            elif replica and not replicas:
+                failures.append(f'{label} read nothing from a replica')
+            elif not replica and replicas:
+                failures.append(f'{label} read {replicas} queries from a replica')
+
+        check('GET /api/services/', 'get', '/api/services/', None, True)
+        check('GET /api/providers/', 'get', '/api/providers/', None, True)
+        check('GET /api/providers/{id}/ (authenticated)', 'get', f'/api/providers/{provider_id}/', token, True)
+        check('GET /api/providers/{id}/reviews/', 'get', f'/api/providers/{provider_id}/reviews/', None, True)
+        check(
+            'GET /api/providers/{id}/availability/', 'get',
+            f'/api/providers/{provider_id}/availability/?date_from={dataset.today}&date_to={dataset.today}',
+            None, True
+        )
+        check('GET /api/bookings/', 'get', '/api/bookings/', token, False)
+        # Invalid, so nothing is written, but a write request all the same
+        check('POST /api/bookings/ (rejected)', 'post', '/api/bookings/', token, False, data='{}')
+        check('GET /api/providers/ after the write', 'get', '/api/providers/', token, False)
+        check('GET /api/providers/ anonymously meanwhile', 'get', '/api/providers/', None, True)
+        unpin(customer.pk)
+        check('GET /api/providers/ once the window ends', 'get', '/api/providers/', token, True)
+
+        if failures:
+            for failure in failures:
+                self.stderr.write(failure)
+            raise CommandError(f'{len(failures)} routing check(s) failed')
+        self.stdout.write(self.style.SUCCESS(f'Database routing works with {len(REPLICAS)} replica(s).'))
@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from django.utils import timezone
+
+from api.providers.models import AvailabilityRule
+from api.providers.recurring import HORIZON_DAYS, materialize
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate availability slots from recurring rules up to the rolling '
+        'horizon. Run daily (e.g. from cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=HORIZON_DAYS,
+            help=f'Days ahead to generate slots for (default {HORIZON_DAYS})'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Rules expanded per transaction (default 200)'
+        )
+
+    def handle(self, *args, **options):
+        until = timezone.localdate() + timedelta(days=options['days'])
+        behind = AvailabilityRule.objects.filter(is_active=True).filter(
+            Q(materialized_until__isnull=True) | Q(materialized_until__lt=until)
+        ).exclude(
+            # Expired, or already expanded to their last day
+            Q(valid_until__lt=timezone.localdate()) | Q(valid_until__lte=F('materialized_until'))
+        ).order_by('id')
+
+        rules_done = created = skipped = 0
+        last_id = 0
+        while True:
+            batch = list(behind.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            batch_created, batch_skipped = materialize(batch, until)
+            rules_done += len(batch)
+            created += batch_created
+            skipped += batch_skipped
+            last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Extended {rules_done} rule(s) to {until}: '
+            f'{created} slot(s) created, {skipped} already existed.'
+        ))
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.providers.catalog_import import ImportFailed, import_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        'Import services, providers (with their user accounts) and '
+        'provider-service links from CSV or JSON files. Rows are matched on '
+        'service name and user email; re-importing the same files changes nothing.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--services', help='Services file: name, name_ne, description, description_ne, default_price')
+        parser.add_argument('--providers', help=(
+            'Providers file: email, first_name, last_name, phone, religion_type, experience_years, '
+            'location, latitude, longitude, short_description, short_description_ne, '
+            'price_per_service, verified'
+        ))
+        parser.add_argument('--links', help='Provider-service links file: email, service (name)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and report, then roll back')
+
+    def handle(self, *args, **options):
+        if not any(options[name] for name in ('services', 'providers', 'links')):
+            raise CommandError('Give at least one of --services, --providers, --links')
+
+        def progress(label, done, total):
+            self.stdout.write(f'{label}: {done}/{total}')
+
+        began = time.perf_counter()
+        try:
+            report = import_catalog(
+                services=options['services'], providers=options['providers'], links=options['links'],
+                dry_run=options['dry_run'], progress=progress if options['verbosity'] else None,
+            )
+        except ImportFailed as e:
+            for error in e.errors:
+                self.stderr.write(error)
+            raise CommandError(f'Import aborted with {len(e.errors)} error(s); nothing was written.')
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for label, (created, updated, unchanged) in report.items():
+            self.stdout.write(f'{label}: {created} created, {updated} updated, {unchanged} unchanged')
+        suffix = ' (dry run, rolled back)' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported in {time.perf_counter() - began:.1f}s{suffix}.'
+        ))
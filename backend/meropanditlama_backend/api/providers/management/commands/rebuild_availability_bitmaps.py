@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.providers.availability import parse_date
+from api.providers.bitmaps import rebuild_bitmaps
+from api.providers.recurring import HORIZON_DAYS
+
+
+class Command(BaseCommand):
+    help = 'Recompute provider availability bitmaps from slots and bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='First date (YYYY-MM-DD, default today)')
+        parser.add_argument(
+            '--to', dest='date_to',
+            help=f'Last date (YYYY-MM-DD, default {HORIZON_DAYS} days ahead)'
+        )
+        parser.add_argument(
+            '--provider', type=int, action='append', dest='provider_ids',
+            help='Only rebuild the given provider id (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        try:
+            date_from = parse_date(options['date_from']) if options['date_from'] else today
+            date_to = (
+                parse_date(options['date_to']) if options['date_to']
+                else today + timedelta(days=HORIZON_DAYS)
+            )
+        except ValueError:
+            raise CommandError('Invalid date format. Use YYYY-MM-DD')
+        if date_to < date_from:
+            raise CommandError('--to must not be before --from')
+
+        days = rebuild_bitmaps(date_from, date_to, options['provider_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {days} provider-day bitmap(s) from {date_from} to {date_to}.'
+        ))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from api.providers.stats import find_stats_drift, rebuild_provider_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild denormalized provider stats from scratch and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--provider', type=int, action='append', dest='provider_ids',
+            help='Only rebuild the given provider id (repeatable)'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report drift without writing anything'
+        )
+
+    def handle(self, *args, **options):
+        provider_ids = options['provider_ids']
+
+        if options['dry_run']:
+            computed, drift = find_stats_drift(provider_ids)
+        else:
+            drift = rebuild_provider_stats(provider_ids)
+            computed = None
+
+        for provider_id, diff in drift:
+            changes = ', '.join(
+                f'{field}: {stored} -> {expected}'
+                for field, (stored, expected) in sorted(diff.items())
+            )
+            self.stdout.write(f'Provider #{provider_id}: {changes}')
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Provider stats are in sync.'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f'{len(drift)} of {len(computed)} provider(s) have drifted stats (dry run, nothing written).'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt stats for {len(drift)} provider(s).'
+            ))
@@ -0,0 +1,53 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from api.dbrouter import REPLICAS
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the SQLite primary database to the SQLite files of '
+        'DATABASE_REPLICAS, once or every --interval seconds, to stand in for '
+        'replication when trying read replicas locally. The interval is the '
+        'replicas\' lag.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Copy once and exit instead of repeating')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between copies (default 1)')
+
+    def handle(self, *args, **options):
+        if not REPLICAS:
+            raise CommandError('No DATABASE_REPLICAS configured')
+        databases = [DEFAULT_DB_ALIAS, *REPLICAS]
+        engines = {connections[alias].vendor for alias in databases}
+        if engines != {'sqlite'}:
+            raise CommandError('sync_sqlite_replicas only copies SQLite databases')
+        primary = connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+
+        try:
+            while True:
+                began = time.perf_counter()
+                source = sqlite3.connect(primary)
+                try:
+                    for alias in REPLICAS:
+                        target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+                        try:
+                            # Online backup: a consistent snapshot, even while the primary is written
+                            source.backup(target)
+                        finally:
+                            target.close()
+                finally:
+                    source.close()
+                if options['once']:
+                    elapsed = (time.perf_counter() - began) * 1000
+                    self.stdout.write(self.style.SUCCESS(
+                        f'Copied {primary} to {len(REPLICAS)} replica(s) in {elapsed:.0f} ms.'
+                    ))
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+STATUS_FIELDS = {
+    'pending': 'pending_bookings',
+    'confirmed': 'confirmed_bookings',
+    'completed': 'completed_bookings',
+    'cancelled': 'cancelled_bookings',
+}
+
+
+def backfill_provider_stats(apps, schema_editor):
+    ServiceProvider = apps.get_model('providers', 'ServiceProvider')
+    ProviderStats = apps.get_model('providers', 'ProviderStats')
+    Review = apps.get_model('providers', 'Review')
+    Booking = apps.get_model('bookings', 'Booking')
+
+    stats = {
+        pk: ProviderStats(provider_id=pk)
+        for pk in ServiceProvider.objects.values_list('id', flat=True)
+    }
+    rows = Booking.objects.order_by().values('provider_id', 'status').annotate(n=models.Count('id'))
+    for row in rows:
+        if row['provider_id'] in stats and row['status'] in STATUS_FIELDS:
+            setattr(stats[row['provider_id']], STATUS_FIELDS[row['status']], row['n'])
+    rows = Review.objects.order_by().values('provider_id').annotate(
+        total=models.Sum('rating'), n=models.Count('id')
+    )
+    for row in rows:
+        if row['provider_id'] in stats:
+            stats[row['provider_id']].rating_sum = row['total'] or 0
+            stats[row['provider_id']].review_count = row['n']
+
+    ProviderStats.objects.bulk_create(stats.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0001_initial'),
+        ('bookings', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderStats',
+            fields=[
+                ('provider', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='providers.serviceprovider')),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('pending_bookings', models.PositiveIntegerField(default=0)),
+                ('confirmed_bookings', models.PositiveIntegerField(default=0)),
+                ('completed_bookings', models.PositiveIntegerField(default=0)),
+                ('cancelled_bookings', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Provider Stats',
+                'verbose_name_plural': 'Provider Stats',
+                'db_table': 'provider_stats',
+            },
+        ),
+        migrations.RunPython(backfill_provider_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:45
+
+from django.db import migrations
+
+
+SQLITE_CREATE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS provider_search USING fts5(
+    name, location, description, description_ne, services, services_ne,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+SQLITE_POPULATE = """
+INSERT INTO provider_search (rowid, name, location, description, description_ne, services, services_ne)
+SELECT
+    sp.id,
+    TRIM(u.first_name || ' ' || u.last_name),
+    sp.location,
+    sp.short_description,
+    sp.short_description_ne,
+    COALESCE((
+        SELECT group_concat(s.name, ' ') FROM service_providers_services l
+        JOIN services s ON s.id = l.service_id WHERE l.serviceprovider_id = sp.id
+    ), ''),
+    COALESCE((
+        SELECT group_concat(s.name_ne, ' ') FROM service_providers_services l
+        JOIN services s ON s.id = l.service_id WHERE l.serviceprovider_id = sp.id
+    ), '')
+FROM service_providers sp
+JOIN users u ON u.id = sp.user_id
+"""
+
+POSTGRES_CREATE = """
+CREATE TABLE IF NOT EXISTS provider_search (
+    provider_id bigint PRIMARY KEY REFERENCES service_providers (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+    document tsvector NOT NULL
+);
+CREATE INDEX IF NOT EXISTS provider_search_document_idx ON provider_search USING GIN (document);
+"""
+
+POSTGRES_POPULATE = """
+INSERT INTO provider_search (provider_id, document)
+SELECT
+    sp.id,
+    setweight(to_tsvector('simple', TRIM(u.first_name || ' ' || u.last_name)), 'A') ||
+    setweight(to_tsvector('simple', COALESCE(svc.names, '')), 'B') ||
+    setweight(to_tsvector('simple', COALESCE(svc.names_ne, '')), 'B') ||
+    setweight(to_tsvector('simple', sp.location), 'C') ||
+    setweight(to_tsvector('simple', sp.short_description), 'D') ||
+    setweight(to_tsvector('simple', sp.short_description_ne), 'D')
+FROM service_providers sp
+JOIN users u ON u.id = sp.user_id
+LEFT JOIN (
+    SELECT l.serviceprovider_id,
+           string_agg(s.name, ' ') AS names,
+           string_agg(s.name_ne, ' ') AS names_ne
+    FROM service_providers_services l
+    JOIN services s ON s.id = l.service_id
+    GROUP BY l.serviceprovider_id
+) svc ON svc.serviceprovider_id = sp.id
+"""
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = [SQLITE_CREATE, SQLITE_POPULATE]
+    elif vendor == 'postgresql':
+        statements = [POSTGRES_CREATE, POSTGRES_POPULATE]
+    else:
+        return  # ORMSearchBackend needs no index
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE IF EXISTS provider_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0002_provider_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
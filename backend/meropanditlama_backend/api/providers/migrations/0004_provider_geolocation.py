@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+from api.providers.geo import geocode, geohash_encode
+
+
+def geocode_providers(apps, schema_editor):
+    ServiceProvider = apps.get_model('providers', 'ServiceProvider')
+    providers = []
+    for provider in ServiceProvider.objects.filter(latitude__isnull=True).only('id', 'location'):
+        point = geocode(provider.location)
+        if point:
+            provider.latitude, provider.longitude = point
+            provider.geohash = geohash_encode(*point)
+            providers.append(provider)
+    ServiceProvider.objects.bulk_update(providers, ['latitude', 'longitude', 'geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0003_provider_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serviceprovider',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Spatial index key derived from latitude/longitude', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='serviceprovider',
+            name='latitude',
+            field=models.FloatField(blank=True, help_text='Geocoded from location if left empty', null=True),
+        ),
+        migrations.AddField(
+            model_name='serviceprovider',
+            name='longitude',
+            field=models.FloatField(blank=True, help_text='Geocoded from location if left empty', null=True),
+        ),
+        migrations.RunPython(geocode_providers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0004_provider_geolocation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='availabilityslot',
+            index=models.Index(fields=['is_booked', 'date', 'start_time', 'end_time', 'provider'], name='slots_free_date_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0005_availability_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='serviceprovider',
+            index=models.Index(fields=['verified', 'created_at', 'id'], name='providers_browse_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='serviceprovider',
+            index=models.Index(condition=models.Q(('verified', True)), fields=['experience_years', 'id'], name='providers_experience_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='serviceprovider',
+            index=models.Index(condition=models.Q(('verified', True)), fields=['price_per_service', 'id'], name='providers_price_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0006_provider_browse_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekdays', models.JSONField(default=list, help_text='Days of the week, Monday=0 to Sunday=6')),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('slot_minutes', models.PositiveIntegerField(blank=True, help_text='Split the window into slots of this length; empty for one slot', null=True)),
+                ('valid_from', models.DateField()),
+                ('valid_until', models.DateField(blank=True, null=True)),
+                ('notes', models.CharField(blank=True, max_length=200)),
+                ('is_active', models.BooleanField(default=True)),
+                ('materialized_until', models.DateField(blank=True, editable=False, help_text='Last date slots have been generated for', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_rules', to='providers.serviceprovider')),
+            ],
+            options={
+                'verbose_name': 'Availability Rule',
+                'verbose_name_plural': 'Availability Rules',
+                'db_table': 'availability_rules',
+                'ordering': ['provider', 'start_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AvailabilityException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField(blank=True, help_text='Leave both times empty to block the whole day', null=True)),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('reason', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_exceptions', to='providers.serviceprovider')),
+            ],
+            options={
+                'verbose_name': 'Availability Exception',
+                'verbose_name_plural': 'Availability Exceptions',
+                'db_table': 'availability_exceptions',
+                'ordering': ['date', 'start_time'],
+            },
+        ),
+        migrations.AddField(
+            model_name='availabilityslot',
+            name='rule',
+            field=models.ForeignKey(blank=True, help_text='Recurring rule this slot was generated from', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='slots', to='providers.availabilityrule'),
+        ),
+        migrations.AddIndex(
+            model_name='availabilityrule',
+            index=models.Index(fields=['is_active', 'materialized_until'], name='rules_horizon_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='availabilityexception',
+            index=models.Index(fields=['provider', 'date'], name='exceptions_provider_date_idx'),
+        ),
+    ]
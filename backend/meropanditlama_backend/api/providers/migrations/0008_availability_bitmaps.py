@@ -0,0 +1,98 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:37
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def backfill_bitmaps(apps, schema_editor):
+    """Bitmaps from today on; same rules as providers.bitmaps.compute_days"""
+    AvailabilitySlot = apps.get_model('providers', 'AvailabilitySlot')
+    AvailabilityBitmap = apps.get_model('providers', 'AvailabilityBitmap')
+    Booking = apps.get_model('bookings', 'Booking')
+
+    def mask(first, last):
+        return ((1 << (last - first)) - 1) << first if last > first else 0
+
+    def minutes(value):
+        return value.hour * 60 + value.minute + bool(value.second or value.microsecond)
+
+    today = timezone.localdate()
+    offered, busy = defaultdict(int), defaultdict(int)
+    slots = AvailabilitySlot.objects.filter(date__gte=today).values_list(
+        'provider_id', 'date', 'start_time', 'end_time', 'is_booked'
+    )
+    for provider_id, day, start_time, end_time, is_booked in slots.iterator():
+        start = start_time.hour * 60 + start_time.minute
+        end = minutes(end_time)
+        if is_booked:
+            busy[provider_id, day] |= mask(start // 15, -(-end // 15))
+        else:
+            offered[provider_id, day] |= mask(-(-start // 15), end // 15)
+
+    midnight_today = datetime.combine(today, time.min, tzinfo=timezone.get_current_timezone())
+    bookings = Booking.objects.filter(
+        status__in=['pending', 'confirmed'], end_datetime__gt=midnight_today
+    ).values_list('provider_id', 'requested_datetime', 'end_datetime')
+    for provider_id, start, end in bookings.iterator():
+        start = timezone.localtime(start).replace(tzinfo=None)
+        end = timezone.localtime(end).replace(tzinfo=None)
+        day = start.date()
+        while datetime.combine(day, time.min) < end:
+            midnight = datetime.combine(day, time.min)
+            first = int((max(start, midnight) - midnight).total_seconds() // 60)
+            last = -int(-(min(end, midnight + timedelta(days=1)) - midnight).total_seconds() // 60)
+            if day >= today:
+                busy[provider_id, day] |= mask(first // 15, -(-last // 15))
+            day += timedelta(days=1)
+
+    rows = []
+    for key in set(offered) | set(busy):
+        free = offered[key] & ~busy[key]
+        words = {}
+        for n in range(3):
+            words[f'free_{n}'] = (free >> (32 * n)) & 0xFFFFFFFF
+            words[f'busy_{n}'] = (busy[key] >> (32 * n)) & 0xFFFFFFFF
+        rows.append(AvailabilityBitmap(provider_id=key[0], date=key[1], **words))
+    AvailabilityBitmap.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0007_recurring_availability'),
+        ('bookings', '0005_booking_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityBitmap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('free_0', models.BigIntegerField(default=0, help_text='Buckets 0-31 (00:00-08:00)')),
+                ('free_1', models.BigIntegerField(default=0, help_text='Buckets 32-63 (08:00-16:00)')),
+                ('free_2', models.BigIntegerField(default=0, help_text='Buckets 64-95 (16:00-24:00)')),
+                ('busy_0', models.BigIntegerField(default=0)),
+                ('busy_1', models.BigIntegerField(default=0)),
+                ('busy_2', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_bitmaps', to='providers.serviceprovider')),
+            ],
+            options={
+                'verbose_name': 'Availability Bitmap',
+                'verbose_name_plural': 'Availability Bitmaps',
+                'db_table': 'availability_bitmaps',
+                'ordering': ['date'],
+                'indexes': [models.Index(fields=['date', 'free_0', 'free_1', 'free_2', 'provider'], name='bitmaps_date_free_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='availabilitybitmap',
+            constraint=models.UniqueConstraint(fields=('provider', 'date'), name='bitmaps_provider_date_uniq'),
+        ),
+        migrations.RunPython(backfill_bitmaps, migrations.RunPython.noop),
+    ]
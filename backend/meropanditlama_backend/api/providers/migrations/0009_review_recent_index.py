@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0008_availability_bitmaps'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['provider', 'created_at'], name='reviews_provider_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:05
+
+from django.db import migrations
+
+
+# unicode61 treats combining marks (Unicode M*) as separators by default,
+# which splits Devanagari words at every vowel sign and virama
+SQLITE_CREATE = """
+CREATE VIRTUAL TABLE provider_search USING fts5(
+    name, location, description, description_ne, services, services_ne,
+    tokenize = "unicode61 remove_diacritics 2 categories 'L* N* Co M*'",
+    prefix = '2 3'
+)
+"""
+
+SQLITE_CREATE_OLD = """
+CREATE VIRTUAL TABLE provider_search USING fts5(
+    name, location, description, description_ne, services, services_ne,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+SQLITE_POPULATE = """
+INSERT INTO provider_search (rowid, name, location, description, description_ne, services, services_ne)
+SELECT
+    sp.id,
+    TRIM(u.first_name || ' ' || u.last_name),
+    sp.location,
+    sp.short_description,
+    sp.short_description_ne,
+    COALESCE((
+        SELECT group_concat(s.name, ' ') FROM service_providers_services l
+        JOIN services s ON s.id = l.service_id WHERE l.serviceprovider_id = sp.id
+    ), ''),
+    COALESCE((
+        SELECT group_concat(s.name_ne, ' ') FROM service_providers_services l
+        JOIN services s ON s.id = l.service_id WHERE l.serviceprovider_id = sp.id
+    ), '')
+FROM service_providers sp
+JOIN users u ON u.id = sp.user_id
+"""
+
+
+def rebuild_with(create):
+    def rebuild_search_index(apps, schema_editor):
+        # Only the SQLite index tokenizes with unicode61
+        if schema_editor.connection.vendor == 'sqlite':
+            for statement in ['DROP TABLE IF EXISTS provider_search', create, SQLITE_POPULATE]:
+                schema_editor.execute(statement)
+    return rebuild_search_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0009_review_recent_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_with(SQLITE_CREATE), rebuild_with(SQLITE_CREATE_OLD)),
+    ]
@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from api.accounts.models import User
+from .geo import geocode, geohash_encode
+from .stats import record_review_change
 
 class Service(models.Model):
     """Services offered by providers (Puja, Bartabanda, etc.)"""
@@ -27,6 +29,9 @@ class Service(models.Model):
     def __str__(self):
         return self.name
 
+# Fields kept consistent by ServiceProvider.save()
+GEO_FIELDS = {'location', 'latitude', 'longitude', 'geohash'}
+
 class ServiceProvider(models.Model):
     """Provider profile for Pandits and Lamas"""
     
@@ -55,6 +60,23 @@ class ServiceProvider(models.Model):
         db_index=True,
         help_text="Primary service location"
     )
+    latitude = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Geocoded from location if left empty"
+    )
+    longitude = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Geocoded from location if left empty"
+    )
+    geohash = models.CharField(
+        max_length=12,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text="Spatial index key derived from latitude/longitude"
+    )
     short_description = models.TextField(
         max_length=500,
         help_text="Brief description (English)"
@@ -87,26 +109,109 @@ class ServiceProvider(models.Model):
         ordering = ['-verified', '-created_at']
         verbose_name = 'Service Provider'
         verbose_name_plural = 'Service Providers'
+        indexes = [
+            # Keyset pagination of the browse orderings, id as tie-break
+            models.Index(fields=['verified', 'created_at', 'id'], name='providers_browse_idx'),
+            # Browsing always filters on verified; partial indexes keep the
+            # `?ordering=` columns seekable
+            models.Index(
+                fields=['experience_years', 'id'], name='providers_experience_idx',
+                condition=models.Q(verified=True)
+            ),
+            models.Index(
+                fields=['price_per_service', 'id'], name='providers_price_idx',
+                condition=models.Q(verified=True)
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.get_religion_type_display()}"
     
+    def save(self, *args, **kwargs):
+        if self.latitude is None or self.longitude is None:
+            point = geocode(self.location)
+            if point:
+                self.latitude, self.longitude = point
+        self.geohash = (
+            geohash_encode(self.latitude, self.longitude)
+            if self.latitude is not None and self.longitude is not None
+            else ''
+        )
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and GEO_FIELDS & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | GEO_FIELDS
+        super().save(*args, **kwargs)
+    
+    @property
+    def provider_stats(self):
+        """Denormalized stats row (unsaved empty row if not built yet)"""
+        try:
+            return self.stats
+        except ProviderStats.DoesNotExist:
+            return ProviderStats(provider=self)
+    
     @property
     def average_rating(self):
-        """Calculate average rating from reviews"""
-        from django.db.models import Avg
-        avg = self.reviews.aggregate(Avg('rating'))['rating__avg']
-        return round(avg, 1) if avg else None
+        """Average rating from denormalized review stats"""
+        return self.provider_stats.average_rating
     
     @property
     def total_reviews(self):
         """Get total number of reviews"""
-        return self.reviews.count()
+        return self.provider_stats.review_count
     
     @property
     def total_bookings(self):
         """Get total completed bookings"""
-        return self.bookings.filter(status='completed').count()
+        return self.provider_stats.completed_bookings
+
+def rating_average(rating_sum, review_count):
+    """ProviderStats.average_rating from column values"""
+    if not review_count:
+        return None
+    return round(rating_sum / review_count, 1)
+
+class ProviderStats(models.Model):
+    """
+    Denormalized per-provider counters.
+    
+    Maintained incrementally by api.providers.stats whenever a Review or
+    Booking is written; rebuild with `manage.py rebuild_provider_stats`.
+    """
+    
+    provider = models.OneToOneField(
+        ServiceProvider,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    rating_sum = models.PositiveIntegerField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    pending_bookings = models.PositiveIntegerField(default=0)
+    confirmed_bookings = models.PositiveIntegerField(default=0)
+    completed_bookings = models.PositiveIntegerField(default=0)
+    cancelled_bookings = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'provider_stats'
+        verbose_name = 'Provider Stats'
+        verbose_name_plural = 'Provider Stats'
+    
+    def __str__(self):
+        return f"Stats for provider #{self.provider_id}"
+    
+    @property
+    def average_rating(self):
+        return rating_average(self.rating_sum, self.review_count)
+    
+    @property
+    def total_bookings(self):
+        """All bookings regardless of status"""
+        return (
+            self.pending_bookings + self.confirmed_bookings +
+            self.completed_bookings + self.cancelled_bookings
+        )
 
 class AvailabilitySlot(models.Model):
     """Provider availability time slots"""
@@ -125,24 +230,191 @@ class AvailabilitySlot(models.Model):
         help_text="Automatically set when booking confirmed"
     )
     notes = models.CharField(max_length=200, blank=True)
+    rule = models.ForeignKey(
+        'AvailabilityRule',
+        on_delete=models.SET_NULL,
+        related_name='slots',
+        null=True,
+        blank=True,
+        help_text="Recurring rule this slot was generated from"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         db_table = 'availability_slots'
         ordering = ['date', 'start_time']
         unique_together = [['provider', 'date', 'start_time']]
+        indexes = [
+            # Covers cross-provider "who is free" searches (equality first, then date range)
+            models.Index(
+                fields=['is_booked', 'date', 'start_time', 'end_time', 'provider'],
+                name='slots_free_date_idx'
+            ),
+        ]
         verbose_name = 'Availability Slot'
         verbose_name_plural = 'Availability Slots'
     
     def __str__(self):
         return f"{self.provider.user.get_full_name()} - {self.date} {self.start_time}-{self.end_time}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the original day so moving a slot refreshes both bitmaps
+        instance._loaded_day = (instance.__dict__.get('provider_id'), instance.__dict__.get('date'))
+        return instance
+    
     def clean(self):
         """Validate that end_time is after start_time"""
         from django.core.exceptions import ValidationError
         if self.end_time <= self.start_time:
             raise ValidationError('End time must be after start time')
 
+class AvailabilityBitmap(models.Model):
+    """
+    One provider's day in 15-minute buckets (bit 0 = 00:00-00:15), derived
+    from slots and bookings by providers.bitmaps. The 96 bits are stored
+    as three 32-bit words so queries can test them with bitwise AND.
+    """
+    
+    provider = models.ForeignKey(
+        ServiceProvider,
+        on_delete=models.CASCADE,
+        related_name='availability_bitmaps'
+    )
+    date = models.DateField()
+    # Buckets fully inside an unbooked slot and not taken by a booking
+    free_0 = models.BigIntegerField(default=0, help_text="Buckets 0-31 (00:00-08:00)")
+    free_1 = models.BigIntegerField(default=0, help_text="Buckets 32-63 (08:00-16:00)")
+    free_2 = models.BigIntegerField(default=0, help_text="Buckets 64-95 (16:00-24:00)")
+    # Buckets touched by an active booking or a booked slot
+    busy_0 = models.BigIntegerField(default=0)
+    busy_1 = models.BigIntegerField(default=0)
+    busy_2 = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'availability_bitmaps'
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'date'], name='bitmaps_provider_date_uniq'),
+        ]
+        indexes = [
+            # Covering index for "who is free" date-range scans
+            models.Index(
+                fields=['date', 'free_0', 'free_1', 'free_2', 'provider'],
+                name='bitmaps_date_free_idx'
+            ),
+        ]
+        verbose_name = 'Availability Bitmap'
+        verbose_name_plural = 'Availability Bitmaps'
+    
+    def __str__(self):
+        return f"{self.provider_id} - {self.date}"
+    
+    @property
+    def free(self):
+        return self.free_0 | self.free_1 << 32 | self.free_2 << 64
+    
+    @property
+    def busy(self):
+        return self.busy_0 | self.busy_1 << 32 | self.busy_2 << 64
+
+class AvailabilityRule(models.Model):
+    """Weekly availability pattern, expanded into AvailabilitySlot rows"""
+    
+    provider = models.ForeignKey(
+        ServiceProvider,
+        on_delete=models.CASCADE,
+        related_name='availability_rules'
+    )
+    weekdays = models.JSONField(
+        default=list,
+        help_text="Days of the week, Monday=0 to Sunday=6"
+    )
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Split the window into slots of this length; empty for one slot"
+    )
+    valid_from = models.DateField()
+    valid_until = models.DateField(null=True, blank=True)
+    notes = models.CharField(max_length=200, blank=True)
+    is_active = models.BooleanField(default=True)
+    materialized_until = models.DateField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Last date slots have been generated for"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'availability_rules'
+        ordering = ['provider', 'start_time']
+        indexes = [
+            models.Index(fields=['is_active', 'materialized_until'], name='rules_horizon_idx'),
+        ]
+        verbose_name = 'Availability Rule'
+        verbose_name_plural = 'Availability Rules'
+    
+    def __str__(self):
+        days = ','.join(str(day) for day in self.weekdays)
+        return f"{self.provider.user.get_full_name()} - [{days}] {self.start_time}-{self.end_time}"
+    
+    def clean(self):
+        """Validate the time window and date range"""
+        from django.core.exceptions import ValidationError
+        if self.end_time <= self.start_time:
+            raise ValidationError('End time must be after start time')
+        if self.valid_until and self.valid_until < self.valid_from:
+            raise ValidationError('Valid until must not be before valid from')
+
+class AvailabilityException(models.Model):
+    """Date (or part of a date) on which a provider's rules do not apply"""
+    
+    provider = models.ForeignKey(
+        ServiceProvider,
+        on_delete=models.CASCADE,
+        related_name='availability_exceptions'
+    )
+    date = models.DateField()
+    start_time = models.TimeField(
+        null=True,
+        blank=True,
+        help_text="Leave both times empty to block the whole day"
+    )
+    end_time = models.TimeField(null=True, blank=True)
+    reason = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'availability_exceptions'
+        ordering = ['date', 'start_time']
+        indexes = [
+            models.Index(fields=['provider', 'date'], name='exceptions_provider_date_idx'),
+        ]
+        verbose_name = 'Availability Exception'
+        verbose_name_plural = 'Availability Exceptions'
+    
+    def __str__(self):
+        if self.start_time is None:
+            return f"{self.provider.user.get_full_name()} - {self.date} (all day)"
+        return f"{self.provider.user.get_full_name()} - {self.date} {self.start_time}-{self.end_time}"
+    
+    @property
+    def is_all_day(self):
+        return self.start_time is None
+    
+    def blocks(self, start_time, end_time):
+        """True if a slot from start_time to end_time on this date overlaps the exception"""
+        if self.is_all_day:
+            return True
+        return start_time < self.end_time and end_time > self.start_time
+
 class Review(models.Model):
     """User reviews for providers"""
     
@@ -175,6 +447,45 @@ class Review(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Review'
         verbose_name_plural = 'Reviews'
+        indexes = [
+            # A provider's reviews, newest first (found by index_advisor)
+            models.Index(fields=['provider', 'created_at'], name='reviews_provider_recent_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.user.get_full_name()} -> {self.provider.user.get_full_name()} ({self.rating}★)"
\ No newline at end of file
+        return f"{self.user.get_full_name()} -> {self.provider.user.get_full_name()} ({self.rating}★)"
+    
+    # Fields whose saved values Review.save() compares against
+    TRACKED_FIELDS = ('rating', 'provider_id')
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_state()
+        return instance
+    
+    def _remember_state(self):
+        state = {name: self.__dict__.get(name) for name in self.TRACKED_FIELDS}
+        # Deferred fields are unknown; save() re-reads them
+        self._loaded_state = state if None not in state.values() else None
+    
+    def _saved_state(self):
+        """Field values as last loaded or saved, without a query when possible"""
+        state = getattr(self, '_loaded_state', None)
+        if state is None:
+            state = Review.objects.filter(pk=self.pk).values(*self.TRACKED_FIELDS).first()
+        return state
+    
+    def save(self, *args, **kwargs):
+        old = self._saved_state() if self.pk is not None else None
+        old_rating = old['rating'] if old else None
+        old_provider_id = old['provider_id'] if old else None
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if old_rating != self.rating or old_provider_id != self.provider_id:
+                record_review_change(
+                    self.provider_id, old_rating, self.rating,
+                    old_provider_id=old_provider_id
+                )
+        self._remember_state()
@@ -0,0 +1,188 @@
+"""
+Recurring availability.
+
+Providers describe their week with AvailabilityRule rows (e.g. Mon-Fri
+07:00-11:00 in 60 minute slots from 1 Baisakh) and block out days with
+AvailabilityException rows. Rules are expanded into ordinary
+AvailabilitySlot rows, so booking, search and the calendar keep working on
+slots alone.
+
+Slots are generated up to HORIZON_DAYS ahead. `manage.py
+extend_availability` moves the horizon forward every day; rule.
+materialized_until records how far each rule has been expanded, so a run
+only generates the new days.
+
+Expansion happens in memory, with each provider's exceptions fetched in
+one query, and the slots are written with one bulk_create per batch.
+Slots that already exist (same provider, date and start time, whether
+entered by hand or generated earlier) are skipped by the database via
+ON CONFLICT DO NOTHING rather than checked row by row.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .bitmaps import mark_days
+from .catalog_cache import bump_catalog_version
+from .models import AvailabilityException, AvailabilityRule, AvailabilitySlot
+
+# Days ahead of today that slots are generated for
+HORIZON_DAYS = getattr(settings, 'AVAILABILITY_HORIZON_DAYS', 90)
+INSERT_BATCH_SIZE = 1000
+
+
+def horizon(today=None):
+    return (today or timezone.localdate()) + timedelta(days=HORIZON_DAYS)
+
+
+def rule_times(rule):
+    """[(start_time, end_time)] of the slots the rule produces on one day"""
+    start = datetime.combine(date.min, rule.start_time)
+    end = datetime.combine(date.min, rule.end_time)
+    if not rule.slot_minutes:
+        return [(rule.start_time, rule.end_time)]
+    step = timedelta(minutes=rule.slot_minutes)
+    times = []
+    while start + step <= end:
+        times.append((start.time(), (start + step).time()))
+        start += step
+    return times
+
+
+def exceptions_by_day(provider_ids, date_from, date_to):
+    """{(provider_id, date): [AvailabilityException]} in one query"""
+    result = defaultdict(list)
+    exceptions = AvailabilityException.objects.filter(
+        provider_id__in=provider_ids, date__gte=date_from, date__lte=date_to
+    )
+    for exception in exceptions:
+        result[(exception.provider_id, exception.date)].append(exception)
+    return result
+
+
+def expand(rules, date_from, date_to):
+    """Unsaved AvailabilitySlot objects for the rules between two dates (inclusive)"""
+    rules = [rule for rule in rules if rule.is_active]
+    if not rules or date_from > date_to:
+        return []
+    exceptions = exceptions_by_day({rule.provider_id for rule in rules}, date_from, date_to)
+
+    slots = []
+    for rule in rules:
+        first = max(date_from, rule.valid_from)
+        last = min(date_to, rule.valid_until) if rule.valid_until else date_to
+        times = rule_times(rule)
+        weekdays = set(rule.weekdays)
+        day = first
+        while day <= last:
+            if day.weekday() in weekdays:
+                blocked = exceptions.get((rule.provider_id, day), ())
+                for start_time, end_time in times:
+                    if any(exception.blocks(start_time, end_time) for exception in blocked):
+                        continue
+                    slots.append(AvailabilitySlot(
+                        provider_id=rule.provider_id, rule=rule, date=day,
+                        start_time=start_time, end_time=end_time, notes=rule.notes,
+                    ))
+            day += timedelta(days=1)
+    return slots
+
+
+def insert_slots(slots):
+    """
+    Bulk insert slots, skipping any that clash with an existing
+    (provider, date, start_time). Returns the number actually created.
+    Call inside a transaction.
+    """
+    if not slots:
+        return 0
+    # ignore_conflicts does not report which rows went in; count around it
+    existing = AvailabilitySlot.objects.filter(
+        provider_id__in={slot.provider_id for slot in slots},
+        date__gte=min(slot.date for slot in slots),
+        date__lte=max(slot.date for slot in slots),
+    )
+    before = existing.count()
+    AvailabilitySlot.objects.bulk_create(slots, batch_size=INSERT_BATCH_SIZE, ignore_conflicts=True)
+    created = existing.count() - before
+    if created:
+        # bulk_create sends no post_save signals
+        bump_catalog_version()
+        mark_days({(slot.provider_id, slot.date) for slot in slots})
+    return created
+
+
+def materialize(rules, until=None):
+    """
+    Generate slots for the rules from where each left off up to `until`
+    (default: today + HORIZON_DAYS), in one transaction.
+
+    Returns (created, skipped): new slots, and slots that already existed.
+    """
+    today = timezone.localdate()
+    until = until or horizon(today)
+
+    slots, advanced = [], []
+    for rule in rules:
+        if not rule.is_active:
+            continue
+        date_from = today
+        if rule.materialized_until:
+            date_from = max(date_from, rule.materialized_until + timedelta(days=1))
+        date_to = min(until, rule.valid_until) if rule.valid_until else until
+        if date_from > date_to:
+            continue
+        slots.extend(expand([rule], date_from, date_to))
+        rule.materialized_until = date_to
+        advanced.append(rule)
+
+    with transaction.atomic():
+        created = insert_slots(slots)
+        AvailabilityRule.objects.bulk_update(advanced, ['materialized_until'])
+    return created, len(slots) - created
+
+
+def clear_future_slots(rule):
+    """Delete the rule's unbooked slots from today on; booked slots are kept"""
+    deleted, _ = AvailabilitySlot.objects.filter(
+        rule=rule, is_booked=False, date__gte=timezone.localdate()
+    ).delete()
+    return deleted
+
+
+def rematerialize(rule):
+    """Replace the rule's future unbooked slots after it was edited"""
+    with transaction.atomic():
+        removed = clear_future_slots(rule)
+        rule.materialized_until = None
+        created, skipped = materialize([rule])
+    return removed, created
+
+
+def apply_exception(exception):
+    """Remove unbooked generated slots the new exception blocks; returns the count"""
+    slots = AvailabilitySlot.objects.filter(
+        provider_id=exception.provider_id, date=exception.date,
+        rule__isnull=False, is_booked=False,
+    )
+    if not exception.is_all_day:
+        slots = slots.filter(start_time__lt=exception.end_time, end_time__gt=exception.start_time)
+    deleted, _ = slots.delete()
+    return deleted
+
+
+def lift_exception(exception):
+    """Delete an exception and regenerate the slots it was blocking; returns the count"""
+    with transaction.atomic():
+        provider_id, day = exception.provider_id, exception.date
+        exception.delete()
+        if day < timezone.localdate():
+            return 0
+        # Only days already inside a rule's horizon; later days come with the rolling job
+        rules = AvailabilityRule.objects.filter(
+            provider_id=provider_id, is_active=True, materialized_until__gte=day
+        )
+        return insert_slots(expand(rules, day, day))
@@ -0,0 +1,271 @@
+"""
+Pluggable full-text search for provider discovery.
+
+The index holds one document per provider built from the user's name,
+location, English/Nepali descriptions and the English/Nepali names of the
+services they offer. Backends return provider ids ordered by relevance:
+
+- SQLiteFTSBackend: FTS5 virtual table ranked with bm25() (default)
+- PostgresSearchBackend: weighted tsvector column with a GIN index
+- ORMSearchBackend: icontains fallback for any other database
+
+Select one explicitly with the PROVIDER_SEARCH_BACKEND setting (dotted
+path); otherwise it is picked from the default connection's vendor. The
+index is kept in sync by api.providers.signals and can be rebuilt with
+`manage.py rebuild_search_index`.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+SEARCH_TABLE = 'provider_search'
+
+# Upper bound on ids a single search returns to the view
+MAX_RESULTS = getattr(settings, 'PROVIDER_SEARCH_MAX_RESULTS', 1000)
+
+# \w alone splits Devanagari words at vowel signs (category Mc/Mn)
+_TOKEN_RE = re.compile(r'[\w\u0900-\u097f]+')
+
+
+def tokenize_query(query):
+    """Split user input into plain word tokens (drops FTS operators/quotes)"""
+    return _TOKEN_RE.findall(query or '')
+
+
+def build_documents(provider_ids=None):
+    """
+    Build index documents with three queries regardless of provider count.
+
+    Returns {provider_id: {'name', 'location', 'description',
+    'description_ne', 'services', 'services_ne'}}.
+    """
+    from .models import ServiceProvider
+
+    providers = ServiceProvider.objects.order_by()
+    if provider_ids is not None:
+        providers = providers.filter(id__in=provider_ids)
+
+    documents = {}
+    for row in providers.values(
+        'id', 'user__first_name', 'user__last_name', 'location',
+        'short_description', 'short_description_ne'
+    ):
+        documents[row['id']] = {
+            'name': f"{row['user__first_name']} {row['user__last_name']}".strip(),
+            'location': row['location'],
+            'description': row['short_description'],
+            'description_ne': row['short_description_ne'],
+            'services': [],
+            'services_ne': [],
+        }
+
+    links = ServiceProvider.services.through.objects.filter(
+        serviceprovider_id__in=list(documents)
+    ).values_list('serviceprovider_id', 'service__name', 'service__name_ne')
+    for provider_id, name, name_ne in links:
+        documents[provider_id]['services'].append(name)
+        if name_ne:
+            documents[provider_id]['services_ne'].append(name_ne)
+
+    for document in documents.values():
+        document['services'] = ' '.join(document['services'])
+        document['services_ne'] = ' '.join(document['services_ne'])
+    return documents
+
+
+class ORMSearchBackend:
+    """Unindexed icontains search; used where no native full-text exists"""
+
+    search_fields = [
+        'user__first_name', 'user__last_name', 'location',
+        'short_description', 'short_description_ne',
+        'services__name', 'services__name_ne',
+    ]
+
+    def index(self, provider_ids):
+        pass
+
+    def remove(self, provider_ids):
+        pass
+
+    def rebuild(self):
+        return 0
+
+    def search(self, query, limit=MAX_RESULTS):
+        from .models import ServiceProvider
+
+        terms = tokenize_query(query)
+        if not terms:
+            return []
+        queryset = ServiceProvider.objects.all()
+        for term in terms:
+            condition = Q()
+            for field in self.search_fields:
+                condition |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(condition)
+        return list(queryset.values_list('id', flat=True).distinct()[:limit])
+
+
+class SQLiteFTSBackend(ORMSearchBackend):
+    """SQLite FTS5 index; rowid is the provider id"""
+
+    columns = ['name', 'location', 'description', 'description_ne', 'services', 'services_ne']
+    # bm25() column weights, in `columns` order
+    weights = [10.0, 3.0, 1.0, 1.0, 5.0, 5.0]
+
+    def index(self, provider_ids):
+        provider_ids = list(provider_ids)
+        if not provider_ids:
+            return
+        documents = build_documents(provider_ids)
+        with transaction.atomic(), connection.cursor() as cursor:
+            self._delete(cursor, provider_ids)
+            self._insert(cursor, documents)
+
+    def remove(self, provider_ids):
+        provider_ids = list(provider_ids)
+        if provider_ids:
+            with connection.cursor() as cursor:
+                self._delete(cursor, provider_ids)
+
+    def rebuild(self):
+        documents = build_documents()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            self._insert(cursor, documents)
+        return len(documents)
+
+    def search(self, query, limit=MAX_RESULTS):
+        terms = tokenize_query(query)
+        if not terms:
+            return []
+        # Every term must match; prefix matching keeps search-as-you-type useful
+        match = ' AND '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+        weights = ', '.join(str(weight) for weight in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+                f'ORDER BY bm25({SEARCH_TABLE}, {weights}) LIMIT %s',
+                [match, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def _delete(self, cursor, provider_ids):
+        placeholders = ', '.join(['%s'] * len(provider_ids))
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})',
+            provider_ids
+        )
+
+    def _insert(self, cursor, documents):
+        if not documents:
+            return
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, {", ".join(self.columns)}) '
+            f'VALUES (%s, {", ".join(["%s"] * len(self.columns))})',
+            [
+                [provider_id] + [document[column] for column in self.columns]
+                for provider_id, document in documents.items()
+            ]
+        )
+
+
+class PostgresSearchBackend(ORMSearchBackend):
+    """
+    Weighted tsvector per provider with a GIN index.
+
+    Uses the 'simple' configuration: there is no Nepali stemmer, and the
+    same configuration must tokenize both languages consistently.
+    """
+
+    config = 'simple'
+    # setweight() label per document field
+    weights = {
+        'name': 'A',
+        'services': 'B',
+        'services_ne': 'B',
+        'location': 'C',
+        'description': 'D',
+        'description_ne': 'D',
+    }
+
+    def index(self, provider_ids):
+        provider_ids = list(provider_ids)
+        if not provider_ids:
+            return
+        documents = build_documents(provider_ids)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE provider_id = ANY(%s)',
+                [provider_ids]
+            )
+            self._insert(cursor, documents)
+
+    def remove(self, provider_ids):
+        provider_ids = list(provider_ids)
+        if provider_ids:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {SEARCH_TABLE} WHERE provider_id = ANY(%s)',
+                    [provider_ids]
+                )
+
+    def rebuild(self):
+        documents = build_documents()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {SEARCH_TABLE}')
+            self._insert(cursor, documents)
+        return len(documents)
+
+    def search(self, query, limit=MAX_RESULTS):
+        terms = tokenize_query(query)
+        if not terms:
+            return []
+        tsquery = ' & '.join(f"'{term}':*" for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT provider_id FROM {SEARCH_TABLE}, to_tsquery(%s, %s) query '
+                f'WHERE document @@ query '
+                f'ORDER BY ts_rank_cd(document, query) DESC, provider_id LIMIT %s',
+                [self.config, tsquery, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def _insert(self, cursor, documents):
+        if not documents:
+            return
+        vector = ' || '.join(
+            f"setweight(to_tsvector('{self.config}', %s), '{weight}')"
+            for weight in self.weights.values()
+        )
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (provider_id, document) VALUES (%s, {vector})',
+            [
+                [provider_id] + [document[field] for field in self.weights]
+                for provider_id, document in documents.items()
+            ]
+        )
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+_backend = None
+
+
+def get_search_backend():
+    """Return the configured (or vendor default) search backend instance"""
+    global _backend
+    if _backend is None:
+        backend_path = getattr(settings, 'PROVIDER_SEARCH_BACKEND', None)
+        if backend_path:
+            backend_class = import_string(backend_path)
+        else:
+            backend_class = VENDOR_BACKENDS.get(connection.vendor, ORMSearchBackend)
+        _backend = backend_class()
+    return _backend
@@ -1,6 +1,10 @@
 from rest_framework import serializers
-from .models import Service, ServiceProvider, AvailabilitySlot, Review
-from api.accounts.serializers import UserSerializer
+from .models import (
+    Service, ServiceProvider, AvailabilitySlot, AvailabilityRule,
+    AvailabilityException, Review, rating_average
+)
+from api.accounts.serializers import UserSerializer, user_projection
+from api.projection import Annotation, Computed, Nested, NestedMany, Projection
 
 class ServiceSerializer(serializers.ModelSerializer):
     """Service serializer with language support"""
@@ -17,16 +21,32 @@ class ServiceProviderListSerializer(serializers.ModelSerializer):
     average_rating = serializers.ReadOnlyField()
     total_reviews = serializers.ReadOnlyField()
     total_bookings = serializers.ReadOnlyField()
+    # Only present when the list is filtered with ?near=
+    distance_km = serializers.FloatField(read_only=True)
     
     class Meta:
         model = ServiceProvider
         fields = [
             'id', 'user', 'religion_type', 'experience_years',
-            'location', 'short_description', 'short_description_ne',
+            'location', 'latitude', 'longitude',
+            'short_description', 'short_description_ne',
             'price_per_service', 'services', 'verified',
-            'average_rating', 'total_reviews', 'total_bookings'
+            'average_rating', 'total_reviews', 'total_bookings',
+            'distance_km'
         ]
 
+# ServiceProviderListSerializer from .values() rows, for the list endpoints.
+# A provider without a stats row reads as zeros, like provider_stats.
+provider_list_projection = Projection(
+    ServiceProviderListSerializer,
+    user=Nested(user_projection),
+    services=NestedMany(Projection(ServiceSerializer)),
+    average_rating=Computed(['stats__rating_sum', 'stats__review_count'], rating_average),
+    total_reviews=Computed(['stats__review_count'], lambda count: count or 0),
+    total_bookings=Computed(['stats__completed_bookings'], lambda count: count or 0),
+    distance_km=Annotation(),
+)
+
 class ServiceProviderDetailSerializer(serializers.ModelSerializer):
     """Detailed provider serializer"""
     
@@ -40,7 +60,8 @@ class ServiceProviderDetailSerializer(serializers.ModelSerializer):
         model = ServiceProvider
         fields = [
             'id', 'user', 'religion_type', 'experience_years',
-            'location', 'short_description', 'short_description_ne',
+            'location', 'latitude', 'longitude',
+            'short_description', 'short_description_ne',
             'price_per_service', 'services', 'verified',
             'created_at', 'average_rating', 'total_reviews', 'total_bookings'
         ]
@@ -72,6 +93,73 @@ class AvailabilitySlotCreateSerializer(serializers.ModelSerializer):
         # Provider is set from request.user in the view
         return AvailabilitySlot.objects.create(**validated_data)
 
+class AvailabilityRuleSerializer(serializers.ModelSerializer):
+    """Recurring weekly availability rule"""
+    
+    weekdays = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=6),
+        allow_empty=False
+    )
+    slot_minutes = serializers.IntegerField(
+        min_value=15, max_value=720, required=False, allow_null=True
+    )
+    
+    class Meta:
+        model = AvailabilityRule
+        fields = [
+            'id', 'weekdays', 'start_time', 'end_time', 'slot_minutes',
+            'valid_from', 'valid_until', 'notes', 'is_active', 'materialized_until'
+        ]
+        read_only_fields = ['materialized_until']
+    
+    def validate_weekdays(self, value):
+        return sorted(set(value))
+    
+    def validate(self, attrs):
+        """Validate time window and date range"""
+        def current(name):
+            if name in attrs:
+                return attrs[name]
+            return getattr(self.instance, name, None)
+        
+        start_time, end_time = current('start_time'), current('end_time')
+        if end_time <= start_time:
+            raise serializers.ValidationError({
+                'end_time': 'End time must be after start time'
+            })
+        slot_minutes = current('slot_minutes')
+        window = (end_time.hour * 60 + end_time.minute) - (start_time.hour * 60 + start_time.minute)
+        if slot_minutes and slot_minutes > window:
+            raise serializers.ValidationError({
+                'slot_minutes': 'Slot length is longer than the time window'
+            })
+        valid_until = current('valid_until')
+        if valid_until and valid_until < current('valid_from'):
+            raise serializers.ValidationError({
+                'valid_until': 'Valid until must not be before valid from'
+            })
+        return attrs
+
+class AvailabilityExceptionSerializer(serializers.ModelSerializer):
+    """Day or part of a day excluded from recurring rules"""
+    
+    class Meta:
+        model = AvailabilityException
+        fields = ['id', 'date', 'start_time', 'end_time', 'reason']
+    
+    def validate(self, attrs):
+        """Both times or neither; end after start"""
+        start_time, end_time = attrs.get('start_time'), attrs.get('end_time')
+        if (start_time is None) != (end_time is None):
+            raise serializers.ValidationError(
+                'Give both start_time and end_time, or neither to block the whole day'
+            )
+        if start_time is not None and end_time <= start_time:
+            raise serializers.ValidationError({
+                'end_time': 'End time must be after start time'
+            })
+        return attrs
+
 class ReviewSerializer(serializers.ModelSerializer):
     """Review serializer"""
     
@@ -94,6 +182,18 @@ class ProviderProfileUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = ServiceProvider
         fields = [
-            'experience_years', 'location', 'short_description',
-            'short_description_ne', 'price_per_service', 'services'
-        ]
\ No newline at end of file
+            'experience_years', 'location', 'latitude', 'longitude',
+            'short_description', 'short_description_ne',
+            'price_per_service', 'services'
+        ]
+    
+    def update(self, instance, validated_data):
+        # A new location without explicit coordinates is re-geocoded on save
+        if (
+            'location' in validated_data and
+            validated_data['location'] != instance.location and
+            'latitude' not in validated_data and
+            'longitude' not in validated_data
+        ):
+            instance.latitude = instance.longitude = None
+        return super().update(instance, validated_data)
\ No newline at end of file
@@ -0,0 +1,140 @@
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from api.accounts.authentication import invalidate_user
+from api.accounts.models import User
+from .models import Service, ServiceProvider, ProviderStats, Review, AvailabilitySlot
+from .bitmaps import mark_days
+from .catalog_cache import bump_catalog_version
+from .dashboard import invalidate_dashboard
+from .search import get_search_backend
+from .stats import record_review_change
+
+# User fields that end up in the provider search document
+SEARCH_USER_FIELDS = {'first_name', 'last_name'}
+
+@receiver(post_save, sender=ServiceProvider)
+def create_provider_stats(sender, instance, created, raw=False, **kwargs):
+    """Every provider starts with an empty stats row"""
+    if created and not raw:
+        ProviderStats.objects.get_or_create(provider=instance)
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    """Remove a deleted review from its provider's rating counters"""
+    # Missing rows are not rebuilt here: during a provider cascade the
+    # stats row may already be gone.
+    record_review_change(
+        instance.provider_id, instance.rating, None,
+        create_missing=False
+    )
+
+# Search index sync
+
+@receiver(post_save, sender=ServiceProvider)
+def index_provider(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_backend().index([instance.pk])
+
+@receiver(post_delete, sender=ServiceProvider)
+def unindex_provider(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+
+@receiver(m2m_changed, sender=ServiceProvider.services.through)
+def provider_services_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        if reverse:
+            # pk_set is None on clear; remember who is about to lose the service
+            instance._search_provider_ids = list(instance.providers.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    
+    if not reverse:
+        provider_ids = [instance.pk]
+    elif action == 'post_clear':
+        provider_ids = getattr(instance, '_search_provider_ids', [])
+    else:
+        provider_ids = pk_set or []
+    get_search_backend().index(provider_ids)
+
+@receiver(post_save, sender=Service)
+def service_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        get_search_backend().index(instance.providers.values_list('id', flat=True))
+
+@receiver(pre_delete, sender=Service)
+def service_deleting(sender, instance, **kwargs):
+    instance._search_provider_ids = list(instance.providers.values_list('id', flat=True))
+
+@receiver(post_delete, sender=Service)
+def service_deleted(sender, instance, **kwargs):
+    get_search_backend().index(getattr(instance, '_search_provider_ids', []))
+
+@receiver(post_save, sender=User)
+def provider_user_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if created or raw:
+        return
+    if update_fields is not None and not SEARCH_USER_FIELDS & set(update_fields):
+        return  # e.g. last_login updates on every login
+    get_search_backend().index(
+        ServiceProvider.objects.filter(user_id=instance.pk).values_list('id', flat=True)
+    )
+
+# Availability bitmaps
+
+@receiver([post_save, post_delete], sender=AvailabilitySlot)
+def slot_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    days = {(instance.provider_id, instance.date)}
+    loaded = getattr(instance, '_loaded_day', None)
+    if loaded and None not in loaded:
+        days.add(loaded)
+    mark_days(days)
+
+# Catalog response cache invalidation
+
+@receiver([post_save, post_delete], sender=Service)
+@receiver([post_save, post_delete], sender=ServiceProvider)
+@receiver([post_save, post_delete], sender=Review)
+@receiver([post_save, post_delete], sender=AvailabilitySlot)
+@receiver(m2m_changed, sender=ServiceProvider.services.through)
+def catalog_changed(sender, raw=False, **kwargs):
+    if not raw:
+        bump_catalog_version()
+
+@receiver(post_save, sender=User)
+def catalog_user_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if created or raw:
+        return
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    provider_ids = list(ServiceProvider.objects.filter(user_id=instance.pk).values_list('id', flat=True))
+    if provider_ids:
+        bump_catalog_version()
+        invalidate_dashboard(provider_ids)
+
+# Cached authenticated user (its entry carries the provider_profile)
+
+@receiver([post_save, post_delete], sender=ServiceProvider)
+def auth_provider_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_user(instance.user_id)
+
+# Provider dashboard cache (booking changes are handled in bookings.signals)
+
+@receiver([post_save, post_delete], sender=ServiceProvider)
+def dashboard_provider_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_dashboard([instance.pk])
+
+@receiver([post_save, post_delete], sender=Review)
+def dashboard_review_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_dashboard([instance.provider_id])
+
+@receiver(m2m_changed, sender=ServiceProvider.services.through)
+def dashboard_services_changed(sender, instance, action, reverse, **kwargs):
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_dashboard([instance.pk])
@@ -0,0 +1,234 @@
+"""
+Incremental maintenance of the denormalized ProviderStats table.
+
+Booking and Review writes call into this module from inside their own
+transaction, so counters always commit (or roll back) together with the
+row that changed them.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.utils import timezone
+
+from .catalog_cache import bump_catalog_version
+
+# Booking.status -> ProviderStats counter column
+BOOKING_STATUS_FIELDS = {
+    'pending': 'pending_bookings',
+    'confirmed': 'confirmed_bookings',
+    'completed': 'completed_bookings',
+    'cancelled': 'cancelled_bookings',
+}
+
+STATS_FIELDS = ['rating_sum', 'review_count'] + list(BOOKING_STATUS_FIELDS.values())
+
+
+def _apply_delta(provider_id, deltas, create_missing=True):
+    """Add `deltas` ({field: int}) to a provider's counters with F() updates"""
+    from .models import ProviderStats
+
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas or provider_id is None:
+        return
+
+    updated = ProviderStats.objects.filter(provider_id=provider_id).update(
+        updated_at=timezone.now(),
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+    if not updated and create_missing:
+        # Row was never built (e.g. provider predates the table): the
+        # change is already written, so a full recompute includes it.
+        rebuild_provider_stats([provider_id])
+
+
+def record_booking_change(provider_id, old_status, new_status,
+                          old_provider_id=None, create_missing=True):
+    """Move a booking between status counters (None = created/deleted)"""
+    old_provider_id = old_provider_id or provider_id
+    if old_provider_id == provider_id and old_status == new_status:
+        return
+
+    deltas = {old_provider_id: {}, provider_id: {}}
+    if old_status in BOOKING_STATUS_FIELDS:
+        deltas[old_provider_id][BOOKING_STATUS_FIELDS[old_status]] = -1
+    if new_status in BOOKING_STATUS_FIELDS:
+        deltas[provider_id][BOOKING_STATUS_FIELDS[new_status]] = 1
+    # One UPDATE per provider: a status move on the same provider is a
+    # single statement rather than a decrement plus an increment
+    with transaction.atomic(savepoint=False):
+        for changed_provider_id, provider_deltas in deltas.items():
+            _apply_delta(changed_provider_id, provider_deltas, create_missing=create_missing)
+
+
+def record_booking_changes(changes):
+    """
+    Apply many booking status changes in one UPDATE.
+
+    `changes` maps (provider_id, old_status, new_status) to a count.
+    """
+    from .models import ProviderStats
+
+    deltas = defaultdict(lambda: defaultdict(int))
+    for (provider_id, old_status, new_status), count in changes.items():
+        if old_status in BOOKING_STATUS_FIELDS:
+            deltas[BOOKING_STATUS_FIELDS[old_status]][provider_id] -= count
+        if new_status in BOOKING_STATUS_FIELDS:
+            deltas[BOOKING_STATUS_FIELDS[new_status]][provider_id] += count
+    provider_ids = {
+        provider_id for by_provider in deltas.values()
+        for provider_id, delta in by_provider.items() if delta
+    }
+    if not provider_ids:
+        return
+
+    updated = 0
+    ordered = sorted(provider_ids)
+    # No savepoint: callers already run inside their own transaction and
+    # nothing here recovers from a partial failure
+    with transaction.atomic(savepoint=False):
+        # Chunked to stay under database parameter limits
+        for i in range(0, len(ordered), 1000):
+            chunk = set(ordered[i:i + 1000])
+            updated += ProviderStats.objects.filter(provider_id__in=chunk).update(
+                updated_at=timezone.now(),
+                **{
+                    field: F(field) + Case(
+                        *(When(provider_id=provider_id, then=Value(delta))
+                          for provider_id, delta in by_provider.items()
+                          if delta and provider_id in chunk),
+                        default=Value(0),
+                    )
+                    for field, by_provider in deltas.items()
+                }
+            )
+        if updated < len(provider_ids):
+            # Some rows were never built; recomputing includes the change
+            present = set(ProviderStats.objects.filter(
+                provider_id__in=provider_ids
+            ).values_list('provider_id', flat=True))
+            rebuild_provider_stats(provider_ids - present)
+
+
+def record_review_change(provider_id, old_rating, new_rating,
+                         old_provider_id=None, create_missing=True):
+    """Adjust rating sum/count (None rating = review created/deleted)"""
+    old_provider_id = old_provider_id or provider_id
+
+    with transaction.atomic():
+        if old_rating is not None:
+            _apply_delta(
+                old_provider_id,
+                {'rating_sum': -old_rating, 'review_count': -1},
+                create_missing=create_missing
+            )
+        if new_rating is not None:
+            _apply_delta(
+                provider_id,
+                {'rating_sum': new_rating, 'review_count': 1},
+                create_missing=create_missing
+            )
+
+
+def compute_provider_stats(provider_ids=None):
+    """
+    Compute stats from scratch with two grouped queries.
+
+    Returns {provider_id: {field: value}} for every requested provider.
+    """
+    from api.bookings.models import Booking
+    from .models import ServiceProvider, Review
+
+    providers = ServiceProvider.objects.all()
+    bookings = Booking.objects.all()
+    reviews = Review.objects.all()
+    if provider_ids is not None:
+        providers = providers.filter(id__in=provider_ids)
+        bookings = bookings.filter(provider_id__in=provider_ids)
+        reviews = reviews.filter(provider_id__in=provider_ids)
+
+    result = {
+        pk: dict.fromkeys(STATS_FIELDS, 0)
+        for pk in providers.values_list('id', flat=True)
+    }
+
+    booking_rows = (
+        bookings.order_by()
+        .values('provider_id', 'status')
+        .annotate(n=Count('id'))
+    )
+    for row in booking_rows:
+        field = BOOKING_STATUS_FIELDS.get(row['status'])
+        if field and row['provider_id'] in result:
+            result[row['provider_id']][field] = row['n']
+
+    review_rows = (
+        reviews.order_by()
+        .values('provider_id')
+        .annotate(total=Sum('rating'), n=Count('id'))
+    )
+    for row in review_rows:
+        if row['provider_id'] in result:
+            result[row['provider_id']]['rating_sum'] = row['total'] or 0
+            result[row['provider_id']]['review_count'] = row['n']
+
+    return result
+
+
+def find_stats_drift(provider_ids=None):
+    """
+    Compare stored stats with freshly computed ones.
+
+    Returns (computed, drift) where drift is a list of
+    (provider_id, {field: (stored, expected)}) for every mismatching row,
+    including providers whose stats row is missing entirely.
+    """
+    from .models import ProviderStats
+
+    computed = compute_provider_stats(provider_ids)
+    stored = {
+        row['provider_id']: row
+        for row in ProviderStats.objects.filter(
+            provider_id__in=list(computed)
+        ).values('provider_id', *STATS_FIELDS)
+    }
+
+    drift = []
+    for provider_id, expected in computed.items():
+        current = stored.get(provider_id)
+        if current is None:
+            drift.append((provider_id, {
+                field: (None, value) for field, value in expected.items()
+            }))
+            continue
+        diff = {
+            field: (current[field], value)
+            for field, value in expected.items()
+            if current[field] != value
+        }
+        if diff:
+            drift.append((provider_id, diff))
+    return computed, drift
+
+
+def rebuild_provider_stats(provider_ids=None):
+    """Recompute and upsert stats rows; returns the drift that was fixed"""
+    from .models import ProviderStats
+
+    with transaction.atomic():
+        computed, drift = find_stats_drift(provider_ids)
+        if drift:
+            now = timezone.now()
+            ProviderStats.objects.bulk_create(
+                [
+                    ProviderStats(provider_id=provider_id, updated_at=now, **computed[provider_id])
+                    for provider_id, _ in drift
+                ],
+                update_conflicts=True,
+                unique_fields=['provider'],
+                update_fields=STATS_FIELDS + ['updated_at'],
+                batch_size=500
+            )
+            # Bulk upserts send no signals
+            bump_catalog_version()
+    return drift
@@ -0,0 +1,957 @@
+import csv
+import re
+from datetime import datetime, time, timedelta
+from io import StringIO
+from pathlib import Path
+from random import Random
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.providers.catalog_cache import get_catalog_version
+from api.providers.catalog_import import ImportFailed, import_catalog
+from api.providers.dashboard import cache_key as dashboard_cache_key
+from api.pagination import KeysetPagination
+from api.accounts.models import User
+from api.bookings.conflicts import ACTIVE_STATUSES
+from api.bookings.models import Booking
+from api.providers import geo
+from api.providers.bitmaps import (
+    BUCKET_MINUTES, BUCKETS, bucket_mask, covered_mask, encode_runs, free_in_window, minute_of_day,
+    provider_bitmaps, rebuild_bitmaps, touched_mask
+)
+from api.providers.filters import ProviderNearFilter
+from api.providers.geo import geocode, geohash_encode, geohash_neighbourhood, haversine_km
+from api.providers.models import (
+    AvailabilityBitmap, AvailabilityException, AvailabilityRule, AvailabilitySlot, ProviderStats, Review, Service,
+    ServiceProvider
+)
+from api.providers.recurring import apply_exception, lift_exception, materialize, rematerialize
+from api.providers.search import SQLiteFTSBackend, get_search_backend
+from api.providers.serializers import ServiceProviderListSerializer
+from api.providers.stats import find_stats_drift, rebuild_provider_stats, record_booking_changes
+from api.querycount import assert_query_budget, measure_queries
+from api.testing import (
+    auth_header, future_day, make_booking, make_provider, make_service, make_slot, make_user
+)
+
+SERVICES_FILE = Path(__file__).resolve().parent / 'data' / 'services.json'
+
+
+class AvailableSearchTests(TestCase):
+    """GET /api/providers/available/ lists only slots no active booking overlaps"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.day = future_day()
+        customer = make_user()
+        # Bitmaps are recomputed when the transaction commits
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.partly_booked = make_provider()
+            make_slot(cls.partly_booked, cls.day, '10:00', '11:00')
+            make_slot(cls.partly_booked, cls.day, '14:00', '15:00')
+            make_booking(customer, cls.partly_booked, cls.day, '10:00')
+
+            # Free from 09:00 to 09:30 by its bitmap, but its only slot is taken
+            cls.overlapped = make_provider()
+            make_slot(cls.overlapped, cls.day, '09:00', '10:00')
+            make_booking(customer, cls.overlapped, cls.day, '09:30', duration_minutes=30)
+
+            cls.free = make_provider()
+            make_slot(cls.free, cls.day, '09:00', '10:00')
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, **params):
+        response = self.client.get('/api/providers/available/', {'date': self.day, **params})
+        self.assertEqual(response.status_code, 200)
+        return {data['id']: data for data in response.json()['results']}
+
+    def test_slots_overlapping_bookings_are_dropped(self):
+        results = self.search()
+        self.assertEqual(
+            [(slot['start_time'], slot['end_time']) for slot in results[self.partly_booked.id]['free_slots']],
+            [('14:00:00', '15:00:00')]
+        )
+        self.assertEqual(len(results[self.free.id]['free_slots']), 1)
+
+    def test_providers_without_free_slots_are_dropped(self):
+        results = self.search()
+        self.assertNotIn(self.overlapped.id, results)
+        self.assertTrue(all(data['free_slots'] for data in results.values()))
+
+    def test_time_window(self):
+        results = self.search(time_from='09:00', time_to='11:00')
+        self.assertEqual(set(results), {self.free.id})
+
+
+class DashboardTests(TestCase):
+    """GET /api/provider/dashboard/: a fixed number of queries, cached until bookings change"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider()
+        cls.customer = make_user()
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.booking = make_booking(cls.customer, cls.provider, future_day(), '10:00')
+
+    def setUp(self):
+        cache.clear()
+
+    def dashboard(self):
+        response = assert_query_budget(self.client, 'get', '/api/provider/dashboard/', **auth_header(self.provider.user))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def count_queries(self):
+        cache.clear()
+        _, log = measure_queries(self.client, 'get', '/api/provider/dashboard/', **auth_header(self.provider.user))
+        return log.count
+
+    def test_query_count_does_not_grow_with_bookings(self):
+        few = self.count_queries()
+        with self.captureOnCommitCallbacks(execute=True):
+            for weeks in range(1, 40):
+                day = timezone.localdate() - timedelta(weeks=weeks)
+                make_booking(self.customer, self.provider, day, '10:00', status='completed')
+                make_booking(self.customer, self.provider, day, '14:00', status='cancelled')
+        self.assertEqual(self.count_queries(), few)
+        data = self.dashboard()
+        self.assertEqual(sum(week['completed'] for week in data['series']['weekly']), 39)
+
+    def test_cached_until_a_booking_changes(self):
+        data = self.dashboard()
+        self.assertEqual(data['stats']['pending_bookings'], 1)
+        # Cached: only authentication reads the database
+        _, log = measure_queries(self.client, 'get', '/api/provider/dashboard/', **auth_header(self.provider.user))
+        self.assertLess(log.count, self.count_queries())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking.status = 'confirmed'
+            self.booking.save()
+        self.assertIsNone(cache.get(dashboard_cache_key(self.provider.pk)))
+        data = self.dashboard()
+        self.assertEqual((data['stats']['pending_bookings'], data['stats']['confirmed_bookings']), (0, 1))
+
+
+class ProviderListProjectionTests(TestCase):
+    """The provider list endpoints render .values() rows as ServiceProviderListSerializer renders instances"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.day = future_day()
+        services = [make_service(name=name, name_ne='पूजा') for name in ('Griha Puja', 'Bratabandha', 'Aarati')]
+        with cls.captureOnCommitCallbacks(execute=True):
+            providers = [
+                make_provider(services=services[:2], price_per_service='1250.50', short_description_ne='पण्डित'),
+                make_provider(
+                    user=make_user(role='provider', first_name='', last_name='', profile_photo='profiles/a.jpg'),
+                    services=services, latitude=27.70, longitude=85.30,
+                ),
+                # No services, and no stats row yet
+                make_provider(latitude=27.75, longitude=85.35),
+            ]
+            for provider in providers:
+                make_slot(provider, cls.day, '09:00', '10:00')
+        ProviderStats.objects.filter(provider=providers[0]).update(
+            rating_sum=13, review_count=3, completed_bookings=7
+        )
+        ProviderStats.objects.filter(provider=providers[2]).delete()
+        make_provider(verified=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertSerializerOutput(self, path, params=None, with_request=True):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        results = [
+            {name: value for name, value in data.items() if name != 'free_slots'}
+            for data in response.data['results']
+        ]
+        self.assertEqual(len(results), 3)
+
+        # The instances the serializer would have had: same filters, same annotations
+        request = Request(APIRequestFactory().get(path, params))
+        queryset = ProviderNearFilter().filter_queryset(
+            request, ServiceProvider.objects.select_related('user', 'stats').prefetch_related('services'), None
+        )
+        providers = {provider.id: provider for provider in queryset}
+        serializer = ServiceProviderListSerializer(
+            [providers[data['id']] for data in results], many=True,
+            context={'request': request} if with_request else {}
+        )
+        self.assertEqual(JSONRenderer().render(results), JSONRenderer().render(serializer.data))
+
+    def test_list(self):
+        self.assertSerializerOutput('/api/providers/')
+
+    def test_list_near(self):
+        self.assertSerializerOutput('/api/providers/', {'near': '27.7172,85.3240', 'radius_km': 50})
+
+    def test_available(self):
+        # Rendered without the request, so photo URLs stay relative
+        self.assertSerializerOutput('/api/providers/available/', {'date': self.day}, with_request=False)
+
+
+class ReviewStatsTests(TestCase):
+    """Review writes move the provider's rating counters"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider()
+        cls.other = make_provider()
+        cls.user = make_user()
+
+    def stats(self, provider):
+        return ProviderStats.objects.values_list('rating_sum', 'review_count').get(provider=provider)
+
+    def test_edits_read_the_loaded_rating(self):
+        review = Review.objects.create(user=self.user, provider=self.provider, rating=4)
+        review = Review.objects.get(pk=review.pk)
+        review.rating = 2
+        with CaptureQueriesContext(connection) as queries:
+            review.save()
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT')])
+        review.provider = self.other
+        review.save()
+        self.assertEqual(self.stats(self.provider), (0, 0))
+        self.assertEqual(self.stats(self.other), (2, 1))
+
+    def test_unloaded_instance_reads_the_saved_row(self):
+        review = Review.objects.create(user=self.user, provider=self.provider, rating=4)
+        Review(
+            pk=review.pk, user=self.user, provider=self.provider, rating=5, created_at=review.created_at
+        ).save()
+        self.assertEqual(self.stats(self.provider), (5, 1))
+
+
+class ProviderStatsTests(TestCase):
+    """Booking and review writes keep ProviderStats equal to a recount"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider()
+        cls.other = make_provider()
+        cls.user = make_user()
+
+    def stats(self, provider, *fields):
+        return ProviderStats.objects.values_list(*fields).get(provider=provider)
+
+    def assertInSync(self):
+        _, drift = find_stats_drift()
+        self.assertEqual(drift, [])
+
+    def test_booking_lifecycle(self):
+        fields = ('pending_bookings', 'confirmed_bookings', 'completed_bookings', 'cancelled_bookings')
+        booking = make_booking(self.user, self.provider, future_day(), '10:00')
+        self.assertEqual(self.stats(self.provider, *fields), (1, 0, 0, 0))
+        booking.status = 'confirmed'
+        booking.save()
+        self.assertEqual(self.stats(self.provider, *fields), (0, 1, 0, 0))
+        booking.provider = self.other
+        booking.save()
+        self.assertEqual(self.stats(self.provider, *fields), (0, 0, 0, 0))
+        self.assertEqual(self.stats(self.other, *fields), (0, 1, 0, 0))
+        booking.delete()
+        self.assertEqual(self.stats(self.other, *fields), (0, 0, 0, 0))
+        self.assertInSync()
+
+    def test_bulk_changes(self):
+        record_booking_changes({
+            (self.provider.pk, None, 'pending'): 3,
+            (self.provider.pk, 'pending', 'confirmed'): 2,
+            (self.other.pk, None, 'cancelled'): 1,
+        })
+        self.assertEqual(self.stats(self.provider, 'pending_bookings', 'confirmed_bookings'), (1, 2))
+        self.assertEqual(self.stats(self.other, 'cancelled_bookings'), (1,))
+
+    def test_review_delete(self):
+        Review.objects.create(user=self.user, provider=self.provider, rating=4)
+        Review.objects.create(user=self.user, provider=self.provider, rating=1).delete()
+        self.assertEqual(self.stats(self.provider, 'rating_sum', 'review_count'), (4, 1))
+        self.assertInSync()
+
+    def test_missing_row_is_rebuilt_on_the_next_change(self):
+        make_booking(self.user, self.provider, future_day(), '10:00')
+        ProviderStats.objects.filter(provider=self.provider).delete()
+        make_booking(self.user, self.provider, future_day(), '12:00')
+        self.assertEqual(self.stats(self.provider, 'pending_bookings'), (2,))
+
+    def test_drift_is_reported_then_rebuilt(self):
+        make_booking(self.user, self.provider, future_day(), '10:00')
+        Review.objects.create(user=self.user, provider=self.provider, rating=3)
+        ProviderStats.objects.filter(provider=self.provider).update(pending_bookings=5, rating_sum=0)
+        ProviderStats.objects.filter(provider=self.other).delete()
+
+        out = StringIO()
+        call_command('rebuild_provider_stats', '--dry-run', stdout=out)
+        self.assertIn(f'Provider #{self.provider.pk}: pending_bookings: 5 -> 1, rating_sum: 0 -> 3', out.getvalue())
+        self.assertIn('2 of 2 provider(s) have drifted', out.getvalue())
+        self.assertEqual(self.stats(self.provider, 'pending_bookings'), (5,))
+        self.assertFalse(ProviderStats.objects.filter(provider=self.other).exists())
+
+        drift = rebuild_provider_stats()
+        self.assertEqual({provider_id for provider_id, _ in drift}, {self.provider.pk, self.other.pk})
+        self.assertInSync()
+        self.assertEqual(rebuild_provider_stats(), [])
+
+
+class ProviderSearchTests(TestCase):
+    """GET /api/providers/?search= through the full-text index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        puja = make_service(name='Griha Puja', name_ne='गृह पूजा')
+        path = make_service(name='Path', name_ne='पाठ')
+        bratabandha = make_service(name='Bratabandha', name_ne='व्रतबन्ध')
+        cls.puja = make_provider(services=[puja])
+        cls.path = make_provider(services=[path])
+        cls.bratabandha = make_provider(services=[bratabandha])
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get('/api/providers/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [data['id'] for data in response.json()['results']]
+
+    def test_nepali_prefix(self):
+        # A vowel sign is part of the word, not a break after "प"
+        self.assertEqual(self.search('पू'), [self.puja.id])
+        self.assertEqual(self.search('पा'), [self.path.id])
+        # Nor is a virama
+        self.assertEqual(self.search('व्रत'), [self.bratabandha.id])
+
+    def test_nepali_word(self):
+        self.assertEqual(self.search('पूजा'), [self.puja.id])
+        self.assertEqual(self.search('गृह पूजा'), [self.puja.id])
+        self.assertEqual(self.search('पाठ'), [self.path.id])
+        self.assertEqual(self.search('पूजा पाठ'), [])
+
+    def test_name_outranks_service_outranks_description(self):
+        in_description = make_provider(short_description='Performs Rudri at home')
+        in_service = make_provider(services=[make_service(name='Rudri Path')])
+        in_name = make_provider(user=make_user(role='provider', first_name='Rudri'))
+        self.assertEqual(self.search('rudri'), [in_name.id, in_service.id, in_description.id])
+        # An explicit ordering replaces the ranking
+        response = self.client.get('/api/providers/', {'search': 'rudri', 'ordering': 'created_at'})
+        self.assertEqual(
+            [data['id'] for data in response.json()['results']],
+            [in_description.id, in_service.id, in_name.id]
+        )
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.search('griha puja'), [self.puja.id])
+        self.assertEqual(self.search('grih'), [self.puja.id])
+        self.assertEqual(self.search('griha path'), [])
+        # Query syntax is not passed to the index
+        self.assertEqual(self.search('"puja*'), [self.puja.id])
+
+    def test_index_follows_writes(self):
+        self.path.user.first_name = 'Hari'
+        self.path.user.save()
+        self.assertEqual(self.search('hari'), [self.path.id])
+        self.bratabandha.services.add(make_service(name='Chudakarma'))
+        self.assertEqual(self.search('chudakarma'), [self.bratabandha.id])
+        self.puja.delete()
+        self.assertEqual(self.search('puja'), [])
+
+    def test_rebuild(self):
+        backend = get_search_backend()
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM provider_search')
+        self.assertEqual(backend.search('puja'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(backend.search('puja'), [self.puja.id])
+
+
+class ProviderNearTests(TestCase):
+    """Geohash-narrowed proximity search returns what a full scan would"""
+
+    centre = (27.7172, 85.3240)
+
+    @classmethod
+    def setUpTestData(cls):
+        random = Random(3)
+        cls.points = {}
+        for _ in range(40):
+            # Up to about 30 km from the centre
+            point = (cls.centre[0] + random.uniform(-0.27, 0.27), cls.centre[1] + random.uniform(-0.3, 0.3))
+            cls.points[make_provider(latitude=point[0], longitude=point[1]).pk] = point
+        cls.pokhara = make_provider(latitude=None, longitude=None, location='Lakeside, Pokhara')
+        cls.points[cls.pokhara.pk] = (cls.pokhara.latitude, cls.pokhara.longitude)
+
+    def setUp(self):
+        cache.clear()
+
+    def by_distance(self, latitude, longitude):
+        return sorted(
+            (haversine_km(latitude, longitude, *point), pk) for pk, point in self.points.items()
+        )
+
+    def test_geocode(self):
+        self.assertEqual(geocode('Thamel, Kathmandu'), (27.7154, 85.3123))
+        self.assertEqual(geocode('ठमेल'), (27.7154, 85.3123))
+        self.assertEqual(geocode('Patan Durbar Square'), (27.6644, 85.3188))
+        self.assertIsNone(geocode('Somewhere else'))
+        self.assertEqual((self.pokhara.latitude, self.pokhara.longitude), (28.2096, 83.9856))
+
+    def test_geohash(self):
+        self.assertEqual(geohash_encode(57.64911, 10.40744, precision=11), 'u4pruydqqvj')
+        cells = geohash_neighbourhood(27.7172, 85.3240, 5)
+        self.assertEqual(len(cells), 9)
+        self.assertIn(geohash_encode(27.7172, 85.3240, 5), cells)
+
+    def test_within_radius_matches_a_full_scan(self):
+        queryset = ServiceProvider.objects.all()
+        for latitude, longitude in [self.centre, (27.80, 85.20), (27.60, 85.50)]:
+            for radius in (0.5, 2, 7.5, 25, 150):
+                expected = {pk for distance, pk in self.by_distance(latitude, longitude) if distance <= radius}
+                found = geo.within_radius(queryset, latitude, longitude, radius)
+                self.assertEqual(set(found.values_list('id', flat=True)), expected, (latitude, longitude, radius))
+
+    def test_nearest_matches_a_full_scan(self):
+        queryset = ServiceProvider.objects.all()
+        for latitude, longitude in [self.centre, (27.80, 85.20), (28.0, 84.5)]:
+            for k in (1, 5, 41):
+                expected = [pk for _, pk in self.by_distance(latitude, longitude)[:k]]
+                found = [pk for pk, _ in geo.nearest(queryset, latitude, longitude, k)]
+                self.assertEqual(found, expected, (latitude, longitude, k))
+
+    def test_results_sorted_nearest_first(self):
+        response = self.client.get('/api/providers/', {'near': '27.7172,85.3240', 'radius_km': 10})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        expected = [(pk, round(distance, 2)) for distance, pk in self.by_distance(*self.centre) if distance <= 10]
+        self.assertEqual([(data['id'], data['distance_km']) for data in results], expected[:len(results)])
+
+    def test_bad_input(self):
+        for params in [{'near': 'kathmandu'}, {'near': '91,85'}, {'near': '27.7,85.3', 'radius_km': 500}]:
+            self.assertEqual(self.client.get('/api/providers/', params).status_code, 400, params)
+
+
+class CatalogCacheTests(TransactionTestCase):
+    """
+    Public catalog responses are cached under a version that commits bump.
+
+    Writes really commit here: inside TestCase's transaction a bump still
+    pending from the fixtures would stand in for every later one.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.provider = make_provider(services=[make_service(name='Griha Puja')])
+
+    def get(self, path='/api/providers/', **headers):
+        return self.client.get(path, HTTP_ACCEPT='application/json', **headers)
+
+    def test_miss_then_hit_without_queries(self):
+        first = self.get()
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.get()
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertIn('must-revalidate', second['Cache-Control'])
+
+    def test_conditional_requests(self):
+        first = self.get()
+        with self.assertNumQueries(0):
+            response = self.get(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.get(HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_keyed_by_query_and_language(self):
+        etag = self.get()['ETag']
+        self.assertNotEqual(self.get('/api/providers/?religion_type=hindu')['ETag'], etag)
+        self.assertNotEqual(self.get(HTTP_ACCEPT_LANGUAGE='ne')['ETag'], etag)
+        # Parameter order does not matter
+        self.assertEqual(
+            self.get('/api/providers/?religion_type=hindu&verified=true')['ETag'],
+            self.get('/api/providers/?verified=true&religion_type=hindu')['ETag']
+        )
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'api.example.com'])
+    def test_keyed_by_scheme_and_host(self):
+        # Cached bodies carry absolute URLs, which must not leak to another host
+        first = self.get()
+        other = self.get(HTTP_HOST='api.example.com')
+        self.assertEqual(other['X-Cache'], 'MISS')
+        self.assertNotEqual(other['ETag'], first['ETag'])
+        self.assertNotEqual(self.get(secure=True)['ETag'], first['ETag'])
+        self.assertEqual(self.get(HTTP_HOST='api.example.com')['X-Cache'], 'HIT')
+
+    def test_commit_invalidates(self):
+        etag = self.get()['ETag']
+        self.provider.experience_years = 20
+        self.provider.save()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][0]['experience_years'], 20)
+
+    def test_rollback_does_not_invalidate(self):
+        version = get_catalog_version()
+        try:
+            with transaction.atomic():
+                self.provider.save()
+                raise DatabaseError
+        except DatabaseError:
+            pass
+        self.assertEqual(get_catalog_version(), version)
+
+    def test_one_bump_per_transaction(self):
+        version = get_catalog_version()
+        with transaction.atomic():
+            for _ in range(3):
+                make_service()
+        self.assertEqual(get_catalog_version(), version + 1)
+
+    def test_browsable_api_is_not_cached(self):
+        response = self.client.get('/api/providers/', HTTP_ACCEPT='text/html')
+        self.assertNotIn('X-Cache', response)
+        self.assertNotIn('ETag', response)
+
+
+@patch.object(KeysetPagination, 'page_size', 3)
+class ProviderKeysetPaginationTests(TestCase):
+    """Cursor pages of /api/providers/ cover every row once, in order, in both directions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Ties on every ordering column, so only the id tie-break tells rows apart
+        for experience, price in [(5, 1000), (5, 1000), (5, 1500), (10, 1000), (10, 1500),
+                                  (10, 1500), (2, 2000), (5, 1500)]:
+            make_provider(experience_years=experience, price_per_service=price)
+        ServiceProvider.objects.update(created_at=timezone.now())
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def walk(self, params):
+        """Ids page by page, forwards to the end and then back to the start"""
+        forwards, backwards = [], []
+        data = self.get('/api/providers/', params)
+        self.assertIsNone(data['previous'])
+        while True:
+            forwards.append([row['id'] for row in data['results']])
+            if not data['next']:
+                break
+            data = self.get(data['next'])
+        while data['previous']:
+            data = self.get(data['previous'])
+            backwards.insert(0, [row['id'] for row in data['results']])
+        return forwards, backwards
+
+    def expected(self, *ordering):
+        return list(ServiceProvider.objects.order_by(*ordering).values_list('id', flat=True))
+
+    def check_ordering(self, params, *ordering):
+        forwards, backwards = self.walk(params)
+        self.assertEqual(sum(forwards, []), self.expected(*ordering))
+        self.assertEqual([len(page) for page in forwards], [3, 3, 2])
+        self.assertEqual(backwards, forwards[:-1])
+
+    def test_default_ordering(self):
+        self.check_ordering({}, '-verified', '-created_at', '-id')
+
+    def test_ascending(self):
+        self.check_ordering({'ordering': 'price_per_service'}, 'price_per_service', 'id')
+
+    def test_mixed_directions(self):
+        self.check_ordering(
+            {'ordering': 'experience_years,-price_per_service'}, 'experience_years', '-price_per_service', 'id'
+        )
+
+    def test_filters_are_kept(self):
+        forwards, _ = self.walk({'min_experience': 5, 'ordering': 'price_per_service'})
+        self.assertEqual(sum(forwards, []), list(
+            ServiceProvider.objects.filter(experience_years__gte=5).order_by('price_per_service', 'id')
+            .values_list('id', flat=True)
+        ))
+
+    def test_approximate_count_only_on_request(self):
+        data = self.get('/api/providers/', {'count': 'approx'})
+        self.assertEqual((data['count'], data['count_is_exact']), (8, True))
+        self.assertNotIn('count=', data['next'])
+        self.assertNotIn('count', self.get(data['next']))
+        cache.clear()
+        with patch('api.pagination.COUNT_CAP', 5):
+            data = self.get('/api/providers/', {'count': 'approx'})
+        self.assertEqual((data['count'], data['count_is_exact']), (5, False))
+
+    def test_bad_cursors(self):
+        next_link = self.get('/api/providers/')['next']
+        cursor = next_link.split('cursor=')[1]
+        for params in [{'cursor': 'garbage'}, {'cursor': cursor, 'ordering': 'price_per_service'}]:
+            self.assertEqual(self.client.get('/api/providers/', params).status_code, 404, params)
+
+
+class RecurringAvailabilityTests(TestCase):
+    """Weekly rules expand into slots once, around exceptions and existing slots"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider()
+        cls.today = timezone.localdate()
+        # Two weeks: ten weekdays
+        cls.until = cls.today + timedelta(days=13)
+
+    def make_rule(self, **fields):
+        fields.setdefault('weekdays', [0, 1, 2, 3, 4])
+        fields.setdefault('start_time', time(7))
+        fields.setdefault('end_time', time(10))
+        fields.setdefault('slot_minutes', 60)
+        fields.setdefault('valid_from', self.today)
+        return AvailabilityRule.objects.create(provider=self.provider, **fields)
+
+    def slots(self, **filters):
+        return AvailabilitySlot.objects.filter(provider=self.provider, **filters)
+
+    def next_weekday(self, weekday):
+        return self.today + timedelta(days=(weekday - self.today.weekday()) % 7)
+
+    def test_expands_weekdays_into_slots_once(self):
+        rule = self.make_rule()
+        self.assertEqual(materialize([rule], until=self.until), (30, 0))
+        self.assertEqual({day.weekday() for day in self.slots().values_list('date', flat=True)}, {0, 1, 2, 3, 4})
+        self.assertEqual(
+            sorted(set(self.slots().values_list('start_time', 'end_time'))),
+            [(time(7), time(8)), (time(8), time(9)), (time(9), time(10))]
+        )
+        rule.refresh_from_db()
+        self.assertEqual(rule.materialized_until, self.until)
+
+        # A rerun has nothing left to do; a later horizon only adds the new week
+        self.assertEqual(materialize([rule], until=self.until), (0, 0))
+        self.assertEqual(materialize([rule], until=self.until + timedelta(days=7)), (15, 0))
+
+    def test_whole_window_and_validity(self):
+        rule = self.make_rule(slot_minutes=None, valid_until=self.today + timedelta(days=6))
+        created, _ = materialize([rule], until=self.until)
+        self.assertEqual(created, 5)
+        self.assertEqual(set(self.slots().values_list('start_time', 'end_time')), {(time(7), time(10))})
+        self.assertFalse(self.slots(date__gt=rule.valid_until).exists())
+
+    def test_existing_slots_are_skipped(self):
+        monday = self.next_weekday(0)
+        make_slot(self.provider, monday, '08:00', '09:00', notes='By hand')
+        rule = self.make_rule()
+        self.assertEqual(materialize([rule], until=self.until), (29, 1))
+        self.assertEqual(self.slots(date=monday, start_time=time(8)).get().notes, 'By hand')
+
+    def test_exceptions_block_slots(self):
+        monday, tuesday = self.next_weekday(0), self.next_weekday(1)
+        AvailabilityException.objects.create(provider=self.provider, date=monday)
+        AvailabilityException.objects.create(
+            provider=self.provider, date=tuesday, start_time=time(8, 30), end_time=time(9)
+        )
+        materialize([self.make_rule()], until=self.until)
+        self.assertFalse(self.slots(date=monday).exists())
+        self.assertEqual(
+            list(self.slots(date=tuesday).values_list('start_time', flat=True)), [time(7), time(9)]
+        )
+
+    def test_adding_and_lifting_an_exception(self):
+        wednesday = self.next_weekday(2)
+        materialize([self.make_rule()], until=self.until)
+        make_slot(self.provider, wednesday, '12:00', '13:00')
+        self.slots(date=wednesday, start_time=time(7)).update(is_booked=True)
+
+        exception = AvailabilityException.objects.create(provider=self.provider, date=wednesday)
+        self.assertEqual(apply_exception(exception), 2)
+        # Booked and hand-entered slots stay
+        self.assertEqual(
+            list(self.slots(date=wednesday).values_list('start_time', flat=True)), [time(7), time(12)]
+        )
+        self.assertEqual(lift_exception(exception), 2)
+        self.assertEqual(self.slots(date=wednesday).count(), 4)
+
+    def test_edit_replaces_unbooked_future_slots(self):
+        rule = self.make_rule()
+        materialize([rule], until=self.until)
+        booked = self.slots(date=self.next_weekday(3), start_time=time(9)).get()
+        booked.is_booked = True
+        booked.save()
+
+        rule.start_time, rule.end_time = time(14), time(16)
+        rule.save()
+        with patch('api.providers.recurring.HORIZON_DAYS', 13):
+            removed, created = rematerialize(rule)
+        self.assertEqual((removed, created), (29, 20))
+        self.assertEqual(
+            set(self.slots().values_list('start_time', flat=True)), {time(9), time(14), time(15)}
+        )
+        self.assertTrue(self.slots(pk=booked.pk).exists())
+
+
+class AvailabilityBitmapTests(TransactionTestCase):
+    """
+    Stored bitmaps equal a bucket-by-bucket recount of slots and bookings.
+
+    Writes really commit here: inside TestCase's transaction, days marked
+    after a first round of on_commit callbacks join that spent round.
+    """
+
+    def setUp(self):
+        self.provider = make_provider()
+        self.customer = make_user()
+        self.day = future_day()
+
+    def bitmap(self, day=None):
+        return provider_bitmaps([self.provider.pk], day or self.day, day or self.day)[self.provider.pk].get(
+            day or self.day, (0, 0)
+        )
+
+    def recount(self, day):
+        """(free, busy) of the day, a bucket at a time, from the rows"""
+        slots = list(AvailabilitySlot.objects.filter(provider=self.provider, date=day))
+        midnight = timezone.make_aware(datetime.combine(day, time.min))
+        bookings = [
+            ((booking.requested_datetime - midnight).total_seconds() // 60,
+             (booking.end_datetime - midnight).total_seconds() // 60)
+            for booking in Booking.objects.filter(provider=self.provider, status__in=ACTIVE_STATUSES)
+        ]
+        free = busy = 0
+        for bucket in range(BUCKETS):
+            start, end = bucket * BUCKET_MINUTES, (bucket + 1) * BUCKET_MINUTES
+            spans = [(minute_of_day(slot.start_time), minute_of_day(slot.end_time))
+                     for slot in slots if slot.is_booked] + bookings
+            if any(first < end and last > start for first, last in spans):
+                busy |= 1 << bucket
+            elif any(
+                minute_of_day(slot.start_time) <= start and minute_of_day(slot.end_time) >= end
+                for slot in slots if not slot.is_booked
+            ):
+                free |= 1 << bucket
+        return free, busy
+
+    def test_masks(self):
+        # 07:10-08:05 covers 07:15-08:00 and touches 07:00-08:15
+        self.assertEqual(covered_mask(430, 485), bucket_mask(29, 32))
+        self.assertEqual(touched_mask(430, 485), bucket_mask(28, 33))
+        self.assertEqual(bucket_mask(5, 5), 0)
+
+    def test_matches_a_recount(self):
+        random = Random(11)
+        starts = random.sample(range(0, 22 * 60, 5), 12)
+        for start in starts:
+            end = min(start + random.randrange(20, 120, 5), 24 * 60 - 1)
+            AvailabilitySlot.objects.create(
+                provider=self.provider, date=self.day,
+                start_time=time(start // 60, start % 60), end_time=time(end // 60, end % 60),
+                is_booked=random.random() < 0.2,
+            )
+        for status in ['pending', 'confirmed', 'cancelled', 'completed', 'pending']:
+            start = random.randrange(0, 22 * 60, 5)
+            make_booking(
+                self.customer, self.provider, self.day, f'{start // 60:02}:{start % 60:02}',
+                duration_minutes=random.randrange(30, 180, 15), status=status,
+            )
+        free, busy = self.recount(self.day)
+        self.assertTrue(free and busy)
+        self.assertEqual(self.bitmap(), (free, busy))
+
+    def test_booking_changes(self):
+        make_slot(self.provider, self.day, '09:00', '12:00')
+        booking = make_booking(self.customer, self.provider, self.day, '10:00', duration_minutes=45)
+        free, busy = self.bitmap()
+        self.assertEqual(busy, bucket_mask(40, 43))
+        self.assertEqual(free, bucket_mask(36, 40) | bucket_mask(43, 48))
+
+        booking.status = 'cancelled'
+        booking.save()
+        self.assertEqual(self.bitmap(), (bucket_mask(36, 48), 0))
+
+    def test_booking_over_midnight(self):
+        make_booking(self.customer, self.provider, self.day, '23:30', duration_minutes=60)
+        next_day = self.day + timedelta(days=1)
+        self.assertEqual(self.bitmap()[1], bucket_mask(94, 96))
+        self.assertEqual(self.bitmap(next_day)[1], bucket_mask(0, 2))
+
+    def test_rebuild_repairs_drift(self):
+        make_slot(self.provider, self.day, '09:00', '10:00')
+        expected = self.bitmap()
+        AvailabilityBitmap.objects.all().delete()
+        AvailabilitySlot.objects.create(
+            provider=self.provider, date=self.day + timedelta(days=1), start_time=time(9), end_time=time(10)
+        )
+        AvailabilitySlot.objects.filter(date=self.day + timedelta(days=1)).delete()
+        AvailabilityBitmap.objects.create(provider=self.provider, date=self.day + timedelta(days=2), free_0=1)
+
+        self.assertEqual(rebuild_bitmaps(self.day, self.day + timedelta(days=2)), 2)
+        self.assertEqual(self.bitmap(), expected)
+        self.assertEqual(AvailabilityBitmap.objects.count(), 1)
+
+    def test_free_in_window(self):
+        make_slot(self.provider, self.day, '09:00', '10:00')
+        bitmaps = AvailabilityBitmap.objects.filter(provider=self.provider)
+        self.assertTrue(free_in_window(bitmaps, time(9, 45), time(11)).exists())
+        self.assertFalse(free_in_window(bitmaps, time(10), time(11)).exists())
+        self.assertFalse(free_in_window(bitmaps, time(7), time(9)).exists())
+
+
+class AvailabilityRunLengthTests(TestCase):
+    """?encoding=rle calendars"""
+
+    def decode(self, runs):
+        return ''.join(symbol * int(count) for count, symbol in re.findall(r'(\d+)([nfb])', runs))
+
+    def test_encode_runs(self):
+        day = future_day()
+        days = {day: (bucket_mask(36, 40), bucket_mask(40, 42))}
+        self.assertEqual(encode_runs(days, day, day), '36n4f2b54n')
+        # Empty days merge into one run
+        runs = encode_runs(days, day - timedelta(days=2), day + timedelta(days=1))
+        self.assertEqual(runs, '228n4f2b150n')
+        self.assertEqual(self.decode(runs), 'n' * 228 + 'f' * 4 + 'b' * 2 + 'n' * 150)
+        self.assertEqual(encode_runs({}, day, day), '96n')
+
+    def test_calendar(self):
+        day = future_day()
+        provider = make_provider()
+        with self.captureOnCommitCallbacks(execute=True):
+            make_slot(provider, day, '09:00', '11:00')
+            make_booking(make_user(), provider, day, '10:00', duration_minutes=30)
+        response = self.client.get(
+            f'/api/providers/{provider.pk}/availability/',
+            {'date_from': day, 'date_to': day + timedelta(days=1), 'encoding': 'rle'}
+        )
+        self.assertEqual(response.status_code, 200)
+        availability = response.json()['availability']
+        self.assertEqual((availability['bucket_minutes'], availability['start']), (15, str(day)))
+        self.assertEqual(availability['runs'], '36n4f2b2f148n')
+
+
+def write_csv(directory, name, rows):
+    path = Path(directory) / name
+    with path.open('w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+IMPORT_PROVIDERS = [
+    {'email': 'hari@example.com', 'first_name': 'Hari', 'last_name': 'Sharma', 'phone': '9800000001',
+     'religion_type': 'hindu', 'experience_years': '12', 'location': 'Thamel, Kathmandu', 'latitude': '',
+     'longitude': '', 'short_description': 'Griha puja', 'short_description_ne': '', 'price_per_service': '2500',
+     'verified': 'yes'},
+    {'email': 'tashi@example.com', 'first_name': 'Tashi', 'last_name': 'Lama', 'phone': '9800000002',
+     'religion_type': 'buddhist', 'experience_years': '8', 'location': 'Boudha', 'latitude': '',
+     'longitude': '', 'short_description': 'Puja at home', 'short_description_ne': '', 'price_per_service': '2000',
+     'verified': 'no'},
+]
+IMPORT_LINKS = [
+    {'email': 'hari@example.com', 'service': 'Ghar Puja'},
+    {'email': 'tashi@example.com', 'service': 'Bartabanda'},
+]
+
+
+class ImportCatalogCacheTests(TransactionTestCase):
+    """import_catalog changes cached catalog pages and dashboards only when it commits"""
+
+    def setUp(self):
+        cache.clear()
+        self.directory = self.enterContext(TemporaryDirectory())
+        self.provider = make_provider(user=make_user(role='provider', email='hari@example.com'))
+        self.version = get_catalog_version()
+        cache.set(dashboard_cache_key(self.provider.pk), {'stats': {}})
+
+    def assertCachesKept(self):
+        self.assertEqual(get_catalog_version(), self.version)
+        self.assertIsNotNone(cache.get(dashboard_cache_key(self.provider.pk)))
+
+    def test_dry_run(self):
+        import_catalog(providers=write_csv(self.directory, 'providers.csv', IMPORT_PROVIDERS), dry_run=True)
+        self.assertFalse(User.objects.filter(email='tashi@example.com').exists())
+        self.assertCachesKept()
+
+    def test_failed_import(self):
+        links = write_csv(self.directory, 'links.csv', IMPORT_LINKS[:1])
+        with patch.object(SQLiteFTSBackend, 'index', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                import_catalog(services=SERVICES_FILE, links=links)
+        self.assertFalse(Service.objects.exists())
+        self.assertCachesKept()
+
+    def test_commit(self):
+        import_catalog(providers=write_csv(self.directory, 'providers.csv', IMPORT_PROVIDERS))
+        self.assertGreater(get_catalog_version(), self.version)
+        self.assertIsNone(cache.get(dashboard_cache_key(self.provider.pk)))
+
+
+class ImportCatalogTests(TestCase):
+    """import_catalog writes what changed and nothing else"""
+
+    def setUp(self):
+        cache.clear()
+        directory = self.enterContext(TemporaryDirectory())
+        self.files = {
+            'services': str(SERVICES_FILE),
+            'providers': write_csv(directory, 'providers.csv', IMPORT_PROVIDERS),
+            'links': write_csv(directory, 'links.csv', IMPORT_LINKS),
+        }
+        self.directory = directory
+
+    def test_import_then_rerun_is_a_no_op(self):
+        report = import_catalog(**self.files)
+        self.assertEqual(report, {
+            'services': (8, 0, 0), 'users': (2, 0, 0), 'providers': (2, 0, 0), 'links': (2, 0, 0),
+        })
+        hari = ServiceProvider.objects.select_related('user').get(user__email='hari@example.com')
+        # Geocoded from the location, with the rows save() and signals would have made
+        self.assertEqual((hari.latitude, hari.longitude), (27.7154, 85.3123))
+        self.assertTrue(hari.geohash)
+        self.assertTrue(ProviderStats.objects.filter(provider=hari).exists())
+        self.assertEqual(get_search_backend().search('ghar'), [hari.pk])
+        self.assertFalse(hari.user.has_usable_password())
+
+        with CaptureQueriesContext(connection) as queries:
+            report = import_catalog(**self.files)
+        self.assertEqual(report, {
+            'services': (0, 0, 8), 'users': (0, 0, 2), 'providers': (0, 0, 2), 'links': (0, 0, 2),
+        })
+        writes = [query['sql'] for query in queries if query['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')]
+        self.assertEqual(writes, [])
+
+    def test_changed_rows_are_updated(self):
+        import_catalog(**self.files)
+        rows = [dict(IMPORT_PROVIDERS[0], first_name='Harihar', price_per_service='3000'), IMPORT_PROVIDERS[1]]
+        report = import_catalog(providers=write_csv(self.directory, 'changed.csv', rows))
+        self.assertEqual((report['users'], report['providers']), ((0, 1, 1), (0, 1, 1)))
+        hari = ServiceProvider.objects.select_related('user').get(user__email='hari@example.com')
+        self.assertEqual((hari.user.first_name, hari.price_per_service), ('Harihar', 3000))
+        self.assertEqual(get_search_backend().search('harihar'), [hari.pk])
+
+    def test_any_error_aborts_everything(self):
+        rows = [IMPORT_PROVIDERS[0], dict(IMPORT_PROVIDERS[1], religion_type='other', experience_years='many')]
+        links = write_csv(self.directory, 'bad_links.csv', [{'email': 'nobody@example.com', 'service': 'Ghar Puja'}])
+        with self.assertRaises(ImportFailed) as failure:
+            import_catalog(
+                services=self.files['services'], providers=write_csv(self.directory, 'bad.csv', rows), links=links
+            )
+        self.assertEqual(len(failure.exception.errors), 2)
+        self.assertTrue(all('bad.csv row 3' in error for error in failure.exception.errors))
+        self.assertFalse(Service.objects.exists())
+        self.assertFalse(User.objects.exists())
@@ -16,4 +16,10 @@ urlpatterns = [
     path('provider/profile/', views.provider_profile, name='provider-profile'),
     path('provider/availability/', views.provider_availability, name='provider-availability'),
     path('provider/availability/<int:slot_id>/', views.provider_availability_detail, name='provider-availability-detail'),
+    path('provider/availability/rules/', views.provider_availability_rules, name='provider-availability-rules'),
+    path('provider/availability/rules/<int:rule_id>/', views.provider_availability_rule_detail, name='provider-availability-rule-detail'),
+    path('provider/availability/exceptions/', views.provider_availability_exceptions, name='provider-availability-exceptions'),
+    path('provider/availability/exceptions/<int:exception_id>/', views.provider_availability_exception_detail, name='provider-availability-exception-detail'),
+    path('exports/providers/', views.export_providers, name='export-providers'),
+    path('exports/reviews/', views.export_reviews, name='export-reviews'),
 ]
\ No newline at end of file
@@ -1,78 +1,150 @@
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from datetime import datetime, timedelta
 
-from .models import Service, ServiceProvider, AvailabilitySlot, Review
+from .models import (
+    Service, ServiceProvider, AvailabilitySlot, AvailabilityRule,
+    AvailabilityException, Review
+)
 from .serializers import (
     ServiceSerializer, ServiceProviderListSerializer,
     ServiceProviderDetailSerializer, AvailabilitySlotSerializer,
     AvailabilitySlotCreateSerializer, ReviewSerializer,
-    ProviderProfileUpdateSerializer
+    ProviderProfileUpdateSerializer, AvailabilityRuleSerializer,
+    AvailabilityExceptionSerializer, provider_list_projection
+)
+from . import recurring
+from .availability import (
+    parse_search_window, parse_date_range, wants_rle,
+    free_provider_ids, free_slots, group_by_provider, drop_busy
 )
+from .bitmaps import provider_bitmaps, rle_response
+from .catalog_cache import CatalogCacheMixin
+from .dashboard import get_dashboard
+from .exports import PROVIDER_EXPORT, REVIEW_EXPORT
+from .filters import ServiceProviderFilter, ProviderSearchFilter, ProviderNearFilter
 from api.accounts.permissions import IsProvider
+from api.dbrouter import ReplicaReadMixin
+from api.exports import export_response
+from api.pagination import KeysetPagination
+from api.querycount import query_budget
+from api.writequeue import serialized_writes
 
 # PUBLIC ENDPOINTS (No auth required)
 
-class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
+class ServiceViewSet(CatalogCacheMixin, ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """Public: List all services"""
     
     queryset = Service.objects.all()
     serializer_class = ServiceSerializer
     permission_classes = [AllowAny]
+    query_budgets = {'list': 2, 'retrieve': 1}
 
-class ServiceProviderViewSet(viewsets.ReadOnlyModelViewSet):
+class ServiceProviderViewSet(CatalogCacheMixin, ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """Public: Browse and search providers"""
     
-    queryset = ServiceProvider.objects.filter(verified=True).select_related('user')
+    queryset = ServiceProvider.objects.filter(verified=True).select_related(
+        'user', 'stats'
+    ).prefetch_related('services')
     permission_classes = [AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['religion_type', 'location', 'verified']
-    search_fields = ['user__first_name', 'user__last_name', 'location', 'short_description']
+    pagination_class = KeysetPagination
+    # Search/near filters impose their own ranking, so they come after OrderingFilter
+    filter_backends = [
+        DjangoFilterBackend, filters.OrderingFilter,
+        ProviderSearchFilter, ProviderNearFilter
+    ]
+    filterset_class = ServiceProviderFilter
     ordering_fields = ['experience_years', 'price_per_service', 'created_at']
     ordering = ['-verified', '-created_at']
+    query_budgets = {'list': 3, 'retrieve': 2, 'available': 4, 'availability': 3, 'reviews': 3}
     
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return ServiceProviderDetailSerializer
         return ServiceProviderListSerializer
     
-    @action(detail=True, methods=['get'])
-    def availability(self, request, pk=None):
-        """Get provider availability for date range"""
-        provider = self.get_object()
-        date_from = request.query_params.get('date_from')
-        date_to = request.query_params.get('date_to')
+    def list(self, request, *args, **kwargs):
+        """Same payload as ServiceProviderListSerializer, built from .values() rows"""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(provider_list_projection.values(queryset))
+        return self.get_paginated_response(provider_list_projection.represent(page, request))
+    
+    @action(detail=False, methods=['get'])
+    def available(self, request):
+        """
+        Providers with free slots in a date range and time window.
         
-        if not date_from or not date_to:
+        Accepts date or date_from/date_to, optional time_from/time_to (HH:MM)
+        and every provider list filter (service, religion_type, near, ...).
+        """
+        try:
+            date_from, date_to, time_from, time_to = parse_search_window(request.query_params)
+        except ValueError as e:
             return Response({
-                'error': 'date_from and date_to parameters are required (YYYY-MM-DD format)'
+                'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        providers = self.filter_queryset(self.get_queryset()).filter(
+            id__in=free_provider_ids(date_from, date_to, time_from, time_to)
+        )
+        
+        page = self.paginate_queryset(provider_list_projection.values(providers))
+        # Serialized without request context, so photo URLs stay relative
+        results = provider_list_projection.represent(page)
+        provider_ids = [data['id'] for data in results]
+        
+        bitmaps = provider_bitmaps(provider_ids, date_from, date_to)
+        if wants_rle(request.query_params):
+            for data in results:
+                data['availability'] = rle_response(bitmaps[data['id']], date_from, date_to)
+            return self.get_paginated_response(results)
+        
+        # Slots overlapping pending or confirmed bookings are not free
+        slots = drop_busy(group_by_provider(
+            free_slots(date_from, date_to, time_from, time_to), provider_ids
+        ), bitmaps)
+        results = [data for data in results if slots[data['id']]]
+        slot_data = iter(AvailabilitySlotSerializer(
+            [slot for data in results for slot in slots[data['id']]], many=True
+        ).data)
+        for data in results:
+            data['free_slots'] = [next(slot_data) for _ in slots[data['id']]]
+        return self.get_paginated_response(results)
+    
+    @action(detail=True, methods=['get'])
+    def availability(self, request, pk=None):
+        """Get provider availability for date range"""
+        provider = self.get_object()
         try:
-            date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
-            date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
-        except ValueError:
+            date_from, date_to = parse_date_range(request.query_params)
+        except ValueError as e:
             return Response({
-                'error': 'Invalid date format. Use YYYY-MM-DD'
+                'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        slots = AvailabilitySlot.objects.filter(
-            provider=provider,
-            date__gte=date_from,
-            date__lte=date_to
-        ).order_by('date', 'start_time')
+        if wants_rle(request.query_params):
+            bitmaps = provider_bitmaps([provider.id], date_from, date_to)
+            availability = rle_response(bitmaps[provider.id], date_from, date_to)
+        else:
+            slots = AvailabilitySlot.objects.filter(
+                provider=provider,
+                date__gte=date_from,
+                date__lte=date_to
+            ).order_by('date', 'start_time')
+            availability = AvailabilitySlotSerializer(slots, many=True).data
         
-        serializer = AvailabilitySlotSerializer(slots, many=True)
         return Response({
             'provider_id': provider.id,
             'provider_name': provider.user.get_full_name(),
             'date_from': date_from,
             'date_to': date_to,
-            'availability': serializer.data
+            'availability': availability
         })
     
     @action(detail=True, methods=['get'])
@@ -90,6 +162,7 @@ class ServiceProviderViewSet(viewsets.ReadOnlyModelViewSet):
 
 # PROVIDER DASHBOARD ENDPOINTS (Provider role only)
 
+@query_budget(6)
 @api_view(['GET'])
 @permission_classes([IsProvider])
 def provider_dashboard(request):
@@ -101,31 +174,10 @@ def provider_dashboard(request):
             'error': 'Provider profile not found'
         }, status=status.HTTP_404_NOT_FOUND)
     
-    from api.bookings.models import Booking
-    
-    # Get statistics
-    total_bookings = provider.bookings.count()
-    pending_bookings = provider.bookings.filter(status='pending').count()
-    confirmed_bookings = provider.bookings.filter(status='confirmed').count()
-    completed_bookings = provider.bookings.filter(status='completed').count()
-    
-    # Recent bookings
-    recent_bookings = provider.bookings.order_by('-created_at')[:5]
-    from api.bookings.serializers import BookingSerializer
-    
-    return Response({
-        'provider': ServiceProviderDetailSerializer(provider).data,
-        'stats': {
-            'total_bookings': total_bookings,
-            'pending_bookings': pending_bookings,
-            'confirmed_bookings': confirmed_bookings,
-            'completed_bookings': completed_bookings,
-            'average_rating': provider.average_rating,
-            'total_reviews': provider.total_reviews,
-        },
-        'recent_bookings': BookingSerializer(recent_bookings, many=True).data
-    })
+    # Stats, 52-week series and recent bookings, cached until the provider's bookings change
+    return Response(get_dashboard(provider.pk))
 
+@query_budget({'GET': 4, 'PUT': 10})
 @api_view(['GET', 'PUT'])
 @permission_classes([IsProvider])
 def provider_profile(request):
@@ -155,8 +207,10 @@ def provider_profile(request):
             })
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@query_budget({'GET': 3, 'POST': 7})
 @api_view(['GET', 'POST'])
 @permission_classes([IsProvider])
+@serialized_writes
 def provider_availability(request):
     """Get or create availability slots"""
     try:
@@ -168,18 +222,22 @@ def provider_availability(request):
     
     if request.method == 'GET':
         # Get provider's availability
-        date_from = request.query_params.get('date_from')
-        date_to = request.query_params.get('date_to')
-        
+        params = request.query_params
         slots = AvailabilitySlot.objects.filter(provider=provider)
         
-        if date_from and date_to:
+        if wants_rle(params) or (params.get('date_from') and params.get('date_to')):
             try:
-                date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
-                date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
-                slots = slots.filter(date__gte=date_from, date__lte=date_to)
-            except ValueError:
-                pass
+                date_from, date_to = parse_date_range(params)
+            except ValueError as e:
+                return Response({
+                    'error': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+            if wants_rle(params):
+                bitmaps = provider_bitmaps([provider.id], date_from, date_to)
+                return Response({
+                    'availability': rle_response(bitmaps[provider.id], date_from, date_to)
+                })
+            slots = slots.filter(date__gte=date_from, date__lte=date_to)
         
         slots = slots.order_by('date', 'start_time')
         serializer = AvailabilitySlotSerializer(slots, many=True)
@@ -198,8 +256,10 @@ def provider_availability(request):
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@query_budget({'PUT': 8, 'DELETE': 8})
 @api_view(['PUT', 'DELETE'])
 @permission_classes([IsProvider])
+@serialized_writes
 def provider_availability_detail(request, slot_id):
     """Update or delete availability slot"""
     try:
@@ -219,7 +279,8 @@ def provider_availability_detail(request, slot_id):
     if request.method == 'PUT':
         serializer = AvailabilitySlotCreateSerializer(slot, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            # An edited slot no longer follows its rule
+            serializer.save(rule=None)
             return Response({
                 'message': 'Availability slot updated successfully',
                 'slot': AvailabilitySlotSerializer(serializer.instance).data
@@ -230,4 +291,155 @@ def provider_availability_detail(request, slot_id):
         slot.delete()
         return Response({
             'message': 'Availability slot deleted successfully'
-        }, status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        }, status=status.HTTP_204_NO_CONTENT)
+
+@query_budget({'GET': 3, 'POST': 16})
+@api_view(['GET', 'POST'])
+@permission_classes([IsProvider])
+@serialized_writes
+def provider_availability_rules(request):
+    """List or create recurring availability rules"""
+    try:
+        provider = request.user.provider_profile
+    except ServiceProvider.DoesNotExist:
+        return Response({
+            'error': 'Provider profile not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    if request.method == 'GET':
+        rules = AvailabilityRule.objects.filter(provider=provider)
+        serializer = AvailabilityRuleSerializer(rules, many=True)
+        return Response({
+            'rules': serializer.data
+        })
+    
+    elif request.method == 'POST':
+        serializer = AvailabilityRuleSerializer(data=request.data)
+        if serializer.is_valid():
+            with transaction.atomic():
+                rule = serializer.save(provider=provider)
+                created, skipped = recurring.materialize([rule])
+            return Response({
+                'message': 'Availability rule created successfully',
+                'rule': AvailabilityRuleSerializer(rule).data,
+                'slots_created': created,
+                'slots_skipped': skipped
+            }, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@query_budget({'PUT': 12, 'DELETE': 7})
+@api_view(['PUT', 'DELETE'])
+@permission_classes([IsProvider])
+@serialized_writes
+def provider_availability_rule_detail(request, rule_id):
+    """Update or delete a recurring rule and its future unbooked slots"""
+    try:
+        provider = request.user.provider_profile
+    except ServiceProvider.DoesNotExist:
+        return Response({
+            'error': 'Provider profile not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    rule = get_object_or_404(AvailabilityRule, id=rule_id, provider=provider)
+    
+    if request.method == 'PUT':
+        serializer = AvailabilityRuleSerializer(rule, data=request.data, partial=True)
+        if serializer.is_valid():
+            with transaction.atomic():
+                rule = serializer.save()
+                removed, created = recurring.rematerialize(rule)
+            return Response({
+                'message': 'Availability rule updated successfully',
+                'rule': AvailabilityRuleSerializer(rule).data,
+                'slots_removed': removed,
+                'slots_created': created
+            })
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    elif request.method == 'DELETE':
+        with transaction.atomic():
+            removed = recurring.clear_future_slots(rule)
+            rule.delete()
+        return Response({
+            'message': 'Availability rule deleted successfully',
+            'slots_removed': removed
+        })
+
+@query_budget({'GET': 3, 'POST': 5})
+@api_view(['GET', 'POST'])
+@permission_classes([IsProvider])
+@serialized_writes
+def provider_availability_exceptions(request):
+    """List or create days off from recurring rules"""
+    try:
+        provider = request.user.provider_profile
+    except ServiceProvider.DoesNotExist:
+        return Response({
+            'error': 'Provider profile not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    if request.method == 'GET':
+        exceptions = AvailabilityException.objects.filter(
+            provider=provider, date__gte=timezone.localdate()
+        )
+        serializer = AvailabilityExceptionSerializer(exceptions, many=True)
+        return Response({
+            'exceptions': serializer.data
+        })
+    
+    elif request.method == 'POST':
+        serializer = AvailabilityExceptionSerializer(data=request.data)
+        if serializer.is_valid():
+            with transaction.atomic():
+                exception = serializer.save(provider=provider)
+                removed = recurring.apply_exception(exception)
+            return Response({
+                'message': 'Availability exception created successfully',
+                'exception': AvailabilityExceptionSerializer(exception).data,
+                'slots_removed': removed
+            }, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@query_budget(6)
+@api_view(['DELETE'])
+@permission_classes([IsProvider])
+@serialized_writes
+def provider_availability_exception_detail(request, exception_id):
+    """Delete an exception, restoring the slots it blocked"""
+    try:
+        provider = request.user.provider_profile
+    except ServiceProvider.DoesNotExist:
+        return Response({
+            'error': 'Provider profile not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    exception = get_object_or_404(AvailabilityException, id=exception_id, provider=provider)
+    restored = recurring.lift_exception(exception)
+    return Response({
+        'message': 'Availability exception deleted successfully',
+        'slots_restored': restored
+    })
+
+# EXPORTS (not on ServiceProviderViewSet: its response cache runs before authentication)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_providers(request):
+    """Staff: stream every provider as CSV or NDJSON"""
+    return export_response(PROVIDER_EXPORT, ServiceProvider.objects.all(), request)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_reviews(request):
+    """Stream the provider's reviews (every review for staff) as CSV or NDJSON"""
+    if request.user.is_staff:
+        return export_response(REVIEW_EXPORT, Review.objects.all(), request)
+    
+    try:
+        provider = request.user.provider_profile
+    except ServiceProvider.DoesNotExist:
+        return Response({
+            'error': 'Provider profile not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return export_response(REVIEW_EXPORT, Review.objects.filter(provider=provider), request)
@@ -0,0 +1,196 @@
+"""
+Per-request query accounting and per-route query budgets.
+
+QueryAccountingMiddleware wraps every database connection for the
+request and, when accounting is on, adds response headers:
+
+    X-DB-Queries             queries the request ran
+    X-DB-Time-ms             time spent in them
+    X-DB-Duplicate-Queries   repeats of one SQL shape (N+1 suspects)
+    X-DB-Query-Budget        the route's budget, when it has one
+
+Accounting is on for every request when QUERY_ACCOUNTING is set (the
+default under DEBUG) and for a QUERY_ACCOUNTING_SAMPLE_RATE fraction of
+requests otherwise. Duplicate shapes and blown budgets are logged.
+
+Budgets are declared next to the views: a `query_budgets` dict of action
+name (handler name on an APIView) -> queries on the class, or
+@query_budget(n) / @query_budget({'GET': n, 'PUT': m}) above @api_view.
+assert_query_budget() is the test helper; `manage.py check_query_budgets`
+runs it over the main routes.
+"""
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.urls import resolve
+
+from api.accounts.revocation import revocation_list
+
+logger = logging.getLogger(__name__)
+
+ENABLED = getattr(settings, 'QUERY_ACCOUNTING', settings.DEBUG)
+SAMPLE_RATE = getattr(settings, 'QUERY_ACCOUNTING_SAMPLE_RATE', 0.0)
+# Executions of one SQL shape within a request before it is flagged
+DUPLICATE_THRESHOLD = getattr(settings, 'QUERY_DUPLICATE_THRESHOLD', 2)
+
+_IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+_TRANSACTION_PREFIXES = ('BEGIN', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def query_budget(limit):
+    """Declare the query budget of a function view, overall or per method; goes above @api_view"""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def budget_for(view_func, method):
+    """The declared budget of a resolved view for an HTTP method, or None"""
+    budget = getattr(view_func, 'query_budget', None)
+    if isinstance(budget, dict):
+        return budget.get(method.upper())
+    if budget is not None:
+        return budget
+    budgets = getattr(getattr(view_func, 'cls', None), 'query_budgets', None)
+    if not budgets:
+        return None
+    # Viewsets map methods to actions; other class-based views use the method's handler
+    actions = getattr(view_func, 'actions', None) or {}
+    return budgets.get(actions.get(method.lower(), method.lower()))
+
+
+def sql_shape(sql):
+    """SQL with IN lists of any length made alike"""
+    return _IN_LIST_RE.sub('IN (...)', sql)
+
+
+def duplicates(statements, threshold=DUPLICATE_THRESHOLD):
+    """{shape: executions} for shapes run at least `threshold` times"""
+    counts = Counter(
+        sql_shape(sql) for sql in statements if not sql.startswith(_TRANSACTION_PREFIXES)
+    )
+    return {shape: count for shape, count in counts.items() if count >= threshold}
+
+
+class QueryLog:
+    """Execute wrapper recording (sql, milliseconds) for every query"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        began = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, (time.perf_counter() - began) * 1000))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def time_ms(self):
+        return sum(ms for _, ms in self.queries)
+
+
+class QueryAccountingMiddleware:
+    """
+    Counts the queries of accounted requests and reports them in headers.
+    Queries run while a streaming response is iterated are not included.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not (ENABLED or (SAMPLE_RATE and random.random() < SAMPLE_RATE)):
+            return self.get_response(request)
+
+        # Outside the count: the worker's revocation filter builds and refreshes
+        # itself on its own schedule, whichever request happens to come first
+        revocation_list.ensure_current()
+        log = QueryLog()
+        request.query_budget = None
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(log))
+            response = self.get_response(request)
+
+        response['X-DB-Queries'] = str(log.count)
+        response['X-DB-Time-ms'] = f'{log.time_ms:.2f}'
+        repeated = duplicates(sql for sql, _ in log.queries)
+        if repeated:
+            response['X-DB-Duplicate-Queries'] = str(sum(count - 1 for count in repeated.values()))
+            for shape, count in repeated.items():
+                logger.warning(f'{request.method} {request.path}: {count}x {shape[:300]}')
+        if request.query_budget is not None:
+            response['X-DB-Query-Budget'] = str(request.query_budget)
+            if log.count > request.query_budget:
+                logger.warning(
+                    f'{request.method} {request.path} ran {log.count} queries; its budget is {request.query_budget}'
+                )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, 'query_budget'):
+            request.query_budget = budget_for(view_func, request.method)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def measure_queries(client, method, path, data=None, **extra):
+    """
+    Send a request with a django.test.Client; returns (response, QueryLog).
+    Inside a transaction (a TestCase), on_commit callbacks the request
+    registered are run and counted, as they would be after a real commit.
+    The worker's token revocation filter is brought up to date first, so
+    its first build and periodic refresh are not counted to the route.
+    """
+    revocation_list.ensure_current()
+    # Not CaptureQueriesContext: the client's request_started signal resets queries_log
+    log = QueryLog()
+    pending = {connection.alias: len(connection.run_on_commit) for connection in connections.all()}
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(log))
+        response = getattr(client, method.lower())(path, data, **extra)
+        for connection in connections.all():
+            callbacks = connection.run_on_commit[pending[connection.alias]:]
+            del connection.run_on_commit[pending[connection.alias]:]
+            for _, callback, _ in callbacks:
+                callback()
+    return response, log
+
+
+def route_budget(method, path):
+    return budget_for(resolve(path.split('?')[0]).func, method)
+
+
+def assert_query_budget(client, method, path, data=None, **extra):
+    """
+    Send a request with a django.test.Client and return the response;
+    raise QueryBudgetExceeded, listing the queries, if the route ran more
+    than its declared budget. Raises AssertionError if it has none.
+
+        assert_query_budget(self.client, 'get', '/api/history/', HTTP_AUTHORIZATION=...)
+    """
+    budget = route_budget(method, path)
+    if budget is None:
+        raise AssertionError(f'{method.upper()} {path} has no query budget')
+    response, log = measure_queries(client, method, path, data, **extra)
+    if log.count > budget:
+        listing = '\n'.join(f'{i}. {sql}' for i, (sql, _) in enumerate(log.queries, start=1))
+        raise QueryBudgetExceeded(
+            f'{method.upper()} {path} ran {log.count} queries; its budget is {budget}:\n{listing}'
+        )
+    return response
@@ -1,3 +1,4 @@
+import tempfile
 from pathlib import Path
 from decouple import config, Csv
 from datetime import timedelta
@@ -37,12 +38,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so it counts the queries of every middleware below it
+    'api.querycount.QueryAccountingMiddleware',
+    'api.profiling.ProfilingMiddleware',
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.dbrouter.DatabaseRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
@@ -68,13 +74,51 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'api.wsgi.application'
 
+# Production SQLite profile, opt-in: connection pragmas, BEGIN IMMEDIATE
+# transactions (api/sqlite/base.py) and queued write requests
+# (api/writequeue.py), so concurrent workers wait rather than hit
+# "database is locked". Not tied to DEBUG, so turning DEBUG off does not
+# also switch the database engine and the write path.
+SQLITE_PRODUCTION = config('SQLITE_PRODUCTION', default=False, cast=bool)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'api.sqlite' if SQLITE_PRODUCTION else 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
     }
 }
 
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # Milliseconds a connection waits for a lock before failing
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT_MS', default=5000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+    # Negative: KiB of page cache per connection
+    'cache_size': config('SQLITE_CACHE_SIZE', default=-64 * 1024, cast=int),
+    'temp_store': 'MEMORY',
+}
+SERIALIZE_WRITES = config('SERIALIZE_WRITES', default=SQLITE_PRODUCTION, cast=bool)
+WRITE_LOCK_FILE = config('WRITE_LOCK_FILE', default=str(BASE_DIR / 'db.sqlite3.write-lock'))
+# Seconds a write request waits for its turn before getting 503
+WRITE_QUEUE_TIMEOUT = config('WRITE_QUEUE_TIMEOUT', default=30, cast=float)
+
+# Read replicas for the public catalog (api.dbrouter): comma-separated
+# database names on the primary's engine, e.g. db.replica1.sqlite3 (kept
+# current locally by `manage.py sync_sqlite_replicas`)
+DATABASE_REPLICAS = []
+for number, name in enumerate(config('DATABASE_REPLICAS', default='', cast=Csv()), 1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'], 'NAME': name, 'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['api.dbrouter.ReplicaRouter']
+# Seconds a user's reads stay on the primary after a write request; keep above replica lag
+DATABASE_STICKY_SECONDS = config('DATABASE_STICKY_SECONDS', default=5, cast=int)
+# PostgreSQL: add an exclusion constraint against overlapping active bookings
+# (bookings migration 0004). Migrating with it on fails while overlaps exist
+BOOKING_EXCLUSION_CONSTRAINT = config('BOOKING_EXCLUSION_CONSTRAINT', default=False, cast=bool)
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator', 'OPTIONS': {'min_length': 8}},
@@ -99,7 +143,7 @@ AUTH_USER_MODEL = 'accounts.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.accounts.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -226,6 +270,9 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
+    # Rotating moves the login session's generation on (api.accounts.revocation), so a copy cannot be replayed
+    'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_REFRESH_SERIALIZER': 'api.accounts.serializers.RevocableTokenRefreshSerializer',
     'ALGORITHM': 'HS256',
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
@@ -235,6 +282,8 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:3000",
 ]
 CORS_ALLOW_CREDENTIALS = True
+# Query accounting headers, readable by the frontend in development
+CORS_EXPOSE_HEADERS = ['X-DB-Queries', 'X-DB-Time-ms', 'X-DB-Duplicate-Queries', 'X-DB-Query-Budget']
 
 SITE_ID = 1
 
@@ -257,4 +306,48 @@ DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@meropanditlam
 
 FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:3000')
 
+# Catalog cache versions, provider dashboards, authenticated users and
+# replica pins live here, so every worker process must see the same cache:
+# use a shared backend (e.g. django.core.cache.backends.redis.RedisCache).
+# The system check (api/checks.py) warns about the per-process default
+# unless SINGLE_PROCESS says one process serves every request, as runserver does.
+SINGLE_PROCESS = config('SINGLE_PROCESS', default=DEBUG, cast=bool)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=300, cast=int)
+# Seconds a read request's user is served from the cache; with token
+# claims trusted, read requests skip the cache and the database entirely
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=60, cast=int)
+AUTH_TRUST_TOKEN_CLAIMS = config('AUTH_TRUST_TOKEN_CLAIMS', default=False, cast=bool)
+# Seconds before a worker's revoked-token Bloom filter picks up other workers' revocations
+REVOCATION_REFRESH_SECONDS = config('REVOCATION_REFRESH_SECONDS', default=5, cast=int)
+# Each refresh reads again the revocations created this long before the last one,
+# so those of transactions that commit late are not missed
+REVOCATION_RESCAN_SECONDS = config('REVOCATION_RESCAN_SECONDS', default=60, cast=int)
+
+# X-DB-Queries / X-DB-Time-ms headers and query budget warnings: on every
+# request in development, on a sampled fraction of requests otherwise
+QUERY_ACCOUNTING = config('QUERY_ACCOUNTING', default=DEBUG, cast=bool)
+QUERY_ACCOUNTING_SAMPLE_RATE = config('QUERY_ACCOUNTING_SAMPLE_RATE', default=0.0, cast=float)
+
+# Server-Timing header on every response in development (it shows any
+# client the request's database and render times); collapsed-stack
+# profiles (for flamegraphs) of a sampled fraction of requests and of slow
+# ones whenever those are set, kept outside the source tree
+PROFILING = config('PROFILING', default=DEBUG, cast=bool)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_SLOW_MS = config('PROFILING_SLOW_MS', default=0, cast=int)
+PROFILING_DIR = config('PROFILING_DIR', default=str(Path(tempfile.gettempdir()) / 'meropanditlama-profiles'))
+
+# Per-process metrics, written here and added up by /api/metrics/. Every
+# worker of a deployment needs the same directory; it is kept outside the
+# source tree
+METRICS = config('METRICS', default=True, cast=bool)
+METRICS_DIR = config('METRICS_DIR', default=str(Path(tempfile.gettempdir()) / 'meropanditlama-metrics'))
+METRICS_FLUSH_SECONDS = config('METRICS_FLUSH_SECONDS', default=5, cast=int)
+
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
\ No newline at end of file
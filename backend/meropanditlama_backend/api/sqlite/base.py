@@ -0,0 +1,33 @@
+"""
+SQLite backend for production (ENGINE 'api.sqlite', see SQLITE_PRODUCTION).
+
+Django's SQLite backend, plus:
+
+- SQLITE_PRAGMAS run on every new connection: WAL, so readers and the
+  writer do not block each other; synchronous=NORMAL, safe with WAL;
+  busy_timeout, so a writer waits for the lock instead of failing; mmap
+  and page cache sizes
+- transaction.atomic() starts with BEGIN IMMEDIATE, taking the write
+  lock up front. A deferred BEGIN that reads and then writes has to
+  upgrade its lock, and when another connection wrote in between SQLite
+  fails it at once with "database is locked", whatever the busy timeout.
+
+Read-only atomic blocks take the write lock too; with WAL that does not
+block readers.
+"""
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in PRAGMAS.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
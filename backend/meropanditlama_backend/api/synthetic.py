@@ -0,0 +1,225 @@
+"""
+Deterministic synthetic datasets for load testing.
+
+generate() bulk-inserts customers, services, providers (with their user
+accounts and services), availability slots, bookings and reviews. All of
+it derives from one random seed and the current local date: slots and
+upcoming bookings fall in the days after today, past bookings in the
+year before it. Bulk inserts skip save() and signals, so what those
+maintain is rebuilt afterwards: provider stats, availability bitmaps,
+the search index, the catalog cache version and cached dashboards.
+
+Synthetic usernames start with PREFIX and service names with
+SERVICE_PREFIX, which is how flush() and `manage.py benchmark_endpoints`
+find a dataset.
+"""
+import csv
+import random
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from api.accounts.models import User
+from api.bookings.conflicts import booking_end
+from api.bookings.models import Booking
+from api.providers.bitmaps import rebuild_bitmaps
+from api.providers.catalog_cache import bump_catalog_version
+from api.providers.dashboard import invalidate_dashboard
+from api.providers.geo import GAZETTEER_PATH, geohash_encode
+from api.providers.models import AvailabilitySlot, Review, Service, ServiceProvider
+from api.providers.search import get_search_backend
+from api.providers.stats import rebuild_provider_stats
+
+PREFIX = 'synthetic-'
+SERVICE_PREFIX = 'Synthetic '
+EMAIL_DOMAIN = 'synthetic.invalid'
+BATCH_SIZE = 2000
+
+# One-hour slots starting 08:00 to 16:00
+SLOT_HOURS = range(8, 17)
+# Share of bookings that are upcoming (pending/confirmed, on a free slot)
+UPCOMING_SHARE = 0.3
+
+FIRST_NAMES = [
+    'Ram', 'Shyam', 'Hari', 'Krishna', 'Gopal', 'Bishnu', 'Sita', 'Gita', 'Laxmi', 'Saraswati',
+    'Tenzing', 'Pasang', 'Dawa', 'Nima', 'Karma', 'Sonam', 'Anish', 'Binita', 'Prakash', 'Sunita',
+]
+LAST_NAMES = [
+    'Sharma', 'Adhikari', 'Poudel', 'Bhattarai', 'Joshi', 'Acharya', 'Pandey', 'Upadhyaya',
+    'Sherpa', 'Lama', 'Tamang', 'Gurung', 'Shrestha', 'Maharjan', 'Bajracharya', 'Shakya',
+]
+SERVICE_NAMES = [
+    ('Ghar Puja', 'घर पूजा'), ('Bratabandha', 'ब्रतबन्ध'), ('Satyanarayan Puja', 'सत्यनारायण पूजा'),
+    ('Rudri Path', 'रुद्री पाठ'), ('Wedding Ceremony', 'विवाह समारोह'), ('Griha Pravesh', 'गृह प्रवेश'),
+    ('Buddha Puja', 'बुद्ध पूजा'), ('Funeral Rites', 'अन्त्येष्टि संस्कार'), ('Shraddha', 'श्राद्ध'),
+    ('Namkaran', 'न्वारन'),
+]
+RATINGS = [1, 2, 3, 4, 5]
+RATING_WEIGHTS = [1, 2, 5, 12, 20]
+
+
+def exists():
+    return User.objects.filter(username__startswith=PREFIX).exists()
+
+
+def flush():
+    """Delete the synthetic dataset; returns the number of rows deleted"""
+    with transaction.atomic():
+        users, _ = User.objects.filter(username__startswith=PREFIX).delete()
+        services, _ = Service.objects.filter(name__startswith=SERVICE_PREFIX).delete()
+    return users + services
+
+
+def _places():
+    with open(GAZETTEER_PATH, encoding='utf-8') as handle:
+        return [
+            (row['name'], float(row['latitude']), float(row['longitude']))
+            for row in csv.DictReader(handle)
+        ]
+
+
+def _users(rng, kind, count, role, password):
+    User.objects.bulk_create([
+        User(
+            username=f'{PREFIX}{kind}-{i}', email=f'{kind}-{i}@{EMAIL_DOMAIN}',
+            first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+            phone=f'98{rng.randrange(10 ** 8):08d}', role=role, password=password,
+        )
+        for i in range(count)
+    ], batch_size=BATCH_SIZE)
+    return list(User.objects.filter(
+        username__startswith=f'{PREFIX}{kind}-'
+    ).order_by('id').values_list('id', flat=True))
+
+
+def generate(users=2000, providers=500, services=20, days=30, bookings=20000, reviews=5000,
+             seed=42, progress=None):
+    """
+    Insert a dataset and return the number of rows of each kind. Raises
+    ValueError if a synthetic dataset is already there.
+    """
+    if exists():
+        raise ValueError('A synthetic dataset already exists; flush it first')
+    rng = random.Random(seed)
+    today = timezone.localdate()
+    tz = timezone.get_current_timezone()
+    report = progress or (lambda label, count: None)
+    counts = {}
+
+    with transaction.atomic():
+        Service.objects.bulk_create([
+            Service(
+                name=f'{SERVICE_PREFIX}{name} {i}', name_ne=name_ne,
+                description=f'{name} performed at home', default_price=rng.randrange(10, 200) * 100,
+            )
+            for i, (name, name_ne) in ((i, SERVICE_NAMES[i % len(SERVICE_NAMES)]) for i in range(services))
+        ])
+        service_ids = list(Service.objects.filter(
+            name__startswith=SERVICE_PREFIX
+        ).order_by('id').values_list('id', flat=True))
+        counts['services'] = len(service_ids)
+        report('services', len(service_ids))
+
+        # One shared unusable password hash; these accounts are only used with issued tokens
+        password = make_password(None)
+        customer_ids = _users(rng, 'user', users, 'user', password)
+        provider_user_ids = _users(rng, 'provider', providers, 'provider', password)
+        counts['users'] = len(customer_ids) + len(provider_user_ids)
+        report('users', counts['users'])
+
+        places = _places()
+        rows = []
+        for user_id in provider_user_ids:
+            place, latitude, longitude = rng.choice(places)
+            latitude += rng.uniform(-0.05, 0.05)
+            longitude += rng.uniform(-0.05, 0.05)
+            rows.append(ServiceProvider(
+                user_id=user_id, religion_type=rng.choice(['hindu', 'buddhist']),
+                experience_years=rng.randrange(1, 40), location=place,
+                latitude=latitude, longitude=longitude, geohash=geohash_encode(latitude, longitude),
+                short_description=f'Experienced pandit serving {place}',
+                short_description_ne='अनुभवी पण्डित',
+                price_per_service=rng.randrange(5, 100) * 100, verified=rng.random() < 0.9,
+            ))
+        ServiceProvider.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        provider_ids = list(ServiceProvider.objects.filter(
+            user_id__in=provider_user_ids
+        ).order_by('id').values_list('id', flat=True))
+        counts['providers'] = len(provider_ids)
+
+        offered = {
+            provider_id: rng.sample(service_ids, min(len(service_ids), rng.randint(1, 4)))
+            for provider_id in provider_ids
+        }
+        through = ServiceProvider.services.through
+        through.objects.bulk_create([
+            through(serviceprovider_id=provider_id, service_id=service_id)
+            for provider_id, ids in offered.items() for service_id in ids
+        ], batch_size=BATCH_SIZE)
+        report('providers', len(provider_ids))
+
+        # Slots on most upcoming days; upcoming bookings take some of them
+        slot_keys = [
+            (provider_id, today + timedelta(days=day), hour)
+            for provider_id in provider_ids
+            for day in range(1, days + 1) if rng.random() < 0.7
+            for hour in sorted(rng.sample(SLOT_HOURS, rng.randint(3, len(SLOT_HOURS))))
+        ]
+        upcoming = rng.sample(slot_keys, min(len(slot_keys), int(bookings * UPCOMING_SHARE)))
+        statuses = {key: rng.choice(['pending', 'confirmed']) for key in upcoming}
+        for start in range(0, len(slot_keys), BATCH_SIZE):
+            AvailabilitySlot.objects.bulk_create([
+                AvailabilitySlot(
+                    provider_id=provider_id, date=day, start_time=time(hour), end_time=time(hour + 1),
+                    # Confirmed bookings hold their slot
+                    is_booked=statuses.get((provider_id, day, hour)) == 'confirmed',
+                )
+                for provider_id, day, hour in slot_keys[start:start + BATCH_SIZE]
+            ])
+        counts['slots'] = len(slot_keys)
+        report('slots', len(slot_keys))
+
+        def booking(provider_id, day, hour, status):
+            begins = datetime.combine(day, time(hour), tzinfo=tz)
+            return Booking(
+                user_id=rng.choice(customer_ids), provider_id=provider_id,
+                service_id=rng.choice(offered[provider_id]),
+                requested_datetime=begins, duration_minutes=60, end_datetime=booking_end(begins, 60),
+                status=status,
+                cancellation_reason='Plans changed' if status == 'cancelled' else '',
+            )
+
+        rows = [booking(*key, statuses[key]) for key in upcoming]
+        for _ in range(bookings - len(upcoming)):
+            day = today - timedelta(days=rng.randint(1, 365))
+            status = 'completed' if rng.random() < 0.75 else 'cancelled'
+            rows.append(booking(rng.choice(provider_ids), day, rng.choice(SLOT_HOURS), status))
+        Booking.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        counts['bookings'] = len(rows)
+        report('bookings', len(rows))
+
+        completed = list(Booking.objects.filter(
+            provider_id__in=provider_ids, status='completed'
+        ).order_by('id').values_list('id', 'user_id', 'provider_id'))
+        Review.objects.bulk_create([
+            Review(
+                booking_id=booking_id, user_id=user_id, provider_id=provider_id,
+                rating=rng.choices(RATINGS, RATING_WEIGHTS)[0], comment=rng.choice(['', 'Very helpful', 'On time']),
+            )
+            for booking_id, user_id, provider_id in rng.sample(completed, min(reviews, len(completed)))
+        ], batch_size=BATCH_SIZE)
+        counts['reviews'] = min(reviews, len(completed))
+        report('reviews', counts['reviews'])
+
+        backend = get_search_backend()
+        for start in range(0, len(provider_ids), BATCH_SIZE):
+            batch = provider_ids[start:start + BATCH_SIZE]
+            rebuild_provider_stats(batch)
+            rebuild_bitmaps(today, today + timedelta(days=days), batch)
+            backend.index(batch)
+        bump_catalog_version()
+        invalidate_dashboard(provider_ids)
+        report('stats, bitmaps and search index', len(provider_ids))
+    return counts
@@ -0,0 +1,82 @@
+"""
+Fixture rows for the apps' tests.
+
+Small factories with defaults for every required field, so a test only
+spells out what it is about. Users get no usable password (hashing is
+the slowest part of a fixture); tests authenticate with tokens_for().
+"""
+import itertools
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from api.accounts.authentication import tokens_for
+from api.accounts.models import User
+from api.bookings.models import Booking
+from api.providers.models import AvailabilitySlot, Service, ServiceProvider
+
+_numbers = itertools.count(1)
+
+# synthetic.generate() arguments for a dataset small enough for a test
+SMALL_DATASET = dict(users=20, providers=6, services=5, days=7, bookings=60, reviews=15)
+
+
+def make_user(role='user', language_pref='en', **fields):
+    number = next(_numbers)
+    fields.setdefault('username', f'test-{role}-{number}')
+    fields.setdefault('email', f'test-{role}-{number}@example.com')
+    fields.setdefault('first_name', 'Test')
+    fields.setdefault('last_name', f'{role.title()} {number}')
+    user = User(role=role, language_pref=language_pref, **fields)
+    user.set_unusable_password()
+    user.save()
+    return user
+
+
+def make_service(**fields):
+    fields.setdefault('name', f'Test service {next(_numbers)}')
+    fields.setdefault('default_price', 1000)
+    return Service.objects.create(**fields)
+
+
+def make_provider(user=None, services=(), **fields):
+    fields.setdefault('religion_type', 'hindu')
+    fields.setdefault('experience_years', 5)
+    fields.setdefault('location', 'Kathmandu')
+    fields.setdefault('latitude', 27.7172)
+    fields.setdefault('longitude', 85.3240)
+    fields.setdefault('short_description', 'Test provider')
+    fields.setdefault('price_per_service', 1500)
+    fields.setdefault('verified', True)
+    provider = ServiceProvider.objects.create(user=user or make_user(role='provider'), **fields)
+    if services:
+        provider.services.set(services)
+    return provider
+
+
+def make_slot(provider, day, start, end, **fields):
+    """A slot on day from start to end ('HH:MM')"""
+    return AvailabilitySlot.objects.create(
+        provider=provider, date=day,
+        start_time=datetime.strptime(start, '%H:%M').time(),
+        end_time=datetime.strptime(end, '%H:%M').time(),
+        **fields
+    )
+
+
+def make_booking(user, provider, day, start, duration_minutes=60, **fields):
+    """A booking on day at start ('HH:MM'), local time"""
+    requested = timezone.make_aware(datetime.combine(day, datetime.strptime(start, '%H:%M').time()))
+    return Booking.objects.create(
+        user=user, provider=provider, requested_datetime=requested,
+        duration_minutes=duration_minutes, **fields
+    )
+
+
+def future_day(days=3):
+    return timezone.localdate() + timedelta(days=days)
+
+
+def auth_header(user):
+    """Client kwargs authenticating as user"""
+    return {'HTTP_AUTHORIZATION': f'Bearer {tokens_for(user).access_token}'}
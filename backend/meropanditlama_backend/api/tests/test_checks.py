@@ -0,0 +1,28 @@
+from django.core.checks import Tags, run_checks
+from django.test import TestCase
+
+
+class SharedCacheCheckTests(TestCase):
+    """The system check warns about a per-process cache unless one process serves everything"""
+
+    LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+    def messages(self):
+        return [message.id for message in run_checks(tags=[Tags.caches])]
+
+    def test_per_process_cache_with_several_workers(self):
+        with self.settings(SINGLE_PROCESS=False, CACHES=self.LOCMEM):
+            self.assertIn('api.W001', self.messages())
+            # A warning: a single-worker deploy still starts
+            self.assertFalse(any(message.is_serious() for message in run_checks(tags=[Tags.caches])))
+
+    def test_single_process(self):
+        with self.settings(SINGLE_PROCESS=True, CACHES=self.LOCMEM):
+            self.assertNotIn('api.W001', self.messages())
+
+    def test_shared_cache(self):
+        shared = {'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/cache',
+        }}
+        with self.settings(SINGLE_PROCESS=False, CACHES=shared):
+            self.assertNotIn('api.W001', self.messages())
@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from api import dbrouter
+from api.providers.models import Service
+
+
+class ReplicaProbeView(dbrouter.ReplicaReadMixin, APIView):
+    """Reports where a read in its handler would go"""
+
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request):
+        return Response(dbrouter.ReplicaRouter().db_for_read(Service))
+
+    def post(self, request):
+        return Response(dbrouter.ReplicaRouter().db_for_read(Service))
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    """Catalog reads go to a replica, unless the user wrote within DATABASE_STICKY_SECONDS"""
+
+    def setUp(self):
+        cache.clear()
+        self.enterContext(patch.object(dbrouter, 'REPLICAS', ['replica1']))
+        self.user = SimpleNamespace(pk=7, is_authenticated=True)
+
+    def request(self, method='get', user=None):
+        request = RequestFactory().generic(method.upper(), '/api/providers/')
+        request.user = user or self.user
+        return request
+
+    def test_reads_use_a_replica_only_in_a_replica_context(self):
+        router = dbrouter.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Service), 'default')
+        self.assertEqual(ReplicaProbeView.as_view()(self.request()).data, 'replica1')
+        self.assertEqual(ReplicaProbeView.as_view()(self.request('post')).data, 'default')
+        # The context ends with the request
+        self.assertEqual(router.db_for_read(Service), 'default')
+        self.assertEqual(router.db_for_write(Service), 'default')
+        with dbrouter.primary_reads():
+            self.assertIsNone(dbrouter.read_alias(self.request()))
+
+    def test_write_request_pins_its_user_to_the_primary(self):
+        middleware = dbrouter.DatabaseRoutingMiddleware(lambda request: HttpResponse())
+        middleware(self.request('get'))
+        self.assertEqual(dbrouter.read_alias(self.request()), 'replica1')
+
+        middleware(self.request('post'))
+        self.assertTrue(dbrouter.is_pinned(self.user))
+        self.assertIsNone(dbrouter.read_alias(self.request()))
+        # Only that user
+        other = SimpleNamespace(pk=8, is_authenticated=True)
+        self.assertEqual(dbrouter.read_alias(self.request(user=other)), 'replica1')
+
+        dbrouter.unpin(self.user.pk)
+        self.assertEqual(dbrouter.read_alias(self.request()), 'replica1')
+
+    def test_pin_lasts_sticky_seconds(self):
+        with patch.object(dbrouter.cache, 'set') as cache_set:
+            dbrouter.pin_to_primary(self.user.pk)
+        cache_set.assert_called_once_with('db:pinned:7', True, dbrouter.STICKY_SECONDS)
+
+    def test_anonymous_writes_pin_nobody(self):
+        middleware = dbrouter.DatabaseRoutingMiddleware(lambda request: HttpResponse())
+        with patch.object(dbrouter, 'pin_to_primary') as pin:
+            middleware(self.request('post', user=SimpleNamespace(pk=None, is_authenticated=False)))
+        pin.assert_not_called()
+
+    def test_no_replicas_means_primary(self):
+        with patch.object(dbrouter, 'REPLICAS', []):
+            self.assertIsNone(dbrouter.read_alias(self.request()))
+            self.assertEqual(ReplicaProbeView.as_view()(self.request()).data, 'default')
@@ -0,0 +1,83 @@
+import io
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from api import indexadvisor
+from api.bookings.models import Booking
+from api.providers.models import Review, Service, ServiceProvider
+
+
+class IndexAdvisorTests(TestCase):
+    """Scans and temporary sorts found in captured queries, and the indexes proposed for them"""
+
+    def advice(self, min_rows=0):
+        """{(kind, table): Meta.indexes line or None} of the queries run in the block"""
+        with indexadvisor.capture() as queries:
+            Booking.objects.filter(notes='x').count()
+            list(Review.objects.filter(comment='a').order_by('-created_at', '-id')[:3])
+            # Served by existing indexes
+            list(Booking.objects.filter(provider_id=1))
+            list(ServiceProvider.objects.filter(verified=True, experience_years__gte=5))
+        return {
+            (kind, table): proposal and indexadvisor.index_source(proposal[1])
+            for _, _, flagged in indexadvisor.advise(queries, min_rows)
+            for kind, table, _, proposal in flagged
+        }
+
+    def test_scans_and_sorts_get_indexes_from_the_query_shape(self):
+        advice = self.advice()
+        self.assertEqual(advice[('scan', 'bookings')], "models.Index(fields=['notes'], name='bookings_notes_c1fcf3_idx')")
+        # Equality columns first, then the ORDER BY, kept ascending as it is all one direction
+        self.assertEqual(
+            advice[('sort', 'reviews')],
+            "models.Index(fields=['comment', 'created_at', 'id'], name='reviews_comment_30a59c_idx')"
+        )
+        self.assertNotIn(('scan', 'service_providers'), advice)
+        self.assertEqual({table for _, table in advice}, {'bookings', 'reviews'})
+
+    def test_small_tables_are_left_alone(self):
+        advice = self.advice(min_rows=1000)
+        self.assertIn(('scan', 'bookings'), advice)
+        self.assertEqual(set(advice.values()), {None})
+
+    def test_boolean_tests_become_partial_index_conditions(self):
+        sql = (
+            'SELECT "availability_slots"."id" FROM "availability_slots" '
+            'WHERE (NOT "availability_slots"."is_booked" AND "availability_slots"."end_time" > %s)'
+        )
+        self.assertEqual(
+            indexadvisor.shape_columns(sql, 'availability_slots'),
+            ([], ['end_time'], {'is_booked': False}, [])
+        )
+        _, index = indexadvisor.propose(connection, 'scan', sql, ['SCAN availability_slots'], 'availability_slots')
+        self.assertEqual(
+            indexadvisor.index_source(index),
+            "models.Index(fields=['end_time'], name='availabilit_end_tim_9118b8_idx', "
+            "condition=models.Q(is_booked=False))"
+        )
+
+    def test_existing_index_drops_the_proposal(self):
+        sql = (
+            'SELECT "service_providers"."id" FROM "service_providers" '
+            'WHERE ("service_providers"."verified" AND "service_providers"."experience_years" >= %s)'
+        )
+        self.assertIsNone(
+            indexadvisor.propose(connection, 'scan', sql, ['SCAN service_providers'], 'service_providers')
+        )
+
+    def test_command_reports_proposals(self):
+        def run(*args, **kwargs):
+            Booking.objects.filter(notes='x').count()
+            Service.objects.filter(description='x').count()
+
+        out = io.StringIO()
+        with mock.patch('api.bookings.management.commands.index_advisor.call_command', side_effect=run):
+            call_command('index_advisor', '--min-rows', '0', '--run', 'anything', stdout=out)
+        report = out.getvalue()
+        self.assertIn('Captured 2 distinct queries from anything.', report)
+        self.assertIn('scan  bookings', report)
+        self.assertIn("  Booking (bookings):\n    models.Index(fields=['notes']", report)
+        self.assertIn("  Service (services):\n    models.Index(fields=['description']", report)
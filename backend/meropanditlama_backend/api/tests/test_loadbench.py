@@ -0,0 +1,55 @@
+from django.core.cache import cache
+from django.test import TransactionTestCase
+
+from api import loadbench, synthetic
+from api.bookings.models import Booking
+from api.providers.stats import find_stats_drift
+from api.testing import SMALL_DATASET
+
+
+class LoadBenchTests(TransactionTestCase):
+    """
+    The load bench over a small synthetic dataset. Not a TestCase: the
+    bench sends from worker threads, which only see committed rows.
+    """
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual([loadbench.percentile(samples, p) for p in (50, 95, 99, 100)], [50, 95, 99, 100])
+        self.assertEqual(loadbench.percentile([7], 99), 7)
+        self.assertIsNone(loadbench.percentile([], 50))
+
+    def test_compare_flags_slower_p95_more_queries_and_errors(self):
+        baseline = {'endpoints': {
+            'providers': {'p95_ms': 10, 'max_queries': 3, 'errors': 0},
+            'bookings': {'p95_ms': 10, 'max_queries': 3, 'errors': 0},
+        }}
+        results = {
+            'providers': {'p95_ms': 11.5, 'max_queries': 3, 'errors': 0},
+            'bookings': {'p95_ms': 13, 'max_queries': 4, 'errors': 1},
+            'new-endpoint': {'p95_ms': 500, 'max_queries': 50, 'errors': 0},
+        }
+        self.assertEqual(loadbench.compare(baseline, results), [
+            'bookings: p95 10 -> 13 ms', 'bookings: queries 3 -> 4', 'bookings: errors 0 -> 1',
+        ])
+
+    def test_run_scenarios_in_process(self):
+        cache.clear()
+        synthetic.generate(**SMALL_DATASET)
+        dataset = loadbench.Dataset()
+        scenarios = {scenario.name: scenario for scenario in loadbench.SCENARIOS}
+        # One writer: the in-memory test database locks whole tables
+        for name, concurrency in (('providers', 2), ('bookings', 2), ('booking-create', 1)):
+            with self.subTest(scenario=name):
+                result = loadbench.run_scenario(
+                    loadbench.InProcessTarget(), scenarios[name], dataset,
+                    requests=6, concurrency=concurrency, warmup=1
+                )
+                self.assertEqual(result['errors'], 0, result.get('first_error'))
+                self.assertEqual(result['requests'], 6)
+                self.assertIsNotNone(result['queries_per_request'])
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertEqual(Booking.objects.filter(notes=loadbench.BOOKING_NOTES).count(), 7)
+        loadbench.cleanup()
+        self.assertFalse(Booking.objects.filter(notes=loadbench.BOOKING_NOTES).exists())
+        self.assertEqual(find_stats_drift()[1], [])
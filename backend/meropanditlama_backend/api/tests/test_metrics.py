@@ -0,0 +1,70 @@
+import json
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase
+
+from api import metrics
+from api.testing import auth_header, future_day, make_booking, make_provider, make_user
+
+
+class MetricsTests(TestCase):
+    """Per-route request metrics, added up across the processes' files"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_user()
+        cls.admin = make_user(is_staff=True)
+        make_booking(cls.customer, make_provider(), future_day(), '10:00')
+
+    def setUp(self):
+        self.directory = Path(self.enterContext(TemporaryDirectory()))
+        self.enterContext(mock.patch.object(metrics, 'METRICS_DIR', self.directory))
+        self.enterContext(mock.patch.object(metrics, 'registry', metrics.Registry()))
+        self.enterContext(mock.patch.object(metrics, '_ensure_flusher'))
+
+    def scrape(self):
+        response = self.client.get('/api/metrics/', **auth_header(self.admin))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def test_requests_are_recorded_per_route(self):
+        for _ in range(2):
+            self.client.get('/api/bookings/', **auth_header(self.customer))
+        text = self.scrape()
+        labels = 'action="list",method="GET",route="booking-list",status="2xx"'
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 2', text)
+        self.assertIn(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2', text)
+        self.assertRegex(text, r'db_queries_total\{route="booking-list"\} \d+')
+
+    def test_other_processes_files_are_added(self):
+        metrics.inc('notifications_total', 2, result='sent')
+        metrics.observe('notification_send_seconds', 0.2, type='confirmed')
+        (self.directory / '1.json').write_text(json.dumps({
+            'counters': [['notifications_total', [['result', 'sent']], 3]],
+            'histograms': [['notification_send_seconds', [['type', 'confirmed']], [0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 20, 1]]],
+        }))
+        (self.directory / '2.json').write_text('{not json')
+        text = self.scrape()
+        self.assertIn('notifications_total{result="sent"} 5', text)
+        self.assertIn('notification_send_seconds_bucket{type="confirmed",le="0.25"} 1', text)
+        self.assertIn('notification_send_seconds_bucket{type="confirmed",le="30"} 2', text)
+        self.assertIn('notification_send_seconds_count{type="confirmed"} 2', text)
+
+    def test_flush_writes_this_process_file(self):
+        metrics.inc('notifications_total', result='sent')
+        metrics.flush()
+        data = json.loads((self.directory / f'{os.getpid()}.json').read_text())
+        self.assertEqual(data['counters'], [['notifications_total', [['result', 'sent']], 1]])
+        # Own file is not counted twice
+        self.assertIn('notifications_total{result="sent"} 1', self.scrape())
+
+    def test_admin_only(self):
+        self.assertEqual(self.client.get('/api/metrics/', **auth_header(self.customer)).status_code, 403)
+
+    def test_default_directory_is_outside_the_source_tree(self):
+        self.assertFalse(Path(settings.METRICS_DIR).resolve().is_relative_to(settings.BASE_DIR.resolve()))
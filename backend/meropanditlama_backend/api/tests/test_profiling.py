@@ -0,0 +1,65 @@
+import re
+from collections import Counter
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase
+
+from api import profiling
+from api.testing import auth_header, future_day, make_booking, make_provider, make_user
+
+
+class ProfilingTests(TestCase):
+    """Server-Timing on responses; collapsed-stack profiles written outside the source tree"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_user()
+        make_booking(cls.customer, make_provider(), future_day(), '10:00')
+
+    def setUp(self):
+        self.directory = Path(self.enterContext(TemporaryDirectory()))
+        self.enterContext(mock.patch.object(profiling, 'PROFILE_DIR', self.directory))
+        self.enterContext(mock.patch.object(profiling, 'ENABLED', True))
+
+    def test_server_timing_phases(self):
+        response = self.client.get('/api/bookings/', **auth_header(self.customer))
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ quer(y|ies)"')
+        self.assertIn('serialize;dur=', timing)
+        self.assertRegex(timing, r'total;dur=[\d.]+$')
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_no_server_timing_unless_enabled(self):
+        with mock.patch.object(profiling, 'ENABLED', False):
+            response = self.client.get('/api/bookings/', **auth_header(self.customer))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+
+    def test_default_directory_is_outside_the_source_tree(self):
+        self.assertFalse(Path(settings.PROFILING_DIR).resolve().is_relative_to(settings.BASE_DIR.resolve()))
+
+    def test_sampled_request_is_written(self):
+        # A sampler that has caught the request three times
+        stacks = Counter({'api.views:handler;django.db:execute': 3})
+        # Profiles are written without the Server-Timing header as well
+        with mock.patch.object(profiling, 'ENABLED', False), \
+                mock.patch.object(profiling, 'SAMPLE_RATE', 1.0), \
+                mock.patch.object(profiling.Sampler, 'track', return_value=stacks), \
+                mock.patch.object(profiling, 'get_sampler', return_value=profiling.Sampler(1)), \
+                self.assertLogs('api.profiling', 'INFO'):
+            self.client.get('/api/bookings/', **auth_header(self.customer))
+        profile, = self.directory.glob('*.folded')
+        self.assertRegex(profile.name, r'-GET-api-bookings-\d+ms\.folded$')
+        self.assertEqual(profile.read_text(), 'api.views:handler;django.db:execute 3\n')
+
+    def test_oldest_profiles_are_removed(self):
+        with mock.patch.object(profiling, 'MAX_FILES', 2):
+            for path in ('/a/', '/b/', '/c/'):
+                profiling.write_profile(Counter({'main': 1}), 'GET', path, 5)
+        self.assertEqual(
+            sorted(re.search(r'-GET-(\w)-', path.name).group(1) for path in self.directory.iterdir()), ['b', 'c']
+        )
@@ -0,0 +1,24 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from api.accounts.revocation import revocation_list
+from api.testing import auth_header, make_user
+
+
+class QueryAccountingMiddlewareTests(TestCase):
+    """X-DB-Queries counts the route's own queries"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_revocation_refresh_is_not_charged(self):
+        user = make_user()
+        revocation_list.ensure_current()
+        revocation_list.refreshed_at = 0.0
+        with mock.patch('api.querycount.ENABLED', True):
+            response = self.client.get('/api/bookings/', **auth_header(user))
+        self.assertGreater(revocation_list.refreshed_at, 0.0)
+        # The user and one page of bookings
+        self.assertEqual(response['X-DB-Queries'], '2')
@@ -0,0 +1,58 @@
+from django.test import TestCase
+from django.utils import timezone
+
+from api import synthetic
+from api.accounts.models import User
+from api.bookings.models import Booking
+from api.providers.models import AvailabilityBitmap, AvailabilitySlot, Service, ServiceProvider
+from api.providers.search import get_search_backend
+from api.providers.stats import find_stats_drift
+from api.testing import SMALL_DATASET
+
+
+class SyntheticDataTests(TestCase):
+    """generate() builds a consistent dataset from its seed; flush() removes it"""
+
+    def snapshot(self):
+        return (
+            list(User.objects.filter(username__startswith=synthetic.PREFIX).order_by('username').values_list(
+                'username', 'first_name', 'last_name', 'phone'
+            )),
+            list(ServiceProvider.objects.order_by('user__username').values_list(
+                'user__username', 'location', 'price_per_service', 'experience_years'
+            )),
+            list(Booking.objects.order_by('requested_datetime', 'provider__user__username').values_list(
+                'provider__user__username', 'requested_datetime', 'status'
+            )),
+        )
+
+    def test_generate_is_consistent_and_deterministic(self):
+        counts = synthetic.generate(**SMALL_DATASET)
+        self.assertEqual(
+            {kind: counts[kind] for kind in ('users', 'providers', 'services', 'bookings', 'reviews')},
+            {'users': 26, 'providers': 6, 'services': 5, 'bookings': 60, 'reviews': 15}
+        )
+        # What bulk inserts skip was rebuilt
+        self.assertEqual(find_stats_drift()[1], [])
+        provider_ids = list(ServiceProvider.objects.values_list('id', flat=True))
+        self.assertTrue(set(get_search_backend().search('pandit')) >= set(provider_ids))
+        bitmaps = set(AvailabilityBitmap.objects.values_list('provider_id', flat=True))
+        self.assertEqual(bitmaps, set(AvailabilitySlot.objects.values_list('provider_id', flat=True)))
+        # Upcoming confirmed bookings hold their slot
+        for booking in Booking.objects.filter(status='confirmed'):
+            local = timezone.localtime(booking.requested_datetime)
+            self.assertTrue(AvailabilitySlot.objects.get(
+                provider_id=booking.provider_id, date=local.date(), start_time=local.time()
+            ).is_booked)
+
+        with self.assertRaises(ValueError):
+            synthetic.generate(**SMALL_DATASET)
+
+        before = self.snapshot()
+        self.assertGreater(synthetic.flush(), 0)
+        self.assertFalse(synthetic.exists())
+        self.assertFalse(ServiceProvider.objects.exists())
+        self.assertFalse(Booking.objects.exists())
+        self.assertFalse(Service.objects.exists())
+        synthetic.generate(**SMALL_DATASET)
+        self.assertEqual(self.snapshot(), before)
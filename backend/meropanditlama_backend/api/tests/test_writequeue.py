@@ -0,0 +1,84 @@
+import threading
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from django.test import SimpleTestCase
+
+from api.writequeue import WriteQueue, WriteQueueTimeout, fcntl
+
+
+class WriteQueueTests(SimpleTestCase):
+    """The write lock goes to waiting threads in arrival order, and to one process at a time"""
+
+    def setUp(self):
+        directory = Path(self.enterContext(TemporaryDirectory()))
+        self.queue = WriteQueue(directory / 'write-lock', record_waits=False)
+
+    def wait_for_queue(self, length):
+        with self.queue.condition:
+            self.assertTrue(self.queue.condition.wait_for(lambda: len(self.queue.waiting) == length, 5))
+
+    def test_waiters_get_the_lock_in_arrival_order(self):
+        order = []
+        release = threading.Event()
+
+        def holder():
+            with self.queue.hold():
+                release.wait(5)
+
+        def writer(number):
+            with self.queue.hold():
+                order.append(number)
+
+        threads = [threading.Thread(target=holder)]
+        threads[0].start()
+        self.wait_for_queue(1)
+        for number in range(5):
+            threads.append(threading.Thread(target=writer, args=(number,)))
+            threads[-1].start()
+            # Queued before the next one arrives
+            self.wait_for_queue(number + 2)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(order, list(range(5)))
+        self.assertEqual(len(self.queue.waiting), 0)
+
+    def test_timeout_leaves_the_queue(self):
+        release = threading.Event()
+
+        def hold_until_released():
+            with self.queue.hold():
+                release.wait(5)
+
+        holder = threading.Thread(target=hold_until_released)
+        holder.start()
+        self.wait_for_queue(1)
+        with self.assertRaises(WriteQueueTimeout):
+            with self.queue.hold(timeout=0.05):
+                pass
+        self.assertEqual(len(self.queue.waiting), 1)
+        release.set()
+        holder.join(5)
+        with self.queue.hold(timeout=1):
+            pass
+
+    def test_nested_hold_is_a_no_op(self):
+        with self.queue.hold():
+            with self.queue.hold(timeout=0):
+                self.assertEqual(len(self.queue.waiting), 1)
+
+    def test_another_process_holding_the_file_lock_blocks(self):
+        if fcntl is None:
+            self.skipTest('flock() is Unix only')
+        # Locks of separate open files conflict like those of separate processes
+        with open(self.queue.path, 'a+b') as other:
+            fcntl.flock(other, fcntl.LOCK_EX)
+            with self.assertRaises(WriteQueueTimeout):
+                with self.queue.hold(timeout=0.05):
+                    pass
+            self.assertEqual(len(self.queue.waiting), 0)
+            fcntl.flock(other, fcntl.LOCK_UN)
+        with self.queue.hold(timeout=1):
+            with open(self.queue.path, 'a+b') as other, self.assertRaises(BlockingIOError):
+                fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
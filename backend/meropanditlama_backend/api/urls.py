@@ -3,11 +3,14 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from api.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.accounts.urls')),
     path('api/', include('api.providers.urls')),
     path('api/', include('api.bookings.urls')),
+    path('api/metrics/', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
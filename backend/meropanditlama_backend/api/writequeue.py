@@ -0,0 +1,158 @@
+"""
+Serialized writes for SQLite.
+
+SQLite takes one writer at a time. With several workers writing at once,
+the losers wait in SQLite's busy handler, which polls with growing
+sleeps, so whoever retries at the right moment goes first and a request
+can wait out the busy timeout and fail.
+
+With SERIALIZE_WRITES (on with SQLITE_PRODUCTION), write requests of the
+booking and availability endpoints queue for the write lock instead:
+
+- within a process, in arrival order (a FIFO of waiting threads)
+- across processes, on an exclusive flock() of WRITE_LOCK_FILE, which one
+  thread per process at a time competes for (Unix only; elsewhere the
+  lock is per process)
+
+The lock is taken after authentication and permission checks and held
+until the view returns. A request that waits longer than
+WRITE_QUEUE_TIMEOUT seconds gets 503. Waits are recorded in the
+db_write_wait_seconds metric and the `write-queue` Server-Timing phase.
+
+Viewsets use SerializedWritesMixin; function views put @serialized_writes
+right above the view function, below @api_view and @permission_classes.
+Holding the lock again inside it (nested views, write_queue.hold()) is a
+no-op.
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import SAFE_METHODS
+
+from api import metrics
+from api.profiling import phase
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+ENABLED = getattr(settings, 'SERIALIZE_WRITES', False)
+LOCK_FILE = getattr(settings, 'WRITE_LOCK_FILE', settings.BASE_DIR / 'db.sqlite3.write-lock')
+TIMEOUT = getattr(settings, 'WRITE_QUEUE_TIMEOUT', 30)
+# Longest sleep between attempts at another process's lock
+POLL_SECONDS = 0.002
+
+
+class WriteQueueTimeout(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The server is busy saving other changes; please try again.'
+    default_code = 'write_queue_timeout'
+
+
+class WriteQueue:
+    """A fair write lock: FIFO between threads, flock() between processes"""
+
+    def __init__(self, path, record_waits=True):
+        self.path = path
+        self.record_waits = record_waits
+        self.condition = threading.Condition()
+        self.waiting = deque()
+        self.local = threading.local()
+        self.file = None
+        self.pid = None
+
+    def _lock_file(self):
+        # A file opened before a fork shares its lock with the parent, so each process opens its own
+        if self.pid != os.getpid():
+            self.file = open(self.path, 'a+b')
+            self.pid = os.getpid()
+        return self.file
+
+    def _lock_process(self, deadline):
+        if fcntl is None:
+            return True
+        lock_file = self._lock_file()
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                time.sleep(min(POLL_SECONDS, remaining))
+
+    def _unlock_process(self):
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+
+    def _leave(self, ticket):
+        with self.condition:
+            self.waiting.remove(ticket)
+            self.condition.notify_all()
+
+    @contextmanager
+    def hold(self, timeout=TIMEOUT):
+        """Hold the write lock for the block; raises WriteQueueTimeout after waiting `timeout` seconds"""
+        if getattr(self.local, 'held', False):
+            yield
+            return
+
+        began = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        ticket = object()
+        with phase('write-queue'):
+            with self.condition:
+                self.waiting.append(ticket)
+                first = self.condition.wait_for(lambda: self.waiting[0] is ticket, timeout)
+            if not first:
+                self._leave(ticket)
+                raise WriteQueueTimeout()
+            if not self._lock_process(deadline):
+                self._leave(ticket)
+                raise WriteQueueTimeout()
+        if self.record_waits:
+            metrics.observe('db_write_wait_seconds', time.perf_counter() - began)
+
+        self.local.held = True
+        try:
+            yield
+        finally:
+            self.local.held = False
+            self._unlock_process()
+            self._leave(ticket)
+
+
+write_queue = WriteQueue(LOCK_FILE)
+
+
+def serialized_writes(view):
+    """Run a function view's write requests (not GET/HEAD/OPTIONS) under the write lock"""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if not ENABLED or request.method in SAFE_METHODS:
+            return view(request, *args, **kwargs)
+        with write_queue.hold():
+            return view(request, *args, **kwargs)
+    return wrapped
+
+
+class SerializedWritesMixin:
+    """Run a viewset's write requests under the write lock, from after the permission checks"""
+
+    def dispatch(self, request, *args, **kwargs):
+        with ExitStack() as self._write_lock:
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if ENABLED and request.method not in SAFE_METHODS:
+            self._write_lock.enter_context(write_queue.hold())